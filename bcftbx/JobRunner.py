@@ -61,7 +61,9 @@ the ``-pe`` argument as part of the 'ge_extra_args' option, for example:
 #######################################################################
 
 from builtins import str
+import sys
 import os
+import getpass
 import io
 import logging
 import subprocess
@@ -70,7 +72,22 @@ import tempfile
 import shutil
 import atexit
 import uuid
-import random
+import threading
+import collections
+import asyncio
+from xml.etree import ElementTree
+
+#######################################################################
+# Constants
+#######################################################################
+
+# Slurm state codes for jobs which have finished
+SLURM_FINISHED_STATES = ("BF", "CA", "CD", "DL", "F", "NF", "OOM",
+                         "PR", "TO")
+
+# Slurm accounting ('sacct') states for jobs which haven't finished
+SACCT_ACTIVE_STATES = ("PENDING", "RUNNING", "REQUEUED", "RESIZING",
+                       "SUSPENDED")
 
 #######################################################################
 # Classes
@@ -98,6 +115,12 @@ class BaseJobRunner:
 
     - ``errorState``: indicates if running job is in an "error state"
     - ``isRunning`` : checks if a specific job is running
+    - ``wait_for_completion``: waits until a job finishes (or a
+      timeout period is reached)
+    - ``async_wait_for_completion``: coroutine version of
+      ``wait_for_completion``, for use with ``asyncio``
+    - ``resource_usage``: returns timings and resource usage
+      (e.g. memory, CPU time) for finished jobs
 
     if the default implementations are not sufficient.
     """
@@ -166,6 +189,79 @@ class BaseJobRunner:
         """
         return None
 
+    def wait_for_completion(self,timeout):
+        """Wait for a job to complete
+
+        Blocks until either a job run by the runner finishes,
+        or the timeout period is reached.
+
+        The default implementation just waits for the timeout
+        period; runners which can detect job completion as it
+        happens should override this.
+
+        Arguments:
+          timeout: maximum time to wait (in seconds)
+
+        Returns:
+          True if a job has completed, False if not (or if
+          it's not known).
+        """
+        time.sleep(timeout)
+        return False
+
+    def resource_usage(self,job_ids):
+        """Return timings and resource usage for finished jobs
+
+        Returns a dictionary with data for each of the specified
+        jobs which has finished and for which the data are
+        available; the data for each job is a dictionary with
+        the following keys:
+
+        - 'start_time': time the job started executing
+          (seconds since the epoch)
+        - 'end_time': time the job finished (seconds since
+          the epoch)
+        - 'max_rss': maximum resident set size (in KiB)
+        - 'cpu_time': total (user plus system) CPU time (in
+          seconds)
+
+        where any of the values may be None if not known.
+
+        The default implementation returns an empty dictionary
+        (i.e. no data available).
+
+        Arguments:
+          job_ids: list of job ids to get data for
+
+        Returns:
+          Dictionary of dictionaries keyed by job id.
+        """
+        return {}
+
+    async def async_wait_for_completion(self,timeout):
+        """Wait for a job to complete (coroutine)
+
+        Awaitable version of ``wait_for_completion``, which
+        can be used from within an ``asyncio`` event loop.
+
+        The default implementation runs ``wait_for_completion``
+        in the event loop's default executor, so that other
+        tasks are not blocked while waiting; runners which can
+        detect job completion as it happens should override
+        this.
+
+        Arguments:
+          timeout: maximum time to wait (in seconds)
+
+        Returns:
+          True if a job has completed, False if not (or if
+          it's not known).
+        """
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None,
+                                          self.wait_for_completion,
+                                          timeout)
+
     @property
     def log_dir(self):
         """Return the current log directory setting
@@ -185,9 +281,16 @@ class BaseJobRunner:
 class SimpleJobRunner(BaseJobRunner):
     """Class implementing job runner for local system
 
-    ``SimpleJobRunner`` starts jobs as processes on a local system;
-    the status of jobs is determined using the Linux ``ps eu``
-    command, and jobs are terminated using ``kill -9``.
+    ``SimpleJobRunner`` starts jobs as processes on a local system,
+    and terminates them using ``kill -9``.
+
+    Each job is monitored by a background thread which waits for
+    the process to finish, so that the exit status is recorded as
+    soon as the job ends (and any callers blocked in
+    ``wait_for_completion`` or awaiting ``async_wait_for_completion``
+    are woken up). The resource usage of the process (as reported
+    by ``getrusage``) is also recorded, and is available via the
+    ``resource_usage`` method.
 
     Arguments:
       log_dir: Directory to write log files to (set to 'None' to use
@@ -217,8 +320,16 @@ class SimpleJobRunner(BaseJobRunner):
         self.__err_fp = {}
         self.__exit_status = {}
         self.__job_popen = {}
+        self.__job_waiters = {}
+        # Timings and resource usage for finished jobs
+        self.__start_times = {}
+        self.__resource_usage = {}
         # Job id lock
         self.__job_lock = ResourceLock()
+        # Set when a job finishes
+        self.__job_completed = threading.Event()
+        # Futures for coroutines waiting for a job to finish
+        self.__async_waiters = []
 
     def __repr__(self):
         name = 'SimpleJobRunner'
@@ -276,6 +387,7 @@ class SimpleJobRunner(BaseJobRunner):
         env = os.environ.copy()
         env['BCFTBX_RUNNER_NSLOTS'] = "%s" % self.nslots
         # Start the subprocess
+        start_time = time.time()
         p = subprocess.Popen(cmd,
                              cwd=working_dir,
                              stdout=log,stderr=err,
@@ -287,6 +399,7 @@ class SimpleJobRunner(BaseJobRunner):
         self.__job_list.append(job_id)
         self.__log_files[job_id] = lognames[0]
         self.__job_popen[job_id] = p
+        self.__start_times[job_id] = start_time
         self.__log_fp[job_id] = log
         if not self.__join_logs:
             self.__err_files[job_id] = lognames[1]
@@ -297,6 +410,12 @@ class SimpleJobRunner(BaseJobRunner):
         # Store name against job id
         if job_id is not None:
             self.__names[job_id] = name
+        # Wait for the job to finish in the background
+        waiter = threading.Thread(target=self.__wait_for_job,
+                                  args=(job_id,p))
+        waiter.daemon = True
+        self.__job_waiters[job_id] = waiter
+        waiter.start()
         # Return the job id
         return job_id
 
@@ -309,9 +428,14 @@ class SimpleJobRunner(BaseJobRunner):
             return False
         # Attempt to terminate
         logging.debug("KillJob: deleting job")
-        p = self.__job_popen[job_id]
+        try:
+            p = self.__job_popen[job_id]
+        except KeyError:
+            # Job has already finished
+            return True
         p.terminate()
-        p.wait()
+        # Wait for the monitoring thread to handle completion
+        self.__job_waiters[job_id].join()
         if job_id not in self.list():
             logging.debug("KillJob: deleted job %s" % job_id)
             return True
@@ -343,52 +467,7 @@ class SimpleJobRunner(BaseJobRunner):
     def list(self):
         """Return a list of running job_ids
         """
-        job_ids = []
-        for job_id in [jid for jid in self.__job_popen]:
-            try:
-                # Get lock on this job id
-                lock = None
-                while lock is None:
-                    lock = self.__job_lock.acquire(job_id)
-                logging.debug("SimpleJobRunner: acquired lock: %s" % lock)
-                # Get the associated Popen instance
-                p = self.__job_popen[job_id]
-            except KeyError:
-                # Job has been removed since the list
-                # was fetched? Ignore
-                logging.debug("SimpleJobRunner: job %s has gone away" %
-                              job_id)
-                self.__job_lock.release(lock)
-                continue
-            status = p.poll()
-            if status is None:
-                job_ids.append(job_id)
-            else:
-                # Set exit status
-                logging.debug("Job id %s: finished (%s)" % (job_id,
-                                                            status))
-                self.__exit_status[job_id] = status
-                # Close output files
-                for fp in (self.__log_fp,
-                           self.__err_fp,):
-                    try:
-                        if fp[job_id] is not None:
-                            fp[job_id].close()
-                    except KeyError:
-                        logging.warning("Job id %s: couldn't get output "
-                                        "file to close" % job_id)
-                # Remove job records
-                for data in (self.__job_popen,
-                             self.__log_fp,
-                             self.__err_fp,):
-                    try:
-                        del(data[job_id])
-                    except KeyError:
-                        logging.warning("Job id %s: record already "
-                                        "deleted?" % job_id)
-            # Release the lock
-            self.__job_lock.release(lock)
-        return job_ids
+        return list(self.__job_popen.keys())
 
     def exit_status(self,job_id):
         """Return exit status from command run by a job
@@ -403,6 +482,164 @@ class SimpleJobRunner(BaseJobRunner):
             logging.error("Don't know anything about job %s" % job_id)
             return None
 
+    def resource_usage(self,job_ids):
+        """Return timings and resource usage for finished jobs
+
+        Returns the start and end times, maximum resident set
+        size (in KiB) and CPU time (in seconds) recorded for
+        each finished job (see ``BaseJobRunner.resource_usage``).
+
+        Arguments:
+          job_ids: list of job ids to get data for
+
+        Returns:
+          Dictionary of dictionaries keyed by job id.
+        """
+        return dict([(job_id,dict(self.__resource_usage[job_id]))
+                     for job_id in job_ids
+                     if job_id in self.__resource_usage])
+
+    def wait_for_completion(self,timeout):
+        """Wait for a job to complete
+
+        Blocks until either a job run by the runner finishes,
+        or the timeout period is reached. Returns immediately
+        if a job has finished since the last call.
+
+        Arguments:
+          timeout: maximum time to wait (in seconds)
+
+        Returns:
+          True if a job has completed, False if the timeout
+          was reached.
+        """
+        completed = self.__job_completed.wait(timeout)
+        self.__job_completed.clear()
+        return completed
+
+    async def async_wait_for_completion(self,timeout):
+        """Wait for a job to complete (coroutine)
+
+        Awaitable version of ``wait_for_completion``: the
+        coroutine is woken directly by the thread monitoring
+        the job process when it exits, so no threads are
+        tied up in the meantime.
+
+        Arguments:
+          timeout: maximum time to wait (in seconds)
+
+        Returns:
+          True if a job has completed, False if the timeout
+          was reached.
+        """
+        loop = asyncio.get_event_loop()
+        waiter = (loop,loop.create_future())
+        self.__async_waiters.append(waiter)
+        try:
+            if not self.__job_completed.is_set():
+                await asyncio.wait_for(waiter[1],timeout)
+            self.__job_completed.clear()
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.__async_waiters.remove(waiter)
+
+    def __wait_for_job(self,job_id,p):
+        """Internal: wait for a job process to finish
+
+        Invoked in a background thread for each job: waits
+        for the process to exit and then records the exit
+        status and resource usage.
+
+        Arguments:
+          job_id: id of the job
+          p: Popen instance for the job process
+        """
+        try:
+            # Use 'wait4' to also get the resource usage
+            pid,status,rusage = os.wait4(p.pid,0)
+            if os.WIFSIGNALED(status):
+                p.returncode = -os.WTERMSIG(status)
+            else:
+                p.returncode = os.WEXITSTATUS(status)
+        except ChildProcessError:
+            # Process was already reaped
+            rusage = None
+        end_time = time.time()
+        status = p.wait()
+        logging.debug("Job id %s: finished (%s)" % (job_id,status))
+        usage = dict(start_time=self.__start_times[job_id],
+                     end_time=end_time,
+                     max_rss=None,
+                     cpu_time=None)
+        if rusage is not None:
+            # NB 'ru_maxrss' is in KiB on Linux but bytes on macOS
+            usage['max_rss'] = rusage.ru_maxrss
+            if sys.platform == 'darwin':
+                usage['max_rss'] = usage['max_rss']//1024
+            usage['cpu_time'] = rusage.ru_utime + rusage.ru_stime
+        self.__resource_usage[job_id] = usage
+        self.__handle_job_completion(job_id,status)
+
+    def __handle_job_completion(self,job_id,status):
+        """Internal: deal with completion of a job
+
+        Records the exit status, closes the output files and
+        removes the job from the list of running jobs, then
+        signals that a job has completed. Does nothing if the
+        job has already been handled.
+
+        Arguments:
+          job_id: id of the job
+          status: exit status of the job process
+        """
+        lock = self.__job_lock.acquire(job_id)
+        try:
+            if job_id not in self.__job_popen:
+                # Already handled
+                return
+            # Set exit status
+            self.__exit_status[job_id] = status
+            # Close output files
+            for fp in (self.__log_fp,
+                       self.__err_fp,):
+                try:
+                    if fp[job_id] is not None:
+                        fp[job_id].close()
+                except KeyError:
+                    logging.warning("Job id %s: couldn't get output "
+                                    "file to close" % job_id)
+            # Remove job records
+            for data in (self.__job_popen,
+                         self.__log_fp,
+                         self.__err_fp,):
+                try:
+                    del(data[job_id])
+                except KeyError:
+                    logging.warning("Job id %s: record already "
+                                    "deleted?" % job_id)
+        finally:
+            self.__job_lock.release(lock)
+        # Wake up anything waiting for a job to complete
+        self.__job_completed.set()
+        for loop,future in list(self.__async_waiters):
+            try:
+                loop.call_soon_threadsafe(self.__notify_waiter,future)
+            except RuntimeError:
+                # Event loop has been closed
+                pass
+
+    @staticmethod
+    def __notify_waiter(future):
+        """Internal: signal job completion to an awaiting coroutine
+
+        Arguments:
+          future: Future that the coroutine is awaiting
+        """
+        if not future.done():
+            future.set_result(True)
+
     def __assign_log_files(self,name,working_dir):
         """Internal: return log file names for stdout and stderr
 
@@ -435,6 +672,12 @@ class GEJobRunner(BaseJobRunner):
     it uses for internal admin; this will be removed at program
     exit via 'atexit'.
 
+    Job completion and exit status are detected using files written
+    to the admin directory by each job. Jobs which disappear from
+    ``qstat`` without writing an exit status (for example, if they
+    were killed by Grid Engine) are checked using a single ``qacct``
+    call for all such jobs.
+
     Arguments:
       queue (str): name of GE queue to use (set to 'None' to use
         default queue)
@@ -483,11 +726,17 @@ class GEJobRunner(BaseJobRunner):
         self.__cached_qstat_output_lifetime = 2.0
         self.__cached_qstat_output_timestamp = 0.0
         self.__cached_qstat_output = None
+        # Use XML output from qstat (switches to plain text
+        # output if XML output isn't available)
+        self.__qstat_xml = True
         # Grace period for new jobs
         self.__new_job_grace_period = 2.0
         # Polling intervals and timeout periods (seconds)
         self.__ge_poll_interval = poll_interval
         self.__ge_timeout = timeout
+        # Handling jobs which are no longer known to qstat
+        self.__creation_time = time.time()
+        self.__missing_job_last_checked = 0.0
         # Register clean up function
         atexit.register(self.__clean_up_admin_dir)
 
@@ -549,16 +798,16 @@ class GEJobRunner(BaseJobRunner):
         logging.debug("Arguments  : %s" % str(args))
         # Wait for lock on job submission
         start_time = time.time()
-        submit_lock = None
-        while submit_lock is None:
-            submit_lock = self.__submit_lock.acquire("job_submission",
-                                                     timeout=self.__ge_timeout)
-        # Get internal job number
-        self.__job_count += 1
-        job_number = self.__job_count
-        logging.debug("Internal job count: %s" % job_number)
-        # Release the lock
-        self.__submit_lock.release(submit_lock)
+        submit_lock = self.__submit_lock.acquire("job_submission",
+                                                 timeout=self.__ge_timeout)
+        try:
+            # Get internal job number
+            self.__job_count += 1
+            job_number = self.__job_count
+            logging.debug("Internal job count: %s" % job_number)
+        finally:
+            # Release the lock
+            self.__submit_lock.release(submit_lock)
         # Build script to run the command to be submitted
         job_dir = os.path.join(self.__admin_dir,str(job_number))
         logging.debug("Job admin dir     : %s" % job_dir)
@@ -720,9 +969,13 @@ exit $exit_code
                                   "__queue")
         logging.debug("GEJobRunner: queue file: %s" % queue_file)
         if not os.path.exists(queue_file):
-            # No queue file available
+            # No queue file available so try qstat instead
             logging.debug("GEJobRunner: queue file not found")
-            return None
+            qstat = self.__run_qstat()
+            try:
+                return qstat[job_id]['queue']
+            except (TypeError,KeyError):
+                return None
         # Extract queue name from file
         try:
             with io.open(queue_file,'rt') as fp:
@@ -778,6 +1031,12 @@ exit $exit_code
                 else:
                     # Job still running
                     job_ids.append(job_id)
+        # Check for jobs which are no longer known to Grid Engine
+        if job_ids and ((time.time() - self.__missing_job_last_checked) >
+                        self.__ge_poll_interval):
+            job_ids = self.__handle_missing_jobs(job_ids,
+                                                 grace_period_jobs)
+            self.__missing_job_last_checked = time.time()
         # Update cache
         self.__cached_job_list_timestamp = time.time()
         self.__cached_job_list = [j for j in job_ids]
@@ -813,6 +1072,35 @@ exit $exit_code
         # Return cached exit status
         return self.__exit_status[job_id]
 
+    async def async_wait_for_completion(self,timeout):
+        """Wait for a job to complete (coroutine)
+
+        Checks the job list at the interval it is cached for
+        (running 'list' in the event loop's default executor,
+        so that the loop isn't blocked), and returns as soon
+        as a job which was queued or running when the wait
+        started is no longer in the list.
+
+        Arguments:
+          timeout: maximum time to wait (in seconds)
+
+        Returns:
+          True if a job has completed, False if the timeout
+          was reached.
+        """
+        loop = asyncio.get_event_loop()
+        end_time = time.time() + timeout
+        job_ids = set(await loop.run_in_executor(None,self.list))
+        while True:
+            remaining = end_time - time.time()
+            if remaining <= 0:
+                return False
+            await asyncio.sleep(min(self.__cached_job_list_lifetime,
+                                    remaining))
+            if job_ids.difference(await loop.run_in_executor(None,
+                                                             self.list)):
+                return True
+
     def __make_admin_dir(self):
         """Internal: create temporary directory for admin etc
 
@@ -872,30 +1160,86 @@ exit $exit_code
         """
         logging.debug("GEJobRunner: update grace period for "
                       "for job %s" % job_id)
-        lock = None
-        while lock is None:
-            lock = self.__updating_grace_period.acquire(job_id)
+        lock = self.__updating_grace_period.acquire(job_id)
         logging.debug("GEJobRunner: acquired lock for grace period "
                       "update: %s" % lock)
         try:
-            start_time = self.__start_time[job_id]
-        except KeyError:
-            logging.debug("GEJobRunner: update grace period: job %s "
-                          "has gone away (ignored)" % job_id)
-            self.__updating_grace_period.release(lock)
-            return
-        if ((time.time() - start_time) > self.__new_job_grace_period):
-            # Job no longer in grace period
-            logging.debug("GEJobRunner: job %s no longer in grace "
-                          "period" % job_id)
             try:
-                del(self.__start_time[job_id])
+                start_time = self.__start_time[job_id]
             except KeyError:
-                logging.debug("GEJobRunner: update grace period: "
-                              "job %s has gone away (ignored)" %
-                              job_id)
-        # Release update lock
-        self.__updating_grace_period.release(lock)
+                logging.debug("GEJobRunner: update grace period: job %s "
+                              "has gone away (ignored)" % job_id)
+                return
+            if ((time.time() - start_time) > self.__new_job_grace_period):
+                # Job no longer in grace period
+                logging.debug("GEJobRunner: job %s no longer in grace "
+                              "period" % job_id)
+                try:
+                    del(self.__start_time[job_id])
+                except KeyError:
+                    logging.debug("GEJobRunner: update grace period: "
+                                  "job %s has gone away (ignored)" %
+                                  job_id)
+        finally:
+            # Release update lock
+            self.__updating_grace_period.release(lock)
+
+    def __handle_missing_jobs(self,job_list,grace_period_jobs):
+        """
+        Internal: handle jobs which have gone from Grid Engine
+
+        Jobs which are no longer reported by 'qstat' but which
+        haven't written an exit code file are looked up using a
+        single 'qacct' call; the exit status is recorded for
+        those jobs that 'qacct' reports on, and the jobs are then
+        completed.
+
+        Jobs which 'qacct' doesn't know about yet are left as
+        running (accounting information can take some time to
+        become available).
+
+        Arguments:
+          job_list: list of job IDs to check
+          grace_period_jobs: list of job IDs for jobs still in
+            the grace period (these will not be checked)
+
+        Returns:
+          List of job IDs with completed jobs removed.
+        """
+        qstat = self.__run_qstat()
+        if qstat is None:
+            # Unable to get job list from qstat
+            return job_list
+        missing_jobs = [job_id for job_id in job_list
+                        if job_id not in qstat and
+                        job_id not in grace_period_jobs]
+        if not missing_jobs:
+            return job_list
+        logging.debug("GEJobRunner: jobs missing from qstat: %s" %
+                      missing_jobs)
+        qacct = self.__run_qacct_batch(missing_jobs)
+        updated_job_list = []
+        for job_id in job_list:
+            if job_id not in qacct:
+                updated_job_list.append(job_id)
+                continue
+            try:
+                exit_status = int(qacct[job_id]['exit_status'])
+            except (KeyError,ValueError):
+                exit_status = 127
+            logging.debug("GEJobRunner: exit status for job %s from "
+                          "qacct: %s" % (job_id,exit_status))
+            # Write an exit code file for the job (unless the
+            # job wrote its own in the meantime)
+            exit_code_file = os.path.join(self.__admin_dir,
+                                          str(self.__job_number[job_id]),
+                                          "__exit_code")
+            if not os.path.exists(exit_code_file):
+                with io.open("%s.tmp" % exit_code_file,'wt') as fp:
+                    fp.write(u"%s\n" % exit_status)
+                os.rename("%s.tmp" % exit_code_file,exit_code_file)
+            self.__handle_job_completion(job_id)
+        return updated_job_list
 
     def __handle_job_completion(self,job_id):
         """
@@ -920,40 +1264,41 @@ exit $exit_code
         """
         logging.debug("GEJobRunner: handle job completion for %s"
                       % job_id)
-        lock = None
-        while lock is None:
-            lock = self.__job_lock.acquire(job_id)
+        lock = self.__job_lock.acquire(job_id)
         logging.debug("GEJobRunner: acquired lock: %s" % lock)
-        if job_id not in self.__job_number:
-            # Job has gone away
-            logging.debug("GEJobRunner: job %s has gone away" %
-                          job_id)
-            self.__job_lock.release(lock)
-            return
-        self.__finalizing[job_id] = True
-        # Check there is an exit code file
-        exit_code_file = os.path.join(self.__admin_dir,
-                                      str(self.__job_number[job_id]),
-                                      "__exit_code")
-        assert(os.path.exists(exit_code_file))
         try:
-            with io.open(exit_code_file,'rt') as fp:
-                exit_status = int(fp.read())
-        except Exception as ex:
-            # Set exit status to 127
-            logging.error("GEJobRunner: exception when "
-                          "reading exit_status for job "
-                          "%s: %s" % (job_id,ex))
-            exit_status = 127
-        # Update queue information
-        self.queue(job_id)
-        # Store exit status and clean up
-        self.__exit_status[job_id] = exit_status
-        self.__clean_up_job(job_id)
-        # Release finalization lock
-        del(self.__finalizing[job_id])
-        # Release job lock
-        self.__job_lock.release(lock)
+            if job_id not in self.__job_number:
+                # Job has gone away
+                logging.debug("GEJobRunner: job %s has gone away" %
+                              job_id)
+                return
+            self.__finalizing[job_id] = True
+            try:
+                # Check there is an exit code file
+                exit_code_file = os.path.join(self.__admin_dir,
+                                              str(self.__job_number[job_id]),
+                                              "__exit_code")
+                assert(os.path.exists(exit_code_file))
+                try:
+                    with io.open(exit_code_file,'rt') as fp:
+                        exit_status = int(fp.read())
+                except Exception as ex:
+                    # Set exit status to 127
+                    logging.error("GEJobRunner: exception when "
+                                  "reading exit_status for job "
+                                  "%s: %s" % (job_id,ex))
+                    exit_status = 127
+                # Update queue information
+                self.queue(job_id)
+                # Store exit status and clean up
+                self.__exit_status[job_id] = exit_status
+                self.__clean_up_job(job_id)
+            finally:
+                # Release finalization lock
+                del(self.__finalizing[job_id])
+        finally:
+            # Release job lock
+            self.__job_lock.release(lock)
 
     def __clean_up_job(self,job_id):
         """Internal: clean up internal job files
@@ -988,53 +1333,247 @@ exit $exit_code
         # Remove the internally stored job number
         del(self.__job_number[job_id])
 
+    def __user(self):
+        """Internal: return the name of the current user
+
+        Uses the login name if available, otherwise falls
+        back to the user name from the environment or the
+        password database.
+
+        Returns:
+          String: the user name, or None if it can't be
+            determined.
+        """
+        try:
+            return os.getlogin()
+        except OSError:
+            # os.getlogin() not guaranteed to work in all environments
+            pass
+        try:
+            return getpass.getuser()
+        except Exception:
+            return None
+
     def __run_qstat(self):
-        """Internal: run qstat and return data as a list of lists
+        """Internal: run qstat and return job data as a dictionary
 
         Runs 'qstat' command, processes the output and returns a
-        list where each item is the data for a job in the form of
-        another list, with the items in this list being the data
-        returned by qstat.
+        dictionary where the keys are job IDs and the values are
+        dictionaries with the 'name', 'state' and 'queue' for each
+        job, for example:
+
+        { '620848': { 'name': 'qc', 'state': 'r',
+                      'queue': 'serial.q@node001' }, ... }
+
+        The XML output from 'qstat -xml' is used by default; if this
+        can't be parsed then the plain text output is used instead.
 
         NB as 'qstat' calls can be expensive to make, a caching
         mechanism is used which stores the output from 'qstat'
         for a specified period.
+
+        Returns:
+          Dictionary of job data, or None if 'qstat' failed.
         """
         # Should we return the cached data?
-        if (time.time() - self.__cached_qstat_output_timestamp) < \
-           self.__cached_qstat_output_lifetime:
+        if (self.__cached_qstat_output is not None and
+            (time.time() - self.__cached_qstat_output_timestamp) <
+            self.__cached_qstat_output_lifetime):
             logging.debug("GEJobRunner: returning cached qstat output")
             return self.__cached_qstat_output
         # Run qstat and collect the output
-        try:
-            cmd = ['qstat','-u',os.getlogin()]
-        except OSError:
-            # os.getlogin() not guaranteed to work in all environments?
-            cmd = ['qstat']
-        # Run qstat command
+        cmd = ['qstat']
+        user = self.__user()
+        if user is not None:
+            cmd.extend(['-u',user])
+        qstat_output = None
+        if self.__qstat_xml:
+            # Run qstat command and parse the XML output as it
+            # is generated
+            p = subprocess.Popen(cmd + ['-xml'],
+                                 stdout=subprocess.PIPE,
+                                 stderr=subprocess.DEVNULL)
+            parse_error = None
+            try:
+                qstat_output = self.__parse_qstat_xml(p.stdout)
+            except ElementTree.ParseError as ex:
+                parse_error = ex
+            # Discard any remaining output
+            p.stdout.read()
+            p.stdout.close()
+            if p.wait() != 0:
+                # Failed qstat call doesn't mean that the XML
+                # output is unusable
+                logging.warning("GEJobRunner: 'qstat' returned %s" %
+                                p.returncode)
+                return None
+            if parse_error is not None:
+                # Successful qstat call but the output can't be
+                # parsed, so stop using XML
+                logging.warning("GEJobRunner: unable to parse output from "
+                                "'qstat -xml' (%s), falling back to plain "
+                                "text output" % parse_error)
+                self.__qstat_xml = False
+        if qstat_output is None:
+            # Run qstat command with plain text output
+            p = subprocess.Popen(cmd,
+                                 stdout=subprocess.PIPE,
+                                 universal_newlines=True)
+            stdoutdata = p.communicate()[0]
+            if p.returncode != 0:
+                logging.warning("GEJobRunner: 'qstat' returned %s" %
+                                p.returncode)
+                return None
+            qstat_output = self.__parse_qstat_text(stdoutdata)
+        # Update the cache
+        self.__cached_qstat_output_timestamp = time.time()
+        self.__cached_qstat_output = qstat_output
+        return qstat_output
+
+    def __parse_qstat_xml(self,fp):
+        """Internal: parse XML output from 'qstat -xml'
+
+        Typical output is:
+
+        <?xml version='1.0'?>
+        <job_info ...>
+          <queue_info>
+            <job_list state="running">
+              <JB_job_number>620848</JB_job_number>
+              <JAT_prio>0.50500</JAT_prio>
+              <JB_name>qc</JB_name>
+              <JB_owner>myname</JB_owner>
+              <state>r</state>
+              <JAT_start_time>2018-07-09T16:53:03</JAT_start_time>
+              <queue_name>serial.q@node001</queue_name>
+              <slots>1</slots>
+            </job_list>
+            ...
+          </queue_info>
+          <job_info>
+            <job_list state="pending">
+            ...
+          </job_info>
+        </job_info>
+
+        i.e. one 'job_list' element per job, with running jobs
+        under 'queue_info' and pending jobs under 'job_info'.
+
+        The elements are processed incrementally and discarded
+        once processed, so the whole document is never held in
+        memory.
+
+        Arguments:
+          fp: file-like object to read the XML from
+
+        Returns:
+          Dictionary of job data keyed by job ID (see
+          '__run_qstat').
+        """
+        qstat_output = {}
+        for event,elem in ElementTree.iterparse(fp):
+            if elem.tag != 'job_list':
+                continue
+            job_id = elem.findtext('JB_job_number')
+            if job_id:
+                qstat_output[job_id.strip()] = dict(
+                    name=elem.findtext('JB_name'),
+                    state=(elem.findtext('state') or '').strip(),
+                    queue=(elem.findtext('queue_name') or None))
+            elem.clear()
+        return qstat_output
+
+    def __parse_qstat_text(self,text):
+        """Internal: parse plain text output from 'qstat'
+
+        Typical output is:
+
+        job-ID  prior   name       user         ...<snipped>...
+        ----------------------------------------...<snipped>...
+        620848 -499.50000 qc       myname       ...<snipped>...
+        ...
+
+        i.e. 2 header lines then one line per job (the queue
+        column is empty for jobs which are not running).
+
+        Arguments:
+          text (str): output from 'qstat'
+
+        Returns:
+          Dictionary of job data keyed by job ID (see
+          '__run_qstat').
+        """
+        qstat_output = {}
+        for line in text.split('\n'):
+            data = line.split()
+            try:
+                if not data[0].isdigit():
+                    continue
+                qstat_output[data[0]] = dict(
+                    name=data[2],
+                    state=data[4],
+                    queue=(data[7] if len(data) > 8 else None))
+            except IndexError:
+                # Skip this line
+                pass
+        return qstat_output
+
+    def __run_qacct_batch(self,job_ids):
+        """Internal: get accounting information for multiple jobs
+
+        Runs a single 'qacct -j' command to get the accounting
+        information for all jobs started since the runner was
+        created, and returns the information for the requested
+        jobs as a dictionary of dictionaries keyed by job ID, for
+        example:
+
+        { '9859': { 'qname': 'serial.q', 'exit_status': '0', ... },
+          ... }
+
+        See the '__run_qacct' method for the caveats on using
+        'qacct'; jobs which 'qacct' doesn't report on will not
+        be included in the returned dictionary.
+
+        Arguments:
+          job_ids: list of job IDs to get information for
+
+        Returns:
+          Dictionary of accounting information keyed by job ID.
+        """
+        # Restrict to jobs started since the runner was created
+        # (NB 'qacct -b' has a resolution of minutes)
+        begin_time = time.strftime("%Y%m%d%H%M",
+                                   time.localtime(self.__creation_time-60))
+        cmd = ['qacct','-j','-b',begin_time]
+        # Restrict to jobs belonging to the current user
+        user = self.__user()
+        if user is not None:
+            cmd.extend(['-o',user])
         p = subprocess.Popen(cmd,
                              stdout=subprocess.PIPE,
+                             stderr=subprocess.PIPE,
                              universal_newlines=True)
-        stdoutdata = p.communicate()[0]
-        # Process the output
-        qstat_output = []
-        # Typical output is:
-        # job-ID  prior   name       user         ...<snipped>...
-        # ----------------------------------------...<snipped>...
-        # 620848 -499.50000 qc       myname       ...<snipped>...
-        # ...
-        # i.e. 2 header lines then one line per job
-        for line in stdoutdata.split('\n'):
+        stdoutdata,stderrdata = p.communicate()
+        # Output consists of blocks of key-value pairs (one pair
+        # per line, see '__run_qacct') with each block preceeded
+        # by a line of '=' characters
+        job_ids = set(job_ids)
+        qacct_data = {}
+        qacct_dict = {}
+        for line in stdoutdata.split('\n') + ['=']:
+            if line.startswith('='):
+                job_id = qacct_dict.get('jobnumber')
+                if job_id in job_ids:
+                    qacct_data[job_id] = qacct_dict
+                qacct_dict = {}
+                continue
             try:
-                if line.split()[0].isdigit():
-                    qstat_output.append(line.split())
-            except IndexError:
+                i = line.index(" ")
+                qacct_dict[line[:i].strip()] = line[i:].strip()
+            except ValueError:
                 # Skip this line
                 pass
-        # Update the cache
-        self.__cached_qstat_output_timestamp = time.time()
-        self.__cached_qstat_output = qstat_output
-        return qstat_output
+        return qacct_data
 
     def __run_qacct(self,job_id):
         """Internal: run qacct and return data as a dictionary
@@ -1131,17 +1670,11 @@ exit $exit_code
         logging.debug("GEJobRunner: acquiring state for job %s"
                       % job_id)
         qstat = self.__run_qstat()
-        job_ids = []
-        job_states = {}
-        for job_data in qstat:
-            id_ = job_data[0]
-            state = job_data[4]
-            logging.debug("GEJobRunner: found job %s (state '%s')"
-                          % (id_,state))
-            if id_ == job_id:
-                return state
-        # Job not found
-        return ""
+        try:
+            return qstat[job_id]['state']
+        except (TypeError,KeyError):
+            # Job not found
+            return ""
 
     def __ge_name(self,name):
         """Internal: sanitize a name for use with GE
@@ -1170,6 +1703,11 @@ class SlurmRunner(BaseJobRunner):
     it uses for internal admin; this will be removed at program
     exit via 'atexit'.
 
+    Jobs submitted by another SlurmRunner instance (e.g. in a
+    previous session) can be monitored by the runner after
+    calling 'reattach'; the exit status for these jobs is
+    obtained from 'sacct' once they finish.
+
     Arguments:
       log_dir (str): path of directory to write log files to (set to 'None'
         to use cwd)
@@ -1210,6 +1748,10 @@ class SlurmRunner(BaseJobRunner):
         self._finalizing = {}
         self._queue = {}
         self._start_time = {}
+        # Admin dirs for job arrays (and the jobs using them)
+        self._array_dirs = {}
+        # Jobs submitted by other runners
+        self._reattached = set()
         # Job id lock
         self._job_lock = ResourceLock()
         # Job grace period lock
@@ -1221,10 +1763,24 @@ class SlurmRunner(BaseJobRunner):
         self._cached_job_list_timestamp = 0.0
         self._cached_job_list = []
         self._cached_job_list_force_update = True
-        # Cached qstat output
+        # Cached squeue output (the lifetime adapts between the
+        # minimum and maximum depending on whether job states are
+        # changing)
+        self._cached_squeue_output_min_lifetime = 0.5
+        self._cached_squeue_output_max_lifetime = 10.0
         self._cached_squeue_output_lifetime = 0.5
         self._cached_squeue_output_timestamp = 0.0
         self._cached_squeue_output = None
+        self._cached_squeue_job_ids = set()
+        self._cached_squeue_output_force_update = True
+        # Maximum number of job IDs per squeue query
+        self._squeue_max_job_ids = 500
+        # Cumulative time spent checking job status (see the
+        # 'timings' property)
+        self._timings = dict(list_calls=0,
+                             filesystem=0.0,
+                             squeue_calls=0,
+                             squeue=0.0)
         # Grace period for new jobs
         self._new_job_grace_period = 2.0
         # Polling intervals and timeout periods (seconds)
@@ -1316,6 +1872,23 @@ class SlurmRunner(BaseJobRunner):
         else:
             return None
 
+    @property
+    def timings(self):
+        """
+        Return cumulative timings for checking job status
+
+        Returns a dictionary with the following items:
+
+        - 'list_calls': number of times the job list was
+          rebuilt (i.e. 'list' calls not using the cache)
+        - 'filesystem': total time (in seconds) spent checking
+          the admin directory for finished jobs
+        - 'squeue_calls': number of times 'squeue' was run
+        - 'squeue': total time (in seconds) spent running
+          'squeue'
+        """
+        return dict(self._timings)
+
     def run(self, name, working_dir, script, args):
         """
         Submit a script or command to the cluster via 'sbatch'
@@ -1342,16 +1915,16 @@ class SlurmRunner(BaseJobRunner):
         logging.debug(f"Arguments  : {str(args)}")
         # Wait for lock on job submission
         start_time = time.time()
-        submit_lock = None
-        while submit_lock is None:
-            submit_lock = self._submit_lock.acquire("job_submission",
-                                                    timeout=self._timeout)
-        # Get internal job number
-        self._job_count += 1
-        job_number = self._job_count
-        logging.debug("Internal job count: %s" % job_number)
-        # Release the lock
-        self._submit_lock.release(submit_lock)
+        submit_lock = self._submit_lock.acquire("job_submission",
+                                                timeout=self._timeout)
+        try:
+            # Get internal job number
+            self._job_count += 1
+            job_number = self._job_count
+            logging.debug("Internal job count: %s" % job_number)
+        finally:
+            # Release the lock
+            self._submit_lock.release(submit_lock)
         # Build script to run the command to be submitted
         job_dir = os.path.join(self._admin_dir, str(job_number))
         logging.debug("Job admin dir     : %s" % job_dir)
@@ -1370,10 +1943,13 @@ export BCFTBX_RUNNER_NSLOTS=$SLURM_NTASKS
 echo "$BCFTBX_RUNNER_NSLOTS" > {job_dir}/__jobrunner_nslots
 {cmd}
 exit_code=$?
-echo "$exit_code" > {job_dir}/__exit_code.tmp
-mv {job_dir}/__exit_code.tmp {job_dir}/__exit_code
+echo "$exit_code" > {exit_code_file}.tmp
+mv {exit_code_file}.tmp {exit_code_file}
 exit $exit_code
-""".format(shell=self._shell, job_dir=job_dir, cmd=cmd))
+""".format(shell=self._shell,
+           job_dir=job_dir,
+           cmd=cmd,
+           exit_code_file=self._exit_code_file(job_number)))
         os.chmod(job_script,0o755)
         job_name = self._sanitize_job_name(name)
         logging.debug("Slurm job name: %s" % job_name)
@@ -1439,11 +2015,183 @@ exit $exit_code
             else:
                 self._log_dirs[job_id] = self.log_dir
             self._start_time[job_id] = time.time()
-        # Force refresh of job list
+        # Force refresh of job list and squeue output
         self._cached_job_list_force_update = True
+        self._cached_squeue_output_force_update = True
         # Return the job id
         return job_id
 
+    def run_array(self, name, working_dir, script, args_list,
+                  max_running=None):
+        """
+        Submit multiple runs of a script as a Slurm job array
+
+        Writes a single wrapper script which runs the script or
+        command with the arguments for each array task, and
+        submits it using a single 'sbatch --array=...' command.
+
+        Each task in the array gets its own job ID (of the form
+        '<ARRAY_JOB_ID>_<TASK_ID>'), which can be used with the
+        other runner methods (e.g. 'isRunning', 'exit_status'
+        etc) in the same way as job IDs returned by 'run'.
+
+        Arguments:
+          name (str): name to give the job array
+          working_dir (str): path to directory to run the jobs in
+          script (str): path to command or script file to run
+          args_list (list): list of argument lists, one for each
+            run of the script (i.e. each task in the array)
+          max_running (int): optional, if set then limit the
+            number of tasks in the array that Slurm will run
+            simultaneously
+
+        Returns:
+          List of job ids for the array tasks (in the same order
+          as the argument lists), or 'None' if the array failed
+          to start.
+        """
+        args_list = [args for args in args_list]
+        ntasks = len(args_list)
+        logging.debug(f"{self._name:11}: submitting job array")
+        logging.debug(f"Name       : {name}")
+        logging.debug(f"Tasks      : {ntasks}")
+        logging.debug(f"Working_dir: {working_dir}")
+        logging.debug(f"Script     : {script}")
+        if ntasks == 0:
+            return []
+        # Wait for lock on job submission
+        submit_lock = self._submit_lock.acquire("job_submission",
+                                                timeout=self._timeout)
+        try:
+            # Get a block of internal job numbers (one for each task)
+            first_job_number = self._job_count + 1
+            self._job_count += ntasks
+            logging.debug("Internal job numbers: %s-%s" %
+                          (first_job_number, self._job_count))
+        finally:
+            # Release the lock
+            self._submit_lock.release(submit_lock)
+        # Make admin dirs for each task
+        for i in range(ntasks):
+            os.mkdir(os.path.join(self._admin_dir,
+                                  str(first_job_number + i)))
+        # Build script which runs the command for each task
+        array_dir = os.path.join(self._admin_dir,
+                                 f"array.{first_job_number}")
+        logging.debug("Array admin dir   : %s" % array_dir)
+        os.mkdir(array_dir)
+        cmds = []
+        for i, args in enumerate(args_list):
+            cmd_args = [script]
+            for arg in args:
+                # Quote arguments containing whitespace
+                if arg.count(' ') or arg.count('\t'):
+                    arg = "\"%s\"" % arg
+                cmd_args.append(arg)
+            cmds.append(f"    {i})\n        {' '.join(cmd_args)}\n        ;;")
+        job_script = os.path.join(array_dir, "job_script.sh")
+        with open(job_script, "wt") as fp:
+            fp.write(u"""#!{shell}
+export BCFTBX_RUNNER_NSLOTS=$SLURM_NTASKS
+job_number=$(({first_job_number} + $SLURM_ARRAY_TASK_ID))
+job_dir={admin_dir}/$job_number
+echo "$BCFTBX_RUNNER_NSLOTS" > $job_dir/__jobrunner_nslots
+case $SLURM_ARRAY_TASK_ID in
+{cmds}
+    *)
+        echo "No command for array task $SLURM_ARRAY_TASK_ID" >&2
+        (exit 127)
+        ;;
+esac
+exit_code=$?
+echo "$exit_code" > {admin_dir}/__exit_code.$job_number.tmp
+mv {admin_dir}/__exit_code.$job_number.tmp {admin_dir}/__exit_code.$job_number
+exit $exit_code
+""".format(shell=self._shell,
+           admin_dir=self._admin_dir,
+           first_job_number=first_job_number,
+           cmds='\n'.join(cmds)))
+        os.chmod(job_script,0o755)
+        job_name = self._sanitize_job_name(name)
+        logging.debug("Slurm job name: %s" % job_name)
+        # Log files (one per task)
+        stdout = "%x.o%A_%a"
+        if self.log_dir:
+            stdout = os.path.join(self.log_dir, stdout)
+        if self.join_logs:
+            stderr = None
+        else:
+            stderr = "%x.e%A_%a"
+            if self.log_dir:
+                stderr = os.path.join(self.log_dir, stderr)
+        # Build sbatch command to submit script
+        array = f"0-{ntasks-1}"
+        if max_running:
+            array += f"%{max_running}"
+        sbatch = ["sbatch",
+                  "--export=ALL",
+                  f"--array={array}",
+                  "-J", job_name,
+                  "-n", str(self.nslots)]
+        if self._partition:
+            sbatch.extend(["-p", self._partition])
+        sbatch.extend(["-o", stdout])
+        if stderr:
+            sbatch.extend(["-e", stderr])
+        if working_dir:
+            sbatch.extend(('--chdir',working_dir))
+        if self.slurm_extra_args:
+            sbatch.extend(self.slurm_extra_args)
+        sbatch.append(job_script)
+        logging.debug("SlurmRunner: sbatch command: %s" % sbatch)
+        # Run the sbatch job in the current directory
+        cwd = os.getcwd()
+        if not os.path.exists(cwd):
+            logging.error("SlurmRunner: cwd doesn't exist!")
+            return None
+        p = subprocess.Popen(sbatch, cwd=cwd,
+                             stdout=subprocess.PIPE,
+                             stderr=subprocess.PIPE,
+                             universal_newlines=True)
+        stdoutdata, stderrdata = p.communicate()
+        logging.debug(f"SlurmRunner: sbatch output: {stdoutdata}")
+        logging.debug(f"SlurmRunner: sbatch error: {stderrdata}")
+        error = stderrdata.strip()
+        if error:
+            # Just echo error message as a warning
+            logging.warning("SlurmRunner: '%s'" % error)
+        # Capture the array job id from the output
+        array_job_id = None
+        for line in stdoutdata.split('\n'):
+            if line.startswith("Submitted batch job"):
+                array_job_id = line.split()[-1]
+        if array_job_id is None:
+            logging.error("SlurmRunner: failed to get job ID from "
+                          "sbatch output: %r" % stdoutdata)
+            # Remove the unused admin dirs
+            for i in range(ntasks):
+                shutil.rmtree(os.path.join(self._admin_dir,
+                                           str(first_job_number + i)))
+            shutil.rmtree(array_dir)
+            return None
+        logging.debug(f"SlurmRunner: done - array job id = {array_job_id}")
+        # Store internal number, name and log dir against task ids
+        job_ids = [f"{array_job_id}_{i}" for i in range(ntasks)]
+        self._array_dirs[array_dir] = set(job_ids)
+        for i, job_id in enumerate(job_ids):
+            self._job_number[job_id] = first_job_number + i
+            self._names[job_id] = name
+            if self.log_dir is None:
+                self._log_dirs[job_id] = working_dir
+            else:
+                self._log_dirs[job_id] = self.log_dir
+            self._start_time[job_id] = time.time()
+        # Force refresh of job list and squeue output
+        self._cached_job_list_force_update = True
+        self._cached_squeue_output_force_update = True
+        # Return the task ids
+        return job_ids
+
     def terminate(self, job_id, exit_code=-1):
         """
         Remove a job from the Slurm queue using 'scancel'
@@ -1456,17 +2204,50 @@ exit $exit_code
         logging.debug("Slurmrunner: scancel: %s" % message)
         if job_id in self._start_time:
             del(self._start_time[job_id])
-        # Write an exit code file for the job
-        exit_code_file = os.path.join(self._admin_dir,
-                                      str(self._job_number[job_id]),
-                                      "__exit_code")
-        with open("%s.tmp" % exit_code_file, "wt") as fp:
-            fp.write(f"{exit_code}\n")
-        os.rename("%s.tmp" % exit_code_file, exit_code_file)
-        # Force update of cached job list
+        if job_id in self._reattached:
+            # No exit code file for reattached jobs
+            self._reattached.remove(job_id)
+            self._exit_status[job_id] = exit_code
+        else:
+            # Write an exit code file for the job
+            exit_code_file = self._exit_code_file(
+                self._job_number[job_id])
+            with open("%s.tmp" % exit_code_file, "wt") as fp:
+                fp.write(f"{exit_code}\n")
+            os.rename("%s.tmp" % exit_code_file, exit_code_file)
+        # Force update of cached job list and squeue output
         self._cached_job_list_force_update = True
+        self._cached_squeue_output_force_update = True
         return True
 
+    def reattach(self, job_id, name, working_dir):
+        """
+        Monitor a job submitted by another runner instance
+
+        Adds a job which was submitted to Slurm outside of
+        this runner instance (for example, by a previous
+        session which has since exited) to the list of jobs
+        managed by the runner. The job's state is then
+        obtained via 'squeue', and its exit status from
+        'sacct' once it has finished.
+
+        Arguments:
+          job_id (str): Slurm ID of the job
+          name (str): name that was given to the job
+          working_dir (str): path to the directory the job
+            is running in
+        """
+        logging.debug(f"SlurmRunner: reattaching to job {job_id}")
+        self._names[job_id] = name
+        if self.log_dir is None:
+            self._log_dirs[job_id] = working_dir
+        else:
+            self._log_dirs[job_id] = self.log_dir
+        self._reattached.add(job_id)
+        # Force refresh of job list and squeue output
+        self._cached_job_list_force_update = True
+        self._cached_squeue_output_force_update = True
+
     def logFile(self, job_id):
         """
         Return the log file name for a job
@@ -1522,36 +2303,40 @@ exit $exit_code
             return job_ids
         else:
             logging.debug("SlurmRunner: building job list")
+        self._timings['list_calls'] += 1
         # Update jobs in grace period
         for job_id in self._grace_period_jobs():
             self._update_job_in_grace_period(job_id)
-        # Build initial list from directory contents
+        # Build initial list from admin directory contents
+        start_time = time.time()
+        job_dirs, finished = self._scan_admin_dir()
         job_ids = []
         for job_id in list(self._job_number.keys()):
             logging.debug(f"SlurmRunner: -- checking job {job_id}")
             try:
-                job_number = self._job_number[job_id]
+                job_number = str(self._job_number[job_id])
             except KeyError:
                 # Job has been removed since the list was
                 # fetched? Ignore
                 continue
-            job_dir = os.path.join(self._admin_dir, str(job_number))
-            if os.path.exists(job_dir):
-                # Job dir exists
-                logging.debug("SlurmRunner: -- found %s" % job_dir)
-                exit_code_file = os.path.join(job_dir, "__exit_code")
-                if os.path.exists(exit_code_file):
-                    # Job has finished, handle completion
-                    logging.debug("SlurmRunner: -- exit code file exists, "
-                                  f"completing job {job_id}")
-                    self._handle_job_completion(job_id)
-                else:
-                    # Job still running
-                    logging.debug("SlurmRunner: -- no exit code file, "
-                                  f"{job_id} still running")
-                    job_ids.append(job_id)
+            if job_number in finished:
+                # Job has finished, handle completion
+                logging.debug("SlurmRunner: -- exit code file exists, "
+                              f"completing job {job_id}")
+                self._handle_job_completion(job_id)
+            elif job_number in job_dirs:
+                # Job still running
+                logging.debug("SlurmRunner: -- no exit code file, "
+                              f"{job_id} still running")
+                job_ids.append(job_id)
+        filesystem_time = time.time() - start_time
+        self._timings['filesystem'] += filesystem_time
+        # Check jobs reattached from other runners
+        if self._reattached:
+            job_ids.extend(self._check_reattached_jobs())
         # Check for "missing" jobs that are in the runner but no
         # longer in the Slurm system
+        squeue_time = self._timings['squeue']
         jobs_still_in_grace_period = bool(self._grace_period_jobs())
         if job_ids and not jobs_still_in_grace_period:
             check_missing_jobs = ((time.time() -
@@ -1559,8 +2344,15 @@ exit $exit_code
                                   self._poll_interval)
             if check_missing_jobs:
                 logging.debug(f"SlurmRunner: checking for missing jobs")
-                job_ids = self._handle_missing_jobs(job_ids)
+                job_ids = [j for j in job_ids
+                           if j in self._reattached] + \
+                          self._handle_missing_jobs(
+                              [j for j in job_ids
+                               if j not in self._reattached])
                 self._missing_job_last_checked = time.time()
+        squeue_time = self._timings['squeue'] - squeue_time
+        logging.debug(f"SlurmRunner: 'list' spent {filesystem_time:.3f}s "
+                      f"on filesystem and {squeue_time:.3f}s on 'squeue'")
         # Update cache
         logging.debug("SlurmRunner: updating the cache")
         self._cached_job_list_timestamp = time.time()
@@ -1631,6 +2423,8 @@ exit $exit_code
                                 "for jobs to finalize")
                 break
         # Try to remove the admin dir and contents
+        if not os.path.exists(self._admin_dir):
+            return
         try:
             shutil.rmtree(self._admin_dir)
         except Exception as ex:
@@ -1638,6 +2432,98 @@ exit $exit_code
                             "admin dir '%s': %s" %
                             (self._admin_dir, ex))
 
+    def _exit_code_file(self, job_number):
+        """
+        Internal: return path to exit code file for a job
+
+        Exit code files are written to the top level of the
+        admin directory (rather than the job's admin
+        subdirectory), so that the finished jobs can be
+        identified by a single scan of the admin directory.
+
+        Arguments:
+          job_number (int): internal job number
+        """
+        return os.path.join(self._admin_dir,
+                            f"__exit_code.{job_number}")
+
+    def _scan_admin_dir(self):
+        """
+        Internal: scan the admin directory for job status
+
+        Uses a single 'os.scandir' pass over the admin
+        directory to find the admin subdirectories for jobs,
+        and the exit code files for jobs which have finished
+        (which avoids separate filesystem metadata lookups for
+        each job, which can be slow on network filesystems).
+
+        Returns:
+          Tuple: pair of sets of internal job numbers (as
+            strings), the first with the numbers for jobs with
+            admin subdirectories and the second with the
+            numbers for jobs with exit code files.
+        """
+        job_dirs = set()
+        finished = set()
+        with os.scandir(self._admin_dir) as entries:
+            for entry in entries:
+                name = entry.name
+                if name.startswith("__exit_code."):
+                    job_number = name[len("__exit_code."):]
+                    if job_number.isdigit():
+                        finished.add(job_number)
+                elif name.isdigit():
+                    job_dirs.add(name)
+        return (job_dirs, finished)
+
+    def _check_reattached_jobs(self):
+        """
+        Internal: check the status of reattached jobs
+
+        Uses a single 'squeue' query to check which of the
+        reattached jobs are still active, then a single 'sacct'
+        query to get the exit status for those which have
+        finished. Finished jobs are removed from the set of
+        reattached jobs.
+
+        If the exit status for a finished job can't be
+        determined then it will be set to '127'.
+
+        Returns:
+          List: IDs of reattached jobs which are still active.
+        """
+        job_ids = sorted(self._reattached)
+        squeue_jobs = self._run_squeue(job_ids)
+        if squeue_jobs is None:
+            # Unable to get job states from Slurm, so assume
+            # that they're all still running
+            return job_ids
+        finished = [job_id for job_id in job_ids
+                    if squeue_jobs.get(job_id) in
+                    (None,) + SLURM_FINISHED_STATES]
+        if not finished:
+            return job_ids
+        sacct_jobs = self._run_sacct(finished, ("State", "ExitCode",))
+        for job_id in finished:
+            if sacct_jobs is not None and job_id in sacct_jobs:
+                state = sacct_jobs[job_id]["State"]
+                if state in SACCT_ACTIVE_STATES:
+                    # Accounting not yet updated
+                    continue
+                exit_status = self._sacct_exit_code(
+                    sacct_jobs[job_id]["ExitCode"])
+            else:
+                logging.warning(f"SlurmRunner: unable to get exit "
+                                f"status for reattached job {job_id} "
+                                f"from 'sacct'")
+                exit_status = 127
+            logging.debug(f"SlurmRunner: reattached job {job_id} "
+                          f"finished (exit status {exit_status})")
+            self._exit_status[job_id] = exit_status
+            self._reattached.remove(job_id)
+        return [job_id for job_id in job_ids
+                if job_id in self._reattached]
+
     def _grace_period_jobs(self):
         """
         Internal: return list of jobs in the grace period
@@ -1662,30 +2548,29 @@ exit $exit_code
         """
         logging.debug("SlurmRunner: checking if job %s is still in "
                       "grace period" % job_id)
-        lock = None
-        while lock is None:
-            lock = self._updating_grace_period.acquire(job_id)
+        lock = self._updating_grace_period.acquire(job_id)
         logging.debug("SlurmRunner: acquired lock for grace period "
                       "update: %s" % lock)
         try:
-            start_time = self._start_time[job_id]
-        except KeyError:
-            logging.debug("SlurmRunner: update grace period: job %s "
-                          "has gone away (ignored)" % job_id)
-            self._updating_grace_period.release(lock)
-            return
-        if ((time.time() - start_time) > self._new_job_grace_period):
-            # Job no longer in grace period
-            logging.debug("SlurmRunner: job %s no longer in grace "
-                          "period" % job_id)
             try:
-                del(self._start_time[job_id])
+                start_time = self._start_time[job_id]
             except KeyError:
-                logging.debug("SlurmRunner: update grace period: "
-                              "job %s has gone away (ignored)" %
-                              job_id)
-        # Release update lock
-        self._updating_grace_period.release(lock)
+                logging.debug("SlurmRunner: update grace period: job %s "
+                              "has gone away (ignored)" % job_id)
+                return
+            if ((time.time() - start_time) > self._new_job_grace_period):
+                # Job no longer in grace period
+                logging.debug("SlurmRunner: job %s no longer in grace "
+                              "period" % job_id)
+                try:
+                    del(self._start_time[job_id])
+                except KeyError:
+                    logging.debug("SlurmRunner: update grace period: "
+                                  "job %s has gone away (ignored)" %
+                                  job_id)
+        finally:
+            # Release update lock
+            self._updating_grace_period.release(lock)
 
     def _handle_missing_jobs(self, job_list):
         """
@@ -1703,10 +2588,16 @@ exit $exit_code
           List: updated list of job IDs with missing jobs
             removed.
         """
+        squeue_jobs = self._run_squeue(job_list)
+        if squeue_jobs is None:
+            # Unable to get job states from Slurm, so can't
+            # tell which jobs are missing
+            return job_list
         updated_job_list = []
-        squeue_jobs = [j[0] for j in self._run_squeue()]
         for job_id in job_list:
-            if job_id not in squeue_jobs:
+            if squeue_jobs.get(job_id) in (None,) + SLURM_FINISHED_STATES:
+                # Not in Slurm, or Slurm reports that it has finished
+                # but the runner hasn't seen an exit code
                 logging.debug(f"SlurmRunner: job {job_id} has gone away?")
                 if job_id not in self._missing:
                     # Set time when job went missing
@@ -1723,6 +2614,9 @@ exit $exit_code
                     self._handle_job_completion(job_id)
                     # Remove the "missing" flag
                     del(self._missing[job_id])
+                else:
+                    # Job still missing but within the timeout
+                    updated_job_list.append(job_id)
             else:
                 # Job is no longer missing?
                 logging.debug(f"SlurmRunner: previously missing job {job_id} "
@@ -1755,38 +2649,38 @@ exit $exit_code
         """
         logging.debug("SlurmRunner: handle job completion for %s"
                       % job_id)
-        lock = None
-        while lock is None:
-            lock = self._job_lock.acquire(job_id)
+        lock = self._job_lock.acquire(job_id)
         logging.debug("SlurmRunner: acquired lock: %s" % lock)
-        if job_id not in self._job_number:
-            # Job has gone away
-            logging.debug("SlurmRunner: job %s has gone away" %
-                          job_id)
-            self._job_lock.release(lock)
-            return
-        self._finalizing[job_id] = True
-        # Check there is an exit code file
-        exit_code_file = os.path.join(self._admin_dir,
-                                      str(self._job_number[job_id]),
-                                      "__exit_code")
-        assert(os.path.exists(exit_code_file))
         try:
-            with open(exit_code_file,'rt') as fp:
-                exit_status = int(fp.read())
-        except Exception as ex:
-            # Set exit status to 127
-            logging.error("SlurmRunner: exception when "
-                          "reading exit_status for job "
-                          "%s: %s" % (job_id, ex))
-            exit_status = 127
-        # Store exit status and clean up
-        self._exit_status[job_id] = exit_status
-        self._clean_up_job(job_id)
-        # Release finalization lock
-        del(self._finalizing[job_id])
-        # Release job lock
-        self._job_lock.release(lock)
+            if job_id not in self._job_number:
+                # Job has gone away
+                logging.debug("SlurmRunner: job %s has gone away" %
+                              job_id)
+                return
+            self._finalizing[job_id] = True
+            try:
+                # Check there is an exit code file
+                exit_code_file = self._exit_code_file(
+                    self._job_number[job_id])
+                assert(os.path.exists(exit_code_file))
+                try:
+                    with open(exit_code_file,'rt') as fp:
+                        exit_status = int(fp.read())
+                except Exception as ex:
+                    # Set exit status to 127
+                    logging.error("SlurmRunner: exception when "
+                                  "reading exit_status for job "
+                                  "%s: %s" % (job_id, ex))
+                    exit_status = 127
+                # Store exit status and clean up
+                self._exit_status[job_id] = exit_status
+                self._clean_up_job(job_id)
+            finally:
+                # Release finalization lock
+                del(self._finalizing[job_id])
+        finally:
+            # Release job lock
+            self._job_lock.release(lock)
 
     def _clean_up_job(self,job_id):
         """
@@ -1811,6 +2705,10 @@ exit $exit_code
         try:
             # Remove the directory and contents
             shutil.rmtree(job_dir)
+            # Remove the exit code file
+            exit_code_file = self._exit_code_file(job_number)
+            if os.path.exists(exit_code_file):
+                os.remove(exit_code_file)
         except Exception as ex:
             logging.warning("SlurmRunner: exception cleaning up for "
                             "job %s (ignored): %s" % (job_id, ex))
@@ -1821,58 +2719,404 @@ exit $exit_code
             pass
         # Remove the internally stored job number
         del(self._job_number[job_id])
+        # Remove the admin dir for a job array once all its
+        # tasks have been cleaned up
+        for array_dir in list(self._array_dirs.keys()):
+            array_job_ids = self._array_dirs[array_dir]
+            if job_id in array_job_ids:
+                array_job_ids.remove(job_id)
+                if not array_job_ids:
+                    del(self._array_dirs[array_dir])
+                    try:
+                        shutil.rmtree(array_dir)
+                    except Exception as ex:
+                        logging.warning("SlurmRunner: exception removing "
+                                        "job array dir '%s' (ignored): %s" %
+                                        (array_dir, ex))
+                break
 
-    def _run_squeue(self):
+    def _run_squeue(self, job_ids=None):
         """
-        Internal: run squeue and return data as a list of lists
+        Internal: run squeue and return job states as a dictionary
 
-        Runs 'squeue' command, processes the output and returns a
-        list where each item is the data for a job in the form of
-        another list, with the items in this list being the data
-        returned by squeue.
+        Runs 'squeue' for the jobs belonging to this runner (i.e.
+        'squeue --jobs=ID1,ID2,... --format="%i %t"'), processes the output
+        and returns a dictionary mapping job IDs to Slurm job state
+        codes. Jobs which 'squeue' doesn't know about will not be
+        present in the dictionary (see '_squeue_job_states' for how
+        queries with large numbers of jobs, or which include jobs
+        no longer known to Slurm, are handled).
 
         NB as 'squeue' calls can be relatively expensive to make,
-        the output from 'squeue' is cached for a specified period
-        before being refreshed.
+        the output from 'squeue' is cached for a period before
+        being refreshed. This period is doubled each time the
+        refreshed output is the same as the previous output (up
+        to a maximum), and is reset to the minimum whenever the
+        output changes or a job is submitted or terminated.
+
+        Arguments:
+          job_ids (list): optional, list of job IDs to query
+            (defaults to all the jobs in the runner)
+
+        Returns:
+          Dictionary: job states keyed by job ID, or 'None' if
+            'squeue' failed.
         """
+        if job_ids is None:
+            job_ids = list(self._job_number.keys()) + \
+                      list(self._reattached)
+        job_ids = set(job_ids)
         # Should we return the cached data?
-        if (time.time() - self._cached_squeue_output_timestamp) < \
-           self._cached_squeue_output_lifetime:
+        if (self._cached_squeue_output is not None and
+            not self._cached_squeue_output_force_update and
+            job_ids.issubset(self._cached_squeue_job_ids) and
+            (time.time() - self._cached_squeue_output_timestamp) <
+            self._cached_squeue_output_lifetime):
             logging.debug("SlurmRunner: returning cached squeue output")
             return self._cached_squeue_output
-        # Run squeue and collect the output
-        try:
-            cmd = ["squeue", "--user", os.getlogin()]
-        except OSError:
-            # os.getlogin() not guaranteed to work in all environments?
-            cmd = ["squeue", "--me"]
-        # Run squeue command
-        p = subprocess.Popen(cmd,
-                             stdout=subprocess.PIPE,
-                             universal_newlines=True)
-        stdoutdata = p.communicate()[0]
-        logging.debug(f"SlurmRunner: output from 'squeue': {stdoutdata}")
-        # Process the output
-        squeue_output = []
-        # Output has a header line with field names then one
-        # line per job
-        lines = stdoutdata.rstrip("\n").split("\n")
-        fields = lines[0].split()
-        idx_jobid = fields.index("JOBID")
-        idx_state = fields.index("ST")
-        for line in lines[1:]:
-            # Store tuples of jobid, state
-            data = line.split()
-            try:
-                squeue_output.append((data[idx_jobid], data[idx_state]))
-            except IndexError:
-                logging.debug(f"SlurmRunner: failed to parse 'squeue' "
-                              f"output: '{line}' (ignored)")
+        # Include all the runner's jobs in the query so that
+        # the output can be reused for subsequent lookups
+        job_ids.update(self._job_number.keys())
+        job_ids.update(self._reattached)
+        squeue_output = {}
+        if job_ids:
+            # NB use the array job ID for array tasks
+            query_ids = set([j.split('_')[0] for j in job_ids])
+            squeue_output = self._squeue_job_states(sorted(query_ids))
+            if squeue_output is None:
+                return None
+        # Update the cache lifetime
+        if squeue_output == self._cached_squeue_output and \
+           not self._cached_squeue_output_force_update:
+            # Nothing changed so back off
+            self._cached_squeue_output_lifetime = min(
+                self._cached_squeue_output_lifetime*2.0,
+                self._cached_squeue_output_max_lifetime)
+        else:
+            self._cached_squeue_output_lifetime = \
+                self._cached_squeue_output_min_lifetime
         # Update the cache
         self._cached_squeue_output_timestamp = time.time()
         self._cached_squeue_output = squeue_output
+        self._cached_squeue_job_ids = job_ids
+        self._cached_squeue_output_force_update = False
+        return squeue_output
+
+    def _squeue_job_states(self, query_ids):
+        """
+        Internal: run squeue to get the states of jobs
+
+        The jobs are queried in chunks of up to
+        '_squeue_max_job_ids' IDs per 'squeue' command (to
+        limit the length of the command line).
+
+        If 'squeue' rejects a query with an 'Invalid job id'
+        error (e.g. because one of the jobs has already been
+        purged from Slurm) then the IDs are split in half and
+        each half is queried separately, until the invalid IDs
+        are isolated, so that the states of the remaining
+        jobs are still reported.
+
+        Arguments:
+          query_ids (list): list of job IDs to query
+
+        Returns:
+          Dictionary: job states keyed by job ID, or 'None' if
+            'squeue' failed.
+        """
+        squeue_output = {}
+        chunk_size = self._squeue_max_job_ids
+        queries = [query_ids[i:i+chunk_size]
+                   for i in range(0, len(query_ids), chunk_size)]
+        while queries:
+            ids = queries.pop()
+            cmd = ["squeue",
+                   "--jobs=%s" % ",".join(ids),
+                   "--format=%i %t"]
+            start_time = time.time()
+            p = subprocess.Popen(cmd,
+                                 stdout=subprocess.PIPE,
+                                 stderr=subprocess.PIPE,
+                                 universal_newlines=True)
+            stdoutdata, stderrdata = p.communicate()
+            self._timings['squeue_calls'] += 1
+            self._timings['squeue'] += time.time() - start_time
+            logging.debug(f"SlurmRunner: output from 'squeue': {stdoutdata}")
+            if p.returncode != 0:
+                if "Invalid job id" not in stderrdata:
+                    logging.warning(f"SlurmRunner: 'squeue' returned "
+                                    f"{p.returncode}: {stderrdata.strip()}")
+                    return None
+                if len(ids) > 1:
+                    # Query each half separately to find the
+                    # invalid IDs
+                    logging.debug(f"SlurmRunner: invalid job ID in "
+                                  f"'squeue' query for {len(ids)} jobs, "
+                                  f"splitting query")
+                    queries.append(ids[:len(ids)//2])
+                    queries.append(ids[len(ids)//2:])
+                # Otherwise the job isn't known to Slurm
+                continue
+            # Output has a header line with field names then one
+            # line per job
+            for line in stdoutdata.rstrip("\n").split("\n")[1:]:
+                # Store states against job ids
+                data = line.split()
+                try:
+                    for id_ in self._expand_array_job_id(data[0]):
+                        squeue_output[id_] = data[1]
+                except (IndexError, ValueError):
+                    logging.debug(f"SlurmRunner: failed to parse 'squeue' "
+                                  f"output: '{line}' (ignored)")
         return squeue_output
 
+    def _run_sacct(self, job_ids, fields):
+        """
+        Internal: run sacct and return job accounting data
+
+        Runs 'sacct' once for all the specified jobs (i.e.
+        'sacct --jobs=ID1,ID2,... --format=JobID,FIELD1,...',
+        with up to '_squeue_max_job_ids' IDs per command), and
+        returns a dictionary mapping the job IDs to the
+        requested accounting fields for each job.
+
+        Data for job steps (e.g. 'ID.batch') are stored under
+        the keys '<ID>.<STEP>'; for 'State', only the first word
+        of the value is kept (e.g. 'CANCELLED by 1000' becomes
+        'CANCELLED').
+
+        Arguments:
+          job_ids (list): list of job IDs to query
+          fields (list): list of 'sacct' field names to
+            return for each job (e.g. 'State', 'ExitCode')
+
+        Returns:
+          Dictionary: dictionaries with the field values for
+            each job, keyed by job ID, or 'None' if 'sacct'
+            failed.
+        """
+        job_ids = sorted(set(job_ids))
+        chunk_size = self._squeue_max_job_ids
+        sacct_output = {}
+        for i in range(0, len(job_ids), chunk_size):
+            cmd = ["sacct",
+                   "--jobs=%s" % ",".join(job_ids[i:i+chunk_size]),
+                   "--noheader",
+                   "--parsable2",
+                   "--format=%s" % ",".join(("JobID",) + tuple(fields))]
+            try:
+                p = subprocess.Popen(cmd,
+                                     stdout=subprocess.PIPE,
+                                     stderr=subprocess.PIPE,
+                                     universal_newlines=True)
+            except OSError as ex:
+                logging.warning(f"SlurmRunner: unable to run 'sacct': "
+                                f"{ex}")
+                return None
+            stdoutdata, stderrdata = p.communicate()
+            logging.debug(f"SlurmRunner: output from 'sacct': {stdoutdata}")
+            if p.returncode != 0:
+                logging.warning(f"SlurmRunner: 'sacct' returned "
+                                f"{p.returncode}: {stderrdata.strip()}")
+                return None
+            for line in stdoutdata.split("\n"):
+                data = line.split("|")
+                if len(data) != len(fields) + 1:
+                    continue
+                values = dict(zip(fields, data[1:]))
+                if "State" in values:
+                    values["State"] = (values["State"].split() or [""])[0]
+                sacct_output[data[0]] = values
+        return sacct_output
+
+    async def async_wait_for_completion(self, timeout):
+        """
+        Wait for a job to complete (coroutine)
+
+        Checks the job list at the interval it is cached for
+        (running 'list' in the event loop's default executor,
+        so that the loop isn't blocked), and returns as soon
+        as a job which was queued or running when the wait
+        started is no longer in the list.
+
+        Arguments:
+          timeout (float): maximum time to wait (in seconds)
+
+        Returns:
+          Boolean: True if a job has completed, False if the
+            timeout was reached.
+        """
+        loop = asyncio.get_event_loop()
+        end_time = time.time() + timeout
+        job_ids = set(await loop.run_in_executor(None, self.list))
+        while True:
+            remaining = end_time - time.time()
+            if remaining <= 0:
+                return False
+            await asyncio.sleep(min(self._cached_job_list_lifetime,
+                                    remaining))
+            if job_ids.difference(await loop.run_in_executor(None,
+                                                             self.list)):
+                return True
+
+    def resource_usage(self, job_ids):
+        """
+        Return timings and resource usage for finished jobs
+
+        Gets the start and end times, maximum resident set
+        size (in KiB) and CPU time (in seconds) for each of
+        the specified jobs using a single 'sacct' query (see
+        'BaseJobRunner.resource_usage'). The maximum resident
+        set size is taken from the largest value reported for
+        the job's steps.
+
+        Arguments:
+          job_ids (list): list of job IDs to get data for
+
+        Returns:
+          Dictionary: dictionaries with the data for each
+            job, keyed by job ID.
+        """
+        if not job_ids:
+            return {}
+        sacct_jobs = self._run_sacct(job_ids, ("State", "Start", "End",
+                                               "MaxRSS", "TotalCPU",))
+        if sacct_jobs is None:
+            return {}
+        usage = {}
+        for job_id in job_ids:
+            try:
+                data = sacct_jobs[job_id]
+            except KeyError:
+                continue
+            if data["State"] in SACCT_ACTIVE_STATES:
+                continue
+            rss = [self._sacct_memory(sacct_jobs[j]["MaxRSS"])
+                   for j in sacct_jobs
+                   if j == job_id or j.startswith(f"{job_id}.")]
+            rss = [x for x in rss if x is not None]
+            usage[job_id] = dict(
+                start_time=self._sacct_timestamp(data["Start"]),
+                end_time=self._sacct_timestamp(data["End"]),
+                max_rss=max(rss) if rss else None,
+                cpu_time=self._sacct_duration(data["TotalCPU"]))
+        return usage
+
+    def _sacct_timestamp(self, timestamp):
+        """
+        Internal: convert a timestamp from sacct
+
+        Arguments:
+          timestamp (str): timestamp from sacct (e.g. the
+            'Start' field) of the form 'YYYY-MM-DDThh:mm:ss'
+
+        Returns:
+          Float: the time in seconds since the epoch, or None
+            if the value can't be converted (e.g. 'Unknown').
+        """
+        try:
+            return time.mktime(time.strptime(timestamp,
+                                             "%Y-%m-%dT%H:%M:%S"))
+        except ValueError:
+            return None
+
+    def _sacct_duration(self, duration):
+        """
+        Internal: convert a time duration from sacct
+
+        Arguments:
+          duration (str): duration from sacct (e.g. the
+            'TotalCPU' field) of the form '[DD-[HH:]]MM:SS[.sss]'
+
+        Returns:
+          Float: the duration in seconds, or None if the value
+            can't be converted.
+        """
+        try:
+            days = 0
+            if '-' in duration:
+                days, duration = duration.split('-')
+            seconds = 0.0
+            for value in duration.split(':'):
+                seconds = seconds*60.0 + float(value)
+            return int(days)*86400.0 + seconds
+        except ValueError:
+            return None
+
+    def _sacct_memory(self, memory):
+        """
+        Internal: convert a memory value from sacct
+
+        Arguments:
+          memory (str): memory value from sacct (e.g. the
+            'MaxRSS' field) with optional units suffix (e.g.
+            '1024K', '1.5G')
+
+        Returns:
+          Integer: the value in KiB, or None if the value
+            can't be converted (e.g. it's blank).
+        """
+        units = dict(K=1, M=1024, G=1024**2, T=1024**3)
+        try:
+            if memory[-1] in units:
+                return int(float(memory[:-1])*units[memory[-1]])
+            # No units means bytes
+            return int(float(memory)//1024)
+        except (IndexError, ValueError):
+            return None
+
+    def _sacct_exit_code(self, exit_code):
+        """
+        Internal: convert an 'ExitCode' value from sacct
+
+        'sacct' reports exit codes as '<EXIT>:<SIGNAL>'; jobs
+        which were killed by a signal are given the exit code
+        '128+<SIGNAL>' (as reported by the shell).
+
+        Arguments:
+          exit_code (str): 'ExitCode' value from sacct
+
+        Returns:
+          Integer: the exit code (or 127 if the value can't
+            be converted).
+        """
+        try:
+            code, signal = [int(x) for x in exit_code.split(":")]
+        except ValueError:
+            return 127
+        if signal:
+            return 128 + signal
+        return code
+
+    def _expand_array_job_id(self, job_id):
+        """
+        Internal: expand job ID from squeue into task IDs
+
+        'squeue' reports pending tasks in a job array using
+        a single ID of the form 'ARRAYID_[1-3,5%2]'; this is
+        expanded into a list of the task IDs (i.e. 'ARRAYID_1',
+        'ARRAYID_2' etc). Other job IDs are returned unchanged
+        in a list.
+
+        Arguments:
+          job_id (str): job ID reported by squeue
+
+        Returns:
+          List: list of job IDs.
+        """
+        if not job_id.endswith(']') or '_[' not in job_id:
+            return [job_id]
+        array_job_id, tasks = job_id[:-1].split('_[')
+        job_ids = []
+        for item in tasks.split('%')[0].split(','):
+            if '-' in item:
+                start, end = item.split('-')
+                task_ids = range(int(start), int(end)+1)
+            else:
+                task_ids = [int(item)]
+            job_ids.extend([f"{array_job_id}_{i}" for i in task_ids])
+        return job_ids
+
     def _job_state_code(self, job_id):
         """
         Internal: get the state code for a job id
@@ -1880,20 +3124,12 @@ exit $exit_code
         Will be one of the Slurm job state codes, or an empty
         string if the job id isn't found.
         """
-        # Run squeue and process output to get job states
         logging.debug("SlurmRunner: acquiring state for job %s"
                       % job_id)
-        squeue = self._run_squeue()
-        job_ids = []
-        job_states = {}
-        for job_data in squeue:
-            id_ = job_data[0]
-            state = job_data[1]
-            logging.debug(f"SlurmRunner: found job {id_} (state '{state}')")
-            if id_ == job_id:
-                return state
-        # Job not found
-        return ""
+        squeue = self._run_squeue([job_id])
+        if squeue is None:
+            return ""
+        return squeue.get(job_id, "")
 
     def _sanitize_job_name(self, name):
         """
@@ -1983,12 +3219,23 @@ class ResourceLock:
     >>> r.release(lock)
     >>> r.is_locked("resource1")
     False
+
+    If the resource is already locked then 'acquire' waits
+    until it is released; waiting requests for the same
+    resource are granted the lock in the order that they
+    were made.
     """
     def __init__(self):
         """
         Create a new ResourceLock instance
         """
+        # Locks which are currently held
         self._locks = dict()
+        # Lock currently held for each resource
+        self._held = dict()
+        # Queue of pending lock requests for each resource
+        self._waiting = dict()
+        self._condition = threading.Condition()
 
     def _get_lock_name(self,resource_name):
         """
@@ -2020,13 +3267,17 @@ class ResourceLock:
             timestamp, unique ID). The timestamp is
             returned as a float.
         """
-        resource_name,timestamp,uuid_ = lock.split('@')
+        resource_name,timestamp,uuid_ = lock.rsplit('@',2)
         timestamp = float(timestamp)
         return (resource_name,timestamp,uuid_)
 
     def acquire(self,resource_name,timeout=None):
         """
-        Attempt to acquire the lock on a resource
+        Acquire the lock on a resource
+
+        Waits until the resource is free and all earlier
+        requests for the lock on the same resource have been
+        granted.
 
         Arguments:
           resource_name (str): name of the resource
@@ -2040,51 +3291,38 @@ class ResourceLock:
         """
         logging.debug("ResourceLock: attempting to get lock for "
                       "resource '%s'" % resource_name)
-        start_time = time.time()
-        has_lock = False
-        while not has_lock:
-            # Assume we have the lock, until proven otherwise
-            has_lock = True
-            # Register a putative lock
-            lock = self._get_lock_name(resource_name)
-            self._locks[lock] = True
-            logging.debug("ResourceLock: made new lock '%s'" % lock)
-            # Wait
-            time.sleep(0.001)
-            # Check all locks for this resource and see if any
-            # pre-date the new lock
-            resource_name,timestamp,uuid_ = self._split_lock_name(lock)
-            for l in list(self._locks.keys()):
-                if l == lock:
+        lock = self._get_lock_name(resource_name)
+        if timeout is not None:
+            end_time = time.time() + timeout
+        with self._condition:
+            # Join the queue for this resource
+            if resource_name not in self._waiting:
+                self._waiting[resource_name] = collections.deque()
+            waiting = self._waiting[resource_name]
+            waiting.append(lock)
+            # Wait until the resource is free and this
+            # request is at the head of the queue
+            while resource_name in self._held or waiting[0] != lock:
+                if timeout is None:
+                    self._condition.wait()
                     continue
-                n,ts,uid = self._split_lock_name(lock)
-                if n == resource_name:
-                    if ts < timestamp:
-                        # Resource is already locked
-                        logging.debug("ResourceLock: resource '%s' already "
-                                      "locked" % resource_name)
-                        # Remove attempted lock
-                        self.release(lock)
-                        return None
-                    elif ts == timestamp:
-                        # Deadlock: two locks with same priority
-                        logging.debug("ResourceLock: two locks with same "
-                                      "priority for resource '%s'" %
-                                      resource_name)
-                        # We don't have the lock after all
-                        has_lock = False
-                        # Release the putative lock
-                        self.release(lock)
-                        # Retry after a random delay
-                        time.sleep(random.random())
-                        break
-            # Check for timeout
-            if not has_lock and timeout is not None:
-                if (time.time() - start_time) > timeout:
+                remaining = end_time - time.time()
+                if remaining <= 0.0:
+                    # Give up and leave the queue
+                    waiting.remove(lock)
+                    if not waiting:
+                        del self._waiting[resource_name]
+                    self._condition.notify_all()
                     raise Exception("ResourceLock: timed out trying to "
                                     "acquire lock for resource '%s'" %
                                     resource_name)
-        # This lock has priority
+                self._condition.wait(remaining)
+            # This lock has priority
+            waiting.popleft()
+            if not waiting:
+                del self._waiting[resource_name]
+            self._held[resource_name] = lock
+            self._locks[lock] = True
         logging.debug("ResourceLock: acquired lock: '%s'" % lock)
         return lock
 
@@ -2096,7 +3334,12 @@ class ResourceLock:
           lock (str): lock to release.
         """
         logging.debug("ResourceLock: releasing '%s'" % lock)
-        del self._locks[lock]
+        resource_name = self._split_lock_name(lock)[0]
+        with self._condition:
+            del self._locks[lock]
+            del self._held[resource_name]
+            # Wake up any requests waiting for the lock
+            self._condition.notify_all()
 
     def is_locked(self,resource_name):
         """
@@ -2110,11 +3353,7 @@ class ResourceLock:
           Boolean: True if resource is locked, False
             if not.
         """
-        for lock in [l for l in self._locks.keys()]:
-            n,ts,uid = self._split_lock_name(lock)
-            if n == resource_name:
-                return True
-        return False
+        return resource_name in self._held
 
 #######################################################################
 # Functions
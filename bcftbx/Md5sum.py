@@ -37,6 +37,9 @@ There is also a high-level class 'Md5Checker' which implements various
 class methods for running MD5 checks across all files in a directory, and
 a wrapper class 'Md5Reporter' which
 
+The 'Md5Throughput' class can be used to collect and report throughput
+and timing information when verifying large numbers of files.
+
 """
 
 #######################################################################
@@ -46,6 +49,7 @@ a wrapper class 'Md5Reporter' which
 import sys
 import os
 import io
+import time
 import logging
 import hashlib
 
@@ -256,7 +260,8 @@ class Md5Checker:
                 logging.error("md5sum: %s: %s" % (f,ex))
 
     @classmethod
-    def verify_md5sums(self,filen=None,fp=None):
+    def verify_md5sums(self,filen=None,fp=None,disk_order=False,
+                       report_interval=None,report_fp=None):
         """Verify md5sums from a file
 
         Given a file (or a file-like object opened for reading), reads
@@ -280,9 +285,29 @@ class Md5Checker:
         there is a problem computing the MD5 sum then it yields
         MD5_ERROR.
 
+        By default the files are verified in the order that they
+        appear in the input. If 'disk_order' is True then all the
+        entries are read first and then verified in order of device
+        and inode number, which approximates the order of the data
+        on disk and reduces seeking on spinning-disk or
+        tape-restored archives. (Missing files are reported first in
+        this mode.)
+
+        If 'report_interval' is set then progress (number of files
+        verified along with files/s and MB/s rates) is written to
+        'report_fp' at (approximately) that interval in seconds, and
+        a breakdown of the time spent in each phase of the
+        verification is written at the end.
+
         Arguments:
           filen: name of the file containing md5sum output
           fp   : file-like object opened for reading, with md5sum output
+          disk_order: (optional) if True then verify files in on-disk
+            (device and inode) order rather than listing order
+          report_interval: (optional) if set then report throughput
+            at this interval (in seconds)
+          report_fp: (optional) file-like object to write throughput
+            reports to (defaults to sys.stderr)
 
         Returns:
           Yields a tuple (f,status) where f is the path of the file being
@@ -294,24 +319,238 @@ class Md5Checker:
             filen=None
         else:
             fp = io.open(filen,'rt')
-        for line in fp:
-            items = line.strip().split()
-            if len(items) < 2:
-                raise IndexError("Bad MD5 sum line: %s" % line.rstrip('\n'))
-            chksum = items[0]
-            f = line[len(chksum):].strip()
+        if report_interval is not None:
+            monitor = Md5Throughput(report_interval,fp=report_fp)
+        else:
+            monitor = None
+        # Read and parse the md5sum lines
+        entries = self._read_md5sum_lines(fp,monitor=monitor)
+        if disk_order:
+            # Stat all the files and sort into disk order
+            entries = list(entries)
+            if monitor:
+                monitor.start_phase("sort")
+            entries = self._sort_into_disk_order(entries)
+        for f,chksum in entries:
+            if monitor:
+                monitor.start_phase("md5")
+            nbytes = 0
             try:
                 if not os.path.exists(f):
                     status = self.MISSING_TARGET
-                elif md5sum(f) == chksum:
-                    status = self.MD5_OK
                 else:
-                    status = self.MD5_FAILED
-            except IOError as ex:
+                    nbytes = os.path.getsize(f)
+                    if md5sum(f) == chksum:
+                        status = self.MD5_OK
+                    else:
+                        status = self.MD5_FAILED
+            except (IOError,OSError) as ex:
                 # Error accessing file
                 logging.error("%s: error while generating MD5 sum: '%s'" % (f,ex))
                 status = self.MD5_ERROR
+            if monitor:
+                monitor.add_file(nbytes)
+                monitor.start_phase(None)
             yield (f,status)
+        if monitor:
+            monitor.finish()
+
+    @classmethod
+    def _read_md5sum_lines(self,fp,monitor=None):
+        """Internal: yield (filename,checksum) pairs from md5sum lines
+
+        Arguments:
+          fp: file-like object opened for reading, with md5sum output
+          monitor: (optional) Md5Throughput instance used to time
+            the reading phase
+
+        Returns:
+          Yields tuples (f,chksum) for each line in the input.
+
+        """
+        lines = iter(fp)
+        while True:
+            if monitor:
+                monitor.start_phase("read")
+            try:
+                line = next(lines)
+            except StopIteration:
+                break
+            items = line.strip().split()
+            if len(items) < 2:
+                raise IndexError("Bad MD5 sum line: %s" % line.rstrip('\n'))
+            chksum = items[0]
+            f = line[len(chksum):].strip()
+            yield (f,chksum)
+
+    @classmethod
+    def _sort_into_disk_order(self,entries):
+        """Internal: sort (filename,checksum) pairs into disk order
+
+        Files are ordered by device and then inode number; files
+        which cannot be stat'ed (e.g. because they are missing) are
+        placed first. Otherwise the listing order is preserved.
+
+        Arguments:
+          entries: list of (f,chksum) tuples
+
+        Returns:
+          List of (f,chksum) tuples sorted into disk order.
+
+        """
+        keys = []
+        for i,(f,chksum) in enumerate(entries):
+            try:
+                st = os.stat(f)
+                key = (st.st_dev,st.st_ino,i)
+            except OSError:
+                key = (-1,-1,i)
+            keys.append((key,(f,chksum)))
+        keys.sort(key=lambda x: x[0])
+        return [x[1] for x in keys]
+
+class Md5Throughput:
+    """Collects and reports throughput and timing for MD5 checks
+
+    Keeps a running count of the number of files and bytes
+    processed, and the time spent in each named 'phase' of an
+    operation (for example reading the input, sorting, and
+    computing checksums).
+
+    Example usage:
+
+    >>> t = Md5Throughput(10.0)
+    >>> t.start_phase("md5")
+    >>> t.add_file(nbytes)
+    ...
+    >>> t.finish()
+
+    Progress reports are written at intervals (in seconds) as
+    files are added, with a breakdown of the time spent in each
+    phase written by the 'finish' method.
+
+    """
+    def __init__(self,interval,fp=None):
+        """Create a new Md5Throughput instance
+
+        Arguments:
+          interval: minimum interval (in seconds) between
+            progress reports
+          fp: specify a file-like object to write reports to.
+            Must already be opened for writing (defaults to
+            sys.stderr)
+
+        """
+        self._interval = interval
+        self._fp = fp
+        self._start = time.time()
+        self._last_report = self._start
+        self._n_files = 0
+        self._n_bytes = 0
+        self._phases = {}
+        self._phase_order = []
+        self._current_phase = None
+        self._phase_start = None
+
+    @property
+    def n_files(self):
+        """Total number of files processed
+        """
+        return self._n_files
+
+    @property
+    def n_bytes(self):
+        """Total number of bytes processed
+        """
+        return self._n_bytes
+
+    @property
+    def elapsed(self):
+        """Total time elapsed (in seconds) since creation
+        """
+        return time.time() - self._start
+
+    @property
+    def phases(self):
+        """List of (phase,seconds) tuples in the order first seen
+        """
+        self._update_phase()
+        return [(p,self._phases[p]) for p in self._phase_order]
+
+    def _write(self,msg):
+        fp = self._fp
+        if fp is None:
+            fp = sys.stderr
+        fp.write(u"%s\n" % msg)
+
+    def _update_phase(self):
+        now = time.time()
+        if self._current_phase is not None:
+            self._phases[self._current_phase] += now - self._phase_start
+        self._phase_start = now
+
+    def start_phase(self,name):
+        """Start timing a new phase
+
+        Time is accumulated against the named phase until the
+        next call to 'start_phase' (or 'finish'). If the name is
+        None then timing is suspended until the next call.
+
+        Arguments:
+          name: name of the phase (or None)
+        """
+        if name == self._current_phase:
+            return
+        self._update_phase()
+        if name is not None and name not in self._phases:
+            self._phases[name] = 0.0
+            self._phase_order.append(name)
+        self._current_phase = name
+
+    def add_file(self,nbytes=0):
+        """Register a processed file
+
+        Writes a progress report if the reporting interval
+        has passed since the last report.
+
+        Arguments:
+          nbytes: size of the file in bytes
+        """
+        self._n_files += 1
+        self._n_bytes += nbytes
+        now = time.time()
+        if now - self._last_report >= self._interval:
+            self._last_report = now
+            self.report()
+
+    def report(self):
+        """Write a progress report
+        """
+        elapsed = self.elapsed
+        if elapsed > 0.0:
+            files_per_sec = self._n_files/elapsed
+            mb_per_sec = float(self._n_bytes)/(1024.0*1024.0)/elapsed
+        else:
+            files_per_sec = 0.0
+            mb_per_sec = 0.0
+        self._write("%d files (%.1f MB) checked in %.1fs: "
+                    "%.1f files/s, %.1f MB/s" %
+                    (self._n_files,
+                     float(self._n_bytes)/(1024.0*1024.0),
+                     elapsed,
+                     files_per_sec,
+                     mb_per_sec))
+
+    def finish(self):
+        """Stop timing and write final report with phase breakdown
+        """
+        phases = self.phases
+        self._current_phase = None
+        self.report()
+        self._write("Timings:")
+        for name,t in phases:
+            self._write("\t%-8s %.2fs" % (name,t))
+        self._write("\t%-8s %.2fs" % ('total',self.elapsed))
 
 class Md5CheckReporter:
     """Provides a generic reporting class for Md5Checker methods
@@ -51,6 +51,8 @@ import sys
 import os
 import re
 import time
+import json
+import asyncio
 try:
     # Python 3
     import queue
@@ -72,7 +74,8 @@ class Job:
 
     The job is started by invoking the 'start' method; its status can be checked
     with the 'isRunning' method, and terminated and restarted using the 'terminate'
-    and 'restart' methods respectively.
+    and 'restart' methods respectively. A job which hasn't been started can be
+    cancelled using the 'cancel' method.
 
     Information about the job can also be accessed via its properties. The following
     properties record the original parameters supplied on instantiation:
@@ -84,6 +87,10 @@ class Job:
       label
       group_label
 
+    The time the Job instance was created is also recorded:
+
+      queued_time The time the job was created (seconds since the epoch)
+
     Additional information is set once the job has started or stopped running:
 
       job_id      The id number for the running job returned by the JobRunner
@@ -124,6 +131,8 @@ class Job:
         self.submitted = False
         self.failed = False
         self.terminated = False
+        self.cancelled = False
+        self.queued_time = time.time()
         self.start_time = None
         self.end_time = None
         self.exit_status = None
@@ -137,14 +146,22 @@ class Job:
         # (seconds)
         self.__timeout = 3600
 
-    def start(self):
+    def start(self,job_id=None):
         """Start the job running
 
+        Arguments:
+          job_id: (optional) id for a job which has already been
+            submitted via the runner on behalf of this Job (e.g. as
+            a task in a job array); if supplied then the job is not
+            submitted again
+
         Returns:
           Id for job
         """
         if not self.submitted and not self.__finished:
-            self.job_id = self.__runner.run(self.name,self.working_dir,self.script,self.args)
+            if job_id is None:
+                job_id = self.__runner.run(self.name,self.working_dir,self.script,self.args)
+            self.job_id = job_id
             self.submitted = True
             self.start_time = time.time()
             if self.job_id is None:
@@ -191,6 +208,47 @@ class Job:
             ##self.__end_time = time.time()
             ##self.__exit_status = self.__runner.exit_status(self.job_id)
 
+    def restore(self,job_id,start_time,end_time=None,exit_status=None,
+                log=None,err=None):
+        """Restore the state of a job which was started previously
+
+        Sets up the job as if it had been started (and, if the
+        end time is supplied, completed) by an earlier instance,
+        without submitting it again.
+
+        If the job hasn't finished then the runner must already
+        be able to monitor the job with the supplied id.
+
+        Arguments:
+          job_id: id for the previously submitted job
+          start_time: time the job was started (seconds since the
+            epoch)
+          end_time: (optional) time the job finished (seconds since
+            the epoch); if not supplied then the job is assumed to be
+            still running
+          exit_status: (optional) exit code from the finished job
+          log: (optional) log file for the job
+          err: (optional) error log file for the job
+        """
+        self.job_id = job_id
+        self.submitted = True
+        self.start_time = start_time
+        self.end_time = end_time
+        self.exit_status = exit_status
+        self.log = log
+        self.err = err
+        self.__finished = (end_time is not None)
+
+    def cancel(self):
+        """Cancel a job which hasn't been started
+
+        The job is marked as finished without ever being
+        submitted.
+        """
+        if not self.submitted:
+            self.cancelled = True
+            self.__finished = True
+
     def restart(self):
         """Restart the job
 
@@ -227,7 +285,9 @@ class Job:
         """Return descriptive string indicating job status
         """
         if self.__finished:
-            if self.terminated:
+            if self.cancelled:
+                return "Cancelled"
+            elif self.terminated:
                 return "Terminated"
             else:
                 return "Finished"
@@ -288,9 +348,51 @@ class PipelineRunner:
     completes ('jobCompletionHandler'), and when a group completes
     ('groupCompletionHandler'). These can perform any specific actions that are required
     such as sending notification email, setting file ownerships and permissions etc.
+
+    The pipeline can also be run from within an 'asyncio' event loop by awaiting
+    the 'run_async' coroutine, e.g.
+
+    >>> asyncio.get_event_loop().run_until_complete(p.run_async())
+
+    Jobs can depend on other jobs (or groups of jobs) queued earlier in the same
+    pipeline, by supplying the 'depends_on' argument to 'queueJob':
+
+    >>> split = p.queueJob('/home/foo','split.sh','bar.in')
+    >>> for i in range(4):
+    ...     p.queueJob('/home/foo','align.sh','bar.%d' % i,group='align',
+    ...                depends_on=[split])
+    >>> p.queueJob('/home/foo','merge.sh','bar.out',depends_on=['align'])
+
+    Waiting jobs are started (in the order they were queued) as soon as all their
+    dependencies have completed successfully; if a dependency fails (or is itself
+    cancelled) then the dependent job is cancelled without being run, along with
+    any jobs which depend on it in turn.
+
+    Timings and resource usage for each job which has been started can be exported
+    (as a list of dictionaries, or in TSV or JSON format) using the 'metrics'
+    method, e.g.
+
+    >>> with open('metrics.tsv','wt') as fp:
+    ...     fp.write(p.metrics(fmt='tsv'))
+
+    If a 'journal' file is specified then the submission and completion of each job
+    is recorded in the file. If the pipeline is subsequently recreated using the same
+    journal (for example after the process running the pipeline was killed), then as
+    the same jobs are queued again, those which previously completed successfully are
+    restored as completed rather than being run again, and those which were still
+    running are reattached to (if the runner supports this, i.e. has a 'reattach'
+    method, as for the SlurmRunner; otherwise they are run again). Job and group
+    completion handlers are not invoked again for restored jobs.
+
+    If 'use_job_arrays' is set and the runner supports job arrays (i.e. has a
+    'run_array' method, as for the SlurmRunner) then consecutive ready jobs which
+    run the same script in the same directory are submitted together as a single
+    job array. Note that the array (and so each of its tasks) is named after the
+    script rather than the job labels, so the labels don't appear in the job names
+    or log file names reported by the runner.
     """
     def __init__(self,runner,max_concurrent_jobs=4,poll_interval=30,jobCompletionHandler=None,
-                 groupCompletionHandler=None):
+                 groupCompletionHandler=None,use_job_arrays=False,journal=None):
         """Create new PipelineRunner instance.
 
         Arguments:
@@ -299,11 +401,17 @@ class PipelineRunner:
             at one time (default = 4)
           poll_interval: time interval (in seconds) between checks on the queue status
             (only used when pipeline is run in 'blocking' mode)
+          use_job_arrays: if True then submit batches of similar jobs as job
+            arrays, if supported by the runner (default = False)
+          journal: (optional) path to a file to record the state of jobs in; if
+            the file already exists then the state of jobs recorded by previous
+            runs of the pipeline is restored as jobs are queued
         """
         # Parameters
         self.__runner = runner
         self.max_concurrent_jobs = max_concurrent_jobs
         self.poll_interval = poll_interval
+        self.use_job_arrays = use_job_arrays
         # Groups
         self.groups = []
         self.njobs_in_group = {}
@@ -313,11 +421,26 @@ class PipelineRunner:
         self.running = []
         # Subset that have completed
         self.completed = []
+        # Subset that have been cancelled
+        self.cancelled = []
+        # Dependencies for each job
+        self.__depends_on = {}
+        self.__jobs_in_group = {}
+        self.__ncompleted_in_group = {}
+        self.__completed_jobs = set()
+        # Journal of job states
+        self.journal = journal
+        self.__journal_keys = {}
+        self.__journal_key_counts = {}
+        self.__journal_state = self.__read_journal()
+        # Resource usage for completed jobs
+        self.__resource_usage = {}
         # Callback functions
         self.handle_job_completion = jobCompletionHandler
         self.handle_group_completion = groupCompletionHandler
 
-    def queueJob(self,working_dir,script,script_args,label=None,group=None):
+    def queueJob(self,working_dir,script,script_args,label=None,group=None,
+                 depends_on=None):
         """Add a job to the pipeline.
 
         The job will be queued and executed once the pipeline's 'run' method has been
@@ -331,7 +454,25 @@ class PipelineRunner:
           group: (optional) arbitrary string to use as a 'group' identifier;
             assign the same 'group' label to multiple jobs to indicate they're
             related
+          depends_on: (optional) list of Job instances and/or group labels for
+            jobs already queued in this pipeline; the job won't be started until
+            all of these have completed successfully
+
+        Returns:
+          Job instance for the queued job.
         """
+        depends_on = list(depends_on) if depends_on else []
+        for dependency in depends_on:
+            if isinstance(dependency,Job):
+                if dependency not in self.__depends_on:
+                    raise Exception("Job dependency '%s' is not in this "
+                                    "pipeline" % dependency.name)
+            elif dependency not in self.groups:
+                raise Exception("Group dependency '%s' is not in this "
+                                "pipeline" % dependency)
+            elif dependency == group:
+                raise Exception("Job can't depend on its own group '%s'" %
+                                group)
         job_name = os.path.splitext(os.path.basename(script))[0]+'.'+str(label)
         if group:
             if group not in self.groups:
@@ -340,9 +481,16 @@ class PipelineRunner:
                 self.njobs_in_group[group] = 1
             else:
                 self.njobs_in_group[group] += 1
-        self.jobs.put(Job(self.__runner,job_name,working_dir,script,script_args,
-                          label,group))
-        logging.debug("Added job: now %d jobs in pipeline" % self.jobs.qsize())
+        job = Job(self.__runner,job_name,working_dir,script,script_args,
+                  label,group)
+        self.__depends_on[job] = depends_on
+        if group:
+            self.__jobs_in_group.setdefault(group,[]).append(job)
+        if not self.__restore_job(job):
+            self.jobs.put(job)
+            logging.debug("Added job: now %d jobs in pipeline" %
+                          self.jobs.qsize())
+        return job
 
     def nWaiting(self):
         """Return the number of jobs still waiting to be started
@@ -359,6 +507,11 @@ class PipelineRunner:
         """
         return len(self.completed)
 
+    def nCancelled(self):
+        """Return the number of jobs that were cancelled
+        """
+        return len(self.cancelled)
+
     def isRunning(self):
         """Check whether the pipeline is still running
 
@@ -399,16 +552,61 @@ class PipelineRunner:
         self.update()
         if blocking:
             while self.isRunning():
-                # Pipeline is still executing so wait
-                time.sleep(self.poll_interval)
+                # Pipeline is still executing so wait (returns
+                # early if the runner reports that a job has
+                # finished)
+                if hasattr(self.__runner,'wait_for_completion'):
+                    self.__runner.wait_for_completion(self.poll_interval)
+                else:
+                    time.sleep(self.poll_interval)
             # Pipeline has finished
             print("Pipeline completed")
 
+    async def run_async(self):
+        """Execute the jobs in the pipeline (coroutine)
+
+        Equivalent to 'run' in blocking mode, but awaits job
+        completion events from the runner instead of blocking,
+        so it can be used from within an 'asyncio' event loop
+        (for example to run several pipelines concurrently).
+
+        The pipeline is updated as soon as the runner signals
+        that a job has completed (or after the poll interval,
+        for runners which can't signal completion), so that
+        waiting jobs are started as soon as there are free
+        slots.
+
+        Updates of the pipeline (which query the runner and
+        submit jobs, and so can block) are run in the event
+        loop's default executor, so job and group completion
+        callbacks are invoked from a thread other than the
+        event loop thread.
+        """
+        logging.debug("PipelineRunner: started (asyncio)")
+        loop = asyncio.get_event_loop()
+        # Report set up
+        print("Initially %d jobs waiting, %d running, %d finished" %
+              (self.nWaiting(),self.nRunning(),self.nCompleted()))
+        # Initial update sets the jobs running
+        await loop.run_in_executor(None,self.update)
+        while (self.nWaiting() > 0 or self.nRunning() > 0):
+            # Pipeline is still executing so wait for a
+            # job to finish
+            if hasattr(self.__runner,'async_wait_for_completion'):
+                await self.__runner.async_wait_for_completion(
+                    self.poll_interval)
+            else:
+                await asyncio.sleep(self.poll_interval)
+            await loop.run_in_executor(None,self.update)
+        # Pipeline has finished
+        print("Pipeline completed")
+
     def update(self):
         """Update the pipeline
 
         The 'update' method checks and updates the status of running jobs,
-        and submits any waiting jobs if space is available.
+        cancels waiting jobs with failed dependencies, and submits any
+        waiting jobs which are ready to run if space is available.
         """
         # Flag to report updated status
         updated_status = False
@@ -417,7 +615,8 @@ class PipelineRunner:
             if not job.isRunning():
                 # Job has completed
                 self.running.remove(job)
-                self.completed.append(job)
+                self.__mark_completed(job)
+                self.__write_journal(job,"completed")
                 updated_status = True
                 print("Job has completed: %s: %s %s (%s)" % (
                     job.job_id,
@@ -429,33 +628,46 @@ class PipelineRunner:
                     self.handle_job_completion(job)
                 # Check for completed group
                 if job.group_label is not None:
-                    jobs_in_group = []
-                    for check_job in self.completed:
-                        if check_job.group_label == job.group_label:
-                            jobs_in_group.append(check_job)
-                    if self.njobs_in_group[job.group_label] == len(jobs_in_group):
+                    if self.njobs_in_group[job.group_label] == \
+                       self.__ncompleted_in_group[job.group_label]:
                         # All jobs in group have completed
                         print("Group '%s' has completed" % job.group_label)
                         # Invoke callback on group completion
                         if self.handle_group_completion:
-                            self.handle_group_completion(job.group_label,jobs_in_group)
+                            self.handle_group_completion(
+                                job.group_label,
+                                list(self.__jobs_in_group[job.group_label]))
             else:
                 # Job is running, check it's not in an error state
                 if job.errorState():
                     # Terminate jobs in error state
                     logging.warning("Terminating job %s in error state" % job.job_id)
                     job.terminate()
+        # Cancel jobs which can never run
+        if self.__cancel_jobs():
+            updated_status = True
         # Submit new jobs to GE queue
         while not self.jobs.empty() and self.nRunning() < self.max_concurrent_jobs:
-            next_job = self.jobs.get()
-            next_job.start()
-            self.running.append(next_job)
-            updated_status = True
-            print("Job has started: %s: %s %s (%s)" % (
-                next_job.job_id,
-                next_job.name,
-                os.path.basename(next_job.working_dir),
-                time.asctime(time.localtime(next_job.start_time))))
+            next_jobs = self.__next_jobs(self.max_concurrent_jobs - self.nRunning())
+            if not next_jobs:
+                # Remaining jobs are waiting for dependencies
+                break
+            if len(next_jobs) > 1:
+                # Submit as a job array
+                job_ids = self.__submit_job_array(next_jobs)
+            else:
+                job_ids = [None]
+            for next_job,job_id in zip(next_jobs,job_ids):
+                next_job.start(job_id=job_id)
+                self.running.append(next_job)
+                if next_job.job_id is not None:
+                    self.__write_journal(next_job,"submitted")
+                updated_status = True
+                print("Job has started: %s: %s %s (%s)" % (
+                    next_job.job_id,
+                    next_job.name,
+                    os.path.basename(next_job.working_dir),
+                    time.asctime(time.localtime(next_job.start_time))))
             if self.jobs.empty():
                 logging.debug("PipelineRunner: all jobs now submitted")
         # Report
@@ -463,6 +675,361 @@ class PipelineRunner:
             print("Currently %d jobs waiting, %d running, %d finished" %
                   (self.nWaiting(),self.nRunning(),self.nCompleted()))
 
+    def __next_jobs(self,max_jobs):
+        """Internal: fetch the next jobs to be submitted
+
+        Removes the next waiting job which is ready to run from
+        the queue, plus (if the runner supports job arrays) any
+        immediately following ready jobs which run the same script
+        in the same working directory, up to the specified maximum
+        number of jobs.
+
+        Arguments:
+          max_jobs: maximum number of jobs to return
+
+        Returns:
+          List of Job instances (empty if no waiting jobs are
+          ready to run).
+        """
+        ready_jobs = [job for job in self.jobs.queue
+                      if self.__dependency_status(job) == "ready"]
+        next_jobs = ready_jobs[:1]
+        if self.use_job_arrays and hasattr(self.__runner,'run_array'):
+            for job in ready_jobs[1:max_jobs]:
+                if job.script != next_jobs[0].script or \
+                   job.working_dir != next_jobs[0].working_dir:
+                    break
+                next_jobs.append(job)
+        for job in next_jobs:
+            self.jobs.queue.remove(job)
+        return next_jobs
+
+    def __mark_completed(self,job):
+        """Internal: add a job to the list of completed jobs
+
+        Arguments:
+          job: Job instance which has completed
+        """
+        self.completed.append(job)
+        self.__completed_jobs.add(job)
+        if job.group_label is not None:
+            self.__ncompleted_in_group[job.group_label] = \
+                self.__ncompleted_in_group.get(job.group_label,0) + 1
+
+    def __restore_job(self,job):
+        """Internal: restore the state of a job from the journal
+
+        If the journal shows that the job completed successfully
+        in a previous run then it's added to the completed jobs;
+        if it was still running then it's added to the running
+        jobs (provided that the runner can reattach to it).
+
+        Arguments:
+          job: newly queued Job instance
+
+        Returns:
+          True if the job was restored, False if it still needs
+          to be run.
+        """
+        # Generate the key for the job
+        key = json.dumps([job.name,job.working_dir,job.script,
+                          job.args if isinstance(job.args,str)
+                          else list(job.args)],default=str)
+        n = self.__journal_key_counts.get(key,0)
+        self.__journal_key_counts[key] = n + 1
+        key = "%s#%d" % (key,n)
+        self.__journal_keys[job] = key
+        # Look up the state from previous runs
+        try:
+            state = self.__journal_state[key]
+        except KeyError:
+            return False
+        if state['event'] == "completed":
+            if state['failed'] or state['exit_status'] not in (0,None):
+                # Failed jobs are run again
+                return False
+            job.restore(state['job_id'],
+                        state['start_time'],
+                        end_time=state['end_time'],
+                        exit_status=state['exit_status'],
+                        log=state['log'],
+                        err=state['err'])
+            job.queued_time = state.get('queued_time')
+            self.__mark_completed(job)
+            print("Job already completed: %s: %s %s" % (
+                job.job_id,
+                job.name,
+                os.path.basename(job.working_dir)))
+            return True
+        elif state['event'] == "submitted":
+            if not hasattr(self.__runner,'reattach'):
+                logging.warning("PipelineRunner: unable to reattach to "
+                                "job %s, job will be run again" %
+                                state['job_id'])
+                return False
+            self.__runner.reattach(state['job_id'],job.name,
+                                   job.working_dir)
+            job.restore(state['job_id'],
+                        state['start_time'],
+                        log=state['log'],
+                        err=state['err'])
+            job.queued_time = state.get('queued_time')
+            self.running.append(job)
+            print("Job reattached: %s: %s %s" % (
+                job.job_id,
+                job.name,
+                os.path.basename(job.working_dir)))
+            return True
+        return False
+
+    def __read_journal(self):
+        """Internal: read the job states recorded in the journal
+
+        Incomplete lines (e.g. if the pipeline was killed while
+        writing to the journal) are ignored.
+
+        Returns:
+          Dictionary where keys are job keys and values are the
+          most recent journal record for each job.
+        """
+        state = {}
+        if self.journal is None or not os.path.exists(self.journal):
+            return state
+        with open(self.journal,'rt') as fp:
+            for line in fp:
+                try:
+                    record = json.loads(line)
+                    state[record['job']] = record
+                except (ValueError,KeyError):
+                    logging.warning("PipelineRunner: bad line in journal "
+                                    "'%s' (ignored): %s" % (self.journal,
+                                                            line.rstrip()))
+        return state
+
+    def __write_journal(self,job,event):
+        """Internal: append a record for a job to the journal
+
+        Arguments:
+          job: Job instance
+          event: event to record for the job (e.g. "submitted",
+            "completed" or "terminated")
+        """
+        if self.journal is None:
+            return
+        record = dict(job=self.__journal_keys[job],
+                      event=event,
+                      job_id=job.job_id,
+                      log=job.log,
+                      err=job.err,
+                      queued_time=job.queued_time,
+                      start_time=job.start_time,
+                      end_time=job.end_time,
+                      exit_status=job.exit_status,
+                      failed=(job.failed or job.terminated))
+        with open(self.journal,'at') as fp:
+            fp.write("%s\n" % json.dumps(record))
+            fp.flush()
+
+    def __cancel_jobs(self):
+        """Internal: cancel waiting jobs with failed dependencies
+
+        Waiting jobs which depend on a job (or group) that failed
+        or was cancelled are removed from the queue and cancelled;
+        this is repeated until all jobs which depend on cancelled
+        jobs have also been cancelled.
+
+        Returns:
+          True if any jobs were cancelled, False otherwise.
+        """
+        cancelled_jobs = False
+        cancelled = True
+        while cancelled:
+            cancelled = False
+            for job in list(self.jobs.queue):
+                if self.__dependency_status(job) == "failed":
+                    self.jobs.queue.remove(job)
+                    job.cancel()
+                    self.cancelled.append(job)
+                    cancelled = cancelled_jobs = True
+                    print("Job has been cancelled: %s %s (failed "
+                          "dependency)" % (job.name,
+                                           os.path.basename(job.working_dir)))
+        return cancelled_jobs
+
+    def __dependency_status(self,job):
+        """Internal: check the status of a job's dependencies
+
+        Arguments:
+          job: Job instance to check
+
+        Returns:
+          "ready" if all dependencies completed successfully,
+          "failed" if any dependency failed or was cancelled,
+          or "waiting" otherwise.
+        """
+        status = "ready"
+        for dependency in self.__depends_on[job]:
+            if isinstance(dependency,Job):
+                jobs = [dependency]
+            else:
+                jobs = self.__jobs_in_group[dependency]
+            for j in jobs:
+                if j.cancelled or \
+                   (j in self.__completed_jobs and self.__job_failed(j)):
+                    return "failed"
+                elif j not in self.__completed_jobs:
+                    status = "waiting"
+        return status
+
+    def __job_failed(self,job):
+        """Internal: check if a completed job failed
+
+        A job is considered to have failed if it couldn't be
+        submitted, was terminated, or finished with a non-zero
+        exit status (jobs where the exit status isn't known are
+        assumed to have succeeded).
+
+        Arguments:
+          job: completed Job instance
+
+        Returns:
+          True if the job failed, False otherwise.
+        """
+        return (job.failed or job.terminated or
+                job.exit_status not in (0,None))
+
+    def __submit_job_array(self,jobs):
+        """Internal: submit jobs as a job array
+
+        Arguments:
+          jobs: list of Job instances which run the same script
+            in the same working directory
+
+        Returns:
+          List of job ids (one for each job). If the array
+          couldn't be submitted then the ids will all be None
+          (so that the jobs are submitted individually instead).
+        """
+        name = os.path.splitext(os.path.basename(jobs[0].script))[0]
+        logging.debug("PipelineRunner: submitting %d jobs as job array "
+                      "'%s'" % (len(jobs),name))
+        try:
+            job_ids = self.__runner.run_array(name,
+                                              jobs[0].working_dir,
+                                              jobs[0].script,
+                                              [job.args for job in jobs])
+        except Exception as ex:
+            logging.warning("PipelineRunner: exception submitting job "
+                            "array: %s" % ex)
+            job_ids = None
+        if job_ids is None:
+            logging.warning("PipelineRunner: failed to submit job array, "
+                            "submitting jobs individually")
+            job_ids = [None]*len(jobs)
+        return job_ids
+
+    def metrics(self,fmt=None):
+        """Return timings and resource usage for jobs
+
+        Returns data for each job which has been started
+        (completed jobs first, then running jobs), with the
+        following fields:
+
+        - name, label, group, job_id, working_dir, status
+          and exit_status: as for the Job instance
+        - queued_time: time the job was queued
+        - submit_time: time the job was submitted to the runner
+        - start_time: time the job started executing
+        - end_time: time the job finished
+        - queue_wait: time from queuing to starting execution
+          (seconds)
+        - run_time: time from starting to finishing execution
+          (seconds)
+        - max_rss: maximum resident set size (KiB)
+        - cpu_time: total CPU time (seconds)
+
+        Times are seconds since the epoch. The start and end
+        times, maximum resident set size and CPU time are taken
+        from the runner's 'resource_usage' method where available
+        (these are fetched for all newly completed jobs in a
+        single call); otherwise the start and end times are the
+        times that the pipeline submitted the job and detected
+        that it had finished, and the resource usage is not
+        known. Unknown values are set to None.
+
+        Arguments:
+          fmt: (optional) if set to "tsv" or "json" then return
+            the data as a string in the specified format (TSV
+            data has a header line starting with '#', and
+            unknown values are empty); otherwise return a list
+            of dictionaries
+
+        Returns:
+          List of dictionaries (one per job) or string.
+        """
+        # Fetch resource usage for newly completed jobs
+        jobs = [job for job in self.completed
+                if job.job_id is not None and
+                job not in self.__resource_usage]
+        if jobs:
+            if hasattr(self.__runner,'resource_usage'):
+                usage = self.__runner.resource_usage([job.job_id
+                                                      for job in jobs])
+            else:
+                usage = {}
+            for job in jobs:
+                # Only store non-empty data, so that jobs which the
+                # runner doesn't have data for yet are tried again
+                if usage.get(job.job_id):
+                    self.__resource_usage[job] = usage[job.job_id]
+        # Assemble the metrics for each job
+        metrics = []
+        for job in self.completed + self.running:
+            usage = self.__resource_usage.get(job,{})
+            start_time = usage.get('start_time')
+            if start_time is None:
+                start_time = job.start_time
+            end_time = usage.get('end_time')
+            if end_time is None:
+                end_time = job.end_time
+            queue_wait = None
+            if start_time is not None and job.queued_time is not None:
+                # NB times from the runner may have lower resolution
+                # than the queued time
+                queue_wait = max(start_time - job.queued_time,0.0)
+            run_time = None
+            if start_time is not None and end_time is not None:
+                run_time = end_time - start_time
+            metrics.append(dict(name=job.name,
+                                label=job.label,
+                                group=job.group_label,
+                                job_id=job.job_id,
+                                working_dir=job.working_dir,
+                                status=job.status(),
+                                exit_status=job.exit_status,
+                                queued_time=job.queued_time,
+                                submit_time=job.start_time,
+                                start_time=start_time,
+                                end_time=end_time,
+                                queue_wait=queue_wait,
+                                run_time=run_time,
+                                max_rss=usage.get('max_rss'),
+                                cpu_time=usage.get('cpu_time')))
+        if fmt == "json":
+            return json.dumps(metrics,indent=2)
+        elif fmt == "tsv":
+            fields = ('name','label','group','job_id','working_dir',
+                      'status','exit_status','queued_time','submit_time',
+                      'start_time','end_time','queue_wait','run_time',
+                      'max_rss','cpu_time')
+            lines = ["#%s" % '\t'.join(fields)]
+            for data in metrics:
+                lines.append('\t'.join([('' if data[field] is None
+                                          else str(data[field]))
+                                         for field in fields]))
+            return '\n'.join(lines) + '\n'
+        return metrics
+
     def report(self):
         """Return a report of the pipeline status
         """
@@ -498,6 +1065,13 @@ class PipelineRunner:
                                                            job.working_dir,
                                                            (job.end_time - job.start_time),
                                                            job.status())
+        # Report cancelled jobs
+        if self.nCancelled() > 0:
+            report += "\n%d jobs cancelled:\n" % self.nCancelled()
+            for job in self.cancelled:
+                report += "\t%s\t%s\t[%s]\n" % (job.label,
+                                                 job.working_dir,
+                                                 job.status())
         return report
 
     def __del__(self):
@@ -516,6 +1090,7 @@ class PipelineRunner:
             print("Terminating job %s" % job.job_id)
             try:
                 job.terminate()
+                self.__write_journal(job,"terminated")
             except Exception as ex:
                 logging.error("Failed to terminate job %s: %s" % (job.job_id,ex))
 
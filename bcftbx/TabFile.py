@@ -98,6 +98,33 @@ Type conversion is automatically performed when data values are assigned:
 >>> line[3]
 'pjb'
 
+When loading data from a file, the 'infer_types' argument can be used to
+determine the type of each column from the first lines of data; the values
+in each column are then converted using a single conversion rather than
+working out the type of each value individually, which is faster for large
+files:
+
+>>> data = TabFile('data.txt',first_line_is_header=True,infer_types=100)
+>>> data.columnTypes()
+[<class 'str'>, <class 'int'>, <class 'int'>, <class 'float'>]
+
+Alternatively the types for some or all columns can be specified explicitly
+using the 'dtypes' argument:
+
+>>> data = TabFile('data.txt',first_line_is_header=True,
+...                dtypes={'start':int,'end':int})
+
+In both cases values which can't be converted to the column type are
+converted individually instead.
+
+Large files can be loaded in parallel by specifying the number of
+processes to use via the 'nprocs' argument:
+
+>>> data = TabFile('data.txt',first_line_is_header=True,nprocs=4)
+
+The file is divided into sections which are parsed concurrently, and
+the resulting data lines are combined in the original order.
+
 Lines can also be removed using the 'del' built-in:
 
 >>> del(data[0]) # Deletes first data line
@@ -115,6 +142,20 @@ specific value:
 >>> data = TabFile('data.txt',column_names=['chr','start','end'])
 >>> chrom = data.lookup('chr','chrX')
 
+By default 'lookup' checks every line; for repeated lookups on the same
+column, use the 'createIndex' method to build a hash index which 'lookup'
+will then use automatically:
+
+>>> data.createIndex('chr')
+>>> chrom = data.lookup('chr','chrX')
+
+The 'join' method combines the lines of two TabFiles where the values in
+a key column match:
+
+>>> peaks = TabFile('peaks.txt',column_names=['chr','start','end','gene_id'])
+>>> genes = TabFile('genes.txt',column_names=['gene_id','symbol'])
+>>> joined = peaks.join(genes,'gene_id')
+
 Within a single data line the 'subset' method returns a list of values
 for a set of column indices or column names:
 
@@ -187,6 +228,33 @@ TabFile object, for example for a comma-delimited file:
 
 >>> data = TabFile('data.txt',delimiter=',')
 
+ColumnarTabFile: column-oriented storage
+----------------------------------------
+
+The ``ColumnarTabFile`` class provides the same interface as
+``TabFile`` but stores the data for each column together (using
+compact typed arrays for integer and float columns) rather than
+as a ``TabDataLine`` object for each line, which substantially
+reduces the memory needed to hold large files:
+
+>>> data = ColumnarTabFile('data.txt',first_line_is_header=True)
+
+Lines are returned as ``ColumnarDataLine`` objects, which are
+views onto the underlying columns and can be used in the same way
+as ``TabDataLine`` objects.
+
+Sorting files larger than memory
+--------------------------------
+
+The ``sort_file`` function sorts a tab-delimited file on one or
+more key columns without loading it into a ``TabFile``, spilling
+sorted batches to temporary files if the data don't fit into the
+specified buffer size:
+
+>>> sort_file('peaks.txt','peaks.sorted.txt',
+...           keys=['chr',('start',int)],
+...           first_line_is_header=True)
+
 TabFileIterator: iterating through a tab-delimited file
 -------------------------------------------------------
 
@@ -199,13 +267,50 @@ through each line in a tab-delimited file:
 
 Each line is returned as a ``TabDataLine`` instance, so the
 methods available that class can be used on the data.
+
+Transformation and filtering steps can also be chained onto a
+``TabFileIterator`` and the results written out line-by-line,
+so that large files can be processed in constant memory:
+
+>>> TabFileIterator(filen='data.tsv',column_names=['chr','start','end'])\
+...   .transformColumn('chr',lambda x: x.replace('chr',''))\
+...   .filter(lambda line: line['end'] > line['start'])\
+...   .computeColumn('midpoint',lambda line: (line['start']+line['end'])//2)\
+...   .write('data.midpoints.tsv.gz',include_header=True)
+
+BulkTabFileIterator: fast iteration through large files
+-------------------------------------------------------
+
+The ``BulkTabFileIterator`` reads the input in large blocks and
+returns each line as a tuple of values, which is much faster
+than ``TabFileIterator`` for very large files. By default the
+values are returned as strings, but a function can be supplied
+for each column to convert the values:
+
+>>> for chrom,start,end in BulkTabFileIterator(filen='data.tsv',
+...                                            types=(str,int,int)):
+...   print(end-start)
 """
 
 from builtins import str
+import os
 import io
+import gzip
+import array
+import bisect
+import functools
+import heapq
+import itertools
+import operator
+import shutil
+import tempfile
 import logging
+import multiprocessing
 from collections.abc import Iterator
 
+# Estimated memory overhead per line (in bytes) when sorting
+_SORT_LINE_OVERHEAD = 128
+
 class TabDataLine:
     """Class to store a line of data from a tab-delimited file
 
@@ -240,8 +345,14 @@ class TabDataLine:
         if not line: print("Blank line")
     
     """
+    # Functions to call with the column position when a value is
+    # changed (added by each TabFile which indexes the line, to keep
+    # its indexes up to date)
+    _on_change = ()
+
     def __init__(self,line=None,column_names=None,delimiter='\t',lineno=None,
-                 convert=True,allow_underscores_in_numeric_literals=False):
+                 convert=True,allow_underscores_in_numeric_literals=False,
+                 converters=None):
         """Create a new TabFileLine object
 
         Arguments:
@@ -257,6 +368,11 @@ class TabDataLine:
             then treat numerical values with underscores as
             numbers according to PEP 15; if False (the default)
             then treat them as strings
+          converters: (optional) list of functions to use to convert
+            the values in each column of 'line' (None for columns
+            which should use the default conversion); if a function
+            raises a ValueError or TypeError then the default
+            conversion is used for that value instead
         """
         # Conversion function
         if convert:
@@ -271,8 +387,12 @@ class TabDataLine:
         self.delimiter(delimiter)
         self.__lineno = None
         if line is not None:
-            for value in line.split(self.__delimiter):
-                self.data.append(self.__convert(value.rstrip('\n')))
+            if converters:
+                self.data = _convert_values(line.split(self.__delimiter),
+                                            converters,self.__convert)
+            else:
+                for value in line.split(self.__delimiter):
+                    self.data.append(self.__convert(value.rstrip('\n')))
         # Column names
         self.names = []
         if column_names:
@@ -350,6 +470,8 @@ class TabDataLine:
             except IndexError:
                 # Integer but out of range
                 raise IndexError("integer index out of range for '%s'" % key)
+        for on_change in self._on_change:
+            on_change(i if i >= 0 else i + len(self.data))
 
     def __len__(self):
         return len(self.data)
@@ -359,13 +481,15 @@ class TabDataLine:
             if str(item).strip(): return True
         return False
 
-    def convert_to_str(self,value):
+    @staticmethod
+    def convert_to_str(value):
         """Convert value to string
 
         """
         return str(value)
 
-    def convert_to_type(self,value):
+    @staticmethod
+    def convert_to_type(value):
         """Internal: convert a value to the correct type
 
         Used to coerce input values into integers or floats
@@ -394,7 +518,8 @@ class TabDataLine:
         # Return value
         return converted
 
-    def convert_to_type_pep515(self,value):
+    @staticmethod
+    def convert_to_type_pep515(value):
         """Internal: convert a value to the correct type
 
         Used to coerce input values into integers or floats
@@ -522,7 +647,8 @@ class TabFile:
                  first_line_is_header=False,tab_data_line=TabDataLine,
                  delimiter='\t',convert=True,
                  allow_underscores_in_numeric_literals=False,
-                 keep_commented_lines=False):
+                 keep_commented_lines=False,dtypes=None,infer_types=None,
+                 nprocs=None):
         """Create a new TabFile object
 
         If either of 'filen' or 'fp' arguments are given then the
@@ -555,6 +681,20 @@ class TabFile:
               then treat them as strings
           keep_commented_lines: (optional) if True then don't
               remove commented lines
+          dtypes: (optional) list of types (or other conversion
+              functions) for each column, or a dictionary mapping
+              column names or indices to types, which are used to
+              convert values when loading data from file (falling
+              back to the default conversion for values where they
+              fail)
+          infer_types: (optional) if set to an integer N then
+              determine the type of each column from the first N
+              lines of data loaded from file, and use a single
+              conversion for each column (see 'columnTypes')
+          nprocs: (optional) if set to an integer greater than 1
+              then load the data from 'filen' in parallel using
+              this number of processes (NB 'tab_data_line' and any
+              'dtypes' must be picklable in this case)
         """
         # Initialise
         self.__filen = filen
@@ -566,12 +706,22 @@ class TabFile:
         self.__allow_underscores_in_numbers = \
                     allow_underscores_in_numeric_literals
         self.__keep_commented_lines = keep_commented_lines
+        self.__dtypes = dtypes
+        self.__infer_types = infer_types
+        self.__column_types = []
+        self.__indexes = {}
         # Class to use for data lines
         self.__tabdataline = tab_data_line
         # Set up column names
         if column_names is not None:
             self.__setHeader(column_names)
         # Read in data
+        if fp is None and filen is not None and nprocs and nprocs > 1:
+            # Load named file in parallel
+            self.__loadParallel(self.__filen,nprocs,
+                                skip_first_line=skip_first_line,
+                                first_line_is_header=first_line_is_header)
+            return
         if fp is None and filen is not None:
             # Open named file
             fp = io.open(self.__filen,'rt')
@@ -593,12 +743,179 @@ class TabFile:
         If a header is set then lines with fewer data items than header
         items raise an IndexError exception.
 
+        If 'dtypes' or 'infer_types' were specified then per-column
+        conversions are set up before the data lines are created.
+
+        Arguments:
+          fp: file-like object to read data from
+          skip_first_line: (optional) if True then ignore the first
+              line of the input file
+          first_line_is_header: (optional) if True then take column
+              names from the first line of the file
+        """
+        lines = self.__readDataLines(fp,skip_first_line=skip_first_line,
+                                     first_line_is_header=first_line_is_header)
+        kws = dict(delimiter=self.__delimiter,
+                   convert=self.__convert,
+                   allow_underscores_in_numeric_literals=
+                   self.__allow_underscores_in_numbers)
+        if self.__dtypes or self.__infer_types:
+            # Set up conversions for each column
+            # (NB always read at least one line to ensure the
+            # header has been processed)
+            sample = list(itertools.islice(lines,
+                                           max(self.__infer_types or 1,1)))
+            self.__column_types,converters = _column_converters(
+                [line for line_no,line in sample],
+                header=self.header(),
+                delimiter=self.__delimiter,
+                dtypes=self.__dtypes,
+                infer_types=bool(self.__infer_types),
+                convert=self.__convert,
+                allow_underscores_in_numeric_literals=
+                self.__allow_underscores_in_numbers)
+            if converters:
+                kws['converters'] = converters
+            lines = itertools.chain(sample,lines)
+        for line_no,line in lines:
+            # Store data
+            data_line = self.__tabdataline(line,column_names=self.header(),lineno=line_no,
+                                           **kws)
+            if self.__ncols > 0:
+                if len(data_line) != self.__ncols:
+                    # Inconsistent lines are an error
+                    logging.error("Line %d has wrong number of data items" % line_no)
+                    logging.error("Line: %s" % data_line)
+                    logging.error("Expected %d, got %d" % (self.__ncols,len(data_line)))
+                    raise IndexError("wrong number of data items in line %d" % line_no)
+            else:
+                # Set number of columns
+                self.__ncols = len(data_line)
+            self.__data.append(data_line)
+
+    def __loadParallel(self,filen,nprocs,skip_first_line=False,
+                       first_line_is_header=False):
+        """Internal: load data from a file using multiple processes
+
+        The data in the file is divided into byte ranges which
+        start and end on line boundaries; the ranges are then
+        parsed by a pool of processes and the resulting data
+        lines are combined in the original order.
+
+        Comments, headers, line numbers and inconsistent lines
+        are handled in the same way as for '__load'.
+
+        Arguments:
+          filen: name of file to read data from
+          nprocs: number of processes to use
+          skip_first_line: (optional) if True then ignore the first
+              line of the input file
+          first_line_is_header: (optional) if True then take column
+              names from the first line of the file
+        """
+        # Deal with the first line(s) and locate the start
+        # of the data
+        line_no = 0
+        with io.open(filen,'rb') as fp:
+            if skip_first_line:
+                if fp.readline():
+                    line_no += 1
+            if first_line_is_header and len(self.header()) == 0:
+                line = fp.readline()
+                if line:
+                    line_no += 1
+                    line = io.TextIOWrapper(io.BytesIO(line)).read()
+                    self.__setHeader(
+                        line.strip().strip('#').split(self.__delimiter))
+            start = fp.tell()
+            end = fp.seek(0,io.SEEK_END)
+            # Split into ranges (more ranges than processes
+            # helps to balance the load)
+            offsets = _line_aligned_offsets(fp,start,end,nprocs*4)
+        ranges = list(zip(offsets[:-1],offsets[1:]))
+        if not ranges:
+            return
+        kws = dict(delimiter=self.__delimiter,
+                   convert=self.__convert,
+                   allow_underscores_in_numeric_literals=
+                   self.__allow_underscores_in_numbers)
+        if self.__dtypes or self.__infer_types:
+            # Set up conversions for each column from the
+            # initial data lines
+            nsample = max(self.__infer_types or 1,1)
+            sample = []
+            with io.open(filen,'rb') as fp:
+                fp.seek(start)
+                for line in io.TextIOWrapper(fp):
+                    if line.lstrip().startswith('#') and \
+                       not self.__keep_commented_lines:
+                        continue
+                    sample.append(line)
+                    if len(sample) == nsample:
+                        break
+            self.__column_types,converters = _column_converters(
+                sample,
+                header=self.header(),
+                delimiter=self.__delimiter,
+                dtypes=self.__dtypes,
+                infer_types=bool(self.__infer_types),
+                convert=self.__convert,
+                allow_underscores_in_numeric_literals=
+                self.__allow_underscores_in_numbers)
+            if converters:
+                kws['converters'] = converters
+        pool = multiprocessing.Pool(nprocs)
+        try:
+            # Count the lines in each range to get the
+            # starting line numbers
+            counts = pool.map(_count_lines_in_range,
+                              [(filen,i,j) for i,j in ranges])
+            line_nos = list(itertools.accumulate([line_no]+counts[:-1]))
+            # Parse the ranges
+            results = pool.map(_load_lines_in_range,
+                               [(filen,i,j,n,self.__tabdataline,
+                                 self.header(),self.__ncols,
+                                 self.__keep_commented_lines,kws)
+                                for (i,j),n in zip(ranges,line_nos)],
+                               chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+        # Combine the results
+        for data_lines,bad_line in results:
+            if not data_lines:
+                continue
+            if self.__ncols > 0 and len(data_lines[0]) != self.__ncols:
+                bad_line = 0
+            elif self.__ncols == 0:
+                # Set number of columns
+                self.__ncols = len(data_lines[0])
+            if bad_line is not None:
+                # Inconsistent lines are an error
+                data_line = data_lines[bad_line]
+                line_no = data_line.lineno()
+                logging.error("Line %d has wrong number of data items" % line_no)
+                logging.error("Line: %s" % data_line)
+                logging.error("Expected %d, got %d" % (self.__ncols,len(data_line)))
+                raise IndexError("wrong number of data items in line %d" % line_no)
+            self.__data.extend(data_lines)
+
+    def __readDataLines(self,fp,skip_first_line=False,
+                        first_line_is_header=False):
+        """Internal: yield the data lines from a file
+
+        Handles skipping of the first line and commented lines,
+        and sets up the header from the first line if required.
+
         Arguments:
           fp: file-like object to read data from
           skip_first_line: (optional) if True then ignore the first
               line of the input file
           first_line_is_header: (optional) if True then take column
               names from the first line of the file
+
+        Returns:
+          Yields tuples (line_no,line) for each data line.
         """
         line_no = 0
         for line in fp:
@@ -616,23 +933,7 @@ class TabFile:
                not self.__keep_commented_lines:
                 # Skip commented line
                 continue
-            # Store data
-            data_line = self.__tabdataline(line,column_names=self.header(),lineno=line_no,
-                                           delimiter=self.__delimiter,
-                                           convert=self.__convert,
-                                           allow_underscores_in_numeric_literals=
-                                           self.__allow_underscores_in_numbers)
-            if self.__ncols > 0:
-                if len(data_line) != self.__ncols:
-                    # Inconsistent lines are an error
-                    logging.error("Line %d has wrong number of data items" % line_no)
-                    logging.error("Line: %s" % data_line)
-                    logging.error("Expected %d, got %d" % (self.__ncols,len(data_line)))
-                    raise IndexError("wrong number of data items in line %d" % line_no)
-            else:
-                # Set number of columns
-                self.__ncols = len(data_line)
-            self.__data.append(data_line)
+            yield (line_no,line)
 
     def __setHeader(self,column_names):
         """Set the names for columns of data
@@ -667,16 +968,198 @@ class TabFile:
         """Return the file name associated with the TabFile
         """
         return self.__filen
+
+    def columnTypes(self):
+        """Return list of the types used for each column on loading
+
+        If 'dtypes' or 'infer_types' were specified when the data
+        were loaded then returns a list with the type (e.g. int,
+        float or str, or the supplied conversion function) used for
+        each column, or None for columns where the values were
+        converted individually. Otherwise this will be an empty list.
+        """
+        return self.__column_types
     
     def lookup(self,key,value):
         """Return lines where the key matches the specified value
+
+        If an index has been created for the key (see the
+        'createIndex' method) then this is used to find the
+        matching lines; otherwise all lines are checked.
+
+        NB if values in the indexed column have been changed
+        since the last lookup (for example by 'line[key] = value')
+        then the index is rebuilt first.
         """
+        if key in self.__indexes:
+            try:
+                return list(self.__getIndex(key).get(value,[]))
+            except TypeError:
+                # Unhashable value, fall back to checking all lines
+                pass
         result = []
         for line in self.__data:
             if line[key] == value:
                 result.append(line)
         return result
 
+    def createIndex(self,key):
+        """Create a hash index for a column
+
+        Once an index has been created for a column, the 'lookup'
+        method will use it to find matching lines rather than
+        checking every line. For example:
+
+        >>> data.createIndex('chr')
+        >>> chrom = data.lookup('chr','chrX')
+
+        Indexes are kept up to date when lines are added or removed
+        using the 'append', 'insert' and 'del' operations, and when
+        column values are updated using 'transformColumn' or
+        'computeColumn'. Setting a value in an individual line (e.g.
+        'line[key] = value') causes the index for that column to be
+        rebuilt on the next lookup. Changes made directly to the
+        'data' list of a line are not tracked; call 'createIndex'
+        again to rebuild the index in this case.
+
+        Arguments:
+          key: column name or index to create the index for
+        """
+        self.__indexes[key] = self.__buildIndex(key)
+
+    def dropIndex(self,key):
+        """Remove the index for a column (if there is one)
+
+        Arguments:
+          key: column name or index to remove the index for
+        """
+        if key in self.__indexes:
+            del(self.__indexes[key])
+
+    def __buildIndex(self,key):
+        """Internal: build a mapping of values to lines for a column
+        """
+        index = {}
+        for line in self.__data:
+            index.setdefault(line[key],[]).append(line)
+            self.__watchLine(line)
+        return index
+
+    def __getIndex(self,key):
+        """Internal: return the index for a column
+
+        The index is rebuilt if it has been invalidated.
+        """
+        index = self.__indexes[key]
+        if index is None:
+            index = self.__buildIndex(key)
+            self.__indexes[key] = index
+        return index
+
+    def __invalidateIndexes(self):
+        """Internal: mark all indexes as needing to be rebuilt
+        """
+        for key in self.__indexes:
+            self.__indexes[key] = None
+
+    def __addToIndexes(self,line):
+        """Internal: add a line to the end of each index
+        """
+        for key in self.__indexes:
+            index = self.__indexes[key]
+            if index is not None:
+                index.setdefault(line[key],[]).append(line)
+        if self.__indexes:
+            self.__watchLine(line)
+
+    def __watchLine(self,line):
+        """Internal: get notified when a value is set in a line
+
+        Adds '__columnChanged' to the functions that the line
+        calls when a value is changed (unless already present),
+        without removing those added by other TabFiles which
+        also contain the line.
+
+        Arguments:
+          line: TabDataLine-based object to watch
+        """
+        if self.__columnChanged not in line._on_change:
+            line._on_change = line._on_change + (self.__columnChanged,)
+
+    def __columnChanged(self,i):
+        """Internal: invalidate indexes after a value is changed
+
+        Invoked by lines when a value is set, to mark any indexes
+        for the affected column as needing to be rebuilt.
+
+        Arguments:
+          i: position of the column where the value was changed
+        """
+        for key in self.__indexes:
+            if self.__indexes[key] is None:
+                continue
+            try:
+                j = self.__header.index(key)
+            except ValueError:
+                j = int(key)
+                if j < 0:
+                    j += self.__ncols
+            if j == i:
+                self.__indexes[key] = None
+
+    def __removeFromIndexes(self,line):
+        """Internal: remove a line from each index
+        """
+        for key in self.__indexes:
+            index = self.__indexes[key]
+            if index is None:
+                continue
+            try:
+                lines = index[line[key]]
+                lines.remove(line)
+                if not lines:
+                    del(index[line[key]])
+            except (KeyError,ValueError):
+                # Line value was changed after indexing
+                self.__indexes[key] = None
+
+    def join(self,other,key,other_key=None,keep_unmatched=False):
+        """Join with another TabFile on a key column
+
+        Creates a new TabFile where each line of this TabFile
+        is combined with each line of 'other' where the values
+        in the key columns match. The columns in the new TabFile
+        are those from this TabFile followed by those from
+        'other' (excluding its key column).
+
+        The lines of 'other' are hashed on the key column once,
+        so the time taken is proportional to the combined number
+        of lines rather than their product.
+
+        Arguments:
+          other: TabFile-like object to join with
+          key: name or index of the key column in this TabFile
+          other_key: (optional) name or index of the key column
+            in 'other' (defaults to the same as 'key')
+          keep_unmatched: (optional) if True then also output
+            lines which have no matches in 'other', with empty
+            values for the columns from 'other' (default is to
+            drop them)
+
+        Returns:
+          New TabFile object.
+        """
+        header,lines = _join_tabfiles(self,other,key,other_key,
+                                      keep_unmatched)
+        joined = TabFile(column_names=header,
+                         delimiter=self.__delimiter,
+                         convert=self.__convert,
+                         allow_underscores_in_numeric_literals=
+                         self.__allow_underscores_in_numbers)
+        for values in lines:
+            joined.append(data=values)
+        return joined
+
     def indexByLineNumber(self,n):
         """Return index of a data line given the file line number
 
@@ -715,6 +1198,7 @@ class TabFile:
         """
         if tabdataline:
             self.__data.append(tabdataline)
+            self.__addToIndexes(tabdataline)
             return tabdataline
         if data:
             line = self.__delimiter.join([str(x) for x in data])
@@ -726,6 +1210,7 @@ class TabFile:
                                        delimiter=self.__delimiter,
                                        convert=self.__convert)
         self.__data.append(data_line)
+        self.__addToIndexes(data_line)
         return data_line
 
     def insert(self,i,data=None,tabdata=None,tabdataline=None):
@@ -751,6 +1236,7 @@ class TabFile:
         """
         if tabdataline:
             self.__data.insert(i,tabdataline)
+            self.__invalidateIndexes()
             return tabdataline
         if data:
             line = '\t'.join([str(x) for x in data])
@@ -760,6 +1246,7 @@ class TabFile:
             line = None
         data_line = self.__tabdataline(line=line,column_names=self.header())
         self.__data.insert(i,data_line)
+        self.__invalidateIndexes()
         return data_line
 
     def appendColumn(self,name,fill_value=''):
@@ -823,6 +1310,7 @@ class TabFile:
         """
         for line in self:
             line[column_name] = transform_func(line[column_name])
+        self.__invalidateIndexes()
 
     def computeColumn(self,column_name,compute_func):
         """Compute and store values in a new column
@@ -846,6 +1334,7 @@ class TabFile:
                 self.appendColumn(column_name)
         for line in self:
             line[column_name] = compute_func(line)
+        self.__invalidateIndexes()
 
     def sort(self,sort_func,reverse=False):
         """Sort data using arbitrary function
@@ -868,6 +1357,7 @@ class TabFile:
             in ascending order, or True to sort in descending order
         """
         self.__data = sorted(self.__data,key=sort_func,reverse=reverse)
+        self.__invalidateIndexes()
 
     def write(self,filen=None,fp=None,include_header=False,no_hash=False,
               delimiter=None):
@@ -923,6 +1413,13 @@ class TabFile:
         return self.__data[key]
 
     def __delitem__(self,key):
+        if self.__indexes:
+            lines = self.__data[key]
+            if isinstance(key,slice):
+                for line in lines:
+                    self.__removeFromIndexes(line)
+            else:
+                self.__removeFromIndexes(lines)
         del(self.__data[key])
 
     def __len__(self):
@@ -931,58 +1428,1682 @@ class TabFile:
     def __repr__(self):
         return '\n'.join([str(x) for x in self.__data])
 
-class TabFileIterator(Iterator):
-    """
-    Iterate through lines in a tab-delimited file
+class ColumnarDataLine:
+    """Row view onto a line of data in a ColumnarTabFile
 
-    Class to loop over all lines in a TSV file, returning a TabDataLine
-    object for each record.
+    ColumnarDataLine objects provide a TabDataLine-like interface
+    to a single row of data held in a ColumnarTabFile, without
+    storing any data themselves: values are fetched from (and
+    written back to) the columns of the parent object.
+
+    Values can be accessed by integer index or by column names (if
+    set), e.g. line[1] or line['second'], and changed using the
+    same notation. Values are converted using the same rules as
+    for the parent ColumnarTabFile.
+
+    Note that the view is associated with a row position rather
+    than the row data, so a view obtained before lines are
+    inserted, deleted or sorted may refer to a different line
+    afterwards.
     """
+    def __init__(self,tabfile,i,delimiter='\t'):
+        """Create a new ColumnarDataLine object
 
-    def __init__(self,filen=None,fp=None,column_names=None):
+        Arguments:
+          tabfile: parent ColumnarTabFile instance
+          i: index of the row within the parent
+          delimiter: (optional) delimiter character (defaults
+            to tab)
         """
-        Create a new TabFileIterator
+        self.__tabfile = tabfile
+        self.__i = i
+        self.__delimiter = str(delimiter)
 
-        The input file should be a tab-delimited text file, specified as
-        either a file name (using the 'filen' argument), or a file-like
-        object opened for line reading (using the 'fp' argument).
+    def __getitem__(self,key):
+        """Implement value = ColumnarDataLine[key]
 
-        Each iteration returns a TabDataLine populated with data from
-        the file.
+        'key' can be the name of a column or an integer index
+        (starting from zero). Column names are checked first.
+        """
+        return self.__tabfile._value(self.__i,
+                                     self.__tabfile._column_index(key))
 
-        Example usage:
+    def __setitem__(self,key,value):
+        """Implement ColumnarDataLine[key] = value
 
-        >>> for line in TabFileIterator(filen='data.tsv'):
-        ...   print(line)
+        'key' can be the name of a column or an integer index
+        (starting from zero). Column names are checked first.
+        """
+        self.__tabfile._set_value(self.__i,
+                                  self.__tabfile._column_index(key),
+                                  value)
+
+    def __len__(self):
+        return self.__tabfile.nColumns()
+
+    def __iter__(self):
+        return iter(self.__tabfile._row(self.__i))
+
+    @property
+    def data(self):
+        """List of the data values in the line
+        """
+        return self.__tabfile._row(self.__i)
+
+    @property
+    def names(self):
+        """List of the column names
+        """
+        return self.__tabfile.header()
+
+    def subset(self,*keys):
+        """Return a subset of data items
+
+        Creates a new TabDataLine instance with a subset of
+        data specified by the 'keys' argument; see the
+        TabDataLine 'subset' method for details.
 
         Arguments:
-          filen: name of the file to iterate through
-          fp: file-like object opened for reading
-          column_names: optional list of names to use as
-            column headers in the returned TabDataLines
+          keys: one or more keys specifying columns to include in
+            the subset.
+        """
+        subset = TabDataLine()
+        for key in keys:
+            subset.appendColumn(key,self[key])
+        return subset
+
+    def delimiter(self,new_delimiter=None):
+        """Set and get the delimiter for the line
+
+        If 'new_delimiter' is not None then the field delimiter
+        for the line will be updated to the supplied value. This
+        affects how the line is represented via the __repr__
+        built-in.
 
+        Returns the current value of the delimiter.
         """
-        self.__filen = filen
-        self.__column_names = column_names
-        self.__lineno = 0
-        if fp is None:
-            self.__fp = io.open(filen,'rt')
-        else:
-            self.__fp = fp
+        if new_delimiter is not None:
+            self.__delimiter = str(new_delimiter)
+        return self.__delimiter
 
-    def __next__(self):
+    def lineno(self):
+        """Return the line number associated with the line
         """
-        Return next record from TSV file as a TabDataLine object
+        return self.__tabfile._lineno(self.__i)
+
+    def __repr__(self):
+        return self.__delimiter.join([str(x) for x in self])
+
+class ColumnarTabFile:
+    """Class to get data from a tab-delimited file using column storage
+
+    ColumnarTabFile provides the same interface as TabFile, but
+    rather than storing each line of data as a separate TabDataLine
+    object it stores the values for each column together, with a
+    single copy of the column names shared by all lines. Columns
+    where all the values are integers or all are floats are held
+    as compact typed arrays; other columns are held as lists.
+
+    This substantially reduces the memory required to hold large
+    files, and allows whole-column operations (via the
+    'transformColumn', 'computeColumn' and 'sort' methods) to work
+    directly on the columns.
+
+    Lines of data are returned as ColumnarDataLine objects, which
+    are TabDataLine-like views onto the underlying columns.
+
+    Example usage:
+
+        data = ColumnarTabFile(myfile,first_line_is_header=True)
+
+        for line in data:
+            ...                     # loop over lines of data
+
+        data.sort(lambda line: line['start'])
+    """
+    def __init__(self,filen=None,fp=None,column_names=None,skip_first_line=False,
+                 first_line_is_header=False,delimiter='\t',convert=True,
+                 allow_underscores_in_numeric_literals=False,
+                 keep_commented_lines=False,dtypes=None,infer_types=None):
+        """Create a new ColumnarTabFile object
+
+        If either of 'filen' or 'fp' arguments are given then the
+        object will be populated with data from the specified file
+        or stream. Otherwise an empty object is created.
+
+        Arguments:
+          filen (optional): name of tab-delimited file to load data
+              from; ignored if fp is also specified
+          fp: (optional) a file-like object which data can be loaded
+              from like a file; used in preference to filen.
+              Note that the calling program must close the stream in
+              these cases.
+          column_names: (optional) list of column names to assign to
+              columns in the file. Overrides column names in the file
+          skip_first_line: (optional) if True then ignore the first
+              line of the input file
+          first_line_is_header: (optional) if True then takes column
+              names from the first line of the file (over-riding
+              'column_names' argument if specified.
+          delimiter: (optional) delimiter character (defaults to tab)
+          convert: (optional) if True then convert input values to
+              the appropriate types (e.g. integer, float etc); if
+              False then convert everything to strings
+          allow_underscores_in_numeric_literals: (optional) if True
+              then treat numerical values with underscores as
+              numbers according to PEP 515; if False (the default)
+              then treat them as strings
+          keep_commented_lines: (optional) if True then don't
+              remove commented lines
+          dtypes: (optional) list of types (or other conversion
+              functions) for each column, or a dictionary mapping
+              column names or indices to types (see TabFile)
+          infer_types: (optional) if set to an integer N then
+              determine the type of each column from the first N
+              lines of data loaded from file (see TabFile)
         """
-        line = self.__fp.readline()
-        self.__lineno += 1
-        if line != '':
-            return TabDataLine(line=line,
-                               column_names=self.__column_names,
-                               lineno=self.__lineno)
+        # Initialise
+        self.__filen = filen
+        self.__header = []
+        self.__names = []
+        self.__name_index = {}
+        self.__columns = []
+        self.__linenos = array.array('q')
+        self.__delimiter = delimiter
+        self.__convert_values = convert
+        self.__allow_underscores_in_numbers = \
+                    allow_underscores_in_numeric_literals
+        self.__keep_commented_lines = keep_commented_lines
+        self.__dtypes = dtypes
+        self.__infer_types = infer_types
+        self.__column_types = []
+        self.__indexes = {}
+        # Conversion function
+        if convert:
+            if allow_underscores_in_numeric_literals:
+                self.__convert = TabDataLine.convert_to_type_pep515
+            else:
+                self.__convert = TabDataLine.convert_to_type
         else:
-            # Reached EOF
-            if self.__filen is not None:
-                # Assume we opened the file originally
-                self.__fp.close()
-            raise StopIteration
+            self.__convert = TabDataLine.convert_to_str
+        # Set up column names
+        if column_names is not None:
+            self.__setHeader(column_names)
+        # Read in data
+        if fp is None and filen is not None:
+            # Open named file
+            fp = io.open(self.__filen,'rt')
+            close_fp = True
+        else:
+            close_fp = False
+        if fp:
+            self.__load(fp,skip_first_line=skip_first_line,
+                        first_line_is_header=first_line_is_header)
+        # Only close the stream if it was opened locally
+        if close_fp: fp.close()
+
+    def __load(self,fp,skip_first_line=False,first_line_is_header=False):
+        """Load data into the object from file
+
+        Lines starting with '#' are ignored (unless the first_line_is_header
+        is set and the first line starts with '#').
+
+        If a header is set then lines with fewer data items than header
+        items raise an IndexError exception.
+
+        Arguments:
+          fp: file-like object to read data from
+          skip_first_line: (optional) if True then ignore the first
+              line of the input file
+          first_line_is_header: (optional) if True then take column
+              names from the first line of the file
+        """
+        delimiter = self.__delimiter
+        convert = self.__convert
+        lines = self.__readDataLines(fp,skip_first_line=skip_first_line,
+                                     first_line_is_header=first_line_is_header)
+        converters = None
+        if self.__dtypes or self.__infer_types:
+            # Set up conversions for each column
+            # (NB always read at least one line to ensure the
+            # header has been processed)
+            sample = list(itertools.islice(lines,
+                                           max(self.__infer_types or 1,1)))
+            self.__column_types,converters = _column_converters(
+                [line for line_no,line in sample],
+                header=self.header(),
+                delimiter=delimiter,
+                dtypes=self.__dtypes,
+                infer_types=bool(self.__infer_types),
+                convert=self.__convert_values,
+                allow_underscores_in_numeric_literals=
+                self.__allow_underscores_in_numbers)
+            lines = itertools.chain(sample,lines)
+        columns = None
+        linenos = self.__linenos
+        ncols = 0
+        for line_no,line in lines:
+            if columns is None:
+                columns = [list(col) for col in self.__columns]
+                ncols = len(columns)
+            # Store data
+            if converters:
+                values = _convert_values(line.split(delimiter),
+                                         converters,convert)
+            else:
+                values = [convert(value.rstrip('\n'))
+                          for value in line.split(delimiter)]
+            while len(values) < len(self.__header):
+                values.append('')
+            if ncols > 0:
+                if len(values) != ncols:
+                    # Inconsistent lines are an error
+                    logging.error("Line %d has wrong number of data items" % line_no)
+                    logging.error("Line: %s" % delimiter.join([str(x)
+                                                              for x in values]))
+                    logging.error("Expected %d, got %d" % (ncols,len(values)))
+                    raise IndexError("wrong number of data items in line %d" % line_no)
+            else:
+                # Set number of columns
+                ncols = len(values)
+                self.__names.extend([None]*ncols)
+                columns = [[] for i in range(ncols)]
+            for column,value in zip(columns,values):
+                column.append(value)
+            linenos.append(line_no)
+        if columns is not None:
+            self.__columns = [self.__compact(column) for column in columns]
+        self.__updateNameIndex()
+
+    def __readDataLines(self,fp,skip_first_line=False,
+                        first_line_is_header=False):
+        """Internal: yield the data lines from a file
+
+        Handles skipping of the first line and commented lines,
+        and sets up the header from the first line if required.
+
+        Returns:
+          Yields tuples (line_no,line) for each data line.
+        """
+        line_no = 0
+        for line in fp:
+            line_no += 1
+            if skip_first_line:
+                # Skip first line
+                skip_first_line = False
+                continue
+            elif first_line_is_header and len(self.header()) == 0:
+                # Set up header from first line
+                self.__setHeader(line.strip().strip('#').split(self.__delimiter))
+                first_line_is_header = False
+                continue
+            if line.lstrip().startswith('#') and \
+               not self.__keep_commented_lines:
+                # Skip commented line
+                continue
+            yield (line_no,line)
+
+    def __setHeader(self,column_names):
+        """Set the names for columns of data
+
+        Arguments:
+          column_names: a tuple or list with names for each column in order.
+        """
+        assert(len(self) == 0)
+        self.__header = [name for name in column_names]
+        self.__names = [name for name in column_names]
+        self.__columns = [[] for name in column_names]
+        self.__updateNameIndex()
+
+    def __updateNameIndex(self):
+        """Internal: rebuild the lookup of column names to indices
+        """
+        self.__name_index = {}
+        for i,name in enumerate(self.__names):
+            if name is not None and name not in self.__name_index:
+                self.__name_index[name] = i
+
+    @staticmethod
+    def __compact(values):
+        """Internal: return compact storage for a column of values
+
+        Columns where all values are integers (which fit into
+        64-bits) are returned as 'q' arrays, and columns where all
+        values are floats as 'd' arrays; otherwise the values are
+        returned as a list.
+        """
+        if values:
+            if all(type(x) is int for x in values):
+                try:
+                    return array.array('q',values)
+                except OverflowError:
+                    pass
+            elif all(type(x) is float for x in values):
+                return array.array('d',values)
+        if isinstance(values,list):
+            return values
+        return list(values)
+
+    def __columnForValue(self,j,value):
+        """Internal: return column 'j' ready to store 'value'
+
+        If the column is a typed array which can't hold the
+        value then it is converted to a list first.
+        """
+        column = self.__columns[j]
+        if isinstance(column,array.array):
+            if column.typecode == 'q':
+                if type(value) is int and \
+                   -(1 << 63) <= value < (1 << 63):
+                    return column
+            elif type(value) is float:
+                return column
+            column = list(column)
+            self.__columns[j] = column
+        return column
+
+    def __newRowValues(self,data=None,tabdata=None,tabdataline=None):
+        """Internal: convert data for a new row into a list of values
+
+        Also adds extra (unnamed) columns if the new row has more
+        values than there are existing columns.
+        """
+        convert = self.__convert
+        if tabdataline is not None:
+            values = [convert(x) for x in tabdataline]
+        elif data:
+            values = [convert(x) for x in data]
+        elif tabdata:
+            values = [convert(x.rstrip('\n'))
+                      for x in tabdata.split(self.__delimiter)]
+        else:
+            values = []
+        ncols = self.nColumns()
+        while len(values) < ncols:
+            values.append('')
+        for i in range(ncols,len(values)):
+            self.__columns.append(['']*len(self))
+            self.__names.append(None)
+        return values
+
+    def _column_index(self,key):
+        """Internal: return the integer index for a column
+
+        'key' can be the name of a column or an integer index
+        (starting from zero). Column names are checked first.
+        """
+        try:
+            return self.__name_index[key]
+        except (KeyError,TypeError):
+            # Not a column name
+            pass
+        # See if it's an integer index
+        try:
+            i = int(key)
+        except (ValueError,TypeError):
+            # Not an integer
+            raise KeyError("column '%s' not found" % key)
+        ncols = self.nColumns()
+        if i < -ncols or i >= ncols:
+            # Integer but out of range
+            raise IndexError("integer index out of range for '%s'" % key)
+        if i < 0:
+            i += ncols
+        return i
+
+    def _value(self,i,j):
+        """Internal: return the value from row 'i' and column 'j'
+        """
+        return self.__columns[j][i]
+
+    def _set_value(self,i,j,value):
+        """Internal: set the value in row 'i' and column 'j'
+        """
+        value = self.__convert(value)
+        column = self.__columnForValue(j,value)
+        for key in self.__indexes:
+            index = self.__indexes[key]
+            if index is not None and self._column_index(key) == j:
+                # Move row to the bucket for the new value
+                positions = index[column[i]]
+                positions.remove(i)
+                if not positions:
+                    del(index[column[i]])
+                bisect.insort(index.setdefault(value,[]),i)
+        column[i] = value
+
+    def _row(self,i):
+        """Internal: return the values from row 'i' as a list
+        """
+        return [column[i] for column in self.__columns]
+
+    def _lineno(self,i):
+        """Internal: return the line number for row 'i'
+        """
+        lineno = self.__linenos[i]
+        if lineno < 0:
+            return None
+        return lineno
+
+    def header(self):
+        """Return list of column names
+
+        If no column names were set then this will be an empty list.
+        """
+        return self.__header
+
+    def nColumns(self):
+        """Return the number of columns in the file
+        """
+        return len(self.__columns)
+
+    def filename(self):
+        """Return the file name associated with the ColumnarTabFile
+        """
+        return self.__filen
+
+    def columnTypes(self):
+        """Return list of the types used for each column on loading
+
+        See the 'columnTypes' method of TabFile for details.
+        """
+        return self.__column_types
+
+    def lookup(self,key,value):
+        """Return lines where the key matches the specified value
+
+        If an index has been created for the key (see the
+        'createIndex' method) then this is used to find the
+        matching lines; otherwise all values in the column are
+        checked.
+        """
+        if key in self.__indexes:
+            try:
+                return [ColumnarDataLine(self,i,self.__delimiter)
+                        for i in self.__getIndex(key).get(value,[])]
+            except TypeError:
+                # Unhashable value, fall back to checking all values
+                pass
+        column = self.__columns[self._column_index(key)]
+        return [ColumnarDataLine(self,i,self.__delimiter)
+                for i,x in enumerate(column) if x == value]
+
+    def createIndex(self,key):
+        """Create a hash index for a column
+
+        Once an index has been created for a column, the 'lookup'
+        method will use it to find matching lines rather than
+        checking every value in the column.
+
+        Indexes are kept up to date when lines are added or removed
+        using the 'append', 'insert' and 'del' operations, when
+        column values are updated using 'transformColumn' or
+        'computeColumn', and when values are set via the data
+        line views.
+
+        Arguments:
+          key: column name or index to create the index for
+        """
+        self.__indexes[key] = self.__buildIndex(key)
+
+    def dropIndex(self,key):
+        """Remove the index for a column (if there is one)
+
+        Arguments:
+          key: column name or index to remove the index for
+        """
+        if key in self.__indexes:
+            del(self.__indexes[key])
+
+    def __buildIndex(self,key):
+        """Internal: build a mapping of values to row positions
+        """
+        index = {}
+        for i,x in enumerate(self.__columns[self._column_index(key)]):
+            index.setdefault(x,[]).append(i)
+        return index
+
+    def __getIndex(self,key):
+        """Internal: return the index for a column
+
+        The index is rebuilt if it has been invalidated.
+        """
+        index = self.__indexes[key]
+        if index is None:
+            index = self.__buildIndex(key)
+            self.__indexes[key] = index
+        return index
+
+    def __invalidateIndexes(self):
+        """Internal: mark all indexes as needing to be rebuilt
+        """
+        for key in self.__indexes:
+            self.__indexes[key] = None
+
+    def join(self,other,key,other_key=None,keep_unmatched=False):
+        """Join with another TabFile on a key column
+
+        Creates a new ColumnarTabFile where each line of this
+        object is combined with each line of 'other' where the
+        values in the key columns match; see the 'join' method
+        of the TabFile class for details.
+
+        Arguments:
+          other: TabFile-like object to join with
+          key: name or index of the key column in this object
+          other_key: (optional) name or index of the key column
+            in 'other' (defaults to the same as 'key')
+          keep_unmatched: (optional) if True then also output
+            lines which have no matches in 'other', with empty
+            values for the columns from 'other' (default is to
+            drop them)
+
+        Returns:
+          New ColumnarTabFile object.
+        """
+        header,lines = _join_tabfiles(self,other,key,other_key,
+                                      keep_unmatched)
+        joined = ColumnarTabFile(column_names=header,
+                                 delimiter=self.__delimiter,
+                                 convert=self.__convert_values,
+                                 allow_underscores_in_numeric_literals=
+                                 self.__allow_underscores_in_numbers)
+        for values in lines:
+            joined.append(data=values)
+        return joined
+
+    def indexByLineNumber(self,n):
+        """Return index of a data line given the file line number
+
+        If no matching line is found then raises an IndexError.
+        """
+        try:
+            return self.__linenos.index(n)
+        except (ValueError,TypeError):
+            raise IndexError("No line number %d" % n)
+
+    def append(self,data=None,tabdata=None,tabdataline=None):
+        """Create and append a new data line
+
+        Optionally the 'data' or 'tabdata' arguments can specify
+        data items which will be used to populate the new line;
+        alternatively 'tabdataline' can provide a TabDataLine-like
+        object whose values will be copied into the new line.
+
+        Arguments:
+          data: (optional) a list of data items
+          tabdata: (optional) a string of tab-delimited data items
+          tabdataline: (optional) a TabDataLine-like object
+
+        Returns:
+          ColumnarDataLine view of the appended line.
+        """
+        values = self.__newRowValues(data=data,tabdata=tabdata,
+                                     tabdataline=tabdataline)
+        for j,value in enumerate(values):
+            self.__columnForValue(j,value).append(value)
+        self.__linenos.append(-1)
+        i = len(self) - 1
+        for key in self.__indexes:
+            index = self.__indexes[key]
+            if index is not None:
+                index.setdefault(values[self._column_index(key)],[]).append(i)
+        return self[-1]
+
+    def insert(self,i,data=None,tabdata=None,tabdataline=None):
+        """Create and insert a new data line at a specified index
+
+        Creates a new data line and inserts it at the specified
+        index position 'i' (nb NOT a line number).
+
+        Arguments:
+          i: index position to insert the line at
+          data: (optional) a list of data items
+          tabdata: (optional) a string of tab-delimited data items
+          tabdataline: (optional) a TabDataLine-like object
+
+        Returns:
+          ColumnarDataLine view of the inserted line.
+        """
+        if i < 0:
+            i = max(0,len(self)+i)
+        else:
+            i = min(i,len(self))
+        values = self.__newRowValues(data=data,tabdata=tabdata,
+                                     tabdataline=tabdataline)
+        for j,value in enumerate(values):
+            self.__columnForValue(j,value).insert(i,value)
+        self.__linenos.insert(i,-1)
+        self.__invalidateIndexes()
+        return self[i]
+
+    def appendColumn(self,name,fill_value=''):
+        """Append a new (empty) column
+
+        Arguments:
+          name: name for the new column
+          fill_value: optional, value to insert into
+            all rows in the new column
+        """
+        fill_value = self.__convert(fill_value)
+        self.__columns.append(self.__compact([fill_value]*len(self)))
+        self.__header.append(name)
+        self.__names.append(name)
+        self.__updateNameIndex()
+
+    def reorderColumns(self,new_columns):
+        """Rearrange the columns in the file
+
+        Arguments:
+          new_columns: list of column names or indices in the
+            new order
+
+        Returns:
+          New ColumnarTabFile object
+        """
+        indices = [self._column_index(key) for key in new_columns]
+        reordered_tabfile = ColumnarTabFile(
+            column_names=new_columns,
+            delimiter=self.__delimiter,
+            convert=self.__convert_values,
+            allow_underscores_in_numeric_literals=
+            self.__allow_underscores_in_numbers)
+        reordered_tabfile.__columns = [self.__columns[j][:] for j in indices]
+        reordered_tabfile.__linenos = array.array('q',[-1]*len(self))
+        return reordered_tabfile
+
+    def transpose(self):
+        """Transpose the contents of the file
+
+        Returns:
+          New ColumnarTabFile object
+        """
+        transposed_tabfile = ColumnarTabFile(
+            delimiter=self.__delimiter,
+            convert=self.__convert_values,
+            allow_underscores_in_numeric_literals=
+            self.__allow_underscores_in_numbers)
+        transposed_tabfile.__header = [None]*len(self)
+        transposed_tabfile.__names = [None]*len(self)
+        transposed_tabfile.__columns = [self.__compact(self._row(i))
+                                        for i in range(len(self))]
+        transposed_tabfile.__linenos = array.array('q',[-1]*self.nColumns())
+        return transposed_tabfile
+
+    def transformColumn(self,column_name,transform_func):
+        """Apply arbitrary function to a column
+
+        The transformation function will be invoked with each value
+        of the named column, with the results being written back to
+        that column (overwriting the existing values).
+
+        Arguments:
+          column_name: name of column to write transformation result to
+          transform_func: callable object that will be invoked to perform
+            the transformation
+        """
+        j = self._column_index(column_name)
+        convert = self.__convert
+        self.__columns[j] = self.__compact([convert(transform_func(x))
+                                            for x in self.__columns[j]])
+        self.__invalidateIndexes()
+
+    def computeColumn(self,column_name,compute_func):
+        """Compute and store values in a new column
+
+        For each line of data the computation function will be invoked
+        with the line as the sole argument, and the results will be
+        stored in a new column with the specified name.
+
+        Arguments:
+          column_name: name or index of column to write transformation
+             result to
+          compute_func: callable object that will be invoked to perform
+            the computation
+        """
+        if column_name not in self.header():
+            try:
+                # Check to see if it's actually an integer index
+                column_name = int(column_name)
+            except ValueError:
+                # Neither existing column name nor integer index
+                self.appendColumn(column_name)
+        j = self._column_index(column_name)
+        convert = self.__convert
+        self.__columns[j] = self.__compact([convert(compute_func(line))
+                                            for line in self])
+        self.__invalidateIndexes()
+
+    def sort(self,sort_func,reverse=False):
+        """Sort data using arbitrary function
+
+        Performs an in-place sort based on the suppled sort_func,
+        which should be a function object taking a data line
+        object as input and returning a single value; see the
+        TabFile 'sort' method for details.
+
+        The sort keys are computed once for each line and the
+        resulting ordering is then applied to each column.
+
+        Arguments:
+          sort_func: function object taking a data line object as
+            input and returning a single numerical value
+          reverse: (optional) Boolean, either False (default) to sort
+            in ascending order, or True to sort in descending order
+        """
+        keys = [sort_func(line) for line in self]
+        order = sorted(range(len(keys)),key=keys.__getitem__,reverse=reverse)
+        for j,column in enumerate(self.__columns):
+            if isinstance(column,array.array):
+                self.__columns[j] = array.array(column.typecode,
+                                                [column[i] for i in order])
+            else:
+                self.__columns[j] = [column[i] for i in order]
+        self.__linenos = array.array('q',[self.__linenos[i] for i in order])
+        self.__invalidateIndexes()
+
+    def write(self,filen=None,fp=None,include_header=False,no_hash=False,
+              delimiter=None):
+        """Write the ColumnarTabFile data to an output file
+
+        One of either the 'filen' or 'fp' arguments must be given,
+        specifying the file name or stream to write the data to.
+
+        Arguments:
+          filen: (optional) name of file to write to; ignored if fp is
+            also specified
+          fp: (optional) a file-like object opened for writing; used in
+            preference to filen if set to a non-null value
+            Note that the calling program must close the stream in
+            these cases.
+          include_header: (optional) if set to True, the first
+            line will be a 'header' line
+          no_hash: (optional) if set to True and include_header is
+            also True then don't put a hash character '#' at the
+            start of the header line in the output file.
+          delimiter: (optional) delimiter to use when writing data values
+            to file (defaults to the delimiter specified on input)
+        """
+        if fp is None and filen is not None:
+            # Open named file for writing
+            fp = io.open(filen,'wt')
+            close_fp = True
+        else:
+            close_fp = False
+        if delimiter is None:
+            delim = str(self.__delimiter)
+        else:
+            delim = str(delimiter)
+        if include_header:
+            if not no_hash:
+                leading_hash = '#'
+            else:
+                leading_hash = ''
+            fp.write("%s%s\n" % (leading_hash,delim.join(self.header())))
+        # Write the data
+        if self.__columns:
+            for values in zip(*self.__columns):
+                fp.write("%s\n" % delim.join([str(x) for x in values]))
+        else:
+            for i in range(len(self)):
+                fp.write("\n")
+        # Only close the stream if it was opened locally
+        if close_fp: fp.close()
+
+    def __getitem__(self,key):
+        if isinstance(key,slice):
+            return [ColumnarDataLine(self,i,self.__delimiter)
+                    for i in range(*key.indices(len(self)))]
+        i = int(key)
+        if i < 0:
+            i += len(self)
+        if i < 0 or i >= len(self):
+            raise IndexError("list index out of range")
+        return ColumnarDataLine(self,i,self.__delimiter)
+
+    def __delitem__(self,key):
+        del(self.__linenos[key])
+        for column in self.__columns:
+            del(column[key])
+        self.__invalidateIndexes()
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield ColumnarDataLine(self,i,self.__delimiter)
+
+    def __len__(self):
+        return len(self.__linenos)
+
+    def __repr__(self):
+        return '\n'.join([str(x) for x in self])
+
+class TabFileIterator(Iterator):
+    """
+    Iterate through lines in a tab-delimited file
+
+    Class to loop over all lines in a TSV file, returning a TabDataLine
+    object for each record.
+
+    Transformation and filtering steps can be added using the
+    'transformColumn', 'computeColumn' and 'filter' methods; these
+    are applied to each line as it is read, and the results can be
+    written out using the 'write' method, e.g.
+
+    >>> TabFileIterator(filen='data.tsv',column_names=['chr','start','end'])\
+    ...   .filter(lambda line: line['chr'] != 'chrM')\
+    ...   .computeColumn('length',lambda line: line['end']-line['start'])\
+    ...   .write('data.filtered.tsv.gz')
+
+    so that arbitrarily large files can be processed without loading
+    them into memory.
+    """
+
+    def __init__(self,filen=None,fp=None,column_names=None):
+        """
+        Create a new TabFileIterator
+
+        The input file should be a tab-delimited text file, specified as
+        either a file name (using the 'filen' argument), or a file-like
+        object opened for line reading (using the 'fp' argument). Files
+        with a '.gz' extension are assumed to be gzipped.
+
+        Each iteration returns a TabDataLine populated with data from
+        the file.
+
+        Example usage:
+
+        >>> for line in TabFileIterator(filen='data.tsv'):
+        ...   print(line)
+
+        Arguments:
+          filen: name of the file to iterate through
+          fp: file-like object opened for reading
+          column_names: optional list of names to use as
+            column headers in the returned TabDataLines
+
+        """
+        self.__filen = filen
+        self.__column_names = column_names
+        self.__header = list(column_names) if column_names else []
+        self.__steps = []
+        self.__lineno = 0
+        if fp is None:
+            if os.path.splitext(filen)[1] == '.gz':
+                self.__fp = gzip.open(filen,'rt')
+            else:
+                self.__fp = io.open(filen,'rt')
+        else:
+            self.__fp = fp
+
+    def header(self):
+        """
+        Return list of column names
+
+        This includes any new columns added by 'computeColumn'.
+        """
+        return self.__header
+
+    def transformColumn(self,column_name,transform_func):
+        """
+        Add a step to apply arbitrary function to a column
+
+        For each line the transformation function will be invoked
+        with the value of the named column, with the result being
+        written back to that column (see TabFile.transformColumn).
+
+        Arguments:
+          column_name: name of column to write transformation result to
+          transform_func: callable object that will be invoked to perform
+            the transformation
+
+        Returns:
+          The TabFileIterator instance (so that steps can be
+          chained).
+        """
+        self.__steps.append(('transform',column_name,transform_func))
+        return self
+
+    def computeColumn(self,column_name,compute_func):
+        """
+        Add a step to compute values for a column
+
+        For each line the computation function will be invoked with
+        the line as the sole argument, and the result stored in the
+        specified column, which will be added if it doesn't already
+        exist (see TabFile.computeColumn).
+
+        Arguments:
+          column_name: name or index of column to write result to
+          compute_func: callable object that will be invoked to perform
+            the computation
+
+        Returns:
+          The TabFileIterator instance (so that steps can be
+          chained).
+        """
+        step = 'compute'
+        if column_name not in self.__header:
+            try:
+                # Check to see if it's actually an integer index
+                column_name = int(column_name)
+            except ValueError:
+                # Neither existing column name nor integer index
+                step = 'append'
+                self.__header.append(column_name)
+        self.__steps.append((step,column_name,compute_func))
+        return self
+
+    def filter(self,filter_func):
+        """
+        Add a step to filter lines
+
+        Lines for which the filter function doesn't return True
+        are dropped (and subsequent steps aren't applied to them).
+
+        Arguments:
+          filter_func: callable object that will be invoked with
+            each line and which should return True if the line is
+            to be kept
+
+        Returns:
+          The TabFileIterator instance (so that steps can be
+          chained).
+        """
+        self.__steps.append(('filter',None,filter_func))
+        return self
+
+    def __apply_steps(self,line):
+        """
+        Internal: apply the transformation steps to a line
+
+        Returns True if the line should be kept, False if it
+        has been filtered out.
+        """
+        for step,column_name,func in self.__steps:
+            if step == 'transform':
+                line[column_name] = func(line[column_name])
+            elif step == 'compute':
+                line[column_name] = func(line)
+            elif step == 'append':
+                value = func(line)
+                # Ensure any unnamed columns are skipped over
+                while len(line.names) < len(line):
+                    line.names.append(None)
+                line.appendColumn(column_name,value)
+            elif step == 'filter':
+                if not func(line):
+                    return False
+        return True
+
+    def write(self,filen=None,fp=None,include_header=False,no_hash=False,
+              delimiter='\t',batch_size=10000):
+        """
+        Write the (transformed) lines to an output file
+
+        One of either the 'filen' or 'fp' arguments must be given,
+        specifying the file name or stream to write the data to.
+        Files with a '.gz' extension are written in gzipped format.
+
+        Lines are written in batches, to reduce the number of
+        individual write operations.
+
+        Arguments:
+          filen: (optional) name of file to write to; ignored if fp is
+            also specified
+          fp: (optional) a file-like object opened for writing; used in
+            preference to filen if set to a non-null value
+            Note that the calling program must close the stream in
+            these cases.
+          include_header: (optional) if set to True, the first
+            line will be a 'header' line
+          no_hash: (optional) if set to True and include_header is
+            also True then don't put a hash character '#' at the
+            start of the header line in the output file.
+          delimiter: (optional) delimiter to use when writing data
+            values to file (defaults to tab)
+          batch_size: (optional) number of lines to write at a time
+
+        Returns:
+          Number of lines written (excluding the header).
+        """
+        if fp is None and filen is not None:
+            # Open named file for writing
+            if os.path.splitext(filen)[1] == '.gz':
+                fp = gzip.open(filen,'wt')
+            else:
+                fp = io.open(filen,'wt')
+            close_fp = True
+        else:
+            close_fp = False
+        if include_header:
+            if not no_hash:
+                leading_hash = '#'
+            else:
+                leading_hash = ''
+            fp.write("%s%s\n" % (leading_hash,
+                                 delimiter.join([str(x)
+                                                 for x in self.header()])))
+        # Write the data
+        nlines = 0
+        batch = []
+        for line in self:
+            batch.append(delimiter.join([str(x) for x in line.data]))
+            if len(batch) >= batch_size:
+                batch.append('')
+                fp.write('\n'.join(batch))
+                nlines += len(batch) - 1
+                batch = []
+        if batch:
+            batch.append('')
+            fp.write('\n'.join(batch))
+            nlines += len(batch) - 1
+        # Only close the stream if it was opened locally
+        if close_fp: fp.close()
+        return nlines
+
+    def __next__(self):
+        """
+        Return next record from TSV file as a TabDataLine object
+        """
+        while True:
+            line = self.__fp.readline()
+            self.__lineno += 1
+            if line != '':
+                line = TabDataLine(line=line,
+                                   column_names=self.__column_names,
+                                   lineno=self.__lineno)
+                if self.__apply_steps(line):
+                    return line
+            else:
+                # Reached EOF
+                if self.__filen is not None:
+                    # Assume we opened the file originally
+                    self.__fp.close()
+                raise StopIteration
+
+class BulkTabFileIterator(Iterator):
+    """
+    Iterate through records in a tab-delimited file using bulk reads
+
+    Class to loop over all lines in a TSV file, returning a tuple of
+    values for each record. Unlike TabFileIterator, the input is read
+    in large blocks which are split into records in bulk, and no
+    TabDataLine objects are created, which makes it suitable for
+    streaming through very large files.
+
+    By default ('raw' mode) each record is returned as a tuple of
+    strings. Alternatively a 'types' schema can be supplied, giving
+    a function (e.g. 'int' or 'float') for each column which is used
+    to convert the values in that column ('typed' mode).
+    """
+
+    def __init__(self,filen=None,fp=None,types=None,delimiter='\t',
+                 chunk_size=1024*1024):
+        """
+        Create a new BulkTabFileIterator
+
+        The input file should be a tab-delimited text file, specified as
+        either a file name (using the 'filen' argument), or a file-like
+        object opened for reading (using the 'fp' argument).
+
+        Example usage:
+
+        >>> for chrom,start,end in BulkTabFileIterator(filen='data.tsv'):
+        ...   print(chrom)
+
+        >>> for rec in BulkTabFileIterator(filen='data.tsv',
+        ...                                types=(str,int,int)):
+        ...   print(rec[2]-rec[1])
+
+        Arguments:
+          filen: name of the file to iterate through
+          fp: file-like object opened for reading
+          types: optional list of functions to convert the
+            values in each column (use None for columns which
+            should be left as strings)
+          delimiter: optional delimiter character (defaults
+            to tab)
+          chunk_size: optional size (in characters) of the
+            blocks of data to read at a time
+
+        """
+        self.__filen = filen
+        self.__delimiter = delimiter
+        self.__chunk_size = chunk_size
+        self.__lineno = 0
+        if types is not None:
+            self.__converters = [(i,f) for i,f in enumerate(types)
+                                 if f is not None and f is not str]
+        else:
+            self.__converters = None
+        if fp is None:
+            self.__fp = io.open(filen,'rt')
+        else:
+            self.__fp = fp
+        self.__records = self.__iterate()
+
+    def __read_chunks(self):
+        """
+        Internal: yield lists of complete lines read in blocks
+        """
+        remainder = ''
+        while True:
+            data = self.__fp.read(self.__chunk_size)
+            if not data:
+                break
+            lines = (remainder + data).split('\n')
+            remainder = lines.pop()
+            if lines:
+                yield lines
+        if remainder:
+            yield [remainder]
+        if self.__filen is not None:
+            # Assume we opened the file originally
+            self.__fp.close()
+
+    def __convert_chunk(self,records):
+        """
+        Internal: apply the type conversions to a list of records
+        """
+        converters = self.__converters
+        lineno = self.__lineno
+        for n,values in enumerate(records):
+            try:
+                for i,f in converters:
+                    values[i] = f(values[i])
+            except (ValueError,TypeError,IndexError) as ex:
+                raise ValueError("line %d: failed to convert value: %s" %
+                                 (lineno+n+1,ex))
+            records[n] = tuple(values)
+        return records
+
+    def chunks(self):
+        """
+        Yield the records in the file in lists
+
+        Each list contains the records parsed from a single
+        block of input data.
+        """
+        delimiter = self.__delimiter
+        for lines in self.__read_chunks():
+            if self.__converters is None:
+                records = [tuple(line.split(delimiter)) for line in lines]
+            else:
+                records = self.__convert_chunk([line.split(delimiter)
+                                                for line in lines])
+            self.__lineno += len(records)
+            yield records
+
+    def __iterate(self):
+        """
+        Internal: yield individual records
+        """
+        for records in self.chunks():
+            for record in records:
+                yield record
+
+    def __next__(self):
+        """
+        Return next record from TSV file as a tuple
+        """
+        return next(self.__records)
+
+def sort_file(infile,outfile,keys,reverse=False,delimiter='\t',
+              first_line_is_header=False,buffer_size=256*1024*1024,
+              tmp_dir=None):
+    """Sort a tab-delimited file which may be larger than memory
+
+    Sorts the lines of data in 'infile' on one or more key
+    columns and writes them to 'outfile', using an external merge
+    sort: data are read in batches of up to approximately
+    'buffer_size' bytes, each batch is sorted in memory and
+    written to a temporary file, and the sorted batches are then
+    merged into the output. (If all the data fit into a single
+    batch then no temporary files are used.)
+
+    The key columns are specified as a list where each item is
+    either a column name or index (in which case the values are
+    compared as strings), or a tuple of (name or index,function)
+    where the function is used to convert the values before
+    comparing them, for example to sort by chromosome and then
+    by start position:
+
+    >>> sort_file('peaks.txt','peaks.sorted.txt',
+    ...           keys=['chr',('start',int)],
+    ...           first_line_is_header=True)
+
+    The sort is stable, so lines with equal keys are output in
+    the same order as in the input.
+
+    The header line (if 'first_line_is_header' is True) and any
+    commented lines (i.e. lines starting with '#') are written to
+    the start of the output file in their original order.
+
+    Arguments:
+      infile: name of the tab-delimited file to sort
+      outfile: name of the file to write the sorted data to
+        (can be the same as 'infile')
+      keys: list of column names or indices, or tuples of
+        (column name or index,function), to sort on
+      reverse: (optional) if True then sort in descending order
+      delimiter: (optional) delimiter character (defaults to tab)
+      first_line_is_header: (optional) if True then take column
+        names from the first line of the file
+      buffer_size: (optional) approximate maximum amount of data
+        (in bytes) to sort in memory at a time
+      tmp_dir: (optional) directory to create temporary files
+        under (defaults to the system temporary directory)
+
+    Returns:
+      Number of data lines that were sorted.
+    """
+    preamble = []
+    header = []
+    buf = []
+    buf_size = 0
+    nlines = 0
+    runs = []
+    run_dir = None
+    sort_key = operator.itemgetter(0)
+    try:
+        with io.open(infile,'rt') as fp:
+            for line_no,line in enumerate(fp,1):
+                if not line.endswith('\n'):
+                    line += '\n'
+                if first_line_is_header and not header:
+                    # Set up header from first line
+                    preamble.append(line)
+                    header = line.strip().strip('#').split(delimiter)
+                    first_line_is_header = False
+                    continue
+                if line.lstrip().startswith('#'):
+                    # Keep commented line
+                    preamble.append(line)
+                    continue
+                if nlines == 0:
+                    key_func = _sort_key_function(keys,header,delimiter)
+                nlines += 1
+                try:
+                    buf.append((key_func(line),line))
+                except (IndexError,ValueError) as ex:
+                    raise ValueError("%s: line %d: unable to get sort "
+                                     "key: %s" % (infile,line_no,ex))
+                buf_size += len(line) + _SORT_LINE_OVERHEAD
+                if buf_size >= buffer_size:
+                    # Write sorted batch to a temporary file
+                    if run_dir is None:
+                        run_dir = tempfile.mkdtemp(prefix="sort_file.",
+                                                   dir=tmp_dir)
+                    buf.sort(key=sort_key,reverse=reverse)
+                    run = os.path.join(run_dir,"run%06d" % len(runs))
+                    with io.open(run,'wt') as fp_run:
+                        fp_run.writelines([x[1] for x in buf])
+                    runs.append(run)
+                    buf = []
+                    buf_size = 0
+        # Sort remaining data
+        buf.sort(key=sort_key,reverse=reverse)
+        if runs:
+            # Merge the sorted batches with the remaining data
+            key_func = _sort_key_function(keys,header,delimiter)
+            def read_run(run):
+                with io.open(run,'rt') as fp_run:
+                    for line in fp_run:
+                        yield (key_func(line),line)
+            merged = heapq.merge(*([read_run(run) for run in runs] + [buf]),
+                                 key=sort_key,reverse=reverse)
+        else:
+            merged = buf
+        # Write the sorted data
+        with io.open(outfile,'wt') as fp:
+            fp.writelines(preamble)
+            for key,line in merged:
+                fp.write(line)
+    finally:
+        # Remove temporary files
+        if run_dir is not None:
+            shutil.rmtree(run_dir)
+    return nlines
+
+def _line_aligned_offsets(fp,start,end,n):
+    """Internal: split a range of bytes on line boundaries
+
+    Divides the bytes from 'start' to 'end' in a file into
+    (up to) 'n' ranges of roughly equal size, adjusting the
+    offsets so that each range starts at the beginning of a
+    line.
+
+    Arguments:
+      fp: file-like object opened for reading in binary mode
+      start: offset of the start of the data
+      end: offset of the end of the data
+      n: number of ranges to split into
+
+    Returns:
+      Sorted list of unique offsets, starting with 'start'
+      and ending with 'end' (or an empty list if there is no
+      data).
+    """
+    if end <= start:
+        return []
+    offsets = [start]
+    for k in range(1,n):
+        offset = start + k*(end-start)//n
+        if offset <= offsets[-1]:
+            continue
+        # Move to the start of the next line
+        fp.seek(offset-1)
+        fp.readline()
+        offset = fp.tell()
+        if offset >= end:
+            break
+        if offset > offsets[-1]:
+            offsets.append(offset)
+    offsets.append(end)
+    return offsets
+
+def _count_lines_in_range(args):
+    """Internal: count the lines in a range of bytes in a file
+
+    Arguments:
+      args: tuple (filen,start,end)
+
+    Returns:
+      Number of newlines in the range.
+    """
+    filen,start,end = args
+    nlines = 0
+    with io.open(filen,'rb') as fp:
+        fp.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            buf = fp.read(min(remaining,1024*1024))
+            if not buf:
+                break
+            nlines += buf.count(b'\n')
+            remaining -= len(buf)
+    return nlines
+
+def _load_lines_in_range(args):
+    """Internal: create data lines from a range of bytes in a file
+
+    Commented lines are skipped (unless 'keep_commented_lines'
+    is set). Loading stops at the first line with a different
+    number of items to 'ncols' (or to the first line in the
+    range, if 'ncols' is zero).
+
+    Arguments:
+      args: tuple (filen,start,end,line_no,tab_data_line,header,
+        ncols,keep_commented_lines,kws) where 'line_no' is the
+        number of the line before the start of the range, and
+        'kws' are additional keywords for 'tab_data_line'
+
+    Returns:
+      Tuple (data_lines,bad_line) where 'bad_line' is the
+      index of the inconsistent line in 'data_lines' (or None
+      if all lines were consistent).
+    """
+    (filen,start,end,line_no,tab_data_line,header,ncols,
+     keep_commented_lines,kws) = args
+    with io.open(filen,'rb') as fp:
+        fp.seek(start)
+        data = fp.read(end-start)
+    data_lines = []
+    for line in io.TextIOWrapper(io.BytesIO(data)):
+        line_no += 1
+        if line.lstrip().startswith('#') and not keep_commented_lines:
+            # Skip commented line
+            continue
+        data_line = tab_data_line(line,column_names=header,lineno=line_no,
+                                  **kws)
+        data_lines.append(data_line)
+        if ncols == 0:
+            ncols = len(data_line)
+        elif len(data_line) != ncols:
+            return (data_lines,len(data_lines)-1)
+    return (data_lines,None)
+
+def _sort_key_function(keys,header=None,delimiter='\t'):
+    """Internal: make a function returning the sort key for a line
+
+    Arguments:
+      keys: list of column names or indices, or tuples of
+        (column name or index,function) (see 'sort_file')
+      header: (optional) list of column names
+      delimiter: (optional) delimiter character (defaults to tab)
+
+    Returns:
+      Function which takes a line of data and returns a tuple
+      of the key values.
+    """
+    key_columns = []
+    for key in keys:
+        if isinstance(key,tuple):
+            key,func = key
+        else:
+            func = None
+        if header and key in header:
+            i = header.index(key)
+        else:
+            try:
+                i = int(key)
+            except (ValueError,TypeError):
+                raise KeyError("column '%s' not found" % key)
+        key_columns.append((i,func))
+    def key_func(line):
+        values = line.rstrip('\n').split(delimiter)
+        return tuple([values[i] if func is None else func(values[i])
+                      for i,func in key_columns])
+    return key_func
+
+def _int_value(value):
+    """Internal: convert a string to an integer
+
+    Raises ValueError for values containing underscores, which
+    TabDataLine's default conversion treats as strings.
+    """
+    if '_' in value:
+        raise ValueError("'%s': contains underscore" % value)
+    return int(value)
+
+def _float_value(value):
+    """Internal: convert a string to a float
+
+    Raises ValueError for values containing underscores or which
+    are integers, which TabDataLine's default conversion doesn't
+    treat as floats.
+    """
+    if '_' in value or value.strip().lstrip('+-').isdecimal():
+        raise ValueError("'%s': not a float" % value)
+    return float(value)
+
+def _pep515(convert):
+    """Internal: wrap a conversion to remove underscores first
+    """
+    return functools.partial(_pep515_value,convert)
+
+def _pep515_value(convert,value):
+    """Internal: remove underscores from a value and convert it
+    """
+    return convert(value.replace('_',''))
+
+def _convert_values(values,converters,default_convert):
+    """Internal: convert a list of values using per-column functions
+
+    Arguments:
+      values: list of string values
+      converters: list of conversion functions for each column
+        (None to use the default conversion for that column)
+      default_convert: function to use for columns without a
+        conversion function, and for values where the column
+        function raises ValueError or TypeError
+
+    Returns:
+      List of converted values.
+    """
+    ncols = len(converters)
+    converted = []
+    for i,value in enumerate(values):
+        value = value.rstrip('\n')
+        if i < ncols and converters[i] is not None:
+            try:
+                converted.append(converters[i](value))
+                continue
+            except (ValueError,TypeError):
+                pass
+        converted.append(default_convert(value))
+    return converted
+
+def _column_converters(lines,header=None,delimiter='\t',dtypes=None,
+                       infer_types=False,convert=True,
+                       allow_underscores_in_numeric_literals=False):
+    """Internal: set up the conversion functions for each column
+
+    If 'infer_types' is True then the type of each column is
+    determined by applying the default TabDataLine conversion to
+    the (non-empty) values in the sample 'lines': columns where
+    every value converts to the same type are assigned a single
+    conversion function for that type.
+
+    The conversions for integer and float columns reject values
+    which the default conversion would treat differently, so that
+    these fall back to the default. Columns inferred to be strings
+    always keep values as strings.
+
+    Explicit types in 'dtypes' override any inferred types.
+
+    Arguments:
+      lines: list of sample lines from the file
+      header: (optional) list of column names
+      delimiter: (optional) delimiter character (defaults to tab)
+      dtypes: (optional) list of types for each column, or a
+        dictionary mapping column names or indices to types
+      infer_types: (optional) if True then infer types from the
+        sample lines
+      convert: (optional) if False then values are not being
+        converted from strings
+      allow_underscores_in_numeric_literals: (optional) if True
+        then values are being converted according to PEP 515
+
+    Returns:
+      Tuple (types,converters) where 'types' is a list of the
+      type for each column (or None if it couldn't be
+      determined), and 'converters' is a list of the
+      corresponding conversion functions.
+    """
+    rows = [[value.rstrip('\n') for value in line.split(delimiter)]
+            for line in lines]
+    ncols = max([len(header or [])] + [len(row) for row in rows])
+    if isinstance(dtypes,(list,tuple)):
+        ncols = max(ncols,len(dtypes))
+    types = [None]*ncols
+    converters = [None]*ncols
+    if infer_types and not convert:
+        # Everything is a string
+        types = [str]*ncols
+    elif infer_types:
+        if allow_underscores_in_numeric_literals:
+            default_convert = TabDataLine.convert_to_type_pep515
+        else:
+            default_convert = TabDataLine.convert_to_type
+        for j in range(ncols):
+            kinds = set([type(default_convert(row[j])) for row in rows
+                         if j < len(row) and row[j] != ''])
+            if len(kinds) != 1:
+                continue
+            kind = kinds.pop()
+            if kind is int:
+                converter = _int_value
+            elif kind is float:
+                converter = _float_value
+            elif kind is str:
+                converter = str
+            else:
+                continue
+            if allow_underscores_in_numeric_literals and kind is not str:
+                converter = _pep515(converter)
+            types[j] = kind
+            converters[j] = converter
+    if dtypes:
+        if isinstance(dtypes,dict):
+            items = dtypes.items()
+        else:
+            items = enumerate(dtypes)
+        for key,dtype in items:
+            if header and key in header:
+                j = header.index(key)
+            else:
+                try:
+                    j = int(key)
+                except (ValueError,TypeError):
+                    raise KeyError("column '%s' not found" % key)
+            while j >= len(types):
+                types.append(None)
+                converters.append(None)
+            types[j] = dtype
+            converters[j] = dtype
+    return (types,converters)
+
+def _join_tabfiles(tabfile,other,key,other_key=None,keep_unmatched=False):
+    """Internal: join two TabFile-like objects on a key column
+
+    See the 'join' method of the TabFile class for details.
+
+    Arguments:
+      tabfile: TabFile-like object
+      other: TabFile-like object to join with 'tabfile'
+      key: name or index of the key column in 'tabfile'
+      other_key: (optional) name or index of the key column
+        in 'other' (defaults to the same as 'key')
+      keep_unmatched: (optional) if True then also output
+        lines from 'tabfile' which have no matches in 'other'
+
+    Returns:
+      Tuple (header,lines) where 'header' is a list of column
+      names for the joined data (or None if either input has
+      no header), and 'lines' is a generator which yields a
+      list of values for each joined line.
+    """
+    if other_key is None:
+        other_key = key
+    # Locate the key column in 'other'
+    other_ncols = other.nColumns()
+    if not other_ncols and len(other):
+        other_ncols = len(other[0])
+    if other_key in other.header():
+        other_key_index = other.header().index(other_key)
+    else:
+        try:
+            other_key_index = int(other_key)
+        except (ValueError,TypeError):
+            raise KeyError("column '%s' not found" % other_key)
+        if other_key_index < 0:
+            other_key_index += other_ncols
+    # Set up the header
+    if tabfile.header() and other.header():
+        header = list(tabfile.header()) + \
+                 [name for i,name in enumerate(other.header())
+                  if i != other_key_index]
+    else:
+        header = None
+    # Hash the lines in 'other' on the key column
+    index = {}
+    for line in other:
+        values = [x for i,x in enumerate(line.data) if i != other_key_index]
+        index.setdefault(line[other_key],[]).append(values)
+    empty_values = ['']*max(other_ncols-1,0)
+    # Generate the joined lines
+    def join_lines():
+        for line in tabfile:
+            values = list(line.data)
+            try:
+                matches = index.get(line[key])
+            except TypeError:
+                # Unhashable value can't match
+                matches = None
+            if matches:
+                for other_values in matches:
+                    yield values + other_values
+            elif keep_unmatched:
+                yield values + empty_values
+    return (header,join_lines())
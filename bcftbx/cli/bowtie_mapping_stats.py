@@ -63,6 +63,11 @@ The program extracts data from the "reads processed"/"reads; of these",
 and "reads that failed to align"/"aligned 0 times" lines for each block,
 and then writes these to an output XLS file.
 
+Multiple log files can be read in parallel (using the -n option),
+and with the --incremental option the statistics for each log are
+cached so that subsequent runs only reread logs which have been
+modified.
+
 The program depends upon the simple_xls module, and the 3rd party
 Python modules xlwt, xlrd and xlutils.
 """
@@ -78,6 +83,8 @@ import os
 import io
 import argparse
 import glob
+import json
+import multiprocessing
 # Set default logging level and output
 import logging
 logging.basicConfig(format='%(levelname)s: %(message)s')
@@ -88,6 +95,13 @@ from ..simple_xls import column_integer_to_index
 from ..simple_xls import NumberFormats
 from .. import get_version
 
+#######################################################################
+# Constants
+#######################################################################
+
+# Version of the format used for the statistics cache
+STATS_CACHE_VERSION = 1
+
 #######################################################################
 # Classes
 #######################################################################
@@ -106,6 +120,12 @@ class BowtieMappingStats:
     Data for each sample found in each file is stored in a
     BowtieSample object.
 
+    Multiple log files can be read in parallel, optionally
+    reusing statistics cached from a previous run for logs
+    which haven't changed since:
+
+    >>> stats.add_logs(log_files,nprocs=4,cache_file='stats.cache')
+
     To create an XLS file summarising the statistics:
 
     >>> stats.xls('stats.xls')
@@ -121,6 +141,7 @@ class BowtieMappingStats:
         """
         self.files = []
         self.samples = []
+        self.cached_files = []
 
     @property
     def n_samples(self):
@@ -152,61 +173,116 @@ class BowtieMappingStats:
           Number of samples acquired from this file.
 
         """
-        sample = None
-        n_samples = self.n_samples
         self.files.append(filen)
         if fp is None:
-            fp = io.open(filen,'rt')
-        for line in fp:
-            if line.startswith("# reads processed: "):
-                # Bowtie 1.* outputs
-                # Lines of the form "# reads processed: 39808407"
-                # Indicates a new sample record
-                i = self.n_samples + 1
-                sample = BowtieSample(i,bowtie_log=filen,bowtie_version='1')
-                sample.total_reads = int(line.strip().split()[-1])
-                self.samples.append(sample)
-                continue
-            elif line.strip().endswith(" reads; of these:"):
-                # Bowtie 2.* outputs
-                # Lines of the form "117279034 reads; of these:"
-                # Indicates a new sample record
-                i = self.n_samples + 1
-                sample = BowtieSample(i,bowtie_log=filen,bowtie_version='2')
-                sample.total_reads = int(line.strip().split()[0])
-                self.samples.append(sample)
-                continue
-            if sample is None:
-                # No more processing of this line
-                continue
-            if sample.bowtie_version == '1':
-                if line.startswith("# reads that failed to align: "):
-                    # Lines of the form "# reads that failed to align: 33721722 (84.71%)"
-                    sample.didnt_align = int(line.strip().split()[-2])
-                elif line.startswith("# reads with at least one reported alignment: "):
-                    # Lines of the form "# reads with at least one reported alignment: 2737588 (6.88%)"
-                    sample.uniquely_mapped = int(line.strip().split()[-2])
-            elif sample.bowtie_version == '2':
-                if line.strip().endswith(" were paired; of these:"):
-                    # Indicates bowtie2 paired-end
-                    sample.paired_end = True
-                elif not sample.paired_end:
-                    # Single-end data
-                    if line.strip().endswith(" aligned exactly 1 time"):
-                        # Lines of the form "    115341420 (98.35%) aligned exactly 1 time"
-                        sample.uniquely_mapped = int(line.strip().split()[0])
-                    elif line.strip().endswith(" aligned 0 times"):
-                        # Lines of the form "    1937614 (1.65%) aligned 0 times"
-                        sample.didnt_align = int(line.strip().split()[0])
-                else:
-                    # Paired-end data
-                    if line.strip().endswith(" aligned concordantly exactly 1 time"):
-                        # Lines of the form "    22792207 (26.64%) aligned concordantly exactly 1 time"
-                        sample.uniquely_mapped = int(line.strip().split()[0])
-                    elif line.strip().endswith(" aligned concordantly 0 times"):
-                        # Lines of the form "   56052776 (65.51%) aligned concordantly 0 times"
-                        sample.didnt_align = int(line.strip().split()[0])
-        return self.n_samples - n_samples
+            with io.open(filen,'rt') as fp:
+                samples = read_bowtie_log(fp,filen=filen)
+        else:
+            samples = read_bowtie_log(fp,filen=filen)
+        return self._store_samples(samples)
+
+    def add_logs(self,filens,nprocs=None,cache_file=None):
+        """Read & store statistics for samples from multiple log files
+
+        Reads the statistics for the samples in each of the
+        supplied bowtie or bowtie2 log files, and appends them to
+        the samples held in the BowtieMappingStats object.
+
+        The samples are always stored in the same order as the
+        input files (and within each file, in the order that they
+        appear), regardless of how the files are processed.
+
+        If 'nprocs' is greater than 1 then the log files are
+        parsed concurrently using a pool of that many processes.
+
+        If 'cache_file' is specified then the statistics for each
+        log file are also recorded in that file along with the
+        file's modification time and size. On subsequent calls
+        with the same cache file, logs which haven't changed are
+        not reparsed and the cached statistics are used instead
+        (the names of these files are stored in the
+        'cached_files' property). The cache file is updated after
+        the logs have been processed.
+
+        Arguments:
+          filens: list of bowtie/bowtie2 log files
+          nprocs: (optional) number of processes to use when
+            parsing the log files (default is to parse them in
+            the current process)
+          cache_file: (optional) name of a file used to cache
+            the statistics between runs
+
+        Returns:
+          List with the number of samples acquired from each
+          of the log files.
+
+        """
+        filens = list(filens)
+        # Load cached data from previous runs
+        cache = {}
+        if cache_file is not None and os.path.exists(cache_file):
+            cache = _read_stats_cache(cache_file)
+        # Identify files which need to be (re)parsed
+        results = [None]*len(filens)
+        file_info = []
+        to_parse = []
+        for i,filen in enumerate(filens):
+            info = _log_file_info(filen)
+            file_info.append(info)
+            cached = cache.get(info['path'])
+            if cached is not None and \
+               cached['mtime'] == info['mtime'] and \
+               cached['size'] == info['size']:
+                results[i] = [_sample_from_dict(d,filen)
+                              for d in cached['samples']]
+                self.cached_files.append(filen)
+            else:
+                to_parse.append(i)
+        # Parse the files
+        if nprocs and nprocs > 1 and len(to_parse) > 1:
+            pool = multiprocessing.Pool(min(nprocs,len(to_parse)))
+            try:
+                parsed = pool.map(_read_bowtie_log_file,
+                                  [filens[i] for i in to_parse],
+                                  chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            parsed = [_read_bowtie_log_file(filens[i]) for i in to_parse]
+        for i,samples in zip(to_parse,parsed):
+            results[i] = samples
+        # Store the samples in the order of the input files
+        n_samples = []
+        for filen,samples in zip(filens,results):
+            self.files.append(filen)
+            n_samples.append(self._store_samples(samples))
+        # Update the cache
+        if cache_file is not None:
+            for info,samples in zip(file_info,results):
+                info['samples'] = [_sample_to_dict(sample)
+                                   for sample in samples]
+                cache[info['path']] = info
+            _write_stats_cache(cache_file,cache)
+        return n_samples
+
+    def _store_samples(self,samples):
+        """Internal: append samples and assign their names
+
+        Samples are named according to their overall position
+        in the list of stored samples.
+
+        Arguments:
+          samples: list of BowtieSample instances
+
+        Returns:
+          Number of samples added.
+
+        """
+        for sample in samples:
+            sample.name = str(self.n_samples + 1)
+            self.samples.append(sample)
+        return len(samples)
 
     def xls(self,xls_out=None):
         """Output an XLS spreadsheet with the sample data
@@ -356,6 +432,173 @@ class BowtieSample:
             bowtie_version = ''
         self.bowtie_version = bowtie_version
 
+#######################################################################
+# Functions
+#######################################################################
+
+def read_bowtie_log(fp,filen=None):
+    """Read statistics for samples from bowtie log output
+
+    Reads the numbers of processed, unaligned etc reads for each
+    sample in bowtie or bowtie2 log output (including bowtie2
+    paired-end blocks) in a single pass.
+
+    Arguments:
+      fp: file-like object opened for reading with bowtie log
+        output
+      filen: (optional) name of the log file that the output
+        was read from
+
+    Returns:
+      List of BowtieSample instances (one per sample, named
+      according to their position in the log).
+
+    """
+    samples = []
+    sample = None
+    for line in fp:
+        if line.startswith("# reads processed: "):
+            # Bowtie 1.* outputs
+            # Lines of the form "# reads processed: 39808407"
+            # Indicates a new sample record
+            i = len(samples) + 1
+            sample = BowtieSample(i,bowtie_log=filen,bowtie_version='1')
+            sample.total_reads = int(line.strip().split()[-1])
+            samples.append(sample)
+            continue
+        elif line.strip().endswith(" reads; of these:"):
+            # Bowtie 2.* outputs
+            # Lines of the form "117279034 reads; of these:"
+            # Indicates a new sample record
+            i = len(samples) + 1
+            sample = BowtieSample(i,bowtie_log=filen,bowtie_version='2')
+            sample.total_reads = int(line.strip().split()[0])
+            samples.append(sample)
+            continue
+        if sample is None:
+            # No more processing of this line
+            continue
+        if sample.bowtie_version == '1':
+            if line.startswith("# reads that failed to align: "):
+                # Lines of the form "# reads that failed to align: 33721722 (84.71%)"
+                sample.didnt_align = int(line.strip().split()[-2])
+            elif line.startswith("# reads with at least one reported alignment: "):
+                # Lines of the form "# reads with at least one reported alignment: 2737588 (6.88%)"
+                sample.uniquely_mapped = int(line.strip().split()[-2])
+        elif sample.bowtie_version == '2':
+            if line.strip().endswith(" were paired; of these:"):
+                # Indicates bowtie2 paired-end
+                sample.paired_end = True
+            elif not sample.paired_end:
+                # Single-end data
+                if line.strip().endswith(" aligned exactly 1 time"):
+                    # Lines of the form "    115341420 (98.35%) aligned exactly 1 time"
+                    sample.uniquely_mapped = int(line.strip().split()[0])
+                elif line.strip().endswith(" aligned 0 times"):
+                    # Lines of the form "    1937614 (1.65%) aligned 0 times"
+                    sample.didnt_align = int(line.strip().split()[0])
+            else:
+                # Paired-end data
+                if line.strip().endswith(" aligned concordantly exactly 1 time"):
+                    # Lines of the form "    22792207 (26.64%) aligned concordantly exactly 1 time"
+                    sample.uniquely_mapped = int(line.strip().split()[0])
+                elif line.strip().endswith(" aligned concordantly 0 times"):
+                    # Lines of the form "   56052776 (65.51%) aligned concordantly 0 times"
+                    sample.didnt_align = int(line.strip().split()[0])
+    return samples
+
+def _read_bowtie_log_file(filen):
+    """Internal: read samples from a bowtie log file
+
+    Wrapper for 'read_bowtie_log' which can be used with
+    multiprocessing pools.
+
+    Arguments:
+      filen: name of bowtie/bowtie2 log file
+
+    Returns:
+      List of BowtieSample instances.
+
+    """
+    with io.open(filen,'rt') as fp:
+        return read_bowtie_log(fp,filen=filen)
+
+def _log_file_info(filen):
+    """Internal: return identifying information for a log file
+
+    Arguments:
+      filen: name of bowtie/bowtie2 log file
+
+    Returns:
+      Dictionary with the absolute path, modification time
+      (in nanoseconds) and size of the file.
+
+    """
+    st = os.stat(filen)
+    return dict(path=os.path.abspath(filen),
+                mtime=st.st_mtime_ns,
+                size=st.st_size)
+
+def _sample_to_dict(sample):
+    """Internal: convert BowtieSample to a dictionary for caching
+    """
+    return dict(total_reads=sample.total_reads,
+                didnt_align=sample.didnt_align,
+                uniquely_mapped=sample.uniquely_mapped,
+                bowtie_version=sample.bowtie_version,
+                paired_end=sample.paired_end)
+
+def _sample_from_dict(d,filen):
+    """Internal: recreate BowtieSample from cached dictionary
+    """
+    sample = BowtieSample(None,bowtie_log=filen,
+                          bowtie_version=d['bowtie_version'])
+    sample.total_reads = d['total_reads']
+    sample.didnt_align = d['didnt_align']
+    sample.uniquely_mapped = d['uniquely_mapped']
+    sample.paired_end = d['paired_end']
+    return sample
+
+def _read_stats_cache(cache_file):
+    """Internal: read cached log file statistics
+
+    Returns an empty cache if the file can't be read or is
+    from an incompatible version.
+
+    Arguments:
+      cache_file: name of the cache file
+
+    Returns:
+      Dictionary with the cached data for each log file,
+      keyed by the absolute path of the log.
+
+    """
+    try:
+        with io.open(cache_file,'rt') as fp:
+            data = json.load(fp)
+        if data.get('version') != STATS_CACHE_VERSION:
+            raise ValueError("version mismatch")
+        return dict(data['logs'])
+    except Exception as ex:
+        logging.warning("Ignoring statistics cache '%s': %s" %
+                        (cache_file,ex))
+        return {}
+
+def _write_stats_cache(cache_file,cache):
+    """Internal: write log file statistics to cache file
+
+    Arguments:
+      cache_file: name of the cache file
+      cache: dictionary with the data for each log file
+
+    """
+    tmp_file = cache_file + ".tmp"
+    with io.open(tmp_file,'wt') as fp:
+        fp.write(json.dumps(dict(version=STATS_CACHE_VERSION,
+                                 logs=cache),
+                            indent=1,sort_keys=True))
+    os.replace(tmp_file,cache_file)
+
 #######################################################################
 # Main program
 #######################################################################
@@ -378,6 +621,17 @@ def main():
                    "the XLS file. The tab file will have the same name as "
                    "the XLS file, with the extension replaced "
                    "by .txt")
+    p.add_argument('-n','--nprocs',action="store",dest="nprocs",type=int,
+                   default=1,
+                   help="number of processes to use when reading the log "
+                   "files (default: 1)")
+    p.add_argument('--incremental',action="store_true",dest="incremental",
+                   default=False,
+                   help="cache the statistics for each log file and only "
+                   "reread logs which have been modified since the "
+                   "previous run (the cache is written alongside the XLS "
+                   "file, with the extension replaced by "
+                   ".stats_cache.json)")
     p.add_argument('bowtie_logs',metavar="BOWTIE_LOG_FILE",action='store',
                    nargs='+',
                    help="logfile output from Bowtie or Bowtie2")
@@ -410,15 +664,27 @@ def main():
     else:
         tab_file = None
 
+    if arguments.incremental:
+        cache_file = os.path.splitext(xls_out)[0] + ".stats_cache.json"
+    else:
+        cache_file = None
+
     # Acquire data
     stats = BowtieMappingStats()
-    for bowtie_log in bowtie_log_files:
+    n_samples = stats.add_logs(bowtie_log_files,
+                               nprocs=arguments.nprocs,
+                               cache_file=cache_file)
+    n_total = 0
+    for bowtie_log,n in zip(bowtie_log_files,n_samples):
         print("Processing data from %s" % bowtie_log)
-        n_samples = stats.add_samples(bowtie_log)
-        if n_samples > 0:
-            print("\tFound %d samples (total %d)" % (n_samples,stats.n_samples))
-            print("\tBowtie version %s" % (stats.samples[-1].bowtie_version))
-            print("\t%s" % ('Paired end' if stats.samples[-1].paired_end else 'Single end'))
+        if bowtie_log in stats.cached_files:
+            print("\tUnchanged since last run, using cached data")
+        if n > 0:
+            n_total += n
+            sample = stats.samples[n_total-1]
+            print("\tFound %d samples (total %d)" % (n,n_total))
+            print("\tBowtie version %s" % (sample.bowtie_version))
+            print("\t%s" % ('Paired end' if sample.paired_end else 'Single end'))
         else:
             logging.warning("No samples found in %s" % bowtie_log)
 
@@ -17,6 +17,11 @@ in the data sheet are.
 
 This is a modified version of make_macs_xls.py updated to work with
 output from MACS 2.0.10.
+
+For very large MACS output files the '--stream' option can be used to
+read the peaks once and write the spreadsheet rows and BED lines in
+the same pass, without holding all the data in memory (the sorting by
+fold enrichment is done using an external sort).
 """
 
 #######################################################################
@@ -27,19 +32,51 @@ from builtins import str
 import os
 import io
 import sys
+import shutil
+import tempfile
 import argparse
 import logging
 # Configure logging output
 logging.basicConfig(format="%(levelname)s %(message)s")
 from ..TabFile import TabFile
+from ..TabFile import TabFileIterator
+from ..TabFile import sort_file
 from ..simple_xls import Limits
 from ..simple_xls import ColumnRange
 from ..simple_xls import XLSLimits
 from ..simple_xls import XLSXLimits
 from ..simple_xls import XLSStyle
 from ..simple_xls import XLSWorkBook
+from ..ngsutils import write_indexed_bed
 from .. import get_version
 
+#######################################################################
+# Constants
+#######################################################################
+
+# Header line for BED output
+BED_HEADER = "#chr\tabs_summit-100\tabs_summit+100"
+
+# Legend descriptions for all possible columns
+MACS2_LEGENDS = { 'order': "Sorting order FE",
+                  'chr': "Chromosome location of binding region",
+                  'start': "Start coordinate of binding region",
+                  'end': "Start coordinate of binding region",
+                  'summit+100': "Summit + 100bp",
+                  'summit-1': "Summit of binding region - 1",
+                  'summit': "Summit of binding region",
+                  'abs_summit+100': "Summit + 100bp",
+                  'abs_summit-100': "Summit of binding region - 100bp",
+                  'abs_summit': "Summit of binding region",
+                  'length': "Length of binding region",
+                  'abs_summit': "Coordinate of region summit",
+                  'pileup': "Number of non-degenerate and position corrected reads at summit",
+                  '-log10(pvalue)': "Transformed Pvalue -log10(Pvalue) for the binding region (e.g. if Pvalue=1e-10, then this value should be 10)",
+                  'fold_enrichment': "Fold enrichment for this region against random Poisson distribution with local lambda",
+                  '-log10(qvalue)': "Transformed Qvalue -log10(Pvalue) for the binding region (e.g. if Qvalue=0.05, then this value should be 1.3)",
+                  'name': "Name"
+                }
+
 #######################################################################
 # Classes
 #######################################################################
@@ -86,9 +123,14 @@ class MacsXLS:
     (Note that the order column is always recalculated after
     sorting.)
 
+    To read just the header information and column names
+    (without loading any of the data):
+
+    >>> macs = MacsXLS("macs.xls",header_only=True)
+
     """
 
-    def __init__(self,filen=None,fp=None,name=None):
+    def __init__(self,filen=None,fp=None,name=None,header_only=False):
         """Create a new MacsXLS instance
 
         Arguments:
@@ -97,6 +139,8 @@ class MacsXLS:
           fp: file-like object opened for reading. If None then
             filen argument must be supplied instead. If both filen
             and fp are supplied then fp will be used preferentially.
+          header_only: if True then stop reading after the
+            column names (so that no data is loaded)
 
         """
         # Store data
@@ -135,6 +179,8 @@ class MacsXLS:
                     columns.insert(0,"order")
                     # Set up TabFile to handle actual data
                     self.__data = TabFile(column_names=columns)
+                    if header_only:
+                        break
                 else:
                     # Assume it's actual data and store it
                     self.__data.append(tabdata="\t%s" % line)
@@ -304,32 +350,9 @@ def xls_for_macs2(macs_xls,row_limit=None,cell_char_limit=None):
     # Maximum length of a data sheet title
     sheet_title_limit = Limits.MAX_LEN_WORKSHEET_TITLE
 
-    # Legend descriptions for all possible columns
-    legends_text = { 'order': "Sorting order FE",
-                     'chr': "Chromosome location of binding region",
-                     'start': "Start coordinate of binding region",
-                     'end': "Start coordinate of binding region",
-                     'summit+100': "Summit + 100bp",
-                     'summit-1': "Summit of binding region - 1",
-                     'summit': "Summit of binding region",
-                     'abs_summit+100': "Summit + 100bp",
-                     'abs_summit-100': "Summit of binding region - 100bp",
-                     'abs_summit': "Summit of binding region",
-                     'length': "Length of binding region",
-                     'abs_summit': "Coordinate of region summit",
-                     'pileup': "Number of non-degenerate and position corrected reads at summit",
-                     '-log10(pvalue)': "Transformed Pvalue -log10(Pvalue) for the binding region (e.g. if Pvalue=1e-10, then this value should be 10)",
-                     'fold_enrichment': "Fold enrichment for this region against random Poisson distribution with local lambda",
-                     '-log10(qvalue)': "Transformed Qvalue -log10(Pvalue) for the binding region (e.g. if Qvalue=0.05, then this value should be 1.3)",
-                     'name': "Name"
-                 }
-
     # Create a new spreadsheet
     xls = XLSWorkBook()
 
-    # Set up styles
-    boldstyle = XLSStyle(bold=True)
-
     # Create and populate the 'data' sheet(s)
     # If there are more records than will fit into a single spreadsheet
     # then make multiple sheets
@@ -379,6 +402,173 @@ def xls_for_macs2(macs_xls,row_limit=None,cell_char_limit=None):
             data.insert_column('E',text="chr")
             data.write_column('E',fill="=B?",from_row=2)
 
+    # Build the 'notes' sheet with the header data
+    add_notes_sheet(xls,macs_xls,cell_char_limit)
+
+    # Build the 'legends' sheet based on content of 'data'
+    data = data_sheets[0]
+    add_legends_sheet(xls,[data[col][1]
+                           for col in ColumnRange(data.last_column)])
+
+    # "Freeze" top line of each 'data' sheet
+    for data in data_sheets:
+        data.freeze_panes = 'A2'
+
+    # Return spreadsheet object
+    return xls
+
+def stream_macs2_xls(macs_file,xls_out,xls_format="xlsx",bed_out=None,
+                     bed_format="bed",sort_on='fold_enrichment',
+                     reverse=True,row_limit=None,tmp_dir=None):
+    """Convert MACS2 output to XLS(X) (and BED) in a single pass
+
+    Reads the peaks from the MACS2 output file once, writing
+    the rows of the 'data' sheet(s) directly to the output
+    spreadsheet and the BED lines to the BED file as each peak
+    is read, so the data are never all held in memory. The
+    peaks are sorted beforehand (by default on fold enrichment
+    in descending order) using an external sort.
+
+    The spreadsheet has the same sheets and columns as the one
+    created by 'xls_for_macs2' (with additional data sheets if
+    there are more peaks than will fit into a single sheet),
+    except that the derived columns (e.g. 'abs_summit-100')
+    contain values rather than formulae.
+
+    Arguments:
+      macs_file: output .xls file from MACS2
+      xls_out: name to write output XLS spreadsheet file to
+      xls_format: optional, specify the XLS output format
+        (either 'xls' or 'xlsx'; default is 'xlsx')
+      bed_out: optional, name to write output BED file to
+      bed_format: optional, format for the BED file (either
+        'bed' or 'bgzip'; see 'make_macs2_xls')
+      sort_on: optional, name of the column to sort the
+        peaks on (default is 'fold_enrichment'); set to None
+        to keep the peaks in their original order
+      reverse: if True (the default) then sort in descending
+        order
+      row_limit: explicitly specify maximum number of rows per
+        output sheet
+      tmp_dir: optional, directory to create temporary files
+        under (defaults to the system temporary directory)
+
+    Returns:
+      Number of peaks that were written.
+
+    """
+    # Check requested XLS and BED formats
+    if xls_format not in ('xls','xlsx'):
+        raise Exception("Unrecognised XLS format: %s" % xls_format)
+    if bed_format not in ('bed','bgzip'):
+        raise Exception("Unrecognised BED format: %s" % bed_format)
+    if xls_format == "xlsx":
+        limits = XLSXLimits
+    else:
+        limits = XLSLimits
+
+    # Read the header information
+    macs_xls = MacsXLS(macs_file,header_only=True)
+    if macs_xls.macs_version.startswith("1."):
+        raise Exception("Only handles output from MACS 2.0*")
+    if bed_out is not None and macs_xls.with_broad_option:
+        raise Exception("BED output only available if MACS2 was "
+                        "run without --broad option")
+    columns = macs_xls.columns[1:]
+
+    # Maximum number of rows per data sheet
+    if row_limit is not None:
+        class RowLimits(limits):
+            MAX_NUMBER_ROWS_PER_WORKSHEET = row_limit
+        limits = RowLimits
+
+    # Columns for the 'data' sheet(s)
+    if not macs_xls.with_broad_option:
+        derived_columns = ["chr","abs_summit-100","abs_summit+100",
+                           "chr","summit-1","summit"]
+    else:
+        derived_columns = ["chr"]
+    header = macs_xls.columns_as_xls_header
+    header = header[:4] + derived_columns + header[4:]
+
+    work_dir = tempfile.mkdtemp(prefix="make_macs2_xls.",dir=tmp_dir)
+    try:
+        # Extract and sort the data
+        data_file = os.path.join(work_dir,"data.txt")
+        with io.open(macs_file,'rt') as fp, \
+             io.open(data_file,'wt') as fp_data:
+            fp_data.writelines(_macs2_data_lines(fp))
+        if sort_on is not None:
+            sort_file(data_file,data_file,
+                      keys=[(columns.index(sort_on),float)],
+                      reverse=reverse,
+                      tmp_dir=work_dir)
+        # BGZF output needs sorting by position so write the
+        # BED data to a temporary file first
+        if bed_out is not None and bed_format == "bgzip":
+            bed_file = os.path.join(work_dir,"data.bed")
+        else:
+            bed_file = bed_out
+        # Build the spreadsheet
+        nlines = [0]
+        def data_rows():
+            # Generate the rows for the data sheet(s), and
+            # write the corresponding BED lines
+            fp_bed = None
+            if bed_file is not None:
+                fp_bed = io.open(bed_file,'wt')
+                fp_bed.write(BED_HEADER + "\n")
+            try:
+                for line in TabFileIterator(data_file,column_names=columns):
+                    nlines[0] += 1
+                    values = line.data
+                    if derived_columns == ["chr"]:
+                        derived = [line['chr']]
+                    else:
+                        chrom = line['chr']
+                        summit = line['abs_summit']
+                        derived = [chrom,summit-100,summit+100,
+                                   chrom,summit-1,summit]
+                        if fp_bed is not None:
+                            fp_bed.write("%s\t%s\t%s\n" % (chrom,
+                                                           summit-100,
+                                                           summit+100))
+                    yield [nlines[0]] + values[:3] + derived + values[3:]
+            finally:
+                if fp_bed is not None:
+                    fp_bed.close()
+        xls = XLSWorkBook()
+        xls.add_table("data",data_rows(),
+                      title=macs_xls.name,
+                      header=header,
+                      limits=limits)
+        add_notes_sheet(xls,macs_xls,limits.MAX_LEN_WORKSHEET_CELL_VALUE)
+        add_legends_sheet(xls,header)
+        if xls_format == "xlsx":
+            xls.save_as_xlsx(xls_out)
+        else:
+            xls.save_as_xls(xls_out)
+        # Sort, compress and index the BED data
+        if bed_file != bed_out:
+            sort_file(bed_file,bed_file,keys=[0,(1,int)],tmp_dir=work_dir)
+            with io.open(bed_file,'rt') as fp:
+                write_indexed_bed(bed_out,fp,header=BED_HEADER,sort=False)
+    finally:
+        shutil.rmtree(work_dir)
+    return nlines[0]
+
+def add_notes_sheet(xls,macs_xls,cell_char_limit):
+    """Add a 'notes' sheet with the header data from MACS2 output
+
+    Arguments:
+      xls: XLSWorkBook to add the sheet to
+      macs_xls: MacsXLS object with the header data
+      cell_char_limit: maximum number of characters per cell
+
+    """
+    # Set up styles
+    boldstyle = XLSStyle(bold=True)
+
     # Build the 'notes' sheet with the header data
     notes = xls.add_work_sheet('notes',"Notes")
     notes.write_row(1,text="MACS RUN NOTES:",style=boldstyle)
@@ -397,24 +587,41 @@ def xls_for_macs2(macs_xls,row_limit=None,cell_char_limit=None):
                 logging.warning("Splitting command line over multiple cells")
                 row_data = chunk(command_line,cell_char_limit,delimiter=' ')
                 notes.write_row(row,data=row_data)
-        
-    # Build the 'legends' sheet based on content of 'data'
-    data = data_sheets[0]
+
+def add_legends_sheet(xls,columns):
+    """Add a 'legends' sheet describing the MACS2 data columns
+
+    Arguments:
+      xls: XLSWorkBook to add the sheet to
+      columns: list of the column names in the 'data' sheet
+
+    """
     legends = xls.add_work_sheet('legends',"Legends")
-    for col in ColumnRange(data.last_column):
-        name = data[col][1].lstrip('#')
+    for name in columns:
+        name = name.lstrip('#')
         try:
-            legends.append_row(data=(name,legends_text[name]))
+            legends.append_row(data=(name,MACS2_LEGENDS[name]))
         except KeyError:
             logging.warning("No legend description found for column '%s'" % name)
             legends.append_row(data=(name,name.title()))
 
-    # "Freeze" top line of each 'data' sheet
-    for data in data_sheets:
-        data.freeze_panes = 'A2'
+def _macs2_data_lines(fp):
+    """Internal: iterate over the data lines in MACS2 output
 
-    # Return spreadsheet object
-    return xls
+    Skips the header lines and the line with the column names,
+    plus any blank or comment lines (as for MacsXLS).
+    """
+    got_columns = False
+    for line in fp:
+        if line.startswith('#') or line.strip() == '':
+            continue
+        if not got_columns:
+            # First line of actual data is the column names
+            got_columns = True
+            continue
+        if not line.endswith('\n'):
+            line += '\n'
+        yield line
 
 def bed_for_macs2(macs_xls):
     """
@@ -484,7 +691,8 @@ def chunk(line,chunksize,delimiter=None):
 # Main program
 #######################################################################
 
-def make_macs2_xls(macs_file,xls_out,xls_format="xlsx",bed_out=None):
+def make_macs2_xls(macs_file,xls_out,xls_format="xlsx",bed_out=None,
+                   bed_format="bed",stream=False):
     """Driver function
 
     Wraps core functionality of program to facilitate
@@ -496,11 +704,36 @@ def make_macs2_xls(macs_file,xls_out,xls_format="xlsx",bed_out=None):
       xls_format: optional, specify the XLS output format
         (either 'xls' or 'xlsx'; default is 'xlsx')
       bed_out: optional, name to write output BED file to
+      bed_format: optional, specify the BED output format
+        (either 'bed' for plain BED, or 'bgzip' for BED sorted
+        by chromosome and start position, compressed with
+        BGZF and indexed with tabix; default is 'bed')
+      stream: if True then convert the data in a single
+        streaming pass (see 'stream_macs2_xls') rather than
+        loading it all into memory
     
     """
-    # Check requested XLS format
+    # Check requested XLS and BED formats
     if xls_format not in ('xls','xlsx'):
         raise Exception("Unrecognised XLS format: %s" % xls_format)
+    if bed_format not in ('bed','bgzip'):
+        raise Exception("Unrecognised BED format: %s" % bed_format)
+
+    # Streaming conversion
+    if stream:
+        print("Generating XLS file%s" % (" and BED file" if bed_out else ""))
+        try:
+            nlines = stream_macs2_xls(macs_file,
+                                      xls_out,
+                                      xls_format=xls_format,
+                                      bed_out=bed_out,
+                                      bed_format=bed_format)
+        except Exception as ex:
+            logging.error("failed to convert to XLS: %s" % ex)
+            sys.exit(1)
+        print("Wrote %d records" % nlines)
+        print("Finished")
+        return
 
     # Load the data from the file
     print("Reading data...",end=' ')
@@ -543,7 +776,12 @@ def make_macs2_xls(macs_file,xls_out,xls_format="xlsx",bed_out=None):
         except Exception as ex:
             logging.error("failed to generate BED data: %s" % ex)
             sys.exit(1)
-        bed.write(bed_out,include_header=True)
+        if bed_format == "bgzip":
+            write_indexed_bed(bed_out,
+                              [str(line) for line in bed],
+                              header=BED_HEADER)
+        else:
+            bed.write(bed_out,include_header=True)
         print("Finished")
 
 def main():
@@ -566,6 +804,19 @@ def main():
                    help="write an additional TSV file with chrom, "
                    "abs_summit+100 and abs_summit-100 data as the columns. "
                    "(NB only possible for MACS2 run without --broad)")
+    p.add_argument("--bed-format",
+                   action="store",dest="bed_format",default="bed",
+                   choices=("bed","bgzip"),
+                   help="specify the format for the BED file; 'bgzip' "
+                   "writes the BED data sorted by chromosome and start "
+                   "position, compressed with BGZF (as for 'bgzip') "
+                   "along with a tabix '.tbi' index (default is 'bed'; "
+                   "implies -b/--bed)")
+    p.add_argument("--stream",
+                   action="store_true",dest="stream",
+                   help="read the data once and write the XLS(X) and "
+                   "BED outputs in a single pass without loading all "
+                   "the data into memory (for very large MACS2 outputs)")
     p.add_argument('macs2_xls',metavar="MACS2_XLS",
                    help="output '.xls' file from MACS2")
     p.add_argument('xls_out',metavar="XLS_OUT",nargs='?',
@@ -590,8 +841,10 @@ def main():
         xls_out = "XLS_"+os.path.splitext(os.path.basename(macs_in))[0]+\
                   "."+xls_format
     # Also generate BED file?
-    if args.bed:
+    if args.bed or args.bed_format != "bed":
         bed_out = os.path.splitext(xls_out)[0]+".bed"
+        if args.bed_format == "bgzip":
+            bed_out += ".gz"
     else:
         bed_out = None
     print("Input file: %s" % macs_in)
@@ -601,4 +854,6 @@ def main():
     make_macs2_xls(macs_in,
                    xls_out,
                    xls_format=xls_format,
-                   bed_out=bed_out)
+                   bed_out=bed_out,
+                   bed_format=args.bed_format,
+                   stream=args.stream)
@@ -95,7 +95,8 @@ def compute_md5sum_for_file(filen,output_file=None):
         fp.close()
     return retval
 
-def verify_md5sums(chksum_file,verbose=False):
+def verify_md5sums(chksum_file,verbose=False,disk_order=False,
+                   report_interval=None):
     """Check the MD5 sums for all entries specified in a file
 
     For all entries in the supplied file, check the MD5 sum is
@@ -110,14 +111,21 @@ def verify_md5sums(chksum_file,verbose=False):
       verbose: (optional) if True then report status for all
         files checked, plus a summary; otherwise only report
         failures
+      disk_order: (optional) if True then check the files in
+        on-disk order rather than the order they are listed
+      report_interval: (optional) if set then report throughput
+        to stderr at this interval (in seconds)
 
     Returns:
       Zero on success, 1 if errors were encountered
 
     """
     # Set up reporter object
-    reporter = Md5CheckReporter(Md5Checker.verify_md5sums(chksum_file),
-                                verbose=verbose)
+    reporter = Md5CheckReporter(
+        Md5Checker.verify_md5sums(chksum_file,
+                                  disk_order=disk_order,
+                                  report_interval=report_interval),
+        verbose=verbose)
     # Summarise
     if verbose: reporter.summary()
     return reporter.status
@@ -262,6 +270,18 @@ def main():
                                  "relative to the current directory. "
                                  "This option behaves the same as the Linux "
                                  "'md5sum' tool.")
+    group.add_argument('--disk-order',action="store_true",
+                       dest="disk_order",default=False,
+                       help="check files in the order they are stored "
+                       "on disk (by device and inode) rather than the "
+                       "order they are listed in CHKSUM_FILE (can be "
+                       "faster for archives on spinning disks)")
+    group.add_argument('--report-interval',action="store",
+                       dest="report_interval",type=float,default=None,
+                       metavar="SECS",
+                       help="report progress and throughput (files/s "
+                       "and MB/s) to stderr every SECS seconds, and "
+                       "write a breakdown of timings at the end")
 
     # Process the command line
     arguments,args = p.parse_known_args()
@@ -280,7 +300,9 @@ def main():
                     chksum_file)
         # Do the verification
         status = verify_md5sums(chksum_file,
-                                verbose=arguments.verbose)
+                                verbose=arguments.verbose,
+                                disk_order=arguments.disk_order,
+                                report_interval=arguments.report_interval)
     elif arguments.diff:
         # Running in "diff" mode
         if len(args) != 2:
@@ -293,6 +293,10 @@ echo "$exit_code" 1>%s/__exit_code.%d
         cu.execute(sql)
         jobs = cu.fetchall()
         finished_jobs = []
+        # Reap any finished jobs started by this instance (otherwise
+        # they persist as zombies and appear to still be running)
+        for process in self._processes:
+            process.poll()
         for job in jobs:
             job_id = job['id']
             pid = job['pid']
@@ -415,6 +419,26 @@ echo "$exit_code" 1>%s/__exit_code.%d
         cu.execute(sql,(job_id,))
         return cu.fetchone()
 
+    def _completed_jobs(self,begin_time=None,owner=None):
+        """
+        Return info on all completed jobs
+        """
+        sql = """
+        SELECT id,name,user,exit_code,qsub_time,start_time,end_time,queue
+        FROM jobs WHERE state=='c' AND end_time IS NOT NULL
+        AND start_time IS NOT NULL
+        """
+        args = []
+        if begin_time is not None:
+            sql += "AND start_time >= ? "
+            args.append(begin_time)
+        if owner is not None:
+            sql += "AND user == ? "
+            args.append(owner)
+        cu = self._cx.cursor()
+        cu.execute(sql,args)
+        return cu.fetchall()
+
     def _mark_for_deletion(self,job_id):
         """
         Mark a job for termination/deletion
@@ -546,6 +570,7 @@ echo "$exit_code" 1>%s/__exit_code.%d
         # Process supplied arguments
         p = argparse.ArgumentParser()
         p.add_argument("-u",action="store")
+        p.add_argument("-xml",action="store_true")
         args = p.parse_args(argv)
         # User
         user = args.u
@@ -553,6 +578,9 @@ echo "$exit_code" 1>%s/__exit_code.%d
             user = self._user()
         # Get jobs
         jobs = self._list_jobs(user=user)
+        if args.xml:
+            self._qstat_xml(jobs)
+            return
         if not jobs:
             return
         # Print job info
@@ -579,6 +607,53 @@ echo "$exit_code" 1>%s/__exit_code.%d
             line.append("1")
             print(' '.join(line))
 
+    def _qstat_xml(self,jobs):
+        """
+        Output job info in the same format as 'qstat -xml'
+        """
+        running = []
+        pending = []
+        for job in jobs:
+            job_id = str(job["id"])
+            state = str(job["state"])
+            start_time = job["start_time"]
+            if start_time is None:
+                start_time = job["qsub_time"]
+            start_time = datetime.datetime.fromtimestamp(start_time).\
+                         strftime("%Y-%m-%dT%H:%M:%S")
+            if state == 'r':
+                running.append("""    <job_list state="running">
+      <JB_job_number>%s</JB_job_number>
+      <JAT_prio>0.00001</JAT_prio>
+      <JB_name>%s</JB_name>
+      <JB_owner>%s</JB_owner>
+      <state>%s</state>
+      <JAT_start_time>%s</JAT_start_time>
+      <queue_name>%s</queue_name>
+      <slots>1</slots>
+    </job_list>""" % (job_id,job["name"],job["user"],state,start_time,
+                      job["queue"]))
+            else:
+                pending.append("""    <job_list state="pending">
+      <JB_job_number>%s</JB_job_number>
+      <JAT_prio>0.00001</JAT_prio>
+      <JB_name>%s</JB_name>
+      <JB_owner>%s</JB_owner>
+      <state>%s</state>
+      <JB_submission_time>%s</JB_submission_time>
+      <queue_name></queue_name>
+      <slots>1</slots>
+    </job_list>""" % (job_id,job["name"],job["user"],state,start_time))
+        print("""<?xml version='1.0'?>
+<job_info  xmlns:xsd="http://arc.liv.ac.uk/repos/darcs/sge/source/dist/util/resources/schemas/qstat/qstat.xsd">
+  <queue_info>
+%s
+  </queue_info>
+  <job_info>
+%s
+  </job_info>
+</job_info>""" % ('\n'.join(running),'\n'.join(pending)))
+
     def qacct(self,argv):
         """
         Implement qacct-like functionality
@@ -610,8 +685,22 @@ echo "$exit_code" 1>%s/__exit_code.%d
         self.update_jobs()
         # Process supplied arguments
         p = argparse.ArgumentParser()
-        p.add_argument("-j",action="store")
+        p.add_argument("-j",action="store",nargs="?",const="")
+        p.add_argument("-b",action="store")
+        p.add_argument("-o",action="store")
         args = p.parse_args(argv)
+        if not args.j:
+            # Report all jobs (optionally only those started
+            # after the begin time and/or owned by a user)
+            begin_time = None
+            if args.b:
+                begin_time = time.mktime(
+                    time.strptime(args.b,"%Y%m%d%H%M"))
+            for job_info in self._completed_jobs(begin_time,
+                                                 owner=args.o):
+                if (time.time() - job_info[6]) >= self._qacct_delay:
+                    self._qacct_job_info(job_info)
+            return
         # Job id
         job_id = int(args.j)
         # Get job info
@@ -626,7 +715,12 @@ echo "$exit_code" 1>%s/__exit_code.%d
         logging.debug("qacct: elapsed time: %s" % elapsed_since_job_end)
         if elapsed_since_job_end < self._qacct_delay:
             return
-        # Print info
+        self._qacct_job_info(job_info)
+
+    def _qacct_job_info(self,job_info):
+        """
+        Output accounting info for a job in 'qacct' format
+        """
         job_id = job_info['id']
         name = job_info['name']
         user = job_info['user']
@@ -9,7 +9,8 @@ Utility class for simulating Slurm functionality
 Provides a single class `MockSlurm`, which implements methods for
 simulating the functionality provided by the Slurm command
 line utilities, and a function `setup_mock_slurm`, which creates
-mock versions of those utilities ('sbatch', 'squeue', and 'scancel').
+mock versions of those utilities ('sbatch', 'squeue', 'scancel'
+and 'sacct').
 """
 
 #######################################################################
@@ -33,7 +34,7 @@ import atexit
 
 class MockSlurm:
     """
-    Class implementing sbatch, squeue & scancel-like functionality
+    Class implementing sbatch, squeue, scancel & sacct-like functionality
 
     Job data is stored in an SQLite3 database in the 'database
     directory' (defaults to '$HOME/.mockslurm'); scripts and job
@@ -45,6 +46,7 @@ class MockSlurm:
     - sbatch: submits a job to be run
     - squeue: outputs information on active jobs
     - scancel: terminates an active job
+    - sacct: outputs accounting information on jobs
 
     Each time any of these are invoked, the 'update_jobs' method is
     called to check the status of any active jobs and update the
@@ -127,7 +129,9 @@ class MockSlurm:
           sbatch_time FLOAT,
           start_time  FLOAT,
           end_time    FLOAT,
-          exit_code   INTEGER
+          exit_code   INTEGER,
+          array_job_id  INTEGER,
+          array_task_id INTEGER
         )
         """
         try:
@@ -139,9 +143,14 @@ class MockSlurm:
             raise ex
 
     def _init_job(self, name, command, working_dir, nslots, partition,
-                  output_tmpl, error_tmpl, export):
+                  output_tmpl, error_tmpl, export, array_job_id=None,
+                  array_task_id=None):
         """
         Create a new job id
+
+        For job array tasks, the array job id should be the
+        id of the first task in the array (or -1 for the first
+        task itself).
         """
         cmd = []
         for arg in command:
@@ -155,8 +164,8 @@ class MockSlurm:
         logging.debug(f"_init_job: cmd: {cmd}")
         try:
             sql = """
-            INSERT INTO jobs (user,state,sbatch_time,name,command,working_dir,nslots,partition,output_tmpl,error_tmpl,export)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            INSERT INTO jobs (user,state,sbatch_time,name,command,working_dir,nslots,partition,output_tmpl,error_tmpl,export,array_job_id,array_task_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """
             cu = self._cx.cursor()
             cu.execute(sql,(self._user(),
@@ -169,9 +178,18 @@ class MockSlurm:
                             partition,
                             output_tmpl,
                             error_tmpl,
-                            export))
+                            export,
+                            array_job_id,
+                            array_task_id))
+            job_id = cu.lastrowid
+            if array_job_id == -1:
+                # First task in an array
+                sql = """
+                UPDATE jobs SET array_job_id=? WHERE id=?
+                """
+                cu.execute(sql,(job_id,job_id))
             self._cx.commit()
-            return cu.lastrowid
+            return job_id
         except Exception as ex:
             logging.error(f"sbatch failed with exception: {ex}")
 
@@ -181,7 +199,8 @@ class MockSlurm:
         """
         # Get job info
         sql = """
-        SELECT name,command,nslots,partition,working_dir,output_tmpl,error_tmpl
+        SELECT name,command,nslots,partition,working_dir,output_tmpl,error_tmpl,
+        array_job_id,array_task_id
         FROM jobs WHERE id==?
         """
         cu = self._cx.cursor()
@@ -194,6 +213,14 @@ class MockSlurm:
         working_dir = job['working_dir']
         output_tmpl = job['output_tmpl']
         error_tmpl = job['error_tmpl']
+        array_job_id = job['array_job_id']
+        array_task_id = job['array_task_id']
+        # Environment for the job
+        env = f"SLURM_NTASKS={nslots} SLURM_JOB_ID={job_id} " \
+              f"SLURM_JOB_NAME={name}"
+        if array_job_id is not None:
+            env += f" SLURM_ARRAY_JOB_ID={array_job_id} " \
+                   f"SLURM_ARRAY_TASK_ID={array_task_id}"
         # Try to run the job
         try:
             # Output file basename
@@ -206,12 +233,16 @@ class MockSlurm:
                 err = None
             # Set up stdout and stderr targets
             stdout_file = out.\
+                          replace("%A", str(array_job_id)).\
+                          replace("%a", str(array_task_id)).\
                           replace("%j", str(job_id)).\
                           replace("%x", str(name))
             logging.debug("Stdout: %s" % stdout_file)
             redirect = "1>%s" % stdout_file
             if err:
                 stderr_file = err.\
+                              replace("%A", str(array_job_id)).\
+                              replace("%a", str(array_task_id)).\
                               replace("%j", str(job_id)).\
                               replace("%x", str(name))
                 logging.debug("Stderr: %s" % stderr_file)
@@ -223,10 +254,10 @@ class MockSlurm:
                                        f"__job{job_id}.sh")
             with open(script_file, "wt") as fp:
                 fp.write(u"""#!%s
-SLURM_NTASKS=%s SLURM_JOB_ID=%s SLURM_JOB_NAME=%s %s %s
+%s %s %s
 exit_code=$?
 echo "$exit_code" 1>%s/__exit_code.%d
-""" % (self._shell, nslots, job_id, name, command, redirect,
+""" % (self._shell, env, command, redirect,
        self._database_dir, job_id))
             os.chmod(script_file,0o775)
             with open(script_file, "rt") as fp:
@@ -277,6 +308,10 @@ echo "$exit_code" 1>%s/__exit_code.%d
         cu.execute(sql)
         jobs = cu.fetchall()
         finished_jobs = []
+        # Reap any finished jobs started by this instance (otherwise
+        # they persist as zombies and appear to still be running)
+        for process in self._processes:
+            process.poll()
         for job in jobs:
             job_id = job['id']
             pid = job['pid']
@@ -380,16 +415,43 @@ echo "$exit_code" 1>%s/__exit_code.%d
         Get list of the jobs
         """
         sql = """
-        SELECT id,name,user,state,sbatch_time,start_time,partition FROM jobs WHERE state != 'c'
+        SELECT id,name,user,state,sbatch_time,start_time,partition,
+        array_job_id,array_task_id FROM jobs WHERE state != 'c'
         """
         args = []
-        if user != "\\*" and user != "*":
+        if user is not None and user != "\\*" and user != "*":
             sql += "AND user == ?"
             args.append(user)
         cu = self._cx.cursor()
         cu.execute(sql, args)
         return cu.fetchall()
 
+    def _resolve_job_ids(self, job_ids):
+        """
+        Get the database ids for a list of Slurm job ids
+
+        The Slurm job ids can be plain job ids, array job ids
+        (which refer to all the tasks in the array), or ids for
+        individual array tasks (of the form 'ARRAYID_TASKID').
+        """
+        ids = set()
+        cu = self._cx.cursor()
+        for job_id in job_ids:
+            job_id = str(job_id)
+            if '_' in job_id:
+                array_job_id,array_task_id = job_id.split('_')
+                sql = """
+                SELECT id FROM jobs WHERE array_job_id=? AND array_task_id=?
+                """
+                cu.execute(sql, (int(array_job_id), int(array_task_id)))
+            else:
+                sql = """
+                SELECT id FROM jobs WHERE id=? OR array_job_id=?
+                """
+                cu.execute(sql, (int(job_id), int(job_id)))
+            ids.update([job['id'] for job in cu.fetchall()])
+        return ids
+
     def _job_info(self, job_id):
         """
         Return info on a job
@@ -480,6 +542,7 @@ echo "$exit_code" 1>%s/__exit_code.%d
         p.add_argument("-e", "--error", action="store", dest="error")
         p.add_argument("--export", action="store", default="ALL")
         p.add_argument("--chdir", action="store")
+        p.add_argument("-a", "--array", action="store")
         args,cmd = p.parse_known_args(argv)
         # Command
         logging.debug(f"sbatch: cmd: {cmd}")
@@ -513,9 +576,30 @@ echo "$exit_code" 1>%s/__exit_code.%d
         else:
             error_tmpl = None
         # Create an initial entry in job table
-        job_id = self._init_job(name, cmd, working_dir, nslots, partition,
-                                output_tmpl, error_tmpl, export)
-        logging.debug("Created job %s" % job_id)
+        if not args.array:
+            job_id = self._init_job(name, cmd, working_dir, nslots,
+                                    partition, output_tmpl, error_tmpl,
+                                    export)
+            logging.debug("Created job %s" % job_id)
+        else:
+            # Job array (ignore any limit on simultaneous tasks)
+            task_ids = []
+            for item in args.array.split('%')[0].split(','):
+                if '-' in item:
+                    start,end = item.split('-')
+                    task_ids.extend(range(int(start), int(end)+1))
+                else:
+                    task_ids.append(int(item))
+            job_id = -1
+            for task_id in task_ids:
+                id_ = self._init_job(name, cmd, working_dir, nslots,
+                                     partition, output_tmpl, error_tmpl,
+                                     export, array_job_id=job_id,
+                                     array_task_id=task_id)
+                if job_id == -1:
+                    job_id = id_
+                logging.debug("Created array task %s_%s" % (job_id,
+                                                            task_id))
         # Report the job id
         print(f"Submitted batch job {job_id}")
         self.update_jobs()
@@ -554,6 +638,8 @@ echo "$exit_code" 1>%s/__exit_code.%d
         p = argparse.ArgumentParser()
         p.add_argument("--user",action="store")
         p.add_argument("--me",action="store_true")
+        p.add_argument("-j","--jobs",action="store")
+        p.add_argument("-o","--format",action="store")
         args = p.parse_args(argv)
         # User
         user = None
@@ -563,9 +649,18 @@ echo "$exit_code" 1>%s/__exit_code.%d
             user = args.user
         # Get jobs
         jobs = self._list_jobs(user=user)
-        # Print header even if there are no jobs to report
-        print("             JOBID PARTITION     NAME     USER ST       TIME  NODES NODELIST(REASON)")
-        # Print info for each job
+        if args.jobs:
+            # Restrict to the specified job ids
+            # NB the query fails if any of the job ids are invalid
+            job_ids = set()
+            for j in [j for j in args.jobs.split(',') if j]:
+                ids = self._resolve_job_ids([j])
+                if not ids:
+                    sys.stderr.write("slurm_load_jobs error: Invalid job "
+                                     "id specified\n")
+                    return 1
+                job_ids.update(ids)
+            jobs = [job for job in jobs if job["id"] in job_ids]
         # From manpage, default output string is:
         # "%.18i %.9P %.8j %.8u %.2t %.10M %.6D %R"
         # where . indicates right-justified (otherwise left-justified)
@@ -581,23 +676,79 @@ echo "$exit_code" 1>%s/__exit_code.%d
         # - D = number of nodes
         # - R = reason why it's pending (pending jobs), reason for
         #        failure (failed jobs), list of nodes (all others)
+        if args.format:
+            fmt = args.format
+        else:
+            fmt = "%.18i %.9P %.8j %.8u %.2t %.10M %.6D %R"
+        fields = []
+        for item in fmt.split():
+            # Extract justification, width and field letter
+            right_justify = item.startswith("%.")
+            width = item.lstrip("%.")[:-1]
+            width = int(width) if width else 0
+            fields.append((item[-1],right_justify,width))
+        # Print header even if there are no jobs to report
+        headers = dict(i="JOBID",
+                       P="PARTITION",
+                       j="NAME",
+                       u="USER",
+                       t="ST",
+                       M="TIME",
+                       D="NODES",
+                       R="NODELIST(REASON)")
+        print(self._format_squeue_line(fields,headers))
+        # Collect the pending tasks for each job array (these are
+        # reported on a single line of the form 'ARRAYID_[TASKS]')
+        pending_tasks = {}
+        for job in jobs:
+            if job["array_job_id"] is not None and job["state"] == "PD":
+                pending_tasks.setdefault(job["array_job_id"],[]).\
+                    append(job["array_task_id"])
+        # Print info for each job
         for job in jobs:
-            job_id = str(job["id"])
-            partition = str(job["partition"])
-            name = str(job["name"])
-            user = job["user"]
-            state = job["state"]
+            array_job_id = job["array_job_id"]
+            if array_job_id is None:
+                job_id = str(job["id"])
+            elif job["state"] != "PD":
+                job_id = f"{array_job_id}_{job['array_task_id']}"
+            elif array_job_id in pending_tasks:
+                task_ids = pending_tasks.pop(array_job_id)
+                job_id = f"{array_job_id}_[%s]" % \
+                         ','.join([str(t) for t in task_ids])
+            else:
+                # Pending tasks already reported
+                continue
             job_time = job["start_time"]
             if job_time is None:
                 job_time = job["sbatch_time"]
             job_time = time.time() - job_time
-            num_nodes = 1
-            if state == "PD":
+            if job["state"] == "PD":
                 nodelist = "(Resources)"
             else:
                 nodelist = "mock-node01"
-            line = f"{job_id:>18} {partition:>9} {name:>8} {user:>8} {state:>2} {job_time:>10.2} {num_nodes:>6} {nodelist}"
-            print(line)
+            values = dict(i=job_id,
+                          P=str(job["partition"]),
+                          j=str(job["name"]),
+                          u=job["user"],
+                          t=job["state"],
+                          M=f"{job_time:.2}",
+                          D="1",
+                          R=nodelist)
+            print(self._format_squeue_line(fields,values))
+
+    def _format_squeue_line(self, fields, values):
+        """
+        Internal: format a line of squeue output
+        """
+        items = []
+        for field,right_justify,width in fields:
+            value = values[field]
+            if right_justify:
+                value = f"{value:>{width}}"
+            else:
+                value = f"{value:<{width}}"
+            items.append(value)
+        return ' '.join(items)
 
     def scancel(self,argv):
         """
@@ -613,15 +764,90 @@ echo "$exit_code" 1>%s/__exit_code.%d
         args = p.parse_args(argv)
         # Loop over job ids
         for job_id in args.job_id:
-            job_id = int(job_id)
-            # Mark the job for deletion
-            status = self._mark_for_deletion(job_id)
+            # Mark the job (or array tasks) for deletion
+            ids = self._resolve_job_ids([job_id])
+            if not ids:
+                status = "Invalid job id specified"
+            for id_ in sorted(ids):
+                status = self._mark_for_deletion(id_)
             if args.verbose:
                 print(f"scancel: Terminating job {job_id}")
                 if status is not None:
                     # Echo status error message
                     print(f"scancel: error: {status}")
 
+    def sacct(self, argv):
+        """
+        Implement sacct-like functionality
+
+        Only supports reporting on specific jobs (via '--jobs')
+        in the 'parsable2' format, for the fields 'JobID',
+        'JobName', 'State', 'ExitCode', 'Start', 'End', 'MaxRSS'
+        and 'TotalCPU'.
+
+        NB resource usage isn't measured for mock jobs, so
+        'MaxRSS' is always blank and 'TotalCPU' is always zero.
+        """
+        logging.debug("sacct: invoked")
+        # Update the db
+        self.update_jobs()
+        # Process supplied arguments
+        p = argparse.ArgumentParser()
+        p.add_argument("-j","--jobs",action="store",required=True)
+        p.add_argument("-n","--noheader",action="store_true")
+        p.add_argument("-P","--parsable2",action="store_true")
+        p.add_argument("-o","--format",action="store",
+                       default="JobID,JobName,State,ExitCode")
+        args = p.parse_args(argv)
+        fields = args.format.split(",")
+        if not args.noheader:
+            print("|".join(fields))
+        # Report each job
+        job_ids = self._resolve_job_ids([j for j in args.jobs.split(',')
+                                         if j])
+        sql = """
+        SELECT id,name,state,exit_code,start_time,end_time,
+        array_job_id,array_task_id
+        FROM jobs WHERE id==?
+        """
+        cu = self._cx.cursor()
+        for id_ in sorted(job_ids):
+            cu.execute(sql,(id_,))
+            job = cu.fetchone()
+            if job["array_job_id"] is None:
+                job_id = str(job["id"])
+            else:
+                job_id = f"{job['array_job_id']}_{job['array_task_id']}"
+            if job["state"] == "PD":
+                state = "PENDING"
+                exit_code = "0:0"
+            elif job["state"] in ("R","CA"):
+                state = "RUNNING"
+                exit_code = "0:0"
+            elif job["exit_code"] is None:
+                # Terminated via 'scancel'
+                state = "CANCELLED"
+                exit_code = "0:9"
+            else:
+                state = "COMPLETED" if job["exit_code"] == 0 else "FAILED"
+                exit_code = f"{job['exit_code']}:0"
+            timestamps = {}
+            for field in ("start_time","end_time"):
+                if job[field] is None:
+                    timestamps[field] = "Unknown"
+                else:
+                    timestamps[field] = time.strftime(
+                        "%Y-%m-%dT%H:%M:%S",time.localtime(job[field]))
+            values = dict(JobID=job_id,
+                          JobName=str(job["name"]),
+                          State=state,
+                          ExitCode=exit_code,
+                          Start=timestamps["start_time"],
+                          End=timestamps["end_time"],
+                          MaxRSS="",
+                          TotalCPU="00:00:00")
+            print("|".join([values[field] for field in fields]))
+
 #######################################################################
 # Functions
 #######################################################################
@@ -649,14 +875,14 @@ sys.exit(MockSlurm(%s).%s(sys.argv[1:]))
 def setup_mock_slurm(bindir=None, database_dir=None, debug=None,
                      sbatch_delay=None):
     """
-    Creates mock 'sbatch', 'squeue' and 'scancel' exes
+    Creates mock 'sbatch', 'squeue', 'scancel' and 'sacct' exes
     """
     # Bin directory
     if bindir is None:
         bindir = os.getcwd()
     bindir = os.path.abspath(bindir)
     # Utilities
-    for utility in ("sbatch", "squeue", "scancel"):
+    for utility in ("sbatch", "squeue", "scancel", "sacct"):
         path = os.path.join(bindir,utility)
         _make_mock_slurm_exe(path,
                              utility,
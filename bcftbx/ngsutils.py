@@ -20,6 +20,14 @@ Extracting reads from Fastq, cfasta and qual files:
 - getreads_subset: fetch subset of reads specified by index
 - getreads_regexp: fetch subset of reads matching regular expression
 
+Writing block-compressed and tabix-indexed files:
+
+- BGZFWriter: write data to a BGZF (block gzip) compressed file
+- BGZFReader: read lines from a BGZF file using virtual offsets
+- TabixIndex: build, save and load tabix (.tbi) indexes
+- write_indexed_bed: write sorted BED data with a tabix index
+- tabix_fetch: fetch lines overlapping a region from an indexed file
+
 """
 
 #######################################################################
@@ -27,9 +35,31 @@ Extracting reads from Fastq, cfasta and qual files:
 #######################################################################
 
 import os
+import io
 import re
+import gzip
+import zlib
+import struct
 from .utils import getlines
 
+#######################################################################
+# Constants
+#######################################################################
+
+# Maximum amount of uncompressed data in a BGZF block
+BGZF_BLOCK_SIZE = 0xff00
+
+# Empty BGZF block used to mark the end of file
+BGZF_EOF = b"\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00" \
+           b"\x42\x43\x02\x00\x1b\x00\x03\x00\x00\x00\x00\x00" \
+           b"\x00\x00\x00\x00"
+
+# Tabix index constants
+TABIX_MAGIC = b"TBI\x01"
+TABIX_UCSC = 0x10000
+TABIX_MIN_SHIFT = 14
+TABIX_PSEUDO_BIN = 37450
+
 #######################################################################
 # Functions
 #######################################################################
@@ -172,3 +202,619 @@ def getreads_regex(filen,pattern):
     for read in getreads(filen):
         if regex.search(''.join(read)):
             yield read
+
+def write_indexed_bed(filen,lines,header=None,sort=True):
+    """
+    Write BED data to a BGZF-compressed file with a tabix index
+
+    Writes the BED lines to 'filen' as a BGZF (block gzip)
+    compressed file, and creates a tabix index for it
+    called '<filen>.tbi', so that the output is equivalent
+    to running 'bgzip' followed by 'tabix -p bed'.
+
+    Example usage:
+
+    >>> write_indexed_bed('peaks.bed.gz',
+    ...                   ['chr1\t100\t300','chr2\t50\t250'],
+    ...                   header='#chr\tstart\tend')
+
+    Arguments:
+      filen (str): path of the output '.gz' file
+      lines (iterable): BED lines (without trailing
+        newlines)
+      header (str): optional header line to write at the
+        start of the file (should start with '#')
+      sort (bool): if True (the default) then sort the
+        lines by chromosome and start position before
+        writing; if False then the lines must already be
+        sorted
+
+    Returns:
+      Integer: number of BED lines written.
+    """
+    if sort:
+        lines = sorted(lines,key=_bed_sort_key)
+    index = TabixIndex(zero_based=True)
+    nlines = 0
+    with BGZFWriter(filen) as bgzf:
+        if header is not None:
+            bgzf.write(header.rstrip('\n') + '\n')
+        for line in lines:
+            line = line.rstrip('\n')
+            if not line or line.startswith('#'):
+                continue
+            fields = line.split('\t')
+            start = bgzf.tell()
+            bgzf.write(line + '\n')
+            index.add(fields[0],int(fields[1]),int(fields[2]),
+                      start,bgzf.tell())
+            nlines += 1
+    index.save(filen + '.tbi')
+    return nlines
+
+def tabix_fetch(filen,chrom,start=None,end=None):
+    """
+    Fetch the lines from an indexed file which overlap a region
+
+    Uses the tabix index '<filen>.tbi' to locate the lines
+    in the BGZF-compressed file 'filen' which overlap the
+    specified region, e.g.
+
+    >>> for line in tabix_fetch('peaks.bed.gz','chr1',1000,2000):
+    >>> ... print(line)
+
+    Arguments:
+      filen (str): path of the BGZF-compressed file
+      chrom (str): name of the sequence (chromosome)
+      start (int): optional, start of the region (zero-based,
+        defaults to the start of the sequence)
+      end (int): optional, end of the region (exclusive,
+        defaults to the end of the sequence)
+
+    Yields:
+      String: next line overlapping the region (without the
+        trailing newline).
+    """
+    index = TabixIndex.load(filen + '.tbi')
+    if start is None:
+        start = 0
+    if end is None:
+        end = 1 << 31
+    col_seq = index.col_seq - 1
+    col_beg = index.col_beg - 1
+    col_end = index.col_end - 1
+    with BGZFReader(filen) as bgzf:
+        for chunk_start,chunk_end in index.chunks(chrom,start,end):
+            bgzf.seek(chunk_start)
+            while bgzf.tell() < chunk_end:
+                line = bgzf.readline()
+                if not line:
+                    break
+                line = line.rstrip('\n')
+                if line.startswith(index.meta):
+                    continue
+                fields = line.split('\t')
+                if fields[col_seq] != chrom:
+                    continue
+                beg,stop = _tabix_interval(fields,col_beg,col_end,
+                                           index.zero_based)
+                if beg >= end:
+                    # Lines are sorted so no more overlaps
+                    return
+                if stop > start:
+                    yield line
+
+def _bed_sort_key(line):
+    """
+    Internal: sort key for BED lines (chromosome, then start)
+    """
+    fields = line.split('\t',2)
+    return (fields[0],int(fields[1]))
+
+def _tabix_interval(fields,col_beg,col_end,zero_based):
+    """
+    Internal: get the zero-based half-open interval for a line
+    """
+    beg = int(fields[col_beg])
+    if not zero_based:
+        beg -= 1
+    if col_end >= 0 and col_end < len(fields):
+        end = int(fields[col_end])
+    else:
+        end = beg + 1
+    return (beg,end)
+
+def _tabix_reg2bin(beg,end):
+    """
+    Internal: return the bin for a zero-based half-open interval
+    """
+    end -= 1
+    for shift,offset in ((14,4681),(17,585),(20,73),(23,9),(26,1)):
+        if beg >> shift == end >> shift:
+            return offset + (beg >> shift)
+    return 0
+
+def _tabix_reg2bins(beg,end):
+    """
+    Internal: return the bins overlapping a half-open interval
+    """
+    end -= 1
+    bins = [0]
+    for shift,offset in ((26,1),(23,9),(20,73),(17,585),(14,4681)):
+        bins.extend(range(offset + (beg >> shift),
+                          offset + (end >> shift) + 1))
+    return bins
+
+#######################################################################
+# Classes
+#######################################################################
+
+class BGZFWriter:
+    """
+    Write data to a BGZF (block gzip) compressed file
+
+    BGZF files consist of a series of gzip members (or
+    'blocks') each holding up to 64Kb of uncompressed data,
+    so they can be read by standard gzip tools but also
+    accessed at random using 'virtual offsets' (see the
+    SAM/BAM format specification).
+
+    Example usage:
+
+    >>> with BGZFWriter('data.txt.gz') as bgzf:
+    >>> ... offset = bgzf.tell()
+    >>> ... bgzf.write('Some data\n')
+
+    Arguments:
+      filen (str): path of the file to write to
+      fp (File): file-like object opened for writing
+        in binary mode (used instead of 'filen')
+      compresslevel (int): zlib compression level
+    """
+    def __init__(self,filen=None,fp=None,compresslevel=6):
+        if fp is None:
+            self._fp = io.open(filen,'wb')
+            self._close_fp = True
+        else:
+            self._fp = fp
+            self._close_fp = False
+        self._compresslevel = compresslevel
+        self._buffer = bytearray()
+        self._coffset = self._fp.tell() if fp is not None else 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,exc_type,exc_value,traceback):
+        self.close()
+
+    def write(self,data):
+        """
+        Write data to the file
+
+        Arguments:
+          data (str): text (or bytes) to write
+        """
+        if not isinstance(data,bytes):
+            data = data.encode('utf-8')
+        self._buffer.extend(data)
+        while len(self._buffer) >= BGZF_BLOCK_SIZE:
+            self._write_block(bytes(self._buffer[:BGZF_BLOCK_SIZE]))
+            del(self._buffer[:BGZF_BLOCK_SIZE])
+
+    def tell(self):
+        """
+        Return the virtual offset of the current position
+
+        The virtual offset is the offset of the start of
+        the current block in the compressed file, shifted
+        16 bits to the left, plus the offset within the
+        uncompressed data of the block.
+        """
+        return (self._coffset << 16) | len(self._buffer)
+
+    def flush(self):
+        """
+        Write any buffered data as a complete block
+        """
+        if self._buffer:
+            self._write_block(bytes(self._buffer))
+            self._buffer = bytearray()
+
+    def close(self):
+        """
+        Flush the data, write the end-of-file marker and close
+        """
+        if self._fp is None:
+            return
+        self.flush()
+        self._fp.write(BGZF_EOF)
+        if self._close_fp:
+            self._fp.close()
+        self._fp = None
+
+    def _write_block(self,data):
+        """
+        Internal: compress and write a single BGZF block
+        """
+        compressor = zlib.compressobj(self._compresslevel,
+                                      zlib.DEFLATED,-15)
+        cdata = compressor.compress(data) + compressor.flush()
+        block_size = 18 + len(cdata) + 8
+        self._fp.write(struct.pack('<4BI2BH2BHH',
+                                   31,139,8,4,0,0,255,6,
+                                   66,67,2,block_size-1))
+        self._fp.write(cdata)
+        self._fp.write(struct.pack('<II',
+                                   zlib.crc32(data) & 0xffffffff,
+                                   len(data)))
+        self._coffset += block_size
+
+class BGZFReader:
+    """
+    Read lines from a BGZF (block gzip) compressed file
+
+    Supports seeking to and reporting 'virtual offsets'
+    (see BGZFWriter), e.g.
+
+    >>> with BGZFReader('data.txt.gz') as bgzf:
+    >>> ... bgzf.seek(offset)
+    >>> ... line = bgzf.readline()
+
+    Arguments:
+      filen (str): path of the file to read
+    """
+    def __init__(self,filen):
+        self._fp = io.open(filen,'rb')
+        self._coffset = 0
+        self._next_coffset = 0
+        self._data = b''
+        self._pos = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,exc_type,exc_value,traceback):
+        self.close()
+
+    def close(self):
+        """
+        Close the file
+        """
+        self._fp.close()
+
+    def tell(self):
+        """
+        Return the virtual offset of the current position
+        """
+        if self._pos == len(self._data) and self._data:
+            # At the end of the block
+            return self._next_coffset << 16
+        return (self._coffset << 16) | self._pos
+
+    def seek(self,offset):
+        """
+        Move to a virtual offset
+
+        Arguments:
+          offset (int): virtual offset to move to
+        """
+        self._load_block(offset >> 16)
+        self._pos = offset & 0xffff
+
+    def readline(self):
+        """
+        Read the next line
+
+        Returns:
+          String: the next line (including the trailing
+            newline), or an empty string at the end of the
+            file.
+        """
+        line = b''
+        while True:
+            if self._pos >= len(self._data):
+                if not self._load_block(self._next_coffset):
+                    break
+                continue
+            i = self._data.find(b'\n',self._pos)
+            if i < 0:
+                line += self._data[self._pos:]
+                self._pos = len(self._data)
+                continue
+            line += self._data[self._pos:i+1]
+            self._pos = i + 1
+            break
+        return line.decode('utf-8')
+
+    def _load_block(self,coffset):
+        """
+        Internal: load the block at a compressed offset
+
+        Returns False if there are no more blocks.
+        """
+        self._fp.seek(coffset)
+        header = self._fp.read(12)
+        if len(header) < 12:
+            return False
+        xlen = struct.unpack('<H',header[10:12])[0]
+        extra = self._fp.read(xlen)
+        block_size = None
+        i = 0
+        while i < xlen:
+            si1,si2,slen = struct.unpack('<BBH',extra[i:i+4])
+            if si1 == 66 and si2 == 67:
+                block_size = struct.unpack('<H',extra[i+4:i+6])[0] + 1
+            i += 4 + slen
+        if block_size is None:
+            raise ValueError("Not a BGZF block at offset %d" % coffset)
+        cdata = self._fp.read(block_size - 12 - xlen - 8)
+        self._coffset = coffset
+        self._next_coffset = coffset + block_size
+        self._data = zlib.decompress(cdata,-15)
+        self._pos = 0
+        if not self._data:
+            # Empty (e.g. end-of-file) block, try the next one
+            return self._load_block(self._next_coffset)
+        return True
+
+class TabixIndex:
+    """
+    Build, save and load tabix (.tbi) indexes
+
+    The index holds the binning and linear indexes used by
+    tabix to locate the lines which overlap a region in a
+    sorted, BGZF-compressed tab-delimited file. Intervals
+    are added in file order along with the virtual offsets
+    of the start and end of each line, e.g.
+
+    >>> index = TabixIndex(zero_based=True)
+    >>> index.add('chr1',100,300,start_offset,end_offset)
+    >>> index.save('data.bed.gz.tbi')
+
+    The defaults for the column settings are those for BED
+    files.
+
+    Arguments:
+      col_seq (int): column with the sequence names (from 1)
+      col_beg (int): column with the start positions
+      col_end (int): column with the end positions
+      meta (str): character marking lines to skip
+      skip (int): number of lines to skip at the start
+      zero_based (bool): if True then start positions are
+        zero-based (as for BED), otherwise they are one-based
+    """
+    def __init__(self,col_seq=1,col_beg=2,col_end=3,meta='#',skip=0,
+                 zero_based=False):
+        self.col_seq = col_seq
+        self.col_beg = col_beg
+        self.col_end = col_end
+        self.meta = meta
+        self.skip = skip
+        self.zero_based = zero_based
+        # Sequence names in the order they appear
+        self.names = []
+        # For each sequence: bins (dictionary of lists of
+        # chunks), linear index (list of offsets), and
+        # metadata (first and last offsets, number of lines)
+        self._bins = {}
+        self._linear = {}
+        self._meta = {}
+        self._last = None
+
+    def add(self,name,beg,end,start_offset,end_offset):
+        """
+        Add an interval to the index
+
+        Intervals must be added in the order that they appear
+        in the file, which must be sorted by start position
+        within each sequence, with all the lines for each
+        sequence together.
+
+        Arguments:
+          name (str): sequence name
+          beg (int): zero-based start of the interval
+          end (int): end of the interval (exclusive)
+          start_offset (int): virtual offset of the start of
+            the line
+          end_offset (int): virtual offset of the end of the
+            line
+        """
+        if self._last is None or name != self._last[0]:
+            if name in self._bins:
+                raise ValueError("Lines for '%s' are not together "
+                                 "(file not sorted?)" % name)
+            self.names.append(name)
+            self._bins[name] = {}
+            self._linear[name] = []
+            self._meta[name] = [start_offset,end_offset,0]
+        elif beg < self._last[1]:
+            raise ValueError("Start position %d for '%s' is before "
+                             "previous position %d (file not sorted?)" %
+                             (beg,name,self._last[1]))
+        self._last = (name,beg)
+        if end <= beg:
+            end = beg + 1
+        # Add to binning index, extending the previous chunk
+        # if it ends where this line starts
+        chunks = self._bins[name].setdefault(_tabix_reg2bin(beg,end),[])
+        if chunks and chunks[-1][1] == start_offset:
+            chunks[-1][1] = end_offset
+        else:
+            chunks.append([start_offset,end_offset])
+        # Add to linear index
+        linear = self._linear[name]
+        last_window = (end - 1) >> TABIX_MIN_SHIFT
+        if len(linear) <= last_window:
+            linear.extend([None]*(last_window + 1 - len(linear)))
+        for window in range(beg >> TABIX_MIN_SHIFT,last_window + 1):
+            if linear[window] is None:
+                linear[window] = start_offset
+        # Update metadata
+        meta = self._meta[name]
+        meta[1] = end_offset
+        meta[2] += 1
+
+    def chunks(self,name,beg,end):
+        """
+        Return the chunks of the file which may overlap a region
+
+        Arguments:
+          name (str): sequence name
+          beg (int): zero-based start of the region
+          end (int): end of the region (exclusive)
+
+        Returns:
+          List: sorted list of non-overlapping (start,end)
+            tuples of virtual offsets.
+        """
+        if name not in self._bins:
+            return []
+        bins = self._bins[name]
+        linear = self._linear[name]
+        if linear:
+            window = min(beg >> TABIX_MIN_SHIFT,len(linear) - 1)
+            min_offset = linear[window] or 0
+        else:
+            min_offset = 0
+        chunks = []
+        for bin_ in _tabix_reg2bins(beg,end):
+            for chunk_start,chunk_end in bins.get(bin_,()):
+                if chunk_end > min_offset:
+                    chunks.append((max(chunk_start,min_offset),chunk_end))
+        chunks.sort()
+        merged = []
+        for chunk in chunks:
+            if merged and chunk[0] <= merged[-1][1]:
+                merged[-1] = (merged[-1][0],max(merged[-1][1],chunk[1]))
+            else:
+                merged.append(chunk)
+        return merged
+
+    def save(self,filen):
+        """
+        Write the index to a (BGZF-compressed) .tbi file
+
+        Arguments:
+          filen (str): path of the index file to write
+        """
+        names = b''.join([name.encode('utf-8') + b'\x00'
+                          for name in self.names])
+        fmt = TABIX_UCSC if self.zero_based else 0
+        data = [TABIX_MAGIC,
+                struct.pack('<8i',len(self.names),fmt,
+                            self.col_seq,self.col_beg,self.col_end,
+                            ord(self.meta),self.skip,len(names)),
+                names]
+        for name in self.names:
+            bins = self._compressed_bins(name)
+            meta = self._meta[name]
+            data.append(struct.pack('<i',len(bins) + 1))
+            for bin_ in sorted(bins):
+                chunks = bins[bin_]
+                data.append(struct.pack('<Ii',bin_,len(chunks)))
+                for chunk_start,chunk_end in chunks:
+                    data.append(struct.pack('<QQ',chunk_start,chunk_end))
+            # Pseudo-bin with the metadata
+            data.append(struct.pack('<IiQQQQ',TABIX_PSEUDO_BIN,2,
+                                    meta[0],meta[1],meta[2],0))
+            # Linear index, with empty windows taking the
+            # offset of the next window (no lines overlap an
+            # empty window, so the next line is the first one
+            # that can overlap a region starting there)
+            linear = []
+            offset = 0
+            for window_offset in reversed(self._linear[name]):
+                if window_offset is not None:
+                    offset = window_offset
+                linear.append(offset)
+            linear.reverse()
+            data.append(struct.pack('<i%dQ' % len(linear),
+                                    len(linear),*linear))
+        # Number of unplaced lines
+        data.append(struct.pack('<Q',0))
+        with BGZFWriter(filen) as bgzf:
+            bgzf.write(b''.join(data))
+
+    def _compressed_bins(self,name):
+        """
+        Internal: return the binning index for saving
+
+        Follows the same scheme as the 'tabix' program to
+        reduce the size of the index: the chunks in bins
+        spanning less than 64Kb of the compressed file are
+        moved into the parent bin (if it exists), and chunks
+        which start in the same block that the previous chunk
+        ends in are merged.
+        """
+        bins = dict([(bin_,[list(chunk) for chunk in chunks])
+                     for bin_,chunks in self._bins[name].items()])
+        for level in range(5,0,-1):
+            first_bin = ((1 << 3*level) - 1)//7
+            for bin_ in sorted(bins):
+                if bin_ < first_bin:
+                    continue
+                chunks = bins[bin_]
+                if level < 5:
+                    chunks.sort()
+                if (chunks[-1][1] >> 16) - (chunks[0][0] >> 16) < 0x10000:
+                    parent = (bin_ - 1) >> 3
+                    if parent in bins:
+                        bins[parent].extend(chunks)
+                        del(bins[bin_])
+        for bin_ in bins:
+            chunks = sorted(bins[bin_])
+            merged = [chunks[0]]
+            for chunk in chunks[1:]:
+                if merged[-1][1] >> 16 >= chunk[0] >> 16:
+                    merged[-1][1] = max(merged[-1][1],chunk[1])
+                else:
+                    merged.append(chunk)
+            bins[bin_] = merged
+        return bins
+
+    @classmethod
+    def load(cls,filen):
+        """
+        Load an index from a .tbi file
+
+        Arguments:
+          filen (str): path of the index file
+
+        Returns:
+          TabixIndex: the loaded index.
+        """
+        with gzip.open(filen,'rb') as fp:
+            data = fp.read()
+        if data[:4] != TABIX_MAGIC:
+            raise ValueError("%s: not a tabix index" % filen)
+        n_ref,fmt,col_seq,col_beg,col_end,meta,skip,l_nm = \
+            struct.unpack_from('<8i',data,4)
+        index = cls(col_seq=col_seq,col_beg=col_beg,col_end=col_end,
+                    meta=chr(meta),skip=skip,
+                    zero_based=bool(fmt & TABIX_UCSC))
+        pos = 36
+        index.names = [name.decode('utf-8')
+                       for name in data[pos:pos+l_nm].split(b'\x00')[:-1]]
+        pos += l_nm
+        for name in index.names:
+            bins = {}
+            n_bin = struct.unpack_from('<i',data,pos)[0]
+            pos += 4
+            for i in range(n_bin):
+                bin_,n_chunk = struct.unpack_from('<Ii',data,pos)
+                pos += 8
+                chunks = struct.unpack_from('<%dQ' % (2*n_chunk),data,pos)
+                pos += 16*n_chunk
+                if bin_ == TABIX_PSEUDO_BIN:
+                    index._meta[name] = [chunks[0],chunks[1],chunks[2]]
+                    continue
+                bins[bin_] = [list(chunks[j:j+2])
+                              for j in range(0,len(chunks),2)]
+            n_intv = struct.unpack_from('<i',data,pos)[0]
+            pos += 4
+            index._linear[name] = list(struct.unpack_from('<%dQ' % n_intv,
+                                                          data,pos))
+            pos += 8*n_intv
+            index._bins[name] = bins
+        return index
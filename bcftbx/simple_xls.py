@@ -98,6 +98,17 @@ In each case the styling information is passed via an XLSStyle object, e.g.
 
 >>> data.set_style(XLSStyle(number_format=NumberFormats.PERCENTAGE),'A3')
 
+Large tables (for example a TabFile or TabFileIterator) can be added
+to a workbook without copying the data into worksheet cells:
+
+>>> wb.add_table('peaks',TabFileIterator('peaks.txt'),
+...              types={ 'start': int, 'end': int })
+
+The rows are streamed directly to the output file when the workbook is
+saved (and are split over multiple sheets if there are more rows than
+will fit into a single sheet). Tables can also be written directly to
+an XlsxWriter Workbook using the 'write_table' function.
+
 The workbook can be saved to file:
 
 >>> wb.save_as_xls('test.xls')
@@ -117,6 +128,8 @@ Alternatively the contents of a sheet (or a subset) can be rendered as text:
 
 from builtins import str
 import re
+import functools
+import itertools
 try:
     from collections.abc import Iterator
 except ImportError:
@@ -134,6 +147,9 @@ from builtins import range
 # Value to assign to failed evaluations
 BAD_REF="## !REF ##"
 
+# Regular expression matching full cell indices e.g. 'A1'
+CELL_INDEX_PATTERN = re.compile(r'^([A-Z]+)([0-9]+)$')
+
 # Number formats
 class NumberFormats:
     THOUSAND_SEPARATOR=0
@@ -187,6 +203,12 @@ class XLSWorkBook:
 
     >>> sheet = xls.worksheet['example']
 
+    Tables of data which are streamed to the output file when
+    it is written (rather than being stored in worksheet cells)
+    can be added using the add_table method:
+
+    >>> xls.add_table('data',TabFile('data.tsv',first_line_is_header=True))
+
     Once the worksheet(s) have been populated an XLS file can be
     created using the 'save_as_xls' method:
 
@@ -202,6 +224,9 @@ class XLSWorkBook:
         """
         self.title = title
         self.worksheet = OrderedDictionary()
+        self.table = OrderedDictionary()
+        # Names of worksheets and tables in output order
+        self.__sheets = []
 
     def add_work_sheet(self,name,title=None):
         """Create and append a new worksheet
@@ -218,14 +243,60 @@ class XLSWorkBook:
           New XLSWorkSheet object.
 
         """
-        if name in self.worksheet:
+        if name in self.worksheet or name in self.table:
             raise KeyError("Worksheet called '%s' already exists" %
                            name)
         if title is None:
             title = name
         self.worksheet[name] = XLSWorkSheet(title)
+        self.__sheets.append(name)
         return self.worksheet[name]
 
+    def add_table(self,name,data,title=None,header=None,styles=None,
+                  types=None,header_style=None,freeze_header=True,
+                  limits=None):
+        """Append a table of data to be streamed on output
+
+        The rows of the table aren't stored in the workbook;
+        instead they are read from 'data' and written directly
+        to the output file when the workbook is saved (see the
+        'write_table' function for details of the arguments).
+        Note that if 'data' is an iterator then the workbook
+        can only be saved once.
+
+        Arguments:
+          name: unique name for the table
+          data: TabFile, TabFileIterator or other iterable
+            which supplies the rows of data
+          title: optional, title for the sheet(s) that the
+            table is written to - defaults to the name.
+          header: optional, list of column names
+          styles: optional, XLSStyles to apply to each column
+          types: optional, types to convert the values in each
+            column to
+          header_style: optional, XLSStyle for the header row
+          freeze_header: if True (the default) then freeze the
+            header row of each sheet
+          limits: optional, class defining the row and cell
+            length limits (defaults to XLSXLimits or XLSLimits,
+            depending on the output format)
+
+        """
+        if name in self.worksheet or name in self.table:
+            raise KeyError("Worksheet called '%s' already exists" %
+                           name)
+        if title is None:
+            title = name
+        self.table[name] = dict(data=data,
+                                title=str(title),
+                                header=header,
+                                styles=styles,
+                                types=types,
+                                header_style=header_style,
+                                freeze_header=freeze_header,
+                                limits=limits)
+        self.__sheets.append(name)
+
     def save_as_xls(self,filen):
         """Output the workbook contents to an Excel-format file
 
@@ -234,7 +305,10 @@ class XLSWorkBook:
 
         """
         xls = Spreadsheet.Workbook()
-        for name in self.worksheet:
+        for name in self.__sheets:
+            if name in self.table:
+                self._write_xls_table(xls,**self.table[name])
+                continue
             worksheet = self.worksheet[name]
             ws = xls.addSheet(worksheet.title)
             ws.addText(worksheet.render_as_text(include_styles=True))
@@ -245,83 +319,157 @@ class XLSWorkBook:
                 ws.freezePanes(column=col,row=row)
         xls.save(filen)
 
-    def save_as_xlsx(self,filen):
+    def _write_xls_table(self,xls,data,title,header=None,styles=None,
+                         types=None,header_style=None,freeze_header=True,
+                         limits=None):
+        """Internal: write a table to a Spreadsheet.Workbook
+
+        Styles aren't applied to tables in XLS output.
+        """
+        if limits is None:
+            limits = XLSLimits
+        header = _table_header(data,header)
+        types = _table_column_settings(types,header)
+        rows = _table_rows(data,types,limits)
+        for title,rows in _split_table(rows,title,bool(header),limits):
+            ws = xls.addSheet(title)
+            if header:
+                ws.addTabData(['\t'.join(header)])
+                if freeze_header:
+                    ws.freezePanes(row=1,column=0)
+            ws.addTabData(['\t'.join(['' if x is None else str(x)
+                                      for x in values])
+                           for values in rows])
+
+    def save_as_xlsx(self,filen,constant_memory=True):
         """Output the workbook contents to an XLSX-format file
 
+        The worksheets are written out row by row; by default
+        XlsxWriter's 'constant_memory' mode is used, so that each
+        row is flushed to disk once it has been written (which
+        limits the memory used when writing large worksheets).
+
         Arguments:
           filen: name of the file to write the workbook to.
+          constant_memory: (optional) if True (the default) then
+            use XlsxWriter's 'constant_memory' mode; set to False
+            to write the workbook from memory
 
         """
-        xlsx = xlsxwriter.Workbook(filen)
-        styles = {}
+        xlsx = xlsxwriter.Workbook(filen,
+                                   { 'constant_memory': constant_memory })
+        formats = XLSXFormats(xlsx)
         default_min_col_width = 7
-        for name in self.worksheet:
+        for name in self.__sheets:
+            if name in self.table:
+                write_table(xlsx,formats=formats,**self.table[name])
+                continue
             worksheet = self.worksheet[name]
             ws = xlsx.add_worksheet(worksheet.title)
-            # Write content to worksheet cell by cell
-            start = CellIndex('A1')
-            end = CellIndex(cell(worksheet.last_column,
-                                 worksheet.last_row))
-            for col in ColumnRange(start.column,end.column):
-                # Maximum column width
-                max_width = default_min_col_width
-                for row in range(start.row,end.row+1):
-                    # Get the value
-                    value = worksheet.render_cell(cell(col,row),
-                                                  eval_formulae=False,
-                                                  apply_format=False)
+            # Maximum width for each column
+            ncols = column_index_to_integer(worksheet.last_column) + 1
+            max_widths = [default_min_col_width]*ncols
+            # Write content to worksheet row by row
+            for row in range(1,worksheet.last_row+1):
+                cells = worksheet._row_cells(row)
+                for col in range(ncols):
                     # Handle styles for this cell
-                    style = worksheet.get_style(cell(col,row))
-                    if style:
-                        style_name = style.name
-                        try:
-                            xlsx_fmt = styles[style_name]
-                        except KeyError:
-                            xlsx_fmt = xlsx.add_format()
-                            if style.bold:
-                                xlsx_fmt.set_bold()
-                            if style.color is not None:
-                                xlsx_fmt.set_font_color(style.color)
-                            if style.bgcolor is not None:
-                                xlsx_fmt.set_bg_color(style.bgcolor)
-                            if style.font_size is not None:
-                                xlsx_fmt.set_font_size(style.font_size)
-                            styles[style_name] = xlsx_fmt
-                    else:
-                        xlsx_fmt = None
-                    # Deal with cell content
-                    if value.startswith('='):
+                    xlsx_fmt = formats.get(worksheet._get_style(row,col))
+                    # Get the value
+                    value = cells.get(col)
+                    if value is None or value == '':
+                        # Empty cell
+                        if xlsx_fmt is not None:
+                            ws.write_blank(row-1,col,None,xlsx_fmt)
+                        continue
+                    if isinstance(value,str) and value.startswith('='):
                         # Cell contains formula
-                        result = eval_formula(value,worksheet)
-                        ws.write_formula(cell(col,row),value,xlsx_fmt,result)
+                        value = worksheet._render_cell(row,col)
+                        result = worksheet._evaluate_cell(row,col)
+                        ws.write_formula(row-1,col,value,xlsx_fmt,result)
                         col_width = len(str(result))
                     else:
                         # Deal with a data item
-                        # Attempt to convert to a number type
-                        # i.e. integer/float
-                        try:
-                            # Try integer
-                            value = int(str(value))
-                        except ValueError:
-                            # Not an integer, try float
-                            try:
-                                value = float(str(value))
-                            except ValueError:
-                                # Not a float either
-                                pass
-                        # Write to the worksheet
-                        ws.write(cell(col,row),value,xlsx_fmt)
+                        value = convert_to_xlsx_value(value)
+                        ws.write(row-1,col,value,xlsx_fmt)
                         col_width = len(str(value))
                     # Handle column widths
-                    max_width = max(max_width,col_width)
-                # Set the column width
-                icol = column_index_to_integer(col)
-                ws.set_column(icol,icol,max_width*1.2)
+                    if col_width > max_widths[col]:
+                        max_widths[col] = col_width
+            # Set the column widths
+            for col,max_width in enumerate(max_widths):
+                ws.set_column(col,col,max_width*1.2)
             # Handle freeze panes
             if worksheet.freeze_panes is not None:
                 ws.freeze_panes(worksheet.freeze_panes)
+            # Release the cached formula results for this sheet
+            worksheet._clear_formulae()
         xlsx.close()
 
+class XLSXFormats:
+    """Class for caching XlsxWriter formats for XLSStyles
+
+    An XLSXFormats object creates and stores the XlsxWriter
+    Format objects corresponding to XLSStyle objects, so
+    that only one Format is added to the workbook for each
+    distinct style:
+
+    >>> formats = XLSXFormats(xlsx)
+    >>> xlsx_fmt = formats.get(XLSStyle(bold=True))
+
+    """
+    def __init__(self,xlsx):
+        """Create a new XLSXFormats instance
+
+        Arguments:
+          xlsx: the xlsxwriter.Workbook that the formats
+            will be added to
+
+        """
+        self.xlsx = xlsx
+        # Formats keyed by style name
+        self.formats = {}
+        # Formats keyed by XLSStyle object id
+        self.styles = {}
+
+    def get(self,style):
+        """Return the XlsxWriter Format for an XLSStyle
+
+        Arguments:
+          style: XLSStyle object (or None)
+
+        Returns:
+          XlsxWriter Format object, or None if the style is
+          None or empty.
+
+        """
+        if style is None:
+            return None
+        try:
+            return self.styles[id(style)][1]
+        except KeyError:
+            pass
+        style_name = style.name
+        if not style_name:
+            xlsx_fmt = None
+        else:
+            try:
+                xlsx_fmt = self.formats[style_name]
+            except KeyError:
+                xlsx_fmt = self.xlsx.add_format()
+                if style.bold:
+                    xlsx_fmt.set_bold()
+                if style.color is not None:
+                    xlsx_fmt.set_font_color(style.color)
+                if style.bgcolor is not None:
+                    xlsx_fmt.set_bg_color(style.bgcolor)
+                if style.font_size is not None:
+                    xlsx_fmt.set_font_size(style.font_size)
+                self.formats[style_name] = xlsx_fmt
+        # Keep a reference to the style so its id isn't reused
+        self.styles[id(style)] = (style,xlsx_fmt)
+        return xlsx_fmt
+
 class XLSWorkSheet:
     """Class for creating sheets within an XLS workbook.
 
@@ -355,6 +503,10 @@ class XLSWorkSheet:
     and 'next_row' properties report the next empty column
     and row respectively.
 
+    Internally cells are stored using integer row and column
+    indices, and the extent of the sheet is updated as cells
+    are added and removed.
+
     Cells can contain Excel-style formula by adding an
     equals sign to the start of the value. Typically formulae
     reference other cells and perform mathematical operations
@@ -395,26 +547,31 @@ class XLSWorkSheet:
 
         """
         self.title = str(title)[:Spreadsheet.MAX_LEN_WORKSHEET_TITLE]
-        self.data = {}
-        self.styles = {}
-        self.rows = []
-        self.columns = []
         self.freeze_panes = None
+        # Cell data stored as {row: {column: value}} where rows
+        # start from 1 and columns from 0
+        self.__cells = {}
+        # Number of stored cells in each column
+        self.__column_counts = {}
+        # Cell styles stored as {(row,column): style}
+        self.__styles = {}
+        # Extent of the stored data
+        self.__max_row = 0
+        self.__max_column = -1
+        # Cached results of evaluated formulae, and the
+        # formula cells which depend on each cell
+        self.__formula_values = {}
+        self.__formula_dependents = {}
 
     def __setitem__(self,idx,value):
         """Implement 'x[idx] = value'
 
         """
-        idx = CellIndex(idx)
-        if not idx.is_full:
+        try:
+            row,col = cell_coordinates(idx)
+        except ValueError:
             raise KeyError("Invalid index: '%s'" % idx)
-        self.data[idx.idx] = value
-        if idx.column not in self.columns:
-            self.columns.append(idx.column)
-        self.columns = sorted(self.columns,key=lambda x: x[::-1])
-        if idx.row not in self.rows:
-            self.rows.append(idx.row)
-        self.rows.sort()
+        self._set_cell(row,col,value)
 
     def __getitem__(self,idx):
         """Implement 'value = x[idx]'
@@ -424,63 +581,260 @@ class XLSWorkSheet:
             return XLSColumn(idx,parent=self)
         else:
             try:
-                return self.data[idx]
-            except Exception as ex:
+                row,col = cell_coordinates(idx)
+            except ValueError:
                 return None
+            return self._get_cell(row,col)
 
     def __delitem__(self,idx):
         """Implement 'del(x[idx])'
 
         """
         try:
-            del(self.data[idx])
+            row,col = cell_coordinates(idx)
+        except ValueError:
+            return
+        self._del_cell(row,col)
+        # Remove any remaining empty cells from the column
+        # and row if there is no more data
+        if self.column_is_empty(column_integer_to_index(col)):
+            for r in [r for r in self.__cells if col in self.__cells[r]]:
+                self._del_cell(r,col)
+        if self.row_is_empty(row):
+            for c in list(self.__cells.get(row,{})):
+                self._del_cell(row,c)
+
+    def _get_cell(self,row,col):
+        """Internal: return the value stored in a cell
+
+        Arguments:
+          row: integer row index (starting from 1)
+          col: integer column index (starting from 0)
+
+        Returns:
+          Value in the cell, or None if the cell is empty.
+        """
+        try:
+            return self.__cells[row][col]
+        except KeyError:
+            return None
+
+    def _set_cell(self,row,col,value):
+        """Internal: store a value in a cell
+
+        Arguments:
+          row: integer row index (starting from 1)
+          col: integer column index (starting from 0)
+          value: value to store
+        """
+        try:
+            cells = self.__cells[row]
+        except KeyError:
+            cells = self.__cells[row] = {}
+            if row > self.__max_row:
+                self.__max_row = row
+        if col not in cells:
+            try:
+                self.__column_counts[col] += 1
+            except KeyError:
+                self.__column_counts[col] = 1
+                if col > self.__max_column:
+                    self.__max_column = col
+        cells[col] = value
+        if self.__formula_values:
+            self._invalidate_formulae(row,col)
+
+    def _del_cell(self,row,col):
+        """Internal: remove a cell
+
+        Arguments:
+          row: integer row index (starting from 1)
+          col: integer column index (starting from 0)
+        """
+        try:
+            cells = self.__cells[row]
+            del(cells[col])
+        except KeyError:
+            return
+        if self.__formula_values:
+            self._invalidate_formulae(row,col)
+        if not cells:
+            del(self.__cells[row])
+            if row == self.__max_row:
+                self.__max_row = max(self.__cells) if self.__cells else 0
+        self.__column_counts[col] -= 1
+        if not self.__column_counts[col]:
+            del(self.__column_counts[col])
+            if col == self.__max_column:
+                self.__max_column = max(self.__column_counts) \
+                                    if self.__column_counts else -1
+
+    def _evaluate_cell(self,row,col):
+        """Internal: return the evaluated value of a cell
+
+        If the cell contains a formula then it is evaluated
+        (see 'eval_formula') and the result is cached until
+        the cell, or any of the cells that it references, is
+        modified. Circular references evaluate to BAD_REF.
+
+        Arguments:
+          row: integer row index (starting from 1)
+          col: integer column index (starting from 0)
+
+        Returns:
+          Result of evaluating the formula, or the value in
+          the cell if it isn't a formula.
+        """
+        key = (row,col)
+        try:
+            return self.__formula_values[key]
         except KeyError:
             pass
-        idx = CellIndex(idx)
-        if self.column_is_empty(idx.column):
-            self.columns.remove(idx.column)
-        if self.row_is_empty(idx.row):
-            self.rows.remove(idx.row)
+        item = self._get_cell(row,col)
+        if not isinstance(item,str) or not item.startswith('='):
+            return item
+        dependents = self.__formula_dependents
+        def lookup(idx):
+            # Record dependency and return rendered value
+            ref = cell_coordinates(idx)
+            try:
+                dependents[ref].add(key)
+            except KeyError:
+                dependents[ref] = set((key,))
+            return self._render_cell(ref[0],ref[1],eval_formulae=True)
+        # Guard against circular references
+        self.__formula_values[key] = BAD_REF
+        value = eval_parsed_formula(parse_formula(item),lookup,
+                                    row=row,col=col)
+        self.__formula_values[key] = value
+        return value
+
+    def _clear_formulae(self):
+        """Internal: discard all cached formula results
+        """
+        self.__formula_values = {}
+        self.__formula_dependents = {}
+
+    def _invalidate_formulae(self,row,col):
+        """Internal: discard cached formula results for a cell
+
+        The cached results of any formulae which depend on
+        the cell are also discarded.
+
+        Arguments:
+          row: integer row index (starting from 1)
+          col: integer column index (starting from 0)
+        """
+        keys = [(row,col)]
+        while keys:
+            key = keys.pop()
+            self.__formula_values.pop(key,None)
+            keys.extend(self.__formula_dependents.pop(key,()))
+
+    def _row_cells(self,row):
+        """Internal: return the cells stored in a row
+
+        Arguments:
+          row: integer row index (starting from 1)
+
+        Returns:
+          Dictionary mapping integer column indices to
+          values (which should not be modified).
+        """
+        return self.__cells.get(row,{})
+
+    def _get_style(self,row,col):
+        """Internal: return the style associated with a cell
+
+        Arguments:
+          row: integer row index (starting from 1)
+          col: integer column index (starting from 0)
+
+        Returns:
+          XLSStyle object, or None if no style is
+          associated with the cell.
+        """
+        return self.__styles.get((row,col))
+
+    def _render_cell(self,row,col,eval_formulae=False,apply_format=False):
+        """Internal: text representation of value stored in a cell
+
+        See 'render_cell' for details.
+
+        Arguments:
+          row: integer row index (starting from 1)
+          col: integer column index (starting from 0)
+          eval_formulae: (optional) if True then evaluate formulae
+          apply_format: (optional) if True then apply number
+            formatting
+        """
+        item = self._get_cell(row,col)
+        if item is None:
+            # Empty item
+            return ''
+        if isinstance(item,str) and item.startswith('='):
+            # Formula
+            if eval_formulae:
+                item = self._evaluate_cell(row,col)
+            else:
+                item = item.replace('?',str(row)).replace(
+                    '#',column_integer_to_index(col))
+        if apply_format:
+            style = self._get_style(row,col)
+            if style is None:
+                style = XLSStyle()
+            try:
+                return format_value(item,style.number_format)
+            except Exception as ex:
+                logging.debug("Exception: %s" % ex)
+                raise ex
+        else:
+            return str(item)
+
+    @property
+    def columns(self):
+        """Return sorted list of indices of columns with data
+
+        """
+        return [column_integer_to_index(col)
+                for col in sorted(self.__column_counts)]
+
+    @property
+    def rows(self):
+        """Return sorted list of indices of rows with data
+
+        """
+        return sorted(self.__cells)
 
     @property
     def last_column(self):
         """Return index of last column with data
 
         """
-        try:
-            return self.columns[-1]
-        except IndexError:
+        if self.__max_column < 0:
             return 'A'
+        return column_integer_to_index(self.__max_column)
 
     @property
     def next_column(self):
         """Index of first empty column after highest index with data
 
         """
-        if len(self.columns):
-            return column_integer_to_index(column_index_to_integer(self.last_column)+1)
-        else:
-            return 'A'
+        return column_integer_to_index(self.__max_column+1)
 
     @property
     def last_row(self):
         """Return index of last row with data
 
         """
-        try:
-            return int(self.rows[-1])
-        except IndexError:
-            return 1
+        return max(self.__max_row,1)
 
     @property
     def next_row(self):
         """Index of first empty row after highest index with data
 
         """
-        if len(self.rows):
-            return self.last_row + 1
-        else:
-            return 1
+        return self.__max_row + 1
 
     def column_is_empty(self,col):
         """Determine whether a column is empty
@@ -489,10 +843,11 @@ class XLSWorkSheet:
         otherwise returns True.
 
         """
-        if col not in self.columns:
+        col = column_index_to_integer(col)
+        if col not in self.__column_counts:
             return True
-        for row in self.rows:
-            if self[cell(col,row)] is not None:
+        for cells in self.__cells.values():
+            if cells.get(col) is not None:
                 return False
         return True
 
@@ -503,10 +858,8 @@ class XLSWorkSheet:
         otherwise returns True.
 
         """
-        if row not in self.rows:
-            return True
-        for col in self.columns:
-            if self[cell(col,row)] is not None:
+        for value in self._row_cells(row).values():
+            if value is not None:
                 return False
         return True
 
@@ -525,9 +878,10 @@ class XLSWorkSheet:
           if no match is found.
 
         """
-        for col in self.columns:
-            if self[cell(col,row)] == s:
-                return col
+        cells = self._row_cells(row)
+        for col in sorted(cells):
+            if cells[col] == s:
+                return column_integer_to_index(col)
         raise LookupError("No match for '%s' in row %d" % (s,row))
 
     def insert_column(self,position,data=None,text=None,fill=None,from_row=None,style=None):
@@ -558,33 +912,19 @@ class XLSWorkSheet:
           The index of the inserted column.
 
         """
-        # Get list of all columns we want to move (in reverse order)
-        columns_to_bump = []
-        try:
-            i = self.columns.index(position)
-            columns_to_bump = self.columns[i:][::-1]
-        except ValueError:
-            for col in self.columns:
-                if cmp_column_indices(col,position) > -1:
-                    i = self.columns.index(col)
-                    columns_to_bump = self.columns[i:][::-1]
-                    break
-        # Shift columns, if required
-        for col in columns_to_bump:
-            next_col = column_integer_to_index(column_index_to_integer(col)+1)
-            for row in range(1,self.last_row+1):
-                # Get cell index
-                idx = cell(col,row)
-                if idx in self.data:
-                    # Copy contents to next column
-                    self.data[cell(next_col,row)] = self.data[idx]
-                    # Remove this cell
-                    del(self.data[idx])
-        # Append a new last column index to list of columns
-        self.columns.append(self.next_column)
-        # Remove the inserted column index from the list of columns
-        if position in self.columns:
-            self.columns.remove(position)
+        # Shift columns at or above the insertion point, if required
+        icol = column_index_to_integer(position)
+        if icol <= self.__max_column:
+            for row,cells in self.__cells.items():
+                if max(cells) >= icol:
+                    self.__cells[row] = dict(
+                        [(col+1 if col >= icol else col,value)
+                         for col,value in cells.items()])
+            self.__column_counts = dict(
+                [(col+1 if col >= icol else col,n)
+                 for col,n in self.__column_counts.items()])
+            self.__max_column += 1
+            self._clear_formulae()
         # Now insert data at the new position
         self.write_column(position,data=data,text=text,fill=fill,from_row=from_row,style=style)
         return position
@@ -651,21 +991,14 @@ class XLSWorkSheet:
         else:
             # Nothing to do
             return
-        # Add column index to list of columns
-        if col not in self.columns:
-            self.columns.append(col)
         # Write data items to cells
+        icol = column_index_to_integer(col)
         row = from_row
         for item in items:
-            self.data[cell(col,row)] = item
-            if row not in self.rows:
-                self.rows.append(row)
+            self._set_cell(row,icol,item)
             if style is not None:
-                self.set_style(style,cell(col,row))
+                self.__styles[(row,icol)] = style
             row += 1
-        # Sort the column and row indices
-        self.columns = sorted(self.columns,key=lambda x: x[::-1])
-        self.rows.sort()
 
     def insert_column_data(self,col,data,start=None,style=None):
         """Insert list of data into a column
@@ -693,10 +1026,11 @@ class XLSWorkSheet:
             i = 1
         else:
             i = int(start)
+        icol = column_index_to_integer(col)
         for item in data:
-            self[cell(col,i)] = item
+            self._set_cell(i,icol,item)
             if style is not None:
-                self.set_style(style,cell(col,i))
+                self.__styles[(i,icol)] = style
             i += 1
 
     def rowof(self,s,column='A'):
@@ -716,8 +1050,9 @@ class XLSWorkSheet:
         """
         # Get row where cell in row matches 'name'
         # i.e. look up a row index
+        icol = column_index_to_integer(column)
         for row in range(1,self.last_row+1):
-            if self[cell(column,row)] == s:
+            if self._get_cell(row,icol) == s:
                 return row
         raise LookupError("No match for '%s' in column '%s'" %
                           (s,column))
@@ -750,27 +1085,13 @@ class XLSWorkSheet:
           The index of the inserted row.
 
         """
-        # Create a new row before the specified row
-        # All rows above it move up one position
-        # 'New' row position is actually 'before_row'
-        # Bump all rows up one position
-        # Get list of all rows we want to move (in reverse order)
-        row_list = list(range(self.last_row,position-1,-1))
-        for row in row_list:
-            next_row = row + 1
-            for col in self.columns:
-                # Get cell index
-                idx = cell(col,row)
-                if idx in self.data:
-                    # Copy contents to next row
-                    self.data[cell(col,next_row)] = self.data[idx]
-                    # Remove this cell
-                    del(self.data[idx])
-        # Add a new last row index to the list of rows
-        self.rows.append(self.next_row)
-        # Remove the inserted row index from the list
-        if position in self.rows:
-            self.rows.remove(position)
+        # Bump all rows at or above the insertion point up one
+        # position, if required
+        if position <= self.__max_row:
+            self.__cells = dict([(row+1 if row >= position else row,cells)
+                                 for row,cells in self.__cells.items()])
+            self.__max_row += 1
+            self._clear_formulae()
         # Now insert data at the new position
         self.write_row(position,data=data,text=text,fill=fill,from_column=from_column,style=style)
         return position
@@ -827,31 +1148,23 @@ class XLSWorkSheet:
         # Set initial column
         if from_column is None:
             from_column = 'A'
+        icol = column_index_to_integer(from_column)
         # Write in data from a list
         if data is not None:
             items = data
         elif text is not None:
             items = text.split('\t')
         elif fill is not None:
-            items = [fill for i in range(from_column,self.last_column+1)]
+            items = [fill for i in range(icol,self.__max_column+1)]
         else:
             # Nothing to do
             return
-        # Add row index to list of rows
-        if row not in self.rows:
-            self.rows.append(row)
         # Write data items to cells
-        col = from_column
         for item in items:
-            self.data[cell(col,row)] = item
-            if col not in self.columns:
-                self.columns.append(col)
+            self._set_cell(row,icol,item)
             if style is not None:
-                self.set_style(style,cell(col,row))
-            col = incr_col(col)
-        # Sort the column and row indices
-        self.columns = sorted(self.columns,key=lambda x: x[::-1])
-        self.rows.sort()
+                self.__styles[(row,icol)] = style
+            icol += 1
 
     def insert_row_data(self,row,data,start=None,style=None):
         """Insert list of data into a row
@@ -879,10 +1192,11 @@ class XLSWorkSheet:
             i = column_index_to_integer('A')
         else:
             i = column_index_to_integer(start)
+        row = int(row)
         for item in data:
-            self[cell(column_integer_to_index(i),row)] = item
+            self._set_cell(row,i,item)
             if style is not None:
-                self.set_style(style,cell(column_integer_to_index(i),row))
+                self.__styles[(row,i)] = style
             i += 1
 
     def insert_block_data(self,data,col=None,row=None,style=None):
@@ -917,12 +1231,11 @@ class XLSWorkSheet:
             else:
                 i = column_index_to_integer(col)
             for item in line.strip('\n').split('\t'):
-                icol = column_integer_to_index(i)
                 if not item:
                     item = None
-                self[cell(icol,j)] = item
+                self._set_cell(j,i,item)
                 if style is not None:
-                    self.set_style(style,cell(icol,j))
+                    self.__styles[(j,i)] = style
                 i += 1
             j += 1
 
@@ -948,7 +1261,7 @@ class XLSWorkSheet:
 
         """
         # Fill a column with the same data item
-        if (start is None or end is None) and (not self.columns and not self.rows):
+        if (start is None or end is None) and not self.__cells:
             # Empty sheet, nothing to fill
             return
         if start is None:
@@ -959,14 +1272,15 @@ class XLSWorkSheet:
             j = self.last_row
         else:
             j = int(end)
+        icol = column_index_to_integer(column)
         for row in range(i,j+1):
-            self[cell(column,row)] = item
+            self._set_cell(row,icol,item)
             if style is not None:
-                self.set_style(style,cell(column,row))
+                self.__styles[(row,icol)] = style
 
     def set_style(self,cell_style,start,end=None):
         """Associate style information with one or more cells
-        
+
         Associates a specified XLSStyle object with a single
         cell, or with a range of cells (if a second cell index
         is supplied).
@@ -980,18 +1294,18 @@ class XLSWorkSheet:
           end: (optional) second cell index; together with
             'start' this defines a range of cells to associate
             the style with.
-        
+
         """
+        start_row,start_col = cell_coordinates(start)
         if end is None:
             # Specified a single cell target
-            self.styles[start] = cell_style
+            self.__styles[(start_row,start_col)] = cell_style
             return
         # Specify a range of cells
-        start_cell = CellIndex(start)
-        end_cell = CellIndex(end)
-        for col in ColumnRange(start_cell.column,end_cell.column):
-            for row in range(start_cell.row,end_cell.row+1):
-                self.styles[cell(col,row)] = cell_style
+        end_row,end_col = cell_coordinates(end)
+        for col in range(start_col,end_col+1):
+            for row in range(start_row,end_row+1):
+                self.__styles[(row,col)] = cell_style
 
     def get_style(self,idx):
         """Return the style information associated with a cell
@@ -1010,10 +1324,13 @@ class XLSWorkSheet:
 
         """
         try:
-            return self.styles[idx]
-        except KeyError:
+            style = self._get_style(*cell_coordinates(idx))
+        except ValueError:
+            style = None
+        if style is None:
             # Return empty style object
             return XLSStyle()
+        return style
 
     def render_cell(self,idx,eval_formulae=False,apply_format=False):
         """Text representation of value stored in a cell
@@ -1037,31 +1354,13 @@ class XLSWorkSheet:
           String representing the cell contents.
 
         """
-        item = self[idx]
-        if item is None:
-            # Empty item
-            return ''
         try:
-            if item.startswith('='):
-                # Formula
-                item = item.replace('?',
-                                    str(CellIndex(idx).row)).replace('#',
-                                                                     str(CellIndex(idx).column))
-                if eval_formulae:
-                    logging.debug("Evaluating %s from %s" % (item,idx))
-                    item = eval_formula(item,self)
-        except AttributeError:
-            pass
-        if apply_format:
-            style = self.get_style(idx)
-            if style is not None:
-                try:
-                    return format_value(item,style.number_format)
-                except Exception as ex:
-                    logging.debug("Exception: %s" % ex)
-                    raise ex
-        else:
-            return str(item)
+            row,col = cell_coordinates(idx)
+        except ValueError:
+            return ''
+        return self._render_cell(row,col,
+                                 eval_formulae=eval_formulae,
+                                 apply_format=apply_format)
 
     def render_as_text(self,include_columns_and_rows=False,
                        include_styles=False,
@@ -1100,29 +1399,32 @@ class XLSWorkSheet:
         """
         # Output worksheet as text (i.e. string)
         if start is None:
-            start = CellIndex('A1')
+            start_row,start_col = (1,0)
         else:
-            start = CellIndex(start)
+            start_row,start_col = cell_coordinates(start)
         if end is None:
-            end = CellIndex(cell(self.last_column,self.last_row))
+            end_row,end_col = (self.last_row,max(self.__max_column,0))
         else:
-            end = CellIndex(end)
+            end_row,end_col = cell_coordinates(end)
+        columns = range(start_col,end_col+1)
         text = []
         if include_columns_and_rows:
             line = ['']
-            for col in ColumnRange(start.column,end.column):
-                line.append(col)
+            for col in columns:
+                line.append(column_integer_to_index(col))
             text.append('\t'.join(line))
-        for row in range(start.row,end.row+1):
+        for row in range(start_row,end_row+1):
             line = []
             if include_columns_and_rows:
                 line.append(u'%s' % row)
-            for col in ColumnRange(start.column,end.column):
-                value = self.render_cell(cell(col,row),
-                                         eval_formulae=eval_formulae,
-                                         apply_format=apply_format)
+            for col in columns:
+                value = self._render_cell(row,col,
+                                          eval_formulae=eval_formulae,
+                                          apply_format=apply_format)
                 if include_styles:
-                    value = self.get_style(cell(col,row)).style(value)
+                    style = self._get_style(row,col)
+                    if style is not None:
+                        value = style.style(value)
                 line.append(u"%s" % value)
             text.append('\t'.join(line))
         return '\n'.join(text)
@@ -1360,7 +1662,7 @@ class CellIndex:
         """
         self.idx = str(idx)
         try:
-            r = re.compile(r'^([A-Z]+)([0-9]+)$').match(idx)
+            r = CELL_INDEX_PATTERN.match(idx)
             self.column = r.group(1)
             self.row = int(r.group(2))
         except:
@@ -1461,6 +1763,22 @@ def cell(col,row):
     """
     return "%s%s" % (col,row)
 
+def cell_coordinates(idx):
+    """Return integer row and column for XLS cell index
+
+    E.g. cell_coordinates('B3') returns (3,1)
+
+    Rows are numbered from 1 and columns from zero (so that
+    the column is consistent with 'column_index_to_integer').
+
+    Raises ValueError if 'idx' is not a full cell index.
+
+    """
+    r = CELL_INDEX_PATTERN.match(str(idx))
+    if r is None:
+        raise ValueError("Invalid cell index: '%s'" % idx)
+    return (int(r.group(2)),column_index_to_integer(r.group(1)))
+
 def incr_col(col,incr=1):
     """Return column index incremented by specific number of positions
 
@@ -1472,6 +1790,7 @@ def incr_col(col,incr=1):
     """
     return column_integer_to_index(column_index_to_integer(col)+incr)
 
+@functools.lru_cache(maxsize=None)
 def column_index_to_integer(col):
     """Convert XLS-style column index into equivalent integer
 
@@ -1489,6 +1808,7 @@ def column_index_to_integer(col):
         i += 1
     return idx-1
 
+@functools.lru_cache(maxsize=None)
 def column_integer_to_index(idx):
     """Convert integer column index to XLS-style equivalent
 
@@ -1525,41 +1845,75 @@ def eval_formula(item,worksheet):
 
     """
     # Evaluate a formula from a cell item and return the computed value
-    logging.debug("Item is %s" % item)
+    if not item.startswith('='):
+        return item
+    return eval_parsed_formula(
+        parse_formula(item),
+        lambda idx: worksheet.render_cell(idx,eval_formulae=True))
+
+@functools.lru_cache(maxsize=4096)
+def parse_formula(item):
+    """Split a formula into arguments and operators
+
+    E.g. parse_formula('=A?+B?*2') returns
+
+    (('A?','+'),('B?','*'),('2',None))
+
+    i.e. a tuple of (argument,operator) pairs, where the
+    operator following the final argument is None.
+
+    Results are cached, so that formulae which are repeated
+    across rows or columns (using the '?' and '#' wildcards)
+    are only parsed once.
+
+    """
     if item.startswith('='):
         item = item[1:]
-        logging.debug("Item reset to %s" % item)
-    else:
-        logging.debug("Returning %s" % item)
-        return item
-    ops = "+-/*"
-    formula = ''
-    arg = ''
-    nargs = 0
-    for c in item:
-        logging.debug(c)
-        if c not in ops:
-            arg += c
-        else:
-            logging.debug("-> %s" % arg)
-            if CellIndex(arg).is_full:
-                arg = worksheet.render_cell(arg,eval_formulae=True)
-            logging.debug("-> %s" % arg)
-            try:
-                arg = convert_to_number(arg) 
-                if c == '/':
-                    arg = float(arg)
-            except ValueError:
-                # Failed to convert to number
-                logging.debug("Error converting %s to number" % arg)
-                return BAD_REF
-            formula = formula + str(arg) + c
-            nargs += 1
-            arg = ''
-            logging.debug("-> %s" % formula)
-    # End of string
-    if CellIndex(arg).is_full:
-        arg = worksheet.render_cell(arg,eval_formulae=True)
+    tokens = re.split(r'([+\-/*])',item)
+    return tuple(zip(tokens[0::2],tokens[1::2]+[None]))
+
+def eval_parsed_formula(formula,lookup,row=None,col=None):
+    """Evaluate a formula which has been split by 'parse_formula'
+
+    Arguments:
+      formula: tuple of (argument,operator) pairs returned
+        by 'parse_formula'
+      lookup: function which returns the rendered value of
+        a cell given its index (e.g. 'A1')
+      row: (optional) integer row index to substitute for
+        any '?' wildcards in the arguments
+      col: (optional) integer column index (starting from
+        zero) to substitute for any '#' wildcards
+
+    Returns:
+      Result of the evaluation (see 'eval_formula').
+
+    """
+    if row is not None:
+        row = str(row)
+    if col is not None:
+        col = column_integer_to_index(col)
+    expr = ''
+    nargs = len(formula) - 1
+    for arg,op in formula:
+        if row is not None:
+            arg = arg.replace('?',row)
+        if col is not None:
+            arg = arg.replace('#',col)
+        if CELL_INDEX_PATTERN.match(arg):
+            arg = lookup(arg)
+        if op is None:
+            # End of formula
+            break
+        try:
+            arg = convert_to_number(arg)
+            if op == '/':
+                arg = float(arg)
+        except ValueError:
+            # Failed to convert to number
+            logging.debug("Error converting %s to number" % arg)
+            return BAD_REF
+        expr = expr + str(arg) + op
     if nargs:
         try:
             arg = convert_to_number(arg)
@@ -1573,17 +1927,237 @@ def eval_formula(item,worksheet):
             return convert_to_number(arg)
         except ValueError:
             return arg
-    formula = formula + str(arg)
-    logging.debug("Formula '%s'" % formula)
-    if re.compile(r"^[0-9+\-\/\*]+").match(formula):
+    expr = expr + str(arg)
+    if re.compile(r"^[0-9+\-\/\*]+").match(expr):
         try:
-            item = eval(formula)
+            return eval(expr)
         except Exception as ex:
-            logging.debug("Error processing %s: %s" % (item,ex))
+            logging.debug("Error processing %s: %s" % (expr,ex))
             return BAD_REF
-    else:
-        item = formula
-    return item
+    return expr
+
+def write_table(xlsx,data,title,header=None,styles=None,types=None,
+                header_style=None,freeze_header=True,limits=None,
+                formats=None):
+    """Stream a table of data directly to an XLSX workbook
+
+    The rows of data are written one at a time to one or
+    more new worksheets in an XlsxWriter Workbook, without
+    being copied into an XLSWorkSheet first, e.g.
+
+    >>> xlsx = xlsxwriter.Workbook('peaks.xlsx',
+    ...                            { 'constant_memory': True })
+    >>> write_table(xlsx,TabFileIterator('peaks.txt'),'Peaks',
+    ...             types={ 'start': int, 'end': int })
+    >>> xlsx.close()
+
+    'data' can be a TabFile, TabFileIterator, or any other
+    iterable which supplies each row as a sequence of values.
+    If 'header' isn't supplied then the column names are
+    taken from the 'header' method of 'data' (if it has one).
+
+    'types' and 'styles' can be either lists (with one item
+    for each column, or None), or dictionaries where the keys
+    are column names or integer column indices (starting from
+    zero). Each type is a function which is used to convert
+    the values in the column (e.g. int or float); if the
+    conversion fails then the original value is kept.
+
+    Values are written according to their Python type
+    (numbers as numbers, everything else as strings) rather
+    than by guessing from their contents, so string values
+    such as '12' are only written as numbers if a type is
+    specified for their column. String values which are
+    longer than the cell length limit are truncated.
+
+    If there are more rows than will fit into a single
+    worksheet then additional worksheets are created
+    automatically, with the header row repeated at the top
+    of each.
+
+    Arguments:
+      xlsx: xlsxwriter.Workbook to write the table to
+      data: TabFile, TabFileIterator or other iterable
+        which supplies the rows of data
+      title: title for the worksheet (additional worksheets
+        have '(2)', '(3)' etc appended)
+      header: optional, list of column names
+      styles: optional, XLSStyles to apply to each column
+      types: optional, types to convert the values in each
+        column to
+      header_style: optional, XLSStyle for the header row
+      freeze_header: if True (the default) then freeze the
+        header row of each worksheet
+      limits: optional, class defining the row and cell
+        length limits (defaults to XLSXLimits)
+      formats: optional, XLSXFormats object to use for
+        creating Formats for the styles
+
+    Returns:
+      List of the titles of the worksheets that were written.
+
+    """
+    if limits is None:
+        limits = XLSXLimits
+    if formats is None:
+        formats = XLSXFormats(xlsx)
+    header = _table_header(data,header)
+    styles = _table_column_settings(styles,header)
+    types = _table_column_settings(types,header)
+    header_fmt = formats.get(header_style)
+    col_fmts = dict([(col,formats.get(styles[col])) for col in styles])
+    default_min_col_width = 7
+    rows = _table_rows(data,types,limits)
+    titles = []
+    for title,rows in _split_table(rows,title,bool(header),limits):
+        ws = xlsx.add_worksheet(title)
+        titles.append(title)
+        max_widths = {}
+        row = 0
+        if header:
+            ws.write_row(0,0,header,header_fmt)
+            for col,value in enumerate(header):
+                max_widths[col] = len(value)
+            if freeze_header:
+                ws.freeze_panes(1,0)
+            row = 1
+        for values in rows:
+            for col,value in enumerate(values):
+                xlsx_fmt = col_fmts.get(col)
+                if value is None or value == '':
+                    if xlsx_fmt is not None:
+                        ws.write_blank(row,col,None,xlsx_fmt)
+                    continue
+                if isinstance(value,(int,float)) and \
+                   not isinstance(value,bool):
+                    ws.write_number(row,col,value,xlsx_fmt)
+                else:
+                    value = str(value)
+                    ws.write_string(row,col,value,xlsx_fmt)
+                col_width = len(str(value))
+                if col_width > max_widths.get(col,0):
+                    max_widths[col] = col_width
+            row += 1
+        # Set the column widths
+        for col in max_widths:
+            ws.set_column(col,col,
+                          max(max_widths[col],default_min_col_width)*1.2)
+    return titles
+
+def _table_header(data,header=None):
+    """Internal: return the list of column names for a table
+    """
+    if header is None:
+        try:
+            header = data.header()
+        except AttributeError:
+            pass
+    if not header:
+        return []
+    return [str(name) for name in header]
+
+def _table_column_settings(settings,header):
+    """Internal: map per-column settings for a table to column indices
+
+    'settings' can be a list (one item per column) or a
+    dictionary keyed by column name or integer index.
+    Returns a dictionary keyed by integer column index.
+    """
+    if not settings:
+        return {}
+    if not isinstance(settings,dict):
+        return dict([(col,setting) for col,setting in enumerate(settings)
+                     if setting is not None])
+    resolved = {}
+    for key in settings:
+        col = key
+        if not isinstance(col,int):
+            try:
+                col = header.index(key)
+            except ValueError:
+                raise KeyError("column '%s' not found" % key)
+        if settings[key] is not None:
+            resolved[col] = settings[key]
+    return resolved
+
+def _table_rows(data,types,limits):
+    """Internal: iterate over the rows of a table as lists of values
+
+    Values are converted using the functions in 'types' (a
+    dictionary keyed by column index) and strings longer
+    than the cell length limit are truncated.
+    """
+    max_len = limits.MAX_LEN_WORKSHEET_CELL_VALUE
+    truncated = False
+    for line in data:
+        try:
+            values = list(line.data)
+        except AttributeError:
+            values = list(line)
+        for col in types:
+            try:
+                values[col] = types[col](values[col])
+            except (ValueError,TypeError,IndexError):
+                pass
+        for col,value in enumerate(values):
+            if isinstance(value,str) and len(value) > max_len:
+                if not truncated:
+                    logging.warning("Truncating values longer than %d "
+                                    "characters" % max_len)
+                    truncated = True
+                values[col] = value[:max_len]
+        yield values
+
+def _split_table(rows,title,has_header,limits):
+    """Internal: split the rows of a table between worksheets
+
+    Yields a (title,rows) tuple for each worksheet, where
+    'rows' is an iterator over the rows that will fit into
+    that sheet. At least one worksheet is always yielded.
+    """
+    max_title_len = limits.MAX_LEN_WORKSHEET_TITLE
+    nrows = limits.MAX_NUMBER_ROWS_PER_WORKSHEET
+    if has_header:
+        nrows -= 1
+    rows = iter(rows)
+    sheet_title = title[:max_title_len]
+    sheet_number = 1
+    while True:
+        sheet_rows = itertools.islice(rows,nrows)
+        yield (sheet_title,sheet_rows)
+        # Consume any rows that weren't used
+        for row in sheet_rows:
+            pass
+        try:
+            first_row = next(rows)
+        except StopIteration:
+            return
+        rows = itertools.chain([first_row],rows)
+        sheet_number += 1
+        sheet_title = "%s(%d)" % (title[:max_title_len-4],sheet_number)
+        logging.warning("Making additional data sheet '%s'" % sheet_title)
+
+def convert_to_xlsx_value(value):
+    """Convert a cell value for writing to an XLSX file
+
+    Integer and float values are returned unchanged; any
+    other value is converted to a string, which is then
+    converted to an integer or float if possible.
+
+    """
+    if isinstance(value,(int,float)) and not isinstance(value,bool):
+        return value
+    value = str(value)
+    try:
+        # Try integer
+        return int(value)
+    except ValueError:
+        # Not an integer, try float
+        try:
+            return float(value)
+        except ValueError:
+            # Not a float either
+            return value
 
 def convert_to_number(s):
     """Convert a number to float or int as appropriate
@@ -4,8 +4,68 @@
 
 import unittest
 import io
+import os
+import shutil
+import tempfile
 from bcftbx.cli.bowtie_mapping_stats import BowtieMappingStats
 
+BOWTIE1_LOG = u"""JP01
+Time loading reference: 00:00:01
+Time loading forward index: 00:00:00
+Time loading mirror index: 00:00:02
+Seeded quality full-index search: 00:10:20
+# reads processed: 39808407
+# reads with at least one reported alignment: 2737588 (6.88%)
+# reads that failed to align: 33721722 (84.71%)
+# reads with alignments suppressed due to -m: 3349097 (8.41%)
+Reported 2737588 alignments to 1 output stream(s)
+Time searching: 00:10:27
+Overall time: 00:10:27
+JP02
+Time loading reference: 00:00:00
+Time loading forward index: 00:00:00
+Time loading mirror index: 00:00:00
+Seeded quality full-index search: 00:09:17
+# reads processed: 34455085
+# reads with at least one reported alignment: 4087382 (11.86%)
+# reads that failed to align: 25744573 (74.72%)
+# reads with alignments suppressed due to -m: 4623130 (13.42%)
+Reported 4087382 alignments to 1 output stream(s)
+Time searching: 00:09:18
+Overall time: 00:09:18
+"""
+
+BOWTIE2_SE_LOG = u"""Multiseed full-index search: 00:20:27
+117279034 reads; of these:
+  117279034 (100.00%) were unpaired; of these:
+    1937614 (1.65%) aligned 0 times
+    115341420 (98.35%) aligned exactly 1 time
+    0 (0.00%) aligned >1 times
+98.35% overall alignment rate
+Time searching: 00:21:01
+Overall time: 00:21:02
+"""
+
+BOWTIE2_PE_LOG = u"""Multiseed full-index search: 01:45:33
+85570063 reads; of these:
+  85570063 (100.00%) were paired; of these:
+    56052776 (65.51%) aligned concordantly 0 times
+    22792207 (26.64%) aligned concordantly exactly 1 time
+    6725080 (7.86%) aligned concordantly >1 times
+    ----
+    56052776 pairs aligned concordantly 0 times; of these:
+      6635276 (11.84%) aligned discordantly 1 time
+    ----
+    49417500 pairs aligned 0 times concordantly or discordantly; of these:
+      98835000 mates make up the pairs; of these:
+        93969575 (95.08%) aligned 0 times
+        1622693 (1.64%) aligned exactly 1 time
+        3242732 (3.28%) aligned >1 times
+45.09% overall alignment rate
+Time searching: 01:46:03
+Overall time: 01:46:03
+"""
+
 class TestBowtieMappingStats(unittest.TestCase):
     def test_bowtie1_single_sample(self):
         """Process output from bowtie for single sample
@@ -291,3 +351,100 @@ total mapped reads	29517287
 uniquely mapped	22792207
   % of all reads	26.6%
   % of mapped reads	77.2%""")
+
+class TestBowtieMappingStatsAddLogs(unittest.TestCase):
+    def setUp(self):
+        self.wd = tempfile.mkdtemp()
+        self.logs = []
+        for name,data in (('log1',BOWTIE1_LOG),
+                          ('log2',BOWTIE2_SE_LOG),
+                          ('log3',BOWTIE2_PE_LOG)):
+            self.logs.append(self._write_log(name,data))
+
+    def tearDown(self):
+        shutil.rmtree(self.wd)
+
+    def _write_log(self,name,data):
+        log = os.path.join(self.wd,name)
+        with io.open(log,'wt') as fp:
+            fp.write(data)
+        return log
+
+    def _check_samples(self,stats):
+        expected = [('1','log1',39808407,33721722,2737588,'1',False),
+                    ('2','log1',34455085,25744573,4087382,'1',False),
+                    ('3','log2',117279034,1937614,115341420,'2',False),
+                    ('4','log3',85570063,56052776,22792207,'2',True)]
+        self.assertEqual(stats.n_samples,len(expected))
+        for sample,values in zip(stats.samples,expected):
+            self.assertEqual((sample.name,
+                              sample.filen,
+                              sample.total_reads,
+                              sample.didnt_align,
+                              sample.uniquely_mapped,
+                              sample.bowtie_version,
+                              sample.paired_end),values)
+
+    def test_add_logs(self):
+        """Process output from multiple bowtie and bowtie2 logs
+        """
+        stats = BowtieMappingStats()
+        self.assertEqual(stats.add_logs(self.logs),[2,1,1])
+        self.assertEqual(stats.files,self.logs)
+        self.assertEqual(stats.cached_files,[])
+        self._check_samples(stats)
+
+    def test_add_logs_multiple_processes(self):
+        """Process output from multiple logs using multiple processes
+        """
+        stats = BowtieMappingStats()
+        self.assertEqual(stats.add_logs(self.logs,nprocs=3),[2,1,1])
+        self.assertEqual(stats.files,self.logs)
+        self._check_samples(stats)
+        # Outputs are the same as for a single process
+        stats1 = BowtieMappingStats()
+        stats1.add_logs(self.logs)
+        self.assertEqual(stats.tab_file(),stats1.tab_file())
+
+    def test_add_logs_with_cache(self):
+        """Process output from multiple logs using cached statistics
+        """
+        cache_file = os.path.join(self.wd,"stats.cache")
+        # First run populates the cache
+        stats = BowtieMappingStats()
+        stats.add_logs(self.logs,cache_file=cache_file)
+        self.assertTrue(os.path.exists(cache_file))
+        self.assertEqual(stats.cached_files,[])
+        self._check_samples(stats)
+        # Second run uses cached data for all logs
+        stats = BowtieMappingStats()
+        self.assertEqual(stats.add_logs(self.logs,nprocs=2,
+                                        cache_file=cache_file),[2,1,1])
+        self.assertEqual(stats.cached_files,self.logs)
+        self._check_samples(stats)
+        # Update one of the logs
+        self._write_log('log2',BOWTIE2_PE_LOG)
+        st = os.stat(self.logs[1])
+        os.utime(self.logs[1],ns=(st.st_atime_ns,st.st_mtime_ns+10**9))
+        stats = BowtieMappingStats()
+        self.assertEqual(stats.add_logs(self.logs,cache_file=cache_file),
+                         [2,1,1])
+        self.assertEqual(stats.cached_files,[self.logs[0],self.logs[2]])
+        self.assertEqual(stats.samples[2].total_reads,85570063)
+        self.assertTrue(stats.samples[2].paired_end)
+        self.assertEqual([s.name for s in stats.samples],['1','2','3','4'])
+
+    def test_add_logs_with_bad_cache(self):
+        """Process output from multiple logs ignoring unreadable cache
+        """
+        cache_file = os.path.join(self.wd,"stats.cache")
+        with io.open(cache_file,'wt') as fp:
+            fp.write(u"not a cache")
+        stats = BowtieMappingStats()
+        stats.add_logs(self.logs,cache_file=cache_file)
+        self.assertEqual(stats.cached_files,[])
+        self._check_samples(stats)
+        # Cache has been overwritten
+        stats = BowtieMappingStats()
+        stats.add_logs(self.logs,cache_file=cache_file)
+        self.assertEqual(stats.cached_files,self.logs)
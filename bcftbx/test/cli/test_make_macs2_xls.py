@@ -4,10 +4,17 @@
 
 import unittest
 import io
+import os
+import shutil
+import tempfile
+import gzip
+import xlrd
 from bcftbx.cli.make_macs2_xls import MacsXLS
 from bcftbx.cli.make_macs2_xls import chunk
 from bcftbx.cli.make_macs2_xls import bed_for_macs2
 from bcftbx.cli.make_macs2_xls import xls_for_macs2
+from bcftbx.cli.make_macs2_xls import stream_macs2_xls
+from bcftbx.ngsutils import tabix_fetch
 
 MACS140beta_data = u"""# This file is generated by MACS version 1.4.0beta
 # ARGUMENTS LIST:
@@ -569,6 +576,152 @@ class TestBedForMacs2Function(unittest.TestCase):
                           bed_for_macs2,
                           macsxls)
 
+class TestStreamMacs2XlsFunction(unittest.TestCase):
+
+    def setUp(self):
+        self.wd = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.wd)
+
+    def _write_macs_file(self,data):
+        macs_file = os.path.join(self.wd,"macs2.xls")
+        with io.open(macs_file,'wt') as fp:
+            fp.write(data)
+        return macs_file
+
+    def test_macsxls_header_only(self):
+        """Load only header data for MACS2.0.10.20131216 data
+
+        """
+        macsxls = MacsXLS(fp=io.StringIO(MACS2010_20131216_data),
+                          header_only=True)
+        self.assertEqual(macsxls.macs_version,"2.0.10.20131216")
+        self.assertEqual(macsxls.columns,['order','chr','start','end',
+                                          'length','abs_summit','pileup',
+                                          '-log10(pvalue)','fold_enrichment',
+                                          '-log10(qvalue)','name'])
+        self.assertEqual(len(macsxls.data),0)
+
+    def test_stream_macs2_xls_with_2010_20131216(self):
+        """Stream MACS2.0.10.20131216 data to XLS and BED files
+
+        """
+        macs_file = self._write_macs_file(MACS2010_20131216_data)
+        xls_out = os.path.join(self.wd,"macs2.xls.xls")
+        bed_out = os.path.join(self.wd,"macs2.xls.bed")
+        self.assertEqual(stream_macs2_xls(macs_file,xls_out,
+                                          xls_format="xls",
+                                          bed_out=bed_out,
+                                          row_limit=4),5)
+        xls = xlrd.open_workbook(xls_out)
+        self.assertEqual(xls.sheet_names(),
+                         ['NW-H3K27ac-chIP_vs_input_E13.5_',
+                          'NW-H3K27ac-chIP_vs_input_E1(2)',
+                          'Notes',
+                          'Legends'])
+        # Check header and first line of data in first sheet
+        data = xls.sheet_by_index(0)
+        self.assertEqual(data.nrows,4)
+        self.assertEqual(data.row_values(0),
+                         ['#order','chr','start','end',
+                          'chr','abs_summit-100','abs_summit+100',
+                          'chr','summit-1','summit',
+                          'length','abs_summit','pileup','-log10(pvalue)',
+                          'fold_enrichment','-log10(qvalue)','name'])
+        self.assertEqual(data.row_values(1)[:16],
+                         [1,'chr1',6214126,6215036,
+                          'chr1',6214692,6214892,
+                          'chr1',6214791,6214792,
+                          911,6214792,56,47.04091,12.64636,43.11036])
+        # Check order of fold enrichment column over both sheets
+        data2 = xls.sheet_by_index(1)
+        self.assertEqual(data2.nrows,3)
+        self.assertEqual(data.col_values(0)[1:]+data2.col_values(0)[1:],
+                         [1,2,3,4,5])
+        self.assertEqual(data.col_values(14)[1:]+data2.col_values(14)[1:],
+                         [12.64636,7.09971,6.65598,4.88105,4.21545])
+        # Check legends
+        legends = xls.sheet_by_name('Legends')
+        self.assertEqual(legends.col_values(0),
+                         [x.lstrip('#') for x in data.row_values(0)])
+        # Check BED file
+        with io.open(bed_out,'rt') as fp:
+            self.assertEqual(fp.read(),
+                             "#chr\tabs_summit-100\tabs_summit+100\n"
+                             "chr1\t6214692\t6214892\n"
+                             "chr1\t4785878\t4786078\n"
+                             "chr1\t4857304\t4857504\n"
+                             "chr1\t5083353\t5083553\n"
+                             "chr1\t4858323\t4858523\n")
+
+    def test_stream_macs2_xls_with_trailing_blank_lines(self):
+        """Stream MACS2.0.10.20131216 data with trailing blank lines
+
+        """
+        macs_file = self._write_macs_file(MACS2010_20131216_data +
+                                          "\n\n")
+        xls_out = os.path.join(self.wd,"macs2.xls.xls")
+        bed_out = os.path.join(self.wd,"macs2.xls.bed")
+        self.assertEqual(stream_macs2_xls(macs_file,xls_out,
+                                          xls_format="xls",
+                                          bed_out=bed_out),5)
+        xls = xlrd.open_workbook(xls_out)
+        data = xls.sheet_by_index(0)
+        self.assertEqual(data.nrows,6)
+        self.assertEqual(data.col_values(14)[1:],
+                         [12.64636,7.09971,6.65598,4.88105,4.21545])
+        with io.open(bed_out,'rt') as fp:
+            self.assertEqual(len(fp.read().rstrip('\n').split('\n')),6)
+
+    def test_stream_macs2_xls_with_2010_20131216_bgzip(self):
+        """Stream MACS2.0.10.20131216 data to indexed BED file
+
+        """
+        macs_file = self._write_macs_file(MACS2010_20131216_data)
+        xlsx_out = os.path.join(self.wd,"macs2.xls.xlsx")
+        bed_out = os.path.join(self.wd,"macs2.xls.bed.gz")
+        self.assertEqual(stream_macs2_xls(macs_file,xlsx_out,
+                                          bed_out=bed_out,
+                                          bed_format="bgzip"),5)
+        self.assertTrue(os.path.isfile(bed_out + ".tbi"))
+        # BED file is sorted on position
+        with gzip.open(bed_out,'rt') as fp:
+            self.assertEqual(fp.read(),
+                             "#chr\tabs_summit-100\tabs_summit+100\n"
+                             "chr1\t4785878\t4786078\n"
+                             "chr1\t4857304\t4857504\n"
+                             "chr1\t4858323\t4858523\n"
+                             "chr1\t5083353\t5083553\n"
+                             "chr1\t6214692\t6214892\n")
+        self.assertEqual(list(tabix_fetch(bed_out,'chr1',4857000,4858400)),
+                         ["chr1\t4857304\t4857504",
+                          "chr1\t4858323\t4858523"])
+
+    def test_stream_macs2_xls_with_2010_20131216_broad(self):
+        """Stream MACS2.0.10.20131216 --broad data to XLSX file
+
+        """
+        macs_file = self._write_macs_file(MACS2010_20131216_broad_data)
+        xlsx_out = os.path.join(self.wd,"macs2.xls.xlsx")
+        self.assertEqual(stream_macs2_xls(macs_file,xlsx_out),5)
+        self.assertTrue(os.path.isfile(xlsx_out))
+        # BED output not possible
+        self.assertRaises(Exception,
+                          stream_macs2_xls,
+                          macs_file,
+                          xlsx_out,
+                          bed_out=os.path.join(self.wd,"macs2.xls.bed"))
+
+    def test_stream_macs2_xls_with_140beta(self):
+        """Check 'stream_macs2_xls' raises exception for MACS14 data
+        """
+        macs_file = self._write_macs_file(MACS140beta_data)
+        self.assertRaises(Exception,
+                          stream_macs2_xls,
+                          macs_file,
+                          os.path.join(self.wd,"macs14.xls.xlsx"))
+
 class TestChunkFunction(unittest.TestCase):
     def test_chunk_no_delimiter(self):
         """Test chunk function with no delimiter
@@ -8,8 +8,11 @@ from bcftbx.mockslurm import setup_mock_slurm
 from bcftbx.mockslurm import MockSlurm
 import bcftbx.utils
 import unittest
+import sys
 import tempfile
 import time
+import threading
+import asyncio
 import shutil
 
 class TestSimpleJobRunner(unittest.TestCase):
@@ -199,6 +202,59 @@ class TestSimpleJobRunner(unittest.TestCase):
         with io.open(runner.logFile(jobid),'rt') as fp:
             self.assertEqual(u"8\n",fp.read())
 
+    def test_simple_job_runner_wait_for_completion(self):
+        """Test SimpleJobRunner 'wait_for_completion' returns when job ends
+        """
+        runner = SimpleJobRunner()
+        jobid = self.run_job(runner,'test',self.working_dir,
+                             'sh',('-c','sleep 0.5; exit 2',))
+        start_time = time.time()
+        self.assertTrue(runner.wait_for_completion(30))
+        self.assertTrue(time.time() - start_time < 10)
+        # Exit status available without further polling
+        self.assertFalse(runner.isRunning(jobid))
+        self.assertEqual(runner.exit_status(jobid),2)
+        # Times out when no jobs finish
+        self.assertFalse(runner.wait_for_completion(0.1))
+
+    def test_simple_job_runner_resource_usage(self):
+        """Test SimpleJobRunner 'resource_usage' returns data for finished jobs
+        """
+        runner = SimpleJobRunner()
+        jobid = self.run_job(runner,'test',self.working_dir,
+                             sys.executable,
+                             ('-c','x = bytearray(64*1024*1024); '
+                              'sum(range(1000000))',))
+        self.assertEqual(runner.resource_usage([jobid]),{})
+        self.wait_for_jobs(runner,jobid)
+        usage = runner.resource_usage([jobid,'missing'])
+        self.assertEqual(list(usage.keys()),[jobid])
+        self.assertTrue(usage[jobid]['start_time'] <=
+                        usage[jobid]['end_time'])
+        self.assertTrue(usage[jobid]['max_rss'] >= 64*1024)
+        self.assertTrue(usage[jobid]['cpu_time'] > 0)
+        self.assertEqual(runner.exit_status(jobid),0)
+
+    def test_simple_job_runner_async_wait_for_completion(self):
+        """Test SimpleJobRunner 'async_wait_for_completion' returns when job ends
+        """
+        runner = SimpleJobRunner()
+        loop = asyncio.new_event_loop()
+        try:
+            jobid = self.run_job(runner,'test',self.working_dir,
+                                 'sh',('-c','sleep 0.5; exit 2',))
+            start_time = time.time()
+            self.assertTrue(loop.run_until_complete(
+                runner.async_wait_for_completion(30)))
+            self.assertTrue(time.time() - start_time < 10)
+            self.assertFalse(runner.isRunning(jobid))
+            self.assertEqual(runner.exit_status(jobid),2)
+            # Times out when no jobs finish
+            self.assertFalse(loop.run_until_complete(
+                runner.async_wait_for_completion(0.1)))
+        finally:
+            loop.close()
+
     def test_simple_job_runner_repr(self):
         """Test SimpleJobRunner '__repr__' built-in
         """
@@ -510,6 +566,152 @@ class TestGEJobRunner(unittest.TestCase):
         # Check the queue
         self.assertEqual(runner.queue(jobid),"mock.q")
 
+    def test_ge_job_runner_async_wait_for_completion(self):
+        """Test GEJobRunner 'async_wait_for_completion' returns when job ends
+        """
+        runner = GEJobRunner(ge_extra_args=self.ge_extra_args)
+        async def wait_for_completion(timeout):
+            # Update the mock GE while waiting
+            waiting = [True]
+            async def update_jobs():
+                while waiting[0]:
+                    self.mock_ge.update_jobs()
+                    await asyncio.sleep(0.1)
+            updater = asyncio.ensure_future(update_jobs())
+            try:
+                return await runner.async_wait_for_completion(timeout)
+            finally:
+                waiting[0] = False
+                await updater
+        loop = asyncio.new_event_loop()
+        try:
+            jobid = self.run_job(runner,'test',self.working_dir,
+                                 'sh',('-c','sleep 1; exit 2',))
+            start_time = time.time()
+            self.assertTrue(loop.run_until_complete(
+                wait_for_completion(30)))
+            self.assertTrue(time.time() - start_time < 10)
+            self.assertFalse(runner.isRunning(jobid))
+            self.assertEqual(runner.exit_status(jobid),2)
+            # Times out when no jobs finish
+            self.assertFalse(loop.run_until_complete(
+                wait_for_completion(0.5)))
+        finally:
+            loop.close()
+
+    def test_ge_job_runner_qstat_xml(self):
+        """Test GEJobRunner gets job data from 'qstat -xml'
+        """
+        # Create a runner and execute the sleep command
+        runner = GEJobRunner(ge_extra_args=self.ge_extra_args)
+        jobid = self.run_job(runner,'test_qstat',
+                             self.working_dir,
+                             'sleep',('10s',))
+        # Wait for job to start running
+        ntries = 0
+        while ntries < 100:
+            self.update_jobs()
+            qstat = runner._GEJobRunner__run_qstat()
+            if qstat[jobid]['state'] == 'r':
+                self.assertEqual(qstat[jobid]['name'],'test_qstat')
+                self.assertEqual(qstat[jobid]['queue'],'mock.q')
+                runner.terminate(jobid)
+                return
+            time.sleep(0.1)
+            ntries += 1
+        self.fail("Job failed to start before time out")
+
+    def test_ge_job_runner_qstat_xml_failed_qstat(self):
+        """Test GEJobRunner keeps using 'qstat -xml' if 'qstat' fails
+        """
+        # Replace qstat with one which fails without output
+        qstat = os.path.join(self.bin_dir,"qstat")
+        with io.open(qstat,'wt') as fp:
+            fp.write(u"#!/bin/sh\necho \"error: qmaster not available\"\n"
+                     u"exit 1\n")
+        os.chmod(qstat,0o775)
+        runner = GEJobRunner(ge_extra_args=self.ge_extra_args)
+        self.assertEqual(runner._GEJobRunner__run_qstat(),None)
+        self.assertTrue(runner._GEJobRunner__qstat_xml)
+
+    def test_ge_job_runner_qstat_xml_unparsable_output(self):
+        """Test GEJobRunner falls back to plain text if 'qstat -xml' can't be parsed
+        """
+        # Replace qstat with one which outputs invalid XML
+        qstat = os.path.join(self.bin_dir,"qstat")
+        with io.open(qstat,'wt') as fp:
+            fp.write(u"""#!/bin/sh
+case "$*" in
+  *-xml*)
+    echo "<job_info><queue_info>"
+    ;;
+  *)
+    echo "job-ID  prior   name       user         state submit/start at     queue                          slots ja-task-ID"
+    echo "-----------------------------------------------------------------------------------------------------------------"
+    echo "1119862 0.00000 anotherjob user1        qw    07/09/2018 16:53:05                                1"
+    ;;
+esac
+""")
+        os.chmod(qstat,0o775)
+        runner = GEJobRunner(ge_extra_args=self.ge_extra_args)
+        self.assertEqual(runner._GEJobRunner__run_qstat(),
+                         { '1119862': { 'name': 'anotherjob',
+                                        'state': 'qw',
+                                        'queue': None } })
+        self.assertFalse(runner._GEJobRunner__qstat_xml)
+
+    def test_ge_job_runner_qacct_batch_restricted_to_user(self):
+        """Test GEJobRunner restricts batch 'qacct' to the current user
+        """
+        # Replace qacct with one which records its arguments
+        qacct = os.path.join(self.bin_dir,"qacct")
+        qacct_args = os.path.join(self.working_dir,"qacct.args")
+        with io.open(qacct,'wt') as fp:
+            fp.write(u"#!/bin/sh\necho \"$@\" >%s\n" % qacct_args)
+        os.chmod(qacct,0o775)
+        runner = GEJobRunner(ge_extra_args=self.ge_extra_args)
+        self.assertEqual(runner._GEJobRunner__run_qacct_batch(['1']),{})
+        with io.open(qacct_args,'rt') as fp:
+            args = fp.read().split()
+        self.assertEqual(args[:2],['-j','-b'])
+        self.assertEqual(args[3:],['-o',runner._GEJobRunner__user()])
+
+    def test_ge_job_runner_parse_qstat_text(self):
+        """Test GEJobRunner parses plain text output from 'qstat'
+        """
+        runner = GEJobRunner(ge_extra_args=self.ge_extra_args)
+        qstat = runner._GEJobRunner__parse_qstat_text(
+            """job-ID  prior   name       user         state submit/start at     queue                          slots ja-task-ID
+-----------------------------------------------------------------------------------------------------------------
+1119861 0.39868 myawesomej user1        r     07/09/2018 16:53:03 serial.q@node001               48
+1119862 0.00000 anotherjob user1        qw    07/09/2018 16:53:05                                1
+""")
+        self.assertEqual(qstat,
+                         { '1119861': { 'name': 'myawesomej',
+                                        'state': 'r',
+                                        'queue': 'serial.q@node001' },
+                           '1119862': { 'name': 'anotherjob',
+                                        'state': 'qw',
+                                        'queue': None } })
+
+    def test_ge_job_runner_job_killed_without_exit_code(self):
+        """Test GEJobRunner gets exit status from 'qacct' for killed job
+        """
+        # Make accounting info available immediately
+        setup_mock_GE(bindir=self.bin_dir,
+                      database_dir=self.database_dir,
+                      qsub_delay=0.4,
+                      qacct_delay=0.0,
+                      debug=False)
+        # Create a runner and execute a command which kills the
+        # job script before it can write the exit code
+        runner = GEJobRunner(ge_extra_args=self.ge_extra_args,
+                             poll_interval=0)
+        jobid = self.run_job(runner,'test',self.working_dir,
+                             'sh',('-c','kill -9 \\$PPID',))
+        self.wait_for_jobs(runner,jobid)
+        self.assertEqual(runner.exit_status(jobid),137)
+
     def test_ge_job_runner_nslots(self):
         """Test GEJobRunner sets BCFTBX_RUNNER_NSLOTS (-pe smp.pe)
         """
@@ -565,6 +767,11 @@ class TestGEJobRunner(unittest.TestCase):
 class TestSlurmRunner(unittest.TestCase):
 
     def setUp(self):
+        # Move to a temporary directory (NB the runner creates
+        # its admin directory in the current directory)
+        self.pwd = os.getcwd()
+        self.tmp_dir = tempfile.mkdtemp()
+        os.chdir(self.tmp_dir)
         # Set up mockSLURM utilities
         self.database_dir = self.make_tmp_dir()
         self.bin_dir = self.make_tmp_dir()
@@ -583,11 +790,8 @@ class TestSlurmRunner(unittest.TestCase):
     def tearDown(self):
         self.mock_slurm.stop()
         os.environ['PATH'] = self.old_path
-        shutil.rmtree(self.database_dir)
-        shutil.rmtree(self.bin_dir)
-        shutil.rmtree(self.working_dir)
-        if self.log_dir is not None:
-            shutil.rmtree(self.log_dir)
+        os.chdir(self.pwd)
+        shutil.rmtree(self.tmp_dir)
 
     def make_tmp_dir(self):
         return tempfile.mkdtemp(dir=os.getcwd())
@@ -1072,6 +1276,337 @@ class TestSlurmRunner(unittest.TestCase):
         self.assertEqual(runner.name(jobid2), "slurm_test_2")
         self.assertEqual(runner.exit_status(jobid2), 0)
 
+    def test_slurm_runner_job_state_code(self):
+        """
+        Test SlurmRunner gets job states from squeue
+        """
+        # Create a runner
+        runner = SlurmRunner()
+        # No jobs
+        self.assertEqual(runner._run_squeue(), {})
+        # Start sleep commands
+        jobid1 = self.run_job(runner,
+                              "slurm_test_1",
+                              self.working_dir,
+                              'sleep', ('2s',))
+        jobid2 = self.run_job(runner,
+                              "slurm_test_2",
+                              self.working_dir,
+                              'sleep', ('2s',))
+        # Both jobs are in the squeue output
+        squeue = runner._run_squeue()
+        self.assertEqual(sorted(squeue.keys()), sorted([jobid1, jobid2]))
+        self.assertTrue(runner._job_state_code(jobid1) in ("PD", "R"))
+        self.assertTrue(runner._job_state_code(jobid2) in ("PD", "R"))
+        # Unknown job
+        self.assertEqual(runner._job_state_code("999"), "")
+        # Wait for jobs to finish
+        self.wait_for_jobs(runner, jobid1, jobid2)
+        # Completed jobs are no longer queried
+        runner._cached_squeue_output_timestamp = 0.0
+        self.assertEqual(runner._run_squeue(), {})
+
+    def test_slurm_runner_squeue_with_purged_job(self):
+        """
+        Test SlurmRunner handles jobs purged from Slurm in squeue queries
+        """
+        # Create a runner
+        runner = SlurmRunner()
+        # Start sleep commands
+        jobids = [self.run_job(runner,
+                               "slurm_test_%d" % i,
+                               self.working_dir,
+                               'sleep', ('10s',))
+                  for i in range(3)]
+        # Wait for jobs to start running
+        self.update_jobs()
+        # Remove the last job from Slurm (NB 'squeue' fails if
+        # the query includes an unknown job ID)
+        self.mock_slurm._cx.execute("DELETE FROM jobs WHERE id=?",
+                                    (int(jobids[2]),))
+        self.mock_slurm._cx.commit()
+        # Running jobs are still reported
+        runner._cached_squeue_output_force_update = True
+        self.assertEqual(runner._run_squeue(),
+                         { jobids[0]: "R", jobids[1]: "R" })
+        # Also when querying each job individually
+        runner._squeue_max_job_ids = 1
+        runner._cached_squeue_output_force_update = True
+        squeue_calls = runner.timings['squeue_calls']
+        self.assertEqual(runner._run_squeue(),
+                         { jobids[0]: "R", jobids[1]: "R" })
+        self.assertEqual(runner.timings['squeue_calls'] - squeue_calls, 3)
+        # Only the purged job is flagged as missing
+        self.assertEqual(runner._handle_missing_jobs(jobids), jobids)
+        self.assertEqual(list(runner._missing.keys()), [jobids[2]])
+
+    def test_slurm_runner_squeue_cache_backs_off(self):
+        """
+        Test SlurmRunner squeue cache lifetime adapts to job changes
+        """
+        # Create a runner
+        runner = SlurmRunner()
+        min_lifetime = runner._cached_squeue_output_min_lifetime
+        max_lifetime = runner._cached_squeue_output_max_lifetime
+        # Start sleep command
+        jobid = self.run_job(runner,
+                             "slurm_test",
+                             self.working_dir,
+                             'sleep', ('10s',))
+        # Wait for job to start running
+        self.update_jobs()
+        runner._cached_squeue_output_force_update = True
+        self.assertEqual(runner._run_squeue(), { jobid: "R" })
+        self.assertEqual(runner._cached_squeue_output_lifetime, min_lifetime)
+        # Output is cached
+        self.assertTrue(runner._run_squeue() is
+                        runner._cached_squeue_output)
+        # Unchanged output increases the lifetime up to the maximum
+        lifetime = min_lifetime
+        for i in range(10):
+            runner._cached_squeue_output_timestamp = 0.0
+            self.assertEqual(runner._run_squeue(), { jobid: "R" })
+            lifetime = min(lifetime*2.0, max_lifetime)
+            self.assertEqual(runner._cached_squeue_output_lifetime,
+                             lifetime)
+        self.assertEqual(runner._cached_squeue_output_lifetime, max_lifetime)
+        # Terminating job forces a refresh and resets the lifetime
+        runner.terminate(jobid)
+        self.mock_slurm.update_jobs()
+        self.assertEqual(runner._run_squeue([jobid]), {})
+        self.assertEqual(runner._cached_squeue_output_lifetime, min_lifetime)
+
+    def test_slurm_runner_reattach(self):
+        """
+        Test SlurmRunner monitors jobs submitted by another runner
+        """
+        # Submit jobs using one runner
+        runner = SlurmRunner()
+        jobid_ok = self.run_job(runner,
+                                "slurm_ok",
+                                self.working_dir,
+                                '/bin/bash', ('-c','sleep 1; exit 0',))
+        jobid_error = self.run_job(runner,
+                                   "slurm_error",
+                                   self.working_dir,
+                                   '/bin/bash', ('-c','sleep 1; exit 3',))
+        self.update_jobs()
+        # Monitor the jobs from a second runner
+        new_runner = SlurmRunner()
+        new_runner.reattach(jobid_ok,"slurm_ok",self.working_dir)
+        new_runner.reattach(jobid_error,"slurm_error",self.working_dir)
+        self.assertTrue(new_runner.isRunning(jobid_ok))
+        self.assertTrue(new_runner.isRunning(jobid_error))
+        self.assertEqual(new_runner.logFile(jobid_ok),
+                         os.path.join(self.working_dir,
+                                      "slurm_ok.o%s" % jobid_ok))
+        self.wait_for_jobs(new_runner,jobid_ok,jobid_error)
+        # Exit codes are obtained from 'sacct'
+        self.assertEqual(new_runner.exit_status(jobid_ok), 0)
+        self.assertEqual(new_runner.exit_status(jobid_error), 3)
+        self.assertEqual(new_runner.list(), [])
+
+    def test_slurm_runner_resource_usage(self):
+        """
+        Test SlurmRunner 'resource_usage' returns data from 'sacct'
+        """
+        runner = SlurmRunner()
+        jobid = self.run_job(runner,
+                             "slurm_test",
+                             self.working_dir,
+                             '/bin/bash', ('-c','sleep 1',))
+        self.wait_for_jobs(runner,jobid)
+        usage = runner.resource_usage([jobid])
+        self.assertEqual(list(usage.keys()),[jobid])
+        self.assertTrue(usage[jobid]['start_time'] <=
+                        usage[jobid]['end_time'])
+        self.assertEqual(usage[jobid]['cpu_time'],0.0)
+        self.assertEqual(usage[jobid]['max_rss'],None)
+        self.assertEqual(runner.resource_usage([]),{})
+
+    def test_slurm_runner_sacct_values(self):
+        """
+        Test SlurmRunner converts time and memory values from 'sacct'
+        """
+        runner = SlurmRunner()
+        self.assertEqual(runner._sacct_duration("00:01.500"), 1.5)
+        self.assertEqual(runner._sacct_duration("02:03:04"), 7384.0)
+        self.assertEqual(runner._sacct_duration("1-02:03:04"), 93784.0)
+        self.assertEqual(runner._sacct_duration(""), None)
+        self.assertEqual(runner._sacct_memory("1024K"), 1024)
+        self.assertEqual(runner._sacct_memory("1.5M"), 1536)
+        self.assertEqual(runner._sacct_memory("2G"), 2*1024*1024)
+        self.assertEqual(runner._sacct_memory("4096"), 4)
+        self.assertEqual(runner._sacct_memory(""), None)
+        self.assertEqual(runner._sacct_timestamp("Unknown"), None)
+        self.assertEqual(runner._sacct_timestamp("2024-01-02T03:04:05"),
+                         time.mktime((2024,1,2,3,4,5,0,0,-1)))
+
+    def test_slurm_runner_sacct_exit_code(self):
+        """
+        Test SlurmRunner converts exit codes from 'sacct'
+        """
+        runner = SlurmRunner()
+        self.assertEqual(runner._sacct_exit_code("0:0"), 0)
+        self.assertEqual(runner._sacct_exit_code("3:0"), 3)
+        self.assertEqual(runner._sacct_exit_code("0:9"), 137)
+        self.assertEqual(runner._sacct_exit_code(""), 127)
+
+    def test_slurm_runner_run_array(self):
+        """
+        Test SlurmRunner submitting a job array
+        """
+        # Create a runner
+        runner = SlurmRunner()
+        # Submit job array
+        jobids = runner.run_array("slurm_test_array",
+                                  self.working_dir,
+                                  "sh",
+                                  (("-c", "echo task 0"),
+                                   ("-c", "echo task 1; exit 3"),
+                                   ("-c", "echo task 2")))
+        self.assertEqual(len(jobids), 3)
+        array_jobid = jobids[0].split('_')[0]
+        self.assertEqual(jobids, [f"{array_jobid}_{i}" for i in range(3)])
+        # Single admin dir with the job script for the array
+        array_dirs = [d for d in os.listdir(runner._admin_dir)
+                      if d.startswith("array.")]
+        self.assertEqual(len(array_dirs), 1)
+        # Wait for the tasks to finish
+        self.wait_for_jobs(runner, *jobids)
+        # Check names, exit status and outputs
+        for i, jobid in enumerate(jobids):
+            self.assertEqual(runner.name(jobid), "slurm_test_array")
+            self.assertEqual(runner.exit_status(jobid), (0, 3, 0)[i])
+            log_file = runner.logFile(jobid)
+            self.assertEqual(os.path.basename(log_file),
+                             f"slurm_test_array.o{array_jobid}_{i}")
+            with io.open(log_file, 'rt') as fp:
+                self.assertEqual(fp.read(), f"task {i}\n")
+        # Admin dirs have been removed
+        self.assertEqual(os.listdir(runner._admin_dir), [])
+
+    def test_slurm_runner_run_empty_array(self):
+        """
+        Test SlurmRunner submitting an empty job array
+        """
+        runner = SlurmRunner()
+        self.assertEqual(runner.run_array("slurm_test_array",
+                                          self.working_dir,
+                                          "sh",
+                                          []), [])
+
+    def test_slurm_runner_expand_array_job_id(self):
+        """
+        Test SlurmRunner expands squeue job IDs for array tasks
+        """
+        runner = SlurmRunner()
+        self.assertEqual(runner._expand_array_job_id("1234"), ["1234"])
+        self.assertEqual(runner._expand_array_job_id("1234_5"), ["1234_5"])
+        self.assertEqual(runner._expand_array_job_id("1234_[5]"),
+                         ["1234_5"])
+        self.assertEqual(runner._expand_array_job_id("1234_[5-7]"),
+                         ["1234_5", "1234_6", "1234_7"])
+        self.assertEqual(runner._expand_array_job_id("1234_[1,3-4%2]"),
+                         ["1234_1", "1234_3", "1234_4"])
+
+    def test_slurm_runner_scan_admin_dir(self):
+        """
+        Test SlurmRunner identifies jobs from the admin directory
+        """
+        runner = SlurmRunner()
+        for job_number in (1, 2, 3):
+            os.mkdir(os.path.join(runner._admin_dir, str(job_number)))
+        for job_number in (2, 3):
+            with open(runner._exit_code_file(job_number), "wt") as fp:
+                fp.write("0\n")
+        # Incomplete exit code file should be ignored
+        with open("%s.tmp" % runner._exit_code_file(1), "wt") as fp:
+            fp.write("0\n")
+        os.mkdir(os.path.join(runner._admin_dir, "array.1"))
+        self.assertEqual(runner._scan_admin_dir(),
+                         (set(["1", "2", "3"]), set(["2", "3"])))
+
+    def test_slurm_runner_async_wait_for_completion(self):
+        """Test SlurmRunner 'async_wait_for_completion' returns when job ends
+        """
+        runner = SlurmRunner()
+        async def wait_for_completion(timeout):
+            # Update the mock Slurm while waiting
+            waiting = [True]
+            async def update_jobs():
+                while waiting[0]:
+                    self.mock_slurm.update_jobs()
+                    await asyncio.sleep(0.1)
+            updater = asyncio.ensure_future(update_jobs())
+            try:
+                return await runner.async_wait_for_completion(timeout)
+            finally:
+                waiting[0] = False
+                await updater
+        loop = asyncio.new_event_loop()
+        try:
+            jobid = self.run_job(runner,"slurm_test",self.working_dir,
+                                 'sh',('-c','sleep 1; exit 2',))
+            start_time = time.time()
+            self.assertTrue(loop.run_until_complete(
+                wait_for_completion(30)))
+            self.assertTrue(time.time() - start_time < 10)
+            self.assertFalse(runner.isRunning(jobid))
+            self.assertEqual(runner.exit_status(jobid),2)
+            # Times out when no jobs finish
+            self.assertFalse(loop.run_until_complete(
+                wait_for_completion(0.5)))
+        finally:
+            loop.close()
+
+    def test_slurm_runner_missing_job_kept_until_timeout(self):
+        """
+        Test SlurmRunner keeps missing jobs in list until timeout
+        """
+        runner = SlurmRunner(missing_job_timeout=60)
+        # Job which isn't known to Slurm
+        self.assertEqual(runner._handle_missing_jobs(["99999"]),
+                         ["99999"])
+        self.assertTrue("99999" in runner._missing)
+        # Still missing but within the timeout
+        self.assertEqual(runner._handle_missing_jobs(["99999"]),
+                         ["99999"])
+        self.assertTrue("99999" in runner._missing)
+
+    def test_slurm_runner_handle_job_completion_releases_lock(self):
+        """
+        Test SlurmRunner releases job lock if job completion fails
+        """
+        runner = SlurmRunner()
+        runner._job_number["1234"] = 1
+        # No exit code file for the job
+        self.assertRaises(AssertionError,
+                          runner._handle_job_completion,
+                          "1234")
+        self.assertFalse(runner._job_lock.is_locked("1234"))
+        self.assertFalse("1234" in runner._finalizing)
+
+    def test_slurm_runner_timings(self):
+        """
+        Test SlurmRunner records timings for checking job status
+        """
+        runner = SlurmRunner()
+        self.assertEqual(runner.timings,
+                         { 'list_calls': 0,
+                           'filesystem': 0.0,
+                           'squeue_calls': 0,
+                           'squeue': 0.0 })
+        jobid = runner.run("slurm_test", self.working_dir, "sh",
+                           ("-c", "exit 0"))
+        self.wait_for_jobs(runner, jobid)
+        runner._run_squeue([jobid])
+        timings = runner.timings
+        self.assertTrue(timings['list_calls'] > 0)
+        self.assertTrue(timings['filesystem'] > 0.0)
+        self.assertEqual(timings['squeue_calls'], 1)
+        self.assertTrue(timings['squeue'] > 0.0)
+
 
 class TestResourceLock(unittest.TestCase):
     """
@@ -1103,6 +1638,56 @@ class TestResourceLock(unittest.TestCase):
                           resource_lock.acquire,
                           "test",
                           timeout=1.0)
+        # Lock on first resource is unaffected
+        self.assertTrue(resource_lock.is_locked("test"))
+        resource_lock.release(lock)
+        self.assertFalse(resource_lock.is_locked("test"))
+        # Lock can be acquired again
+        lock = resource_lock.acquire("test",timeout=1.0)
+        self.assertTrue(resource_lock.is_locked("test"))
+
+    def test_resource_lock_different_resources(self):
+        """
+        ResourceLock: check locks on different resources are independent
+        """
+        resource_lock = ResourceLock()
+        lock1 = resource_lock.acquire("test1")
+        lock2 = resource_lock.acquire("test2",timeout=1.0)
+        self.assertTrue(resource_lock.is_locked("test1"))
+        self.assertTrue(resource_lock.is_locked("test2"))
+        resource_lock.release(lock1)
+        self.assertFalse(resource_lock.is_locked("test1"))
+        self.assertTrue(resource_lock.is_locked("test2"))
+        resource_lock.release(lock2)
+        self.assertFalse(resource_lock.is_locked("test2"))
+
+    def test_resource_lock_waits_in_order(self):
+        """
+        ResourceLock: check waiting requests acquire lock in order
+        """
+        resource_lock = ResourceLock()
+        acquired = []
+        def get_lock(i):
+            lock = resource_lock.acquire("test",timeout=10.0)
+            acquired.append(i)
+            resource_lock.release(lock)
+        # Hold the lock while other threads queue up for it
+        lock = resource_lock.acquire("test")
+        threads = []
+        for i in range(5):
+            t = threading.Thread(target=get_lock,args=(i,))
+            t.start()
+            threads.append(t)
+            # Wait for the thread to join the queue
+            while len(resource_lock._waiting.get("test",[])) < i+1:
+                time.sleep(0.01)
+        self.assertEqual(acquired,[])
+        # Release the lock and wait for the threads to finish
+        resource_lock.release(lock)
+        for t in threads:
+            t.join()
+        self.assertEqual(acquired,[0,1,2,3,4])
+        self.assertFalse(resource_lock.is_locked("test"))
 
 class TestFetchRunnerFunction(unittest.TestCase):
     """Tests for the fetch_runner function
@@ -369,6 +369,89 @@ class TestMd5CheckerVerifyMd5sms(unittest.TestCase):
         # Check no files were missed
         self.assertEqual(len(files),0)
 
+    def test_verify_md5sums_disk_order(self):
+        """Md5Checker.verify_md5sums checks files in disk order
+
+        """
+        # Create MD5sum 'file' with a missing file at the end
+        md5sums = []
+        for f in self.example_dir.filelist(full_path=True):
+            md5sums.append(u"%s  %s" % (md5sum(f),f))
+        missing = self.example_dir.path("missing.txt")
+        md5sums.append(u"%s  %s" % ("d41d8cd98f00b204e9800998ecf8427e",
+                                    missing))
+        md5sums = '\n'.join(md5sums)
+        fp = io.StringIO(md5sums)
+        # Run verification
+        files = self.example_dir.filelist(full_path=True)
+        inodes = [os.stat(f).st_ino for f in files]
+        results = list(Md5Checker.verify_md5sums(fp=fp,disk_order=True))
+        self.assertEqual(len(results),len(files)+1)
+        # Missing file should be first
+        self.assertEqual(results[0],(missing,Md5Checker.MISSING_TARGET))
+        # Remaining files should be in inode order
+        checked = [f for f,status in results[1:]]
+        self.assertEqual(sorted(checked),sorted(files))
+        self.assertEqual([os.stat(f).st_ino for f in checked],
+                         sorted(inodes))
+        for f,status in results[1:]:
+            self.assertEqual(status,Md5Checker.MD5_OK)
+
+    def test_verify_md5sums_report_throughput(self):
+        """Md5Checker.verify_md5sums reports throughput and timings
+
+        """
+        # Create MD5sum 'file'
+        md5sums = []
+        for f in self.example_dir.filelist(full_path=True):
+            md5sums.append(u"%s  %s" % (md5sum(f),f))
+        md5sums = '\n'.join(md5sums)
+        fp = io.StringIO(md5sums)
+        # Run verification
+        report = io.StringIO()
+        files = self.example_dir.filelist(full_path=True)
+        for f,status in Md5Checker.verify_md5sums(fp=fp,
+                                                  disk_order=True,
+                                                  report_interval=0.0,
+                                                  report_fp=report):
+            self.assertEqual(status,Md5Checker.MD5_OK)
+        report = report.getvalue().split('\n')
+        # Check there is a progress report for each file
+        # plus a final report
+        progress = [l for l in report if 'files/s' in l]
+        self.assertEqual(len(progress),len(files)+1)
+        self.assertTrue(progress[-1].startswith("%d files" % len(files)))
+        # Check the timings breakdown
+        timings = report[report.index("Timings:")+1:]
+        phases = [l.split()[0] for l in timings if l]
+        self.assertEqual(phases,['read','sort','md5','total'])
+
+class TestMd5Throughput(unittest.TestCase):
+    """Test the Md5Throughput class
+
+    """
+    def test_md5throughput(self):
+        """Md5Throughput collects counts and phase timings
+        """
+        fp = io.StringIO()
+        t = Md5Throughput(3600.0,fp=fp)
+        self.assertEqual(t.n_files,0)
+        self.assertEqual(t.n_bytes,0)
+        t.start_phase("read")
+        t.start_phase("md5")
+        t.add_file(1024)
+        t.add_file(2048)
+        t.start_phase(None)
+        t.start_phase("md5")
+        self.assertEqual(t.n_files,2)
+        self.assertEqual(t.n_bytes,3072)
+        self.assertEqual([p[0] for p in t.phases],['read','md5'])
+        # No reports before the interval has passed
+        self.assertEqual(fp.getvalue(),"")
+        t.finish()
+        self.assertTrue(fp.getvalue().startswith("2 files (0.0 MB)"))
+        self.assertTrue("Timings:\n" in fp.getvalue())
+
 class TestMd5CheckReporter(unittest.TestCase):
     """Test the Md5CheckReporter class
 
@@ -6,9 +6,16 @@ import unittest
 import tempfile
 import shutil
 import time
+import threading
+import atexit
+import asyncio
+import json
 import bcftbx.utils
 from bcftbx.JobRunner import SimpleJobRunner
 from bcftbx.JobRunner import GEJobRunner
+from bcftbx.JobRunner import SlurmRunner
+from bcftbx.mockslurm import setup_mock_slurm
+from bcftbx.mockslurm import MockSlurm
 from bcftbx.Pipeline import Job
 from bcftbx.Pipeline import GetSolidDataFiles
 from bcftbx.Pipeline import GetSolidPairedEndFiles
@@ -522,6 +529,468 @@ class TestPipelineRunner(unittest.TestCase):
         pr.queueJob(self.working_dir,'ls','-l')
         pr.run(blocking=True)
 
+    def test_pipelinerunner_doesnt_wait_for_poll_interval(self):
+        """PipelineRunner starts next jobs as soon as local jobs finish
+        """
+        pr = PipelineRunner(SimpleJobRunner(),
+                            max_concurrent_jobs=1,
+                            poll_interval=30)
+        for i in range(3):
+            pr.queueJob(self.working_dir,'sh',('-c','exit 0'))
+        start_time = time.time()
+        pr.run(blocking=True)
+        self.assertEqual(pr.nCompleted(),3)
+        self.assertTrue(time.time() - start_time < 30)
+
+    def test_pipelinerunner_job_dependencies(self):
+        """PipelineRunner runs jobs after the jobs they depend on
+        """
+        completed = []
+        pr = PipelineRunner(SimpleJobRunner(),
+                            max_concurrent_jobs=4,
+                            poll_interval=30,
+                            jobCompletionHandler=
+                            lambda job: completed.append(job.label))
+        split = pr.queueJob(self.working_dir,'sh',('-c','sleep 0.5'),
+                            label='split')
+        for i in range(2):
+            pr.queueJob(self.working_dir,'sh',('-c','sleep 0.2'),
+                        label='align%d' % i,group='align',
+                        depends_on=[split])
+        pr.queueJob(self.working_dir,'sh',('-c','exit 0'),
+                    label='merge',depends_on=['align'])
+        # Independent job queued after dependent ones
+        pr.queueJob(self.working_dir,'sh',('-c','exit 0'),
+                    label='other')
+        pr.run(blocking=True)
+        self.assertEqual(pr.nCompleted(),5)
+        self.assertEqual(pr.nCancelled(),0)
+        self.assertEqual(completed[0],'other')
+        self.assertEqual(completed[1],'split')
+        self.assertEqual(sorted(completed[2:4]),['align0','align1'])
+        self.assertEqual(completed[4],'merge')
+
+    def test_pipelinerunner_cancels_failed_dependencies(self):
+        """PipelineRunner cancels jobs which depend on failed jobs
+        """
+        pr = PipelineRunner(SimpleJobRunner(),
+                            max_concurrent_jobs=4,
+                            poll_interval=30)
+        fail = pr.queueJob(self.working_dir,'sh',('-c','exit 1'),
+                           label='fail',group='group')
+        pr.queueJob(self.working_dir,'sh',('-c','exit 0'),
+                    label='ok',group='group')
+        child = pr.queueJob(self.working_dir,'sh',('-c','exit 0'),
+                            label='child',depends_on=[fail])
+        grandchild = pr.queueJob(self.working_dir,'sh',('-c','exit 0'),
+                                 label='grandchild',depends_on=[child])
+        group_child = pr.queueJob(self.working_dir,'sh',('-c','exit 0'),
+                                  label='group_child',depends_on=['group'])
+        other = pr.queueJob(self.working_dir,'sh',('-c','exit 0'),
+                            label='other')
+        pr.run(blocking=True)
+        self.assertEqual(sorted([job.label for job in pr.completed]),
+                         ['fail','ok','other'])
+        self.assertEqual(pr.nCancelled(),3)
+        for job in (child,grandchild,group_child):
+            self.assertTrue(job in pr.cancelled)
+            self.assertEqual(job.status(),"Cancelled")
+            self.assertEqual(job.job_id,None)
+        self.assertEqual(other.exit_status,0)
+        self.assertTrue("3 jobs cancelled" in pr.report())
+
+    def test_pipelinerunner_bad_dependencies(self):
+        """PipelineRunner rejects dependencies not in the pipeline
+        """
+        pr = PipelineRunner(SimpleJobRunner())
+        job = PipelineRunner(SimpleJobRunner()).queueJob(self.working_dir,
+                                                         'ls','-l')
+        pr.queueJob(self.working_dir,'ls','-l',group='group')
+        self.assertRaises(Exception,
+                          pr.queueJob,self.working_dir,'ls','-l',
+                          depends_on=[job])
+        self.assertRaises(Exception,
+                          pr.queueJob,self.working_dir,'ls','-l',
+                          depends_on=['missing'])
+        self.assertRaises(Exception,
+                          pr.queueJob,self.working_dir,'ls','-l',
+                          group='group',depends_on=['group'])
+
+    def test_pipelinerunner_journal_skips_completed_jobs(self):
+        """PipelineRunner doesn't rerun jobs which completed in previous run
+        """
+        journal = os.path.join(self.working_dir,"pipeline.journal")
+        flag = os.path.join(self.working_dir,"flag")
+        def queue_jobs(pr):
+            pr.queueJob(self.working_dir,'sh',('-c','exit 0'),
+                        label='ok',group='group')
+            pr.queueJob(self.working_dir,'sh',('-c','test -f %s' % flag),
+                        label='check_flag',group='group')
+            pr.queueJob(self.working_dir,'sh',('-c','exit 0'),
+                        label='ok',group='group')
+        # First run: one job fails
+        pr = PipelineRunner(SimpleJobRunner(),poll_interval=30,
+                            journal=journal)
+        queue_jobs(pr)
+        pr.run(blocking=True)
+        self.assertEqual(pr.nCompleted(),3)
+        job_ids = dict([(job.job_id,job.exit_status)
+                        for job in pr.completed])
+        self.assertEqual(sorted(job_ids.values()),[0,0,1])
+        self.assertTrue(os.path.exists(journal))
+        # Second run: only the failed job (and new job) are run
+        completed_jobs = []
+        completed_groups = []
+        with open(flag,'wt') as fp:
+            fp.write("")
+        pr = PipelineRunner(SimpleJobRunner(),poll_interval=30,
+                            journal=journal,
+                            jobCompletionHandler=
+                            lambda job: completed_jobs.append(job.label),
+                            groupCompletionHandler=
+                            lambda group,jobs:
+                            completed_groups.append((group,len(jobs))))
+        queue_jobs(pr)
+        self.assertEqual(pr.nCompleted(),2)
+        self.assertEqual(pr.nWaiting(),1)
+        for job in pr.completed:
+            self.assertEqual(job.exit_status,job_ids[job.job_id])
+            self.assertEqual(job.status(),"Finished")
+        pr.queueJob(self.working_dir,'sh',('-c','exit 0'),label='new')
+        pr.run(blocking=True)
+        self.assertEqual(pr.nCompleted(),4)
+        self.assertEqual(sorted(completed_jobs),['check_flag','new'])
+        self.assertEqual(completed_groups,[('group',3)])
+        for job in pr.completed:
+            self.assertEqual(job.exit_status,0)
+
+    def test_pipelinerunner_journal_reruns_unfinished_jobs(self):
+        """PipelineRunner reruns unfinished jobs if runner can't reattach
+        """
+        journal = os.path.join(self.working_dir,"pipeline.journal")
+        # Start a job but don't wait for it to finish
+        pr = PipelineRunner(SimpleJobRunner(),poll_interval=30,
+                            journal=journal)
+        first_job = pr.queueJob(self.working_dir,'sh',('-c','sleep 0.5'))
+        pr.run(blocking=False)
+        # SimpleJobRunner can't reattach to the running job
+        new_pr = PipelineRunner(SimpleJobRunner(),poll_interval=30,
+                                journal=journal)
+        job = new_pr.queueJob(self.working_dir,'sh',('-c','sleep 0.5'))
+        self.assertEqual(new_pr.nWaiting(),1)
+        new_pr.run(blocking=True)
+        self.assertEqual(job.exit_status,0)
+        self.assertNotEqual(job.job_id,first_job.job_id)
+        pr.run(blocking=True)
+
+    def test_pipelinerunner_metrics(self):
+        """PipelineRunner 'metrics' returns timings and resource usage
+        """
+        pr = PipelineRunner(SimpleJobRunner(),poll_interval=30)
+        for i in range(2):
+            pr.queueJob(self.working_dir,'sh',('-c','sleep 0.2; exit %d' % i),
+                        label=str(i),group='group')
+        self.assertEqual(pr.metrics(),[])
+        pr.run(blocking=True)
+        metrics = pr.metrics()
+        self.assertEqual(len(metrics),2)
+        for data in metrics:
+            self.assertEqual(data['exit_status'],int(data['label']))
+            self.assertEqual(data['group'],'group')
+            self.assertEqual(data['status'],'Finished')
+            self.assertTrue(data['queue_wait'] >= 0)
+            self.assertTrue(data['run_time'] >= 0.2)
+            self.assertTrue(data['run_time'] < 30)
+            self.assertTrue(data['max_rss'] > 0)
+            self.assertTrue(data['cpu_time'] is not None)
+        # JSON
+        self.assertEqual(json.loads(pr.metrics(fmt='json')),metrics)
+        # TSV
+        tsv = pr.metrics(fmt='tsv').rstrip('\n').split('\n')
+        self.assertEqual(len(tsv),3)
+        header = tsv[0].lstrip('#').split('\t')
+        self.assertEqual(len(header),15)
+        for line,data in zip(tsv[1:],metrics):
+            values = dict(zip(header,line.split('\t')))
+            self.assertEqual(values['job_id'],data['job_id'])
+            self.assertEqual(values['exit_status'],str(data['exit_status']))
+
+    def test_pipelinerunner_metrics_retries_missing_usage(self):
+        """PipelineRunner 'metrics' retries jobs without resource usage
+        """
+        class DelayedUsageRunner(SimpleJobRunner):
+            # Runner where resource usage isn't available at first
+            usage_available = False
+            def resource_usage(self,job_ids):
+                if not self.usage_available:
+                    return {}
+                return SimpleJobRunner.resource_usage(self,job_ids)
+        runner = DelayedUsageRunner()
+        pr = PipelineRunner(runner,poll_interval=30)
+        pr.queueJob(self.working_dir,'sh',('-c','exit 0'))
+        pr.run(blocking=True)
+        metrics = pr.metrics()
+        self.assertEqual(len(metrics),1)
+        self.assertEqual(metrics[0]['max_rss'],None)
+        # Resource usage is picked up once available
+        runner.usage_available = True
+        metrics = pr.metrics()
+        self.assertEqual(len(metrics),1)
+        self.assertTrue(metrics[0]['max_rss'] > 0)
+
+    def test_pipelinerunner_run_async(self):
+        """PipelineRunner 'run_async' runs jobs and invokes callbacks
+        """
+        completed_jobs = []
+        completed_groups = []
+        pr = PipelineRunner(SimpleJobRunner(),
+                            max_concurrent_jobs=2,
+                            poll_interval=30,
+                            jobCompletionHandler=
+                            lambda job: completed_jobs.append(job.label),
+                            groupCompletionHandler=
+                            lambda group,jobs:
+                            completed_groups.append((group,len(jobs))))
+        for i in range(4):
+            pr.queueJob(self.working_dir,'sh',('-c','exit %d' % i),
+                        label=str(i),group="group%d" % (i%2))
+        start_time = time.time()
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(pr.run_async())
+        finally:
+            loop.close()
+        self.assertTrue(time.time() - start_time < 30)
+        self.assertEqual(pr.nWaiting(),0)
+        self.assertEqual(pr.nRunning(),0)
+        self.assertEqual(sorted(completed_jobs),['0','1','2','3'])
+        self.assertEqual(sorted(completed_groups),[('group0',2),
+                                                   ('group1',2)])
+        for job in pr.completed:
+            self.assertEqual(job.exit_status,int(job.label))
+
+    def test_pipelinerunner_run_async_concurrent_pipelines(self):
+        """PipelineRunner 'run_async' can run pipelines concurrently
+        """
+        runner = SimpleJobRunner()
+        pipelines = [PipelineRunner(runner,
+                                    max_concurrent_jobs=1,
+                                    poll_interval=30)
+                     for i in range(2)]
+        for pr in pipelines:
+            for i in range(2):
+                pr.queueJob(self.working_dir,'sh',('-c','sleep 0.1'))
+        async def run_pipelines():
+            await asyncio.gather(*[pr.run_async() for pr in pipelines])
+        start_time = time.time()
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(run_pipelines())
+        finally:
+            loop.close()
+        self.assertTrue(time.time() - start_time < 30)
+        for pr in pipelines:
+            self.assertEqual(pr.nCompleted(),2)
+
+    def test_pipelinerunner_run_async_doesnt_block_event_loop(self):
+        """PipelineRunner 'run_async' doesn't block the event loop
+        """
+        class SlowJobRunner(SimpleJobRunner):
+            # Runner where job submission blocks
+            def run(self,*args,**kws):
+                time.sleep(1)
+                return SimpleJobRunner.run(self,*args,**kws)
+        pr = PipelineRunner(SlowJobRunner(),
+                            max_concurrent_jobs=2,
+                            poll_interval=30)
+        for i in range(2):
+            pr.queueJob(self.working_dir,'sh',('-c','exit 0'))
+        # Record the longest gap between wake ups of another
+        # task running in the same event loop
+        max_gap = [0.0]
+        finished = [False]
+        async def ticker():
+            last_tick = time.time()
+            while not finished[0]:
+                await asyncio.sleep(0.05)
+                max_gap[0] = max(max_gap[0],time.time() - last_tick)
+                last_tick = time.time()
+        async def run_pipeline():
+            tick = asyncio.ensure_future(ticker())
+            await asyncio.sleep(0.1)
+            await pr.run_async()
+            finished[0] = True
+            await tick
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(run_pipeline())
+        finally:
+            loop.close()
+        self.assertEqual(pr.nCompleted(),2)
+        self.assertTrue(max_gap[0] < 0.5,
+                        "Event loop blocked for %.2fs" % max_gap[0])
+
+class TestPipelineRunnerWithSlurmRunner(unittest.TestCase):
+
+    def setUp(self):
+        # Create a temporary directory to work in (NB the runner
+        # creates its admin directory in the current directory)
+        self.pwd = os.getcwd()
+        self.tmp_dir = tempfile.mkdtemp()
+        os.chdir(self.tmp_dir)
+        # Set up mock Slurm utilities
+        self.database_dir = tempfile.mkdtemp(dir=self.tmp_dir)
+        self.bin_dir = tempfile.mkdtemp(dir=self.tmp_dir)
+        self.old_path = os.environ['PATH']
+        os.environ['PATH'] = self.bin_dir + os.pathsep + self.old_path
+        # NB set a delay so that jobs are started by the mock
+        # Slurm instance updated in a separate thread (rather than
+        # the short-lived mock 'sbatch' processes)
+        setup_mock_slurm(bindir=self.bin_dir,
+                         database_dir=self.database_dir,
+                         sbatch_delay=0.4,
+                         debug=False)
+        self.stop_mock_slurm = threading.Event()
+        self.mock_slurm = threading.Thread(target=self.update_mock_slurm)
+        self.mock_slurm.start()
+        # Set up working dir
+        self.working_dir = tempfile.mkdtemp(dir=self.tmp_dir)
+
+    def update_mock_slurm(self):
+        mock_slurm = MockSlurm(database_dir=self.database_dir)
+        while not self.stop_mock_slurm.wait(0.1):
+            mock_slurm.update_jobs()
+        mock_slurm.stop()
+        # Already stopped (and can't be stopped from the main thread)
+        atexit.unregister(mock_slurm.stop)
+
+    def tearDown(self):
+        self.stop_mock_slurm.set()
+        self.mock_slurm.join()
+        os.environ['PATH'] = self.old_path
+        os.chdir(self.pwd)
+        shutil.rmtree(self.tmp_dir)
+
+    def test_pipelinerunner_uses_job_arrays(self):
+        """PipelineRunner submits similar jobs as job arrays
+        """
+        completed = []
+        pr = PipelineRunner(SlurmRunner(),
+                            max_concurrent_jobs=3,
+                            poll_interval=0.5,
+                            jobCompletionHandler=
+                            lambda job: completed.append(job),
+                            use_job_arrays=True)
+        for i in range(4):
+            pr.queueJob(self.working_dir,'sh',('-c','exit %d' % i),
+                        label=str(i))
+        pr.queueJob(self.working_dir,'echo',('hello',),label='echo')
+        pr.run(blocking=True)
+        self.assertEqual(pr.nCompleted(),5)
+        jobs = dict([(job.label,job) for job in completed])
+        # First three jobs are tasks in the same array
+        array_ids = set([jobs[str(i)].job_id.split('_')[0]
+                         for i in range(3)])
+        self.assertEqual(len(array_ids),1)
+        # Remaining jobs are submitted separately
+        self.assertFalse(jobs['3'].job_id.split('_')[0] in array_ids)
+        self.assertFalse('_' in jobs['echo'].job_id)
+        # Check exit status and names
+        for i in range(4):
+            self.assertEqual(jobs[str(i)].exit_status,i)
+            self.assertEqual(jobs[str(i)].name,'sh.%d' % i)
+        self.assertEqual(jobs['echo'].exit_status,0)
+
+    def test_pipelinerunner_journal_reattaches_to_jobs(self):
+        """PipelineRunner reattaches to jobs still running from previous run
+        """
+        journal = os.path.join(self.working_dir,"pipeline.journal")
+        def queue_jobs(pr):
+            return [pr.queueJob(self.working_dir,'sh',('-c',cmd),label=str(i))
+                    for i,cmd in enumerate(('exit 0',
+                                            'sleep 2; exit 3'))]
+        # Start the pipeline and wait for the first job to complete
+        pr = PipelineRunner(SlurmRunner(),
+                            max_concurrent_jobs=2,
+                            poll_interval=0.5,
+                            use_job_arrays=False,
+                            journal=journal)
+        first_jobs = queue_jobs(pr)
+        pr.run(blocking=False)
+        while pr.nCompleted() == 0:
+            time.sleep(0.1)
+            pr.update()
+        self.assertEqual(pr.nRunning(),1)
+        # Recreate the pipeline using a new runner
+        new_pr = PipelineRunner(SlurmRunner(),
+                                max_concurrent_jobs=2,
+                                poll_interval=0.5,
+                                use_job_arrays=False,
+                                journal=journal)
+        jobs = queue_jobs(new_pr)
+        self.assertEqual(new_pr.nCompleted(),1)
+        self.assertEqual(new_pr.nRunning(),1)
+        self.assertEqual(new_pr.nWaiting(),0)
+        new_pr.run(blocking=True)
+        # Jobs weren't resubmitted
+        for job,first_job in zip(jobs,first_jobs):
+            self.assertEqual(job.job_id,first_job.job_id)
+        self.assertEqual(jobs[0].exit_status,0)
+        self.assertEqual(jobs[1].exit_status,3)
+        self.assertEqual(jobs[1].log,first_jobs[1].log)
+
+    def test_pipelinerunner_metrics(self):
+        """PipelineRunner 'metrics' gets job timings from 'sacct'
+        """
+        pr = PipelineRunner(SlurmRunner(),
+                            max_concurrent_jobs=2,
+                            poll_interval=0.5)
+        for i in range(2):
+            pr.queueJob(self.working_dir,'sh',('-c','exit %d' % i),
+                        label=str(i))
+        pr.run(blocking=True)
+        metrics = pr.metrics()
+        self.assertEqual(len(metrics),2)
+        for data in metrics:
+            self.assertEqual(data['exit_status'],int(data['label']))
+            self.assertTrue(data['start_time'] is not None)
+            self.assertTrue(data['queue_wait'] >= 0)
+            self.assertTrue(data['run_time'] >= 0)
+            self.assertEqual(data['cpu_time'],0.0)
+            self.assertEqual(data['max_rss'],None)
+        self.assertEqual(len(pr.metrics(fmt='tsv').split('\n')),4)
+
+    def test_pipelinerunner_no_job_arrays(self):
+        """PipelineRunner submits jobs individually if job arrays disabled
+        """
+        pr = PipelineRunner(SlurmRunner(),
+                            max_concurrent_jobs=3,
+                            poll_interval=0.5,
+                            use_job_arrays=False)
+        for i in range(3):
+            pr.queueJob(self.working_dir,'sh',('-c','exit 0'),label=str(i))
+        pr.run(blocking=True)
+        self.assertEqual(pr.nCompleted(),3)
+        for job in pr.completed:
+            self.assertFalse('_' in job.job_id)
+            self.assertEqual(job.exit_status,0)
+
+    def test_pipelinerunner_no_job_arrays_by_default(self):
+        """PipelineRunner doesn't use job arrays by default
+        """
+        pr = PipelineRunner(SlurmRunner(),
+                            max_concurrent_jobs=3,
+                            poll_interval=0.5)
+        self.assertFalse(pr.use_job_arrays)
+        for i in range(3):
+            pr.queueJob(self.working_dir,'sh',('-c','exit 0'),label=str(i))
+        pr.run(blocking=True)
+        self.assertEqual(pr.nCompleted(),3)
+        for job in pr.completed:
+            # Jobs keep their own names
+            self.assertFalse('_' in job.job_id)
+            self.assertEqual(job.name,'sh.%s' % job.label)
+
 #######################################################################
 # Main program
 #######################################################################
@@ -812,6 +812,595 @@ chr2\t1234\t5678\t3.4
         for i in range(len(tabfile)):
             self.assertEqual(tabfile[i]['data'],sorted_data[i])
         
+class TestTabFileParallelLoad(unittest.TestCase):
+    """Test loading data using multiple processes
+    """
+
+    def setUp(self):
+        # Make temporary directory
+        self.working_dir = tempfile.mkdtemp(suffix='TestTabFileParallelLoad')
+        # Make test file
+        self.tabfile = os.path.join(self.working_dir,'test.tsv')
+        with open(self.tabfile,'wt') as fp:
+            fp.write(u"#chr\tstart\tend\tdata\n")
+            for i in range(100):
+                if i%7 == 0:
+                    fp.write(u"# Comment line %d\n" % i)
+                fp.write(u"chr%d\t%d\t%d\t%.1f\n" % (i%3,i,i+100,i/10.0))
+
+    def tearDown(self):
+        # Remove the temporary directory
+        if os.path.exists(self.working_dir):
+            shutil.rmtree(self.working_dir)
+
+    def assertSameData(self,tabfile1,tabfile2):
+        self.assertEqual(tabfile1.header(),tabfile2.header())
+        self.assertEqual(len(tabfile1),len(tabfile2))
+        for line1,line2 in zip(tabfile1,tabfile2):
+            self.assertEqual(line1.data,line2.data)
+            self.assertEqual(line1.lineno(),line2.lineno())
+
+    def test_parallel_load(self):
+        """Parallel load gives same data as serial load
+        """
+        for kws in (dict(),
+                    dict(first_line_is_header=True),
+                    dict(skip_first_line=True),
+                    dict(first_line_is_header=True,keep_commented_lines=True),
+                    dict(column_names=('a','b','c','d')),
+                    dict(first_line_is_header=True,infer_types=10),
+                    dict(first_line_is_header=True,
+                         allow_underscores_in_numeric_literals=True,
+                         infer_types=10),
+                    dict(first_line_is_header=True,dtypes={'data':float})):
+            self.assertSameData(TabFile(self.tabfile,**kws),
+                                TabFile(self.tabfile,nprocs=3,**kws))
+
+    def test_parallel_load_inconsistent_line(self):
+        """Parallel load raises IndexError for inconsistent line
+        """
+        with open(self.tabfile,'at') as fp:
+            fp.write(u"chr1\t1\t2\n")
+            fp.write(u"chr1\t1\t2\t3\t4\n")
+        # NB short lines are padded so only the final line is
+        # inconsistent
+        for nprocs in (None,3):
+            self.assertRaisesRegex(IndexError,
+                                   "wrong number of data items in line 118",
+                                   TabFile,self.tabfile,
+                                   first_line_is_header=True,nprocs=nprocs)
+
+    def test_parallel_load_empty_file(self):
+        """Parallel load handles empty and header-only files
+        """
+        with open(self.tabfile,'wt') as fp:
+            pass
+        tabfile = TabFile(self.tabfile,first_line_is_header=True,nprocs=2)
+        self.assertEqual(len(tabfile),0)
+        self.assertEqual(tabfile.header(),[])
+        with open(self.tabfile,'wt') as fp:
+            fp.write(u"#chr\tstart\n")
+        tabfile = TabFile(self.tabfile,first_line_is_header=True,nprocs=2)
+        self.assertEqual(len(tabfile),0)
+        self.assertEqual(tabfile.header(),['chr','start'])
+
+class TestTabFileColumnTypes(unittest.TestCase):
+    """Test the dtypes and infer_types options
+    """
+
+    def setUp(self):
+        # Make file-like object to read data in
+        self.data = \
+u"""#name\tchr\tstart\tend\tscore
+peak_1\tchr1\t1\t234\t4.6
+peak_2\tchr1\t567\t890\t5.7
+peak_3\tchr2\t1234\t5678\t6
+peak_4\t2\tNA\t1_000\t1e3
+"""
+
+    def test_infer_types(self):
+        """Infer column types from first lines of data
+        """
+        for cls in (TabFile,ColumnarTabFile):
+            tabfile = cls(fp=io.StringIO(self.data),first_line_is_header=True,
+                          infer_types=2)
+            self.assertEqual(tabfile.columnTypes(),[str,str,int,int,float])
+            self.assertEqual([line['start'] for line in tabfile],
+                             [1,567,1234,'NA'])
+            self.assertEqual([line['end'] for line in tabfile],
+                             [234,890,5678,'1_000'])
+            self.assertEqual([line['score'] for line in tabfile],
+                             [4.6,5.7,6,1000.0])
+            # Columns inferred as strings are kept as strings
+            self.assertEqual(tabfile[3]['chr'],'2')
+            # Output matches the input
+            fp = io.StringIO()
+            tabfile.write(fp=fp,include_header=True)
+            self.assertEqual(fp.getvalue(),
+                             self.data.replace('1e3','1000.0'))
+
+    def test_infer_types_mixed_column(self):
+        """Infer column types where column has mixed types
+        """
+        tabfile = TabFile(fp=io.StringIO(self.data),first_line_is_header=True,
+                          infer_types=10)
+        self.assertEqual(tabfile.columnTypes(),[str,None,None,None,None])
+        self.assertEqual([line['score'] for line in tabfile],
+                         [4.6,5.7,6,1000.0])
+
+    def test_infer_types_allow_underscores(self):
+        """Infer column types allowing underscores in numbers
+        """
+        tabfile = TabFile(fp=io.StringIO(self.data),first_line_is_header=True,
+                          infer_types=2,
+                          allow_underscores_in_numeric_literals=True)
+        self.assertEqual(tabfile.columnTypes(),[str,str,int,int,float])
+        self.assertEqual([line['end'] for line in tabfile],
+                         [234,890,5678,1000])
+
+    def test_explicit_dtypes(self):
+        """Specify explicit column types
+        """
+        for cls in (TabFile,ColumnarTabFile):
+            tabfile = cls(fp=io.StringIO(self.data),first_line_is_header=True,
+                          dtypes={'start':int,4:float,'chr':str})
+            self.assertEqual(tabfile.columnTypes(),[None,str,int,None,float])
+            self.assertEqual([line['start'] for line in tabfile],
+                             [1,567,1234,'NA'])
+            self.assertEqual([line['score'] for line in tabfile],
+                             [4.6,5.7,6.0,1000.0])
+            self.assertEqual(tabfile[3]['chr'],'2')
+            # Columns without explicit types use default conversion
+            self.assertEqual([line['end'] for line in tabfile],
+                             [234,890,5678,'1_000'])
+
+    def test_explicit_dtypes_as_list(self):
+        """Specify explicit column types as a list
+        """
+        tabfile = TabFile(fp=io.StringIO(self.data),first_line_is_header=True,
+                          dtypes=(str,str,str))
+        self.assertEqual(tabfile.columnTypes(),[str,str,str,None,None])
+        self.assertEqual(tabfile[0]['start'],'1')
+        self.assertEqual(tabfile[0]['end'],234)
+
+    def test_explicit_dtypes_bad_column(self):
+        """Raise KeyError for explicit type for missing column
+        """
+        self.assertRaises(KeyError,
+                          TabFile,
+                          fp=io.StringIO(self.data),
+                          first_line_is_header=True,
+                          dtypes={'missing':int})
+
+class TestTabFileIndexes(unittest.TestCase):
+    """Test the createIndex, lookup and join methods
+    """
+
+    def setUp(self):
+        # Make file-like objects to read data in
+        self.peaks = \
+u"""#chr\tstart\tend\tgene_id
+chr1\t1\t234\tG1
+chr1\t567\t890\tG2
+chr2\t1234\t5678\tG3
+chr2\t6789\t7890\tG1
+"""
+        self.genes = \
+u"""#id\tsymbol
+G1\tABC1
+G3\tXYZ3
+G4\tDEF4
+"""
+
+    def test_lookup_with_index(self):
+        """Index is used by lookup and kept in sync with changes
+        """
+        for cls in (TabFile,ColumnarTabFile):
+            tabfile = cls(fp=io.StringIO(self.peaks),
+                          first_line_is_header=True)
+            tabfile.createIndex('chr')
+            self.assertEqual([l['start'] for l in tabfile.lookup('chr','chr1')],
+                             [1,567])
+            self.assertEqual(tabfile.lookup('chr','chrX'),[])
+            # Append
+            tabfile.append(data=['chr1',999,1000,'G5'])
+            self.assertEqual([l['start'] for l in tabfile.lookup('chr','chr1')],
+                             [1,567,999])
+            # Insert
+            tabfile.insert(0,data=['chr1',0,1,'G6'])
+            self.assertEqual([l['start'] for l in tabfile.lookup('chr','chr1')],
+                             [0,1,567,999])
+            # Delete
+            del(tabfile[1])
+            self.assertEqual([l['start'] for l in tabfile.lookup('chr','chr1')],
+                             [0,567,999])
+            del(tabfile[0:2])
+            self.assertEqual([l['start'] for l in tabfile.lookup('chr','chr1')],
+                             [999])
+            # Transform
+            tabfile.transformColumn('chr',lambda x: x.replace('chr','Chr'))
+            self.assertEqual(tabfile.lookup('chr','chr1'),[])
+            self.assertEqual([l['start'] for l in tabfile.lookup('chr','Chr2')],
+                             [1234,6789])
+            # Sort
+            tabfile.sort(lambda line: line['start'],reverse=True)
+            self.assertEqual([l['start'] for l in tabfile.lookup('chr','Chr2')],
+                             [6789,1234])
+            # Drop the index
+            tabfile.dropIndex('chr')
+            self.assertEqual([l['start'] for l in tabfile.lookup('chr','Chr2')],
+                             [6789,1234])
+
+    def test_index_tracks_set_values(self):
+        """Index tracks values set via data lines
+        """
+        for cls in (TabFile,ColumnarTabFile):
+            tabfile = cls(fp=io.StringIO(self.peaks),
+                          first_line_is_header=True)
+            tabfile.createIndex('gene_id')
+            tabfile.createIndex(0)
+            tabfile[2]['gene_id'] = 'G1'
+            self.assertEqual([l['start']
+                              for l in tabfile.lookup('gene_id','G1')],
+                             [1,1234,6789])
+            self.assertEqual(tabfile.lookup('gene_id','G3'),[])
+            # Set using integer index
+            tabfile[0][-1] = 'G2'
+            self.assertEqual([l['start']
+                              for l in tabfile.lookup('gene_id','G1')],
+                             [1234,6789])
+            self.assertEqual([l['start']
+                              for l in tabfile.lookup('gene_id','G2')],
+                             [1,567])
+            tabfile[3][0] = 'chr1'
+            self.assertEqual([l['start'] for l in tabfile.lookup(0,'chr1')],
+                             [1,567,6789])
+            # Appended lines are also tracked
+            line = tabfile.append(data=['chr3',1,2,'G7'])
+            line['gene_id'] = 'G8'
+            self.assertEqual(tabfile.lookup('gene_id','G7'),[])
+            self.assertEqual([l['chr'] for l in tabfile.lookup('gene_id','G8')],
+                             ['chr3'])
+
+    def test_index_tracks_set_values_for_shared_lines(self):
+        """Indexes track values set in lines shared between files
+        """
+        # NB only applies to TabFile (ColumnarTabFile copies the
+        # values of appended lines)
+        tabfile1 = TabFile(fp=io.StringIO(self.peaks),
+                           first_line_is_header=True)
+        tabfile1.createIndex('gene_id')
+        tabfile2 = TabFile(column_names=tabfile1.header())
+        tabfile2.createIndex('gene_id')
+        # Append a line from the first file to the second
+        line = tabfile2.append(tabdataline=tabfile1[0])
+        self.assertEqual([l['start']
+                          for l in tabfile2.lookup('gene_id','G1')],
+                         [1])
+        # Setting a value updates both indexes
+        line['gene_id'] = 'G9'
+        self.assertEqual([l['start']
+                          for l in tabfile1.lookup('gene_id','G1')],
+                         [6789])
+        self.assertEqual([l['start']
+                          for l in tabfile1.lookup('gene_id','G9')],
+                         [1])
+        self.assertEqual(tabfile2.lookup('gene_id','G1'),[])
+        self.assertEqual([l['start']
+                          for l in tabfile2.lookup('gene_id','G9')],
+                         [1])
+
+    def test_join(self):
+        """Join two TabFiles on a key column
+        """
+        for cls in (TabFile,ColumnarTabFile):
+            peaks = cls(fp=io.StringIO(self.peaks),first_line_is_header=True)
+            genes = TabFile(fp=io.StringIO(self.genes),
+                            first_line_is_header=True)
+            joined = peaks.join(genes,'gene_id',other_key='id')
+            self.assertTrue(isinstance(joined,cls))
+            self.assertEqual(joined.header(),
+                             ['chr','start','end','gene_id','symbol'])
+            self.assertEqual(str(joined),
+                             "chr1\t1\t234\tG1\tABC1\n"
+                             "chr2\t1234\t5678\tG3\tXYZ3\n"
+                             "chr2\t6789\t7890\tG1\tABC1")
+            self.assertEqual(joined[0]['start'],1)
+
+    def test_join_keep_unmatched(self):
+        """Join two TabFiles on a key column keeping unmatched lines
+        """
+        peaks = TabFile(fp=io.StringIO(self.peaks),first_line_is_header=True)
+        genes = TabFile(fp=io.StringIO(self.genes),first_line_is_header=True)
+        joined = peaks.join(genes,'gene_id',other_key='id',
+                            keep_unmatched=True)
+        self.assertEqual(str(joined),
+                         "chr1\t1\t234\tG1\tABC1\n"
+                         "chr1\t567\t890\tG2\t\n"
+                         "chr2\t1234\t5678\tG3\tXYZ3\n"
+                         "chr2\t6789\t7890\tG1\tABC1")
+
+    def test_join_no_headers(self):
+        """Join two TabFiles without headers using column indices
+        """
+        peaks = TabFile(fp=io.StringIO(self.peaks))
+        genes = TabFile(fp=io.StringIO(self.genes))
+        joined = genes.join(peaks,0,other_key=3)
+        self.assertEqual(joined.header(),[])
+        self.assertEqual(str(joined),
+                         "G1\tABC1\tchr1\t1\t234\n"
+                         "G1\tABC1\tchr2\t6789\t7890\n"
+                         "G3\tXYZ3\tchr2\t1234\t5678")
+
+class TestColumnarTabFile(unittest.TestCase):
+    """Test the ColumnarTabFile class
+    """
+
+    def setUp(self):
+        # Make file-like object to read data in
+        self.data = \
+u"""chr1\t567\t890\t5.7
+chr1\t1\t234\t6.8
+chr2\t1234\t5678\t3.4
+"""
+        self.fp = io.StringIO(u"#chr\tstart\tend\tdata\n"+self.data)
+
+    def tearDown(self):
+        # Close the open file-like input
+        self.fp.close()
+
+    def test_load_data(self):
+        """ColumnarTabFile: load data with header
+        """
+        tabfile = ColumnarTabFile('test',self.fp,first_line_is_header=True)
+        self.assertEqual(len(tabfile),3)
+        self.assertEqual(tabfile.nColumns(),4)
+        self.assertEqual(tabfile.header(),['chr','start','end','data'])
+        self.assertEqual(str(tabfile),self.data.rstrip('\n'))
+        self.assertTrue(isinstance(tabfile[0],ColumnarDataLine))
+        self.assertEqual(tabfile[0]['chr'],'chr1')
+        self.assertEqual(tabfile[0]['start'],567)
+        self.assertEqual(tabfile[0][3],5.7)
+        self.assertEqual(tabfile[-1]['end'],5678)
+        self.assertEqual(tabfile[2].lineno(),4)
+        self.assertEqual(tabfile.indexByLineNumber(3),1)
+        self.assertRaises(KeyError,tabfile[0].__getitem__,'missing')
+        self.assertRaises(IndexError,tabfile[0].__getitem__,4)
+        self.assertRaises(IndexError,tabfile.__getitem__,3)
+
+    def test_load_data_no_conversion(self):
+        """ColumnarTabFile: load data without type conversion
+        """
+        tabfile = ColumnarTabFile('test',self.fp,first_line_is_header=True,
+                                  convert=False)
+        self.assertEqual(tabfile[0]['start'],'567')
+        self.assertEqual(tabfile[0]['data'],'5.7')
+
+    def test_ragged_input_file(self):
+        """ColumnarTabFile: raise IndexError for ragged input
+        """
+        fp = io.StringIO(u"chr1\t1\t234\t4.6\nchr1\t567\t890\n")
+        self.assertRaises(IndexError,ColumnarTabFile,'test',fp)
+
+    def test_write_data(self):
+        """ColumnarTabFile: write data to file
+        """
+        tabfile = ColumnarTabFile('test',self.fp,first_line_is_header=True)
+        fp = io.StringIO()
+        tabfile.write(fp=fp,include_header=True)
+        self.assertEqual(fp.getvalue(),
+                         u"#chr\tstart\tend\tdata\n"+self.data)
+        fp = io.StringIO()
+        tabfile.write(fp=fp,delimiter=',')
+        self.assertEqual(fp.getvalue(),self.data.replace('\t',','))
+
+    def test_lookup(self):
+        """ColumnarTabFile: look up lines by value
+        """
+        tabfile = ColumnarTabFile('test',self.fp,first_line_is_header=True)
+        lines = tabfile.lookup('chr','chr1')
+        self.assertEqual(len(lines),2)
+        self.assertEqual(lines[0]['start'],567)
+        self.assertEqual(lines[1]['start'],1)
+        self.assertEqual(tabfile.lookup('chr','chrX'),[])
+
+    def test_set_values(self):
+        """ColumnarTabFile: set values via data line views
+        """
+        tabfile = ColumnarTabFile('test',self.fp,first_line_is_header=True)
+        tabfile[0]['start'] = '12'
+        self.assertEqual(tabfile[0]['start'],12)
+        tabfile[1]['start'] = 'unknown'
+        self.assertEqual(tabfile[1]['start'],'unknown')
+        self.assertEqual(tabfile[2]['start'],1234)
+        tabfile[2][3] = 1
+        self.assertEqual(tabfile[2]['data'],1)
+        self.assertEqual(str(tabfile[2]),"chr2\t1234\t5678\t1")
+
+    def test_append_and_insert(self):
+        """ColumnarTabFile: append and insert lines
+        """
+        tabfile = ColumnarTabFile('test',self.fp,first_line_is_header=True)
+        line = tabfile.append(data=['chr3',10,'20',1.5])
+        self.assertEqual(len(tabfile),4)
+        self.assertEqual(str(line),"chr3\t10\t20\t1.5")
+        self.assertEqual(line.lineno(),None)
+        line = tabfile.insert(1,tabdata="chrX\t1\t2\t3.0")
+        self.assertEqual(len(tabfile),5)
+        self.assertEqual(str(tabfile[1]),"chrX\t1\t2\t3.0")
+        self.assertEqual(tabfile[1]['end'],2)
+        line = tabfile.append(tabdataline=TabDataLine("chrY\t5\t6\t7.0"))
+        self.assertEqual(str(tabfile[-1]),"chrY\t5\t6\t7.0")
+        line = tabfile.append()
+        self.assertEqual(str(tabfile[-1]),"\t\t\t")
+
+    def test_delete_lines(self):
+        """ColumnarTabFile: delete lines
+        """
+        tabfile = ColumnarTabFile('test',self.fp,first_line_is_header=True)
+        del(tabfile[0])
+        self.assertEqual(len(tabfile),2)
+        self.assertEqual(tabfile[0]['start'],1)
+        self.assertEqual(tabfile[0].lineno(),3)
+
+    def test_append_column(self):
+        """ColumnarTabFile: append a new column
+        """
+        tabfile = ColumnarTabFile('test',self.fp,first_line_is_header=True)
+        tabfile.appendColumn('strand',fill_value='+')
+        self.assertEqual(tabfile.nColumns(),5)
+        self.assertEqual(tabfile.header(),
+                         ['chr','start','end','data','strand'])
+        for line in tabfile:
+            self.assertEqual(line['strand'],'+')
+            self.assertEqual(len(line),5)
+
+    def test_transform_and_compute_columns(self):
+        """ColumnarTabFile: transform and compute columns
+        """
+        tabfile = ColumnarTabFile('test',self.fp,first_line_is_header=True)
+        tabfile.transformColumn('start',lambda x: x+1)
+        self.assertEqual([line['start'] for line in tabfile],[568,2,1235])
+        tabfile.computeColumn('size',
+                              lambda line: line['end'] - line['start'])
+        self.assertEqual(tabfile.header(),
+                         ['chr','start','end','data','size'])
+        self.assertEqual([line['size'] for line in tabfile],[322,232,4443])
+        tabfile.computeColumn(3,lambda line: line['chr'])
+        self.assertEqual([line['data'] for line in tabfile],
+                         ['chr1','chr1','chr2'])
+
+    def test_sort(self):
+        """ColumnarTabFile: sort data on a column
+        """
+        tabfile = ColumnarTabFile('test',self.fp,first_line_is_header=True)
+        tabfile.sort(lambda line: line['data'])
+        self.assertEqual([line['data'] for line in tabfile],[3.4,5.7,6.8])
+        self.assertEqual([line.lineno() for line in tabfile],[4,2,3])
+        tabfile.sort(lambda line: line['chr'],reverse=True)
+        self.assertEqual([line['start'] for line in tabfile],[1234,567,1])
+
+    def test_reorder_columns(self):
+        """ColumnarTabFile: reorder columns
+        """
+        tabfile = ColumnarTabFile('test',self.fp,first_line_is_header=True)
+        reordered = tabfile.reorderColumns(['data','chr'])
+        self.assertTrue(isinstance(reordered,ColumnarTabFile))
+        self.assertEqual(reordered.header(),['data','chr'])
+        self.assertEqual(str(reordered[0]),"5.7\tchr1")
+        # Changes to the reordered data don't affect the original
+        reordered[0]['data'] = 0.1
+        self.assertEqual(tabfile[0]['data'],5.7)
+
+    def test_transpose(self):
+        """ColumnarTabFile: transpose data
+        """
+        tabfile = ColumnarTabFile('test',self.fp,first_line_is_header=True)
+        transposed = tabfile.transpose()
+        self.assertEqual(len(transposed),tabfile.nColumns())
+        self.assertEqual(transposed.nColumns(),len(tabfile))
+        self.assertEqual(str(transposed[1]),"567\t1\t1234")
+
+    def test_same_output_as_tabfile(self):
+        """ColumnarTabFile: output matches TabFile for same operations
+        """
+        data = self.fp.getvalue()
+        tabfiles = []
+        for cls in (TabFile,ColumnarTabFile):
+            tabfile = cls(fp=io.StringIO(data),first_line_is_header=True)
+            tabfile.computeColumn('midpoint',
+                                  lambda line: (line['end']+line['start'])/2.0)
+            tabfile.transformColumn('chr',lambda x: x.upper())
+            tabfile.sort(lambda line: line['midpoint'])
+            tabfile.append(data=['chr9',1,2,'x',1.5])
+            fp = io.StringIO()
+            tabfile.write(fp=fp,include_header=True)
+            tabfiles.append(fp.getvalue())
+        self.assertEqual(tabfiles[0],tabfiles[1])
+
+class TestSortFile(unittest.TestCase):
+    """Test the sort_file function
+    """
+
+    def setUp(self):
+        # Make temporary directory
+        self.working_dir = tempfile.mkdtemp(suffix='TestSortFile')
+        # Data to sort
+        self.header = u"#chr\tstart\tend\tname\n"
+        self.data = []
+        for i in range(200):
+            self.data.append(u"chr%d\t%d\t%d\tpeak%d\n" %
+                             ((i*7)%3+1,(i*37)%101,(i*37)%101+10,i))
+        self.infile = os.path.join(self.working_dir,'data.tsv')
+        with io.open(self.infile,'wt') as fp:
+            fp.write(self.header)
+            fp.write(u"".join(self.data))
+
+    def tearDown(self):
+        # Remove the temporary directory
+        if os.path.exists(self.working_dir):
+            shutil.rmtree(self.working_dir)
+
+    def expected(self,reverse=False):
+        # Sort the data in memory
+        return self.header + u"".join(
+            sorted(self.data,
+                   key=lambda l: (l.split('\t')[0],int(l.split('\t')[1])),
+                   reverse=reverse))
+
+    def test_sort_file_in_memory(self):
+        """sort_file: sort data which fit into memory
+        """
+        outfile = os.path.join(self.working_dir,'sorted.tsv')
+        nlines = sort_file(self.infile,outfile,keys=['chr',('start',int)],
+                           first_line_is_header=True)
+        self.assertEqual(nlines,200)
+        with io.open(outfile,'rt') as fp:
+            self.assertEqual(fp.read(),self.expected())
+
+    def test_sort_file_external(self):
+        """sort_file: sort data using temporary files
+        """
+        tmp_dir = os.path.join(self.working_dir,'tmp')
+        os.mkdir(tmp_dir)
+        outfile = os.path.join(self.working_dir,'sorted.tsv')
+        nlines = sort_file(self.infile,outfile,keys=[0,(1,int)],
+                           first_line_is_header=True,buffer_size=1000,
+                           tmp_dir=tmp_dir)
+        self.assertEqual(nlines,200)
+        with io.open(outfile,'rt') as fp:
+            self.assertEqual(fp.read(),self.expected())
+        # Temporary files should have been removed
+        self.assertEqual(os.listdir(tmp_dir),[])
+
+    def test_sort_file_external_reverse(self):
+        """sort_file: reverse sort data using temporary files
+        """
+        outfile = os.path.join(self.working_dir,'sorted.tsv')
+        sort_file(self.infile,outfile,keys=['chr',('start',int)],
+                  first_line_is_header=True,buffer_size=1000,reverse=True)
+        with io.open(outfile,'rt') as fp:
+            self.assertEqual(fp.read(),self.expected(reverse=True))
+
+    def test_sort_file_in_place(self):
+        """sort_file: sort data in place
+        """
+        sort_file(self.infile,self.infile,keys=['chr',('start',int)],
+                  first_line_is_header=True,buffer_size=1000)
+        with io.open(self.infile,'rt') as fp:
+            self.assertEqual(fp.read(),self.expected())
+
+    def test_sort_file_bad_key(self):
+        """sort_file: raise exception for bad keys
+        """
+        outfile = os.path.join(self.working_dir,'sorted.tsv')
+        self.assertRaises(KeyError,
+                          sort_file,self.infile,outfile,keys=['missing'],
+                          first_line_is_header=True)
+        self.assertRaises(ValueError,
+                          sort_file,self.infile,outfile,keys=[('chr',int)],
+                          first_line_is_header=True)
+
 class TestTabDataLine(unittest.TestCase):
 
     def test_new_line_no_data(self):
@@ -1087,6 +1676,151 @@ chr2\t1234\t5678\t6.8
             # Check columns
             for col,value in zip(columns,data.split('\t')):
                 self.assertEqual(str(tabline[col]),value)
+
+    def test_tabfileiterator_transform_compute_and_filter(self):
+        """
+        TabFileIterator: chain transform, compute and filter steps
+        """
+        self.fp = io.StringIO(self.data)
+        columns = ['chrom','start','end','p_value']
+        tsv = TabFileIterator(fp=self.fp,column_names=columns)\
+              .transformColumn('chrom',lambda x: x.upper())\
+              .filter(lambda line: line['chrom'] == 'CHR1')\
+              .computeColumn('length',
+                             lambda line: line['end']-line['start'])
+        self.assertEqual(tsv.header(),
+                         ['chrom','start','end','p_value','length'])
+        lines = [str(line) for line in tsv]
+        self.assertEqual(lines,["CHR1\t1\t234\t4.6\t233",
+                                "CHR1\t567\t890\t5.7\t323"])
+
+    def test_tabfileiterator_compute_existing_column(self):
+        """
+        TabFileIterator: compute values for existing column
+        """
+        self.fp = io.StringIO(self.data)
+        tsv = TabFileIterator(fp=self.fp)\
+              .computeColumn(3,lambda line: line[2]-line[1])
+        lines = [str(line) for line in tsv]
+        self.assertEqual(lines,["chr1\t1\t234\t233",
+                                "chr1\t567\t890\t323",
+                                "chr2\t1234\t5678\t4444"])
+
+    def test_tabfileiterator_write(self):
+        """
+        TabFileIterator: write transformed lines to file
+        """
+        self.fp = io.StringIO(self.data)
+        columns = ['chrom','start','end','p_value']
+        out_file = os.path.join(self.working_dir,'out.tsv')
+        nlines = TabFileIterator(fp=self.fp,column_names=columns)\
+                 .filter(lambda line: line['chrom'] == 'chr1')\
+                 .computeColumn('length',
+                                lambda line: line['end']-line['start'])\
+                 .write(out_file,include_header=True,batch_size=1)
+        self.assertEqual(nlines,2)
+        with open(out_file,'rt') as fp:
+            self.assertEqual(fp.read(),
+                             "#chrom\tstart\tend\tp_value\tlength\n"
+                             "chr1\t1\t234\t4.6\t233\n"
+                             "chr1\t567\t890\t5.7\t323\n")
+
+    def test_tabfileiterator_write_gzipped(self):
+        """
+        TabFileIterator: read and write gzipped files
+        """
+        import gzip
+        in_file = os.path.join(self.working_dir,'test.tsv.gz')
+        with gzip.open(in_file,'wt') as fp:
+            fp.write(self.data)
+        out_file = os.path.join(self.working_dir,'out.tsv.gz')
+        nlines = TabFileIterator(in_file)\
+                 .transformColumn(3,lambda x: x*2)\
+                 .write(out_file,delimiter=',')
+        self.assertEqual(nlines,3)
+        with gzip.open(out_file,'rt') as fp:
+            self.assertEqual(fp.read(),
+                             "chr1,1,234,9.2\n"
+                             "chr1,567,890,11.4\n"
+                             "chr2,1234,5678,13.6\n")
+        
+class TestBulkTabFileIterator(unittest.TestCase):
+
+    def setUp(self):
+        # Tab-delimited data
+        self.data = \
+u"""chr1\t1\t234\t4.6
+chr1\t567\t890\t5.7
+chr2\t1234\t5678\t6.8
+"""
+        # Make temporary directory
+        self.working_dir = tempfile.mkdtemp(suffix='TestBulkTabFileIterator')
+
+    def tearDown(self):
+        # Remove the temporary directory
+        if os.path.exists(self.working_dir):
+            shutil.rmtree(self.working_dir)
+
+    def test_bulktabfileiterator_iterate_through_file(self):
+        """
+        BulkTabFileIterator: iterates through TSV file
+        """
+        # Make test file
+        tabfile = os.path.join(self.working_dir,'test.tsv')
+        with open(tabfile,'wt') as fp:
+            fp.write(self.data)
+        # Iterate though file
+        records = list(BulkTabFileIterator(tabfile))
+        self.assertEqual(records,
+                         [('chr1','1','234','4.6'),
+                          ('chr1','567','890','5.7'),
+                          ('chr2','1234','5678','6.8')])
+
+    def test_bulktabfileiterator_small_chunks(self):
+        """
+        BulkTabFileIterator: handles lines split across chunks
+        """
+        for chunk_size in (1,5,17,1024):
+            tsv = BulkTabFileIterator(fp=io.StringIO(self.data),
+                                      chunk_size=chunk_size)
+            self.assertEqual(['\t'.join(r) for r in tsv],
+                             self.data.split('\n')[:-1])
+
+    def test_bulktabfileiterator_no_trailing_newline(self):
+        """
+        BulkTabFileIterator: handles missing newline on last line
+        """
+        tsv = BulkTabFileIterator(fp=io.StringIO(self.data.rstrip('\n')))
+        self.assertEqual(len(list(tsv)),3)
+
+    def test_bulktabfileiterator_typed(self):
+        """
+        BulkTabFileIterator: converts values using types schema
+        """
+        tsv = BulkTabFileIterator(fp=io.StringIO(self.data),
+                                  types=(None,int,int,float))
+        self.assertEqual(list(tsv),
+                         [('chr1',1,234,4.6),
+                          ('chr1',567,890,5.7),
+                          ('chr2',1234,5678,6.8)])
+
+    def test_bulktabfileiterator_typed_bad_value(self):
+        """
+        BulkTabFileIterator: raise ValueError for bad values
+        """
+        tsv = BulkTabFileIterator(fp=io.StringIO(self.data),
+                                  types=(int,))
+        self.assertRaises(ValueError,list,tsv)
+
+    def test_bulktabfileiterator_chunks(self):
+        """
+        BulkTabFileIterator: returns records in chunks
+        """
+        tsv = BulkTabFileIterator(fp=io.StringIO(self.data),
+                                  chunk_size=20)
+        chunks = list(tsv.chunks())
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual(sum([len(c) for c in chunks]),3)
         
 ########################################################################
 # Main: test runner
@@ -207,3 +207,115 @@ AAF#FJJJJJJJJJJJ
                            for i in (0,)]
         for r1,r2 in zip(reference_reads,fastq_reads):
             self.assertEqual(r1,r2)
+
+class TestBGZFWriter(unittest.TestCase):
+    """Tests for the 'BGZFWriter' and 'BGZFReader' classes
+    """
+    def setUp(self):
+        self.wd = tempfile.mkdtemp()
+    def tearDown(self):
+        shutil.rmtree(self.wd)
+    def test_bgzf_writer(self):
+        """BGZFWriter: output can be read by gzip
+        """
+        filen = os.path.join(self.wd,"test.txt.gz")
+        with BGZFWriter(filen) as bgzf:
+            bgzf.write(u"Line 1\n")
+            bgzf.write(u"Line 2\n")
+        with gzip.open(filen,'rt') as fp:
+            self.assertEqual(fp.read(),u"Line 1\nLine 2\n")
+        with io.open(filen,'rb') as fp:
+            self.assertEqual(fp.read()[-len(BGZF_EOF):],BGZF_EOF)
+    def test_bgzf_writer_multiple_blocks(self):
+        """BGZFWriter: data written over multiple blocks
+        """
+        filen = os.path.join(self.wd,"test.txt.gz")
+        lines = [u"Line %d\n" % i for i in range(20000)]
+        offsets = []
+        with BGZFWriter(filen) as bgzf:
+            for line in lines:
+                offsets.append(bgzf.tell())
+                bgzf.write(line)
+        self.assertTrue(offsets[-1] >> 16 > 0)
+        with gzip.open(filen,'rt') as fp:
+            self.assertEqual(fp.read(),u''.join(lines))
+        with BGZFReader(filen) as bgzf:
+            for i in (0,1,8000,8001,19999):
+                bgzf.seek(offsets[i])
+                self.assertEqual(bgzf.tell(),offsets[i])
+                self.assertEqual(bgzf.readline(),lines[i])
+            self.assertEqual(bgzf.readline(),u'')
+
+class TestWriteIndexedBed(unittest.TestCase):
+    """Tests for the 'write_indexed_bed' and 'tabix_fetch' functions
+    """
+    def setUp(self):
+        self.wd = tempfile.mkdtemp()
+        self.bed_data = [u"chr2\t500\t700\tpeak1",
+                         u"chr1\t40000\t40200\tpeak2",
+                         u"chr1\t100\t300\tpeak3",
+                         u"chr1\t200\t2000000\tpeak4",
+                         u"chr10\t1000\t1200\tpeak5"]
+    def tearDown(self):
+        shutil.rmtree(self.wd)
+    def test_write_indexed_bed(self):
+        """write_indexed_bed: write sorted BGZF data and index
+        """
+        filen = os.path.join(self.wd,"test.bed.gz")
+        self.assertEqual(write_indexed_bed(filen,self.bed_data,
+                                           header="#chr\tstart\tend\tname"),
+                         5)
+        with gzip.open(filen,'rt') as fp:
+            self.assertEqual(fp.read(),
+                             u"#chr\tstart\tend\tname\n"
+                             u"chr1\t100\t300\tpeak3\n"
+                             u"chr1\t200\t2000000\tpeak4\n"
+                             u"chr1\t40000\t40200\tpeak2\n"
+                             u"chr10\t1000\t1200\tpeak5\n"
+                             u"chr2\t500\t700\tpeak1\n")
+        index = TabixIndex.load(filen + ".tbi")
+        self.assertEqual(index.names,['chr1','chr10','chr2'])
+        self.assertEqual((index.col_seq,index.col_beg,index.col_end),
+                         (1,2,3))
+        self.assertEqual(index.meta,'#')
+        self.assertTrue(index.zero_based)
+    def test_write_indexed_bed_unsorted(self):
+        """write_indexed_bed: raise exception for unsorted data
+        """
+        filen = os.path.join(self.wd,"test.bed.gz")
+        self.assertRaises(ValueError,
+                          write_indexed_bed,filen,self.bed_data,sort=False)
+    def test_tabix_fetch(self):
+        """tabix_fetch: fetch lines overlapping regions
+        """
+        filen = os.path.join(self.wd,"test.bed.gz")
+        write_indexed_bed(filen,self.bed_data)
+        self.assertEqual(list(tabix_fetch(filen,'chr1',0,150)),
+                         [u"chr1\t100\t300\tpeak3"])
+        self.assertEqual(list(tabix_fetch(filen,'chr1',300,40001)),
+                         [u"chr1\t200\t2000000\tpeak4",
+                          u"chr1\t40000\t40200\tpeak2"])
+        self.assertEqual(list(tabix_fetch(filen,'chr1',1999999,3000000)),
+                         [u"chr1\t200\t2000000\tpeak4"])
+        self.assertEqual(list(tabix_fetch(filen,'chr1',2000000,3000000)),[])
+        self.assertEqual(list(tabix_fetch(filen,'chr10')),
+                         [u"chr10\t1000\t1200\tpeak5"])
+        self.assertEqual(list(tabix_fetch(filen,'chrX')),[])
+    def test_tabix_fetch_many_lines(self):
+        """tabix_fetch: fetch lines from file with multiple blocks
+        """
+        filen = os.path.join(self.wd,"test.bed.gz")
+        bed_data = [u"chr%d\t%d\t%d\tpeak%d" % (i%3,i*100,i*100+250,i)
+                    for i in range(30000)]
+        write_indexed_bed(filen,bed_data)
+        for chrom,start,end in (('chr0',0,1000),
+                                ('chr1',1500000,1600000),
+                                ('chr2',2999000,4000000)):
+            expected = []
+            for line in bed_data:
+                fields = line.split('\t')
+                if fields[0] == chrom and \
+                   int(fields[1]) < end and int(fields[2]) > start:
+                    expected.append(line)
+            self.assertEqual(list(tabix_fetch(filen,chrom,start,end)),
+                             expected)
@@ -4,7 +4,10 @@
 from bcftbx.simple_xls import *
 import unittest
 import os
+import shutil
 import tempfile
+import xlsxwriter
+import xlrd
 try:
     # Python 2
     from itertools import izip as zip
@@ -70,6 +73,87 @@ class TestXLSWorkBook(unittest.TestCase):
         wb.save_as_xlsx(xlsx_out)
         # Check file exists
         self.assertTrue(os.path.isfile(xlsx_out))
+    def test_work_book_save_as_xlsx_without_constant_memory(self):
+        wb = XLSWorkBook("Test")
+        self.wd = tempfile.mkdtemp()
+        # Add content
+        ws = wb.add_work_sheet('test','Test')
+        self._add_test_worksheet(ws)
+        # Save out to XLSX file
+        xlsx_out = os.path.join(self.wd,'test.xlsx')
+        wb.save_as_xlsx(xlsx_out,constant_memory=False)
+        # Check file exists
+        self.assertTrue(os.path.isfile(xlsx_out))
+
+class TestXLSWorkBookTables(unittest.TestCase):
+    """
+    """
+    def setUp(self):
+        self.wd = tempfile.mkdtemp()
+        self.data = [['chr1',1,'10','peak1'],
+                     ['chr2',5,'20','peak2'],
+                     ['chr3',7,'9','peak3']]
+        self.header = ['chr','start','end','name']
+    def tearDown(self):
+        shutil.rmtree(self.wd)
+    def test_work_book_add_table(self):
+        wb = XLSWorkBook("Test")
+        wb.add_work_sheet('notes','Notes')
+        wb.add_table('data',self.data,title='Data',header=self.header)
+        self.assertRaises(KeyError,wb.add_table,'notes',self.data)
+        self.assertRaises(KeyError,wb.add_work_sheet,'data')
+        xlsx_out = os.path.join(self.wd,'test.xlsx')
+        wb.save_as_xlsx(xlsx_out)
+        self.assertTrue(os.path.isfile(xlsx_out))
+    def test_work_book_add_table_save_as_xls(self):
+        wb = XLSWorkBook("Test")
+        wb.add_work_sheet('notes','Notes')['A1'] = "Notes"
+        wb.add_table('data',self.data,title='Data',header=self.header,
+                     types={ 'end': int })
+        xls_out = os.path.join(self.wd,'test.xls')
+        wb.save_as_xls(xls_out)
+        xls = xlrd.open_workbook(xls_out)
+        self.assertEqual(xls.sheet_names(),['Notes','Data'])
+        data = xls.sheet_by_name('Data')
+        self.assertEqual(data.nrows,4)
+        self.assertEqual(data.row_values(0),self.header)
+        self.assertEqual(data.row_values(1),['chr1',1.0,10.0,'peak1'])
+
+class TestWriteTable(unittest.TestCase):
+    """
+    """
+    def setUp(self):
+        self.wd = tempfile.mkdtemp()
+        self.xlsx = xlsxwriter.Workbook(os.path.join(self.wd,'test.xlsx'))
+    def tearDown(self):
+        self.xlsx.close()
+        shutil.rmtree(self.wd)
+    def test_write_table(self):
+        data = [['chr1',1,10],['chr2',5,20]]
+        self.assertEqual(write_table(self.xlsx,data,'Peaks',
+                                     header=['chr','start','end']),
+                         ['Peaks'])
+    def test_write_table_empty(self):
+        self.assertEqual(write_table(self.xlsx,[],'Peaks',
+                                     header=['chr','start','end']),
+                         ['Peaks'])
+    def test_write_table_splits_over_sheets(self):
+        class Limits(XLSXLimits):
+            MAX_NUMBER_ROWS_PER_WORKSHEET = 3
+        data = [['chr1',1,10],['chr2',5,20],['chr3',7,9],
+                ['chr4',2,8],['chr5',3,6]]
+        self.assertEqual(write_table(self.xlsx,data,'Peaks',
+                                     header=['chr','start','end'],
+                                     limits=Limits),
+                         ['Peaks','Peaks(2)','Peaks(3)'])
+        self.assertEqual(write_table(self.xlsx,data,'More peaks',
+                                     limits=Limits),
+                         ['More peaks','More peaks(2)'])
+    def test_write_table_bad_column_name(self):
+        self.assertRaises(KeyError,
+                          write_table,self.xlsx,[['chr1',1,10]],'Peaks',
+                          header=['chr','start','end'],
+                          types={ 'stop': int })
 
 class TestXLSWorkSheet(unittest.TestCase):
     """
@@ -397,6 +481,34 @@ class TestXLSWorkSheet(unittest.TestCase):
         self.assertEqual(ws.rows,[5,12,93])
         self.assertEqual(ws.next_column,'BA')
         self.assertEqual(ws.next_row,94)
+    def test_columns_and_rows_after_insert_and_delete(self):
+        ws = self.ws
+        ws['AA2'] = "A value"
+        ws['B4'] = "Another value"
+        self.assertEqual(ws.columns,['B','AA'])
+        self.assertEqual(ws.rows,[2,4])
+        ws.insert_column('C',text="Inserted")
+        ws.insert_row(3,text="Inserted")
+        self.assertEqual(ws.columns,['A','B','C','AB'])
+        self.assertEqual(ws.rows,[1,2,3,5])
+        self.assertEqual(ws['AB2'],"A value")
+        self.assertEqual(ws['B5'],"Another value")
+        self.assertEqual(ws.last_column,'AB')
+        self.assertEqual(ws.last_row,5)
+        del(ws['AB2'])
+        del(ws['B5'])
+        self.assertEqual(ws.columns,['A','C'])
+        self.assertEqual(ws.rows,[1,3])
+        self.assertEqual(ws.last_column,'C')
+        self.assertEqual(ws.last_row,3)
+    def test_insert_column_shifts_all_data(self):
+        ws = self.ws
+        ws.write_row(1,data=('a','b','c','d','e','f'))
+        ws.write_row(2,data=('g','h'))
+        ws.insert_column('B',fill='x')
+        self.assertEqual(ws.render_as_text(),
+                         "a\tx\tb\tc\td\te\tf\n"
+                         "g\tx\th\t\t\t\t")
     def test_render_cell(self):
         self.ws.insert_column_data(self.ws.next_column,['4.5'])
         self.assertEqual(self.ws.render_cell('A1'),'4.5')
@@ -443,6 +555,18 @@ class TestCellIndex(unittest.TestCase):
         self.assertTrue(str(CellIndex('A')),'A')
         self.assertTrue(str(CellIndex('1')),'1')
 
+class TestCellCoordinates(unittest.TestCase):
+    """
+    """
+    def test_cell_coordinates(self):
+        self.assertEqual(cell_coordinates('A1'),(1,0))
+        self.assertEqual(cell_coordinates('B3'),(3,1))
+        self.assertEqual(cell_coordinates('ZB567'),(567,677))
+    def test_cell_coordinates_invalid_index(self):
+        self.assertRaises(ValueError,cell_coordinates,'A')
+        self.assertRaises(ValueError,cell_coordinates,'1')
+        self.assertRaises(ValueError,cell_coordinates,'!1#2')
+
 class TestColumnIndexToInteger(unittest.TestCase):
     """
     """
@@ -613,6 +737,65 @@ class TestEvalFormula(unittest.TestCase):
         self.assertEqual(eval_formula("=A1-D2",self.ws),-1.0)
         self.assertEqual(eval_formula("=A1*D2",self.ws),2.0)
         self.assertEqual(eval_formula("=A1/D2",self.ws),0.5)
+    def test_cached_results_updated_when_referenced_cells_change(self):
+        self.ws.insert_column_data('D',['=A1+B1','=D1*2'])
+        self.assertEqual(eval_formula("=D2",self.ws),10.0)
+        self.ws['A1'] = '2.0'
+        self.assertEqual(eval_formula("=D1",self.ws),6.0)
+        self.assertEqual(eval_formula("=D2",self.ws),12.0)
+        self.ws['D1'] = '1'
+        self.assertEqual(eval_formula("=D2",self.ws),2)
+    def test_cached_results_updated_when_column_inserted(self):
+        self.ws.insert_column_data('D',['=A1+B1'])
+        self.assertEqual(eval_formula("=D1",self.ws),5.0)
+        self.ws.insert_column('A',data=['10.0'])
+        self.assertEqual(eval_formula("=E1",self.ws),11.0)
+    def test_circular_reference(self):
+        self.ws.insert_column_data('D',['=D2','=D1','=D3'])
+        self.assertEqual(eval_formula("=D1",self.ws),BAD_REF)
+        self.assertEqual(eval_formula("=D3",self.ws),BAD_REF)
+
+class TestParseFormula(unittest.TestCase):
+    """
+    """
+    def test_parse_formula(self):
+        self.assertEqual(parse_formula("=A1"),(('A1',None),))
+        self.assertEqual(parse_formula("=A?+B?*2"),
+                         (('A?','+'),('B?','*'),('2',None)))
+        self.assertEqual(parse_formula("=#1/C1-1.5"),
+                         (('#1','/'),('C1','-'),('1.5',None)))
+
+class TestXLSXFormats(unittest.TestCase):
+    """
+    """
+    def setUp(self):
+        self.wd = tempfile.mkdtemp()
+        self.xlsx = xlsxwriter.Workbook(os.path.join(self.wd,'test.xlsx'))
+    def tearDown(self):
+        self.xlsx.close()
+        shutil.rmtree(self.wd)
+    def test_xlsx_formats_no_style(self):
+        formats = XLSXFormats(self.xlsx)
+        self.assertEqual(formats.get(None),None)
+        self.assertEqual(formats.get(XLSStyle()),None)
+    def test_xlsx_formats_are_cached(self):
+        formats = XLSXFormats(self.xlsx)
+        bold = formats.get(XLSStyle(bold=True))
+        self.assertNotEqual(bold,None)
+        self.assertEqual(formats.get(XLSStyle(bold=True)),bold)
+        self.assertNotEqual(formats.get(XLSStyle(color='red')),bold)
+        self.assertEqual(len(formats.formats),2)
+
+class TestConvertToXLSXValue(unittest.TestCase):
+    """
+    """
+    def test_convert_to_xlsx_value(self):
+        self.assertEqual(convert_to_xlsx_value(1),1)
+        self.assertEqual(convert_to_xlsx_value(1.5),1.5)
+        self.assertEqual(convert_to_xlsx_value('12'),12)
+        self.assertEqual(convert_to_xlsx_value('1.25'),1.25)
+        self.assertEqual(convert_to_xlsx_value('chr1'),'chr1')
+        self.assertEqual(convert_to_xlsx_value(True),'True')
 
 class TestFormatValue(unittest.TestCase):
     """
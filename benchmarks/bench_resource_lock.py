@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+#
+#     bench_resource_lock.py: microbenchmark for JobRunner.ResourceLock
+#     Copyright (C) University of Manchester 2026 Peter Briggs
+#
+"""
+Microbenchmark for acquire/release of ResourceLock
+
+Measures the mean time per acquire/release pair on a single
+resource, both uncontended (one thread) and contended (several
+threads sharing the same ResourceLock and resource name).
+
+By default the ResourceLock class from the installed 'bcftbx'
+package is benchmarked. To compare against another version,
+point '--jobrunner' at a copy of the JobRunner module, e.g.:
+
+    git show <commit>:bcftbx/JobRunner.py >/tmp/JobRunner_old.py
+    python benchmarks/bench_resource_lock.py \\
+        --jobrunner /tmp/JobRunner_old.py
+"""
+
+#######################################################################
+# Imports
+#######################################################################
+
+import argparse
+import importlib.util
+import threading
+import time
+
+#######################################################################
+# Functions
+#######################################################################
+
+def load_resource_lock(jobrunner=None):
+    """
+    Return the ResourceLock class to benchmark
+
+    Arguments:
+      jobrunner (str): optional, path to a JobRunner module
+        file to load ResourceLock from (otherwise it is
+        imported from 'bcftbx.JobRunner')
+
+    Returns:
+      Class: the ResourceLock class.
+    """
+    if jobrunner is None:
+        from bcftbx.JobRunner import ResourceLock
+        return ResourceLock
+    spec = importlib.util.spec_from_file_location("_bench_jobrunner",
+                                                  jobrunner)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.ResourceLock
+
+def run_ops(resource_lock,nops,resource_name="resource"):
+    """
+    Acquire and release the lock on a resource repeatedly
+
+    Arguments:
+      resource_lock (ResourceLock): ResourceLock instance
+      nops (int): number of acquire/release pairs
+      resource_name (str): name of the resource to lock
+    """
+    for i in range(nops):
+        lock = resource_lock.acquire(resource_name)
+        resource_lock.release(lock)
+
+def bench_uncontended(ResourceLock,nops):
+    """
+    Time acquire/release pairs from a single thread
+
+    Arguments:
+      ResourceLock (class): ResourceLock class to benchmark
+      nops (int): number of acquire/release pairs
+
+    Returns:
+      Float: mean time per operation (in microseconds).
+    """
+    r = ResourceLock()
+    start = time.perf_counter()
+    run_ops(r,nops)
+    return (time.perf_counter() - start)/nops*1.0e6
+
+def bench_contended(ResourceLock,nthreads,nops):
+    """
+    Time acquire/release pairs from several threads
+
+    Arguments:
+      ResourceLock (class): ResourceLock class to benchmark
+      nthreads (int): number of threads
+      nops (int): number of acquire/release pairs per thread
+
+    Returns:
+      Float: mean time per operation (in microseconds).
+    """
+    r = ResourceLock()
+    threads = [threading.Thread(target=run_ops,args=(r,nops))
+               for i in range(nthreads)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return (time.perf_counter() - start)/(nthreads*nops)*1.0e6
+
+#######################################################################
+# Main program
+#######################################################################
+
+def main(args=None):
+    p = argparse.ArgumentParser(
+        description="Microbenchmark for acquire/release of "
+        "ResourceLock")
+    p.add_argument("--jobrunner",action="store",default=None,
+                   help="load ResourceLock from JOBRUNNER (path "
+                   "to a JobRunner.py file) instead of the "
+                   "installed bcftbx package")
+    p.add_argument("-n","--nops",action="store",type=int,default=50,
+                   help="number of acquire/release operations "
+                   "per thread (default: 50)")
+    p.add_argument("-t","--threads",action="store",type=int,default=4,
+                   help="number of threads for the contended "
+                   "benchmark (default: 4)")
+    args = p.parse_args(args)
+    ResourceLock = load_resource_lock(args.jobrunner)
+    print("uncontended:        %.0fus/op" %
+          bench_uncontended(ResourceLock,args.nops))
+    print("%d threads x %d ops: %.0fus/op" %
+          (args.threads,args.nops,
+           bench_contended(ResourceLock,args.threads,args.nops)))
+
+if __name__ == "__main__":
+    main()